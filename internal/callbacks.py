@@ -1,6 +1,7 @@
 import os
 import sys
 import math
+import time
 from lightning.pytorch.callbacks import Callback
 from lightning.pytorch.callbacks.progress.tqdm_progress import TQDMProgressBar, Tqdm
 
@@ -28,10 +29,17 @@ class KeepRunningIfWebViewerEnabled(Callback):
     def on_train_end(self, trainer, pl_module) -> None:
         if pl_module.web_viewer is None:
             return
+        # the clients are rendered from the snapshot in another thread, so only the final model needs to be published
+        pl_module.web_viewer.is_training_paused = True
+        pl_module.web_viewer.publish_snapshot(
+            pl_module.gaussian_model,
+            pl_module.renderer,
+            pl_module._fixed_background_color(),
+            trainer.global_step,
+        )
         print("Training finished! Web viewer is still running. Press `Ctrl+C` to exist.")
         while True:
-            pl_module.web_viewer.is_training_paused = True
-            pl_module.web_viewer.process_all_render_requests(pl_module.gaussian_model, pl_module.renderer, pl_module._fixed_background_color())
+            time.sleep(1.)
 
 
 class StopImageSavingThreads(Callback):
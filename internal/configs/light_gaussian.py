@@ -9,3 +9,26 @@ class LightGaussian:
     prune_percent: float = 0.66
     prune_type: Literal["v_important_score"] = "v_important_score"
     v_pow: float = 0.1
+
+    exact_quantile: bool = True
+    """`False` to approximate the percentiles by histograms instead of exact selections"""
+
+    score_batch_size: int = 8
+    """The number of the cameras projected together by the exact pass"""
+
+    score_mode: Literal["exact", "accumulated"] = "exact"
+    """
+    exact: render all the training cameras at each prune step;
+    accumulated: accumulate the scores during the `score_accumulation_steps` training steps before each prune step
+    """
+
+    score_accumulation_steps: int = 1_000
+
+    score_accumulation_source: Literal["hit_count", "render_outputs"] = "hit_count"
+    """
+    hit_count: count the hit pixels for the camera of each training step;
+    render_outputs: estimate from the `radii` and `visibility_filter` of the training render, no extra pass required, but occlusion is ignored
+    """
+
+    validate_accumulated_score: bool = False
+    """also run the batched exact pass, and print the agreement between the prune masks"""
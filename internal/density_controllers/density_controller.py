@@ -3,6 +3,7 @@ import torch
 from torch import nn
 from lightning import LightningModule
 from internal.configs.instantiate_config import InstantiatableConfig
+from internal.utils.spatial_index import invalidate_spatial_index
 
 
 class DensityControllerImpl(torch.nn.Module):
@@ -26,7 +27,7 @@ class DensityControllerImpl(torch.nn.Module):
         """
         This interface will be invoked when the density is changed elsewhere
         """
-        pass
+        invalidate_spatial_index(gaussian_model)
 
 
 class DensityController(InstantiatableConfig):
@@ -359,4 +359,5 @@ class ForegroundFirstDensityControllerModule(DensityControllerImpl):
         self._init_state(checkpoint["state_dict"]["density_controller.max_radii2D"].shape[0], module.device)
 
     def after_density_changed(self, gaussian_model, optimizers: List, pl_module: LightningModule) -> None:
+        super().after_density_changed(gaussian_model, optimizers, pl_module)
         self._init_state(gaussian_model.n_gaussians, pl_module.device)
@@ -0,0 +1,183 @@
+"""
+Limit the number of Gaussians added by densification to a memory budget.
+
+The memory required by each Gaussian is estimated from the tensors actually allocated for it,
+i.e., the properties and their gradients, the optimizer states and the buffers of the density controller,
+plus a configurable estimation of the intermediate buffers allocated by the renderer.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Callable
+import torch
+
+
+@dataclass
+class MemoryBudget:
+    budget_gb: float = -1.
+    """The maximum memory allowed to be allocated during training, in GiB. A non-positive value disables the limitation."""
+
+    renderer_bytes_per_gaussian: int = 256
+    """The intermediate buffers allocated by the renderer for each Gaussian, e.g., 2D means, conics, colors, tile intersections and their gradients"""
+
+
+class CUDAMemoryReporter:
+    def __init__(self, device=None):
+        self.device = device
+
+    def get_peak_bytes(self) -> int:
+        return torch.cuda.max_memory_allocated(self.device)
+
+    def reset_peak(self) -> None:
+        torch.cuda.reset_peak_memory_stats(self.device)
+
+
+class MemoryBudgetGovernor:
+    """
+    Usage:
+        1. `get_max_new_gaussians()` before densifying, to get the number of Gaussians can be added;
+        2. `after_densify()` with the number of Gaussians actually added, to log the projected peak and restart the peak measurement.
+
+    Or simply `select_by_budget()`, if the densification is decided by a candidate mask.
+
+    The peak is measured since the last densification, so the working set of training steps is included.
+    """
+
+    def __init__(
+            self,
+            config: MemoryBudget,
+            memory_reporter=None,
+            log_fn: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.config = config
+        self.memory_reporter = CUDAMemoryReporter() if memory_reporter is None else memory_reporter
+        self.log_fn = log_fn
+
+        self.bytes_per_gaussian = 0
+        self.observed_peak_bytes = 0
+
+    @property
+    def budget_bytes(self) -> int:
+        return int(self.config.budget_gb * 1024 ** 3)
+
+    @staticmethod
+    def _bytes_per_row(tensor: torch.Tensor) -> int:
+        return tensor.element_size() * math.prod(tensor.shape[1:])
+
+    @classmethod
+    def estimate_bytes_per_gaussian(
+            cls,
+            gaussian_model,
+            optimizers: List,
+            buffers: Iterable[torch.Tensor] = (),
+            renderer_bytes_per_gaussian: int = 0,
+    ) -> int:
+        """
+        Args:
+            gaussian_model
+            optimizers
+            buffers: the per-Gaussian states held by the density controller, those whose first dimension is not the number of Gaussians will be ignored
+            renderer_bytes_per_gaussian
+        """
+
+        n = gaussian_model.n_gaussians
+        n_bytes = renderer_bytes_per_gaussian
+
+        # properties and their gradients
+        for value in gaussian_model.properties.values():
+            row_bytes = cls._bytes_per_row(value)
+            n_bytes += row_bytes
+            if value.requires_grad:
+                n_bytes += row_bytes
+
+        # optimizer states
+        for optimizer in optimizers:
+            for state in optimizer.state.values():
+                for value in state.values():
+                    if isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == n:
+                        n_bytes += cls._bytes_per_row(value)
+
+        # density controller states
+        for value in buffers:
+            if value.dim() > 0 and value.shape[0] == n:
+                n_bytes += cls._bytes_per_row(value)
+
+        return n_bytes
+
+    def get_max_new_gaussians(self, gaussian_model, optimizers: List, buffers: Iterable[torch.Tensor] = ()) -> int:
+        self.bytes_per_gaussian = self.estimate_bytes_per_gaussian(
+            gaussian_model,
+            optimizers,
+            buffers,
+            renderer_bytes_per_gaussian=self.config.renderer_bytes_per_gaussian,
+        )
+        self.observed_peak_bytes = self.memory_reporter.get_peak_bytes()
+
+        return max((self.budget_bytes - self.observed_peak_bytes) // max(self.bytes_per_gaussian, 1), 0)
+
+    def after_densify(self, n_requested: int, n_new: int) -> int:
+        """
+        Returns:
+            the projected peak in bytes
+        """
+
+        projected_peak_bytes = self.observed_peak_bytes + n_new * self.bytes_per_gaussian
+
+        if self.log_fn is not None:
+            self.log_fn("memory/projected_peak_gb", projected_peak_bytes / 1024 ** 3)
+            self.log_fn("memory/bytes_per_gaussian", self.bytes_per_gaussian)
+            self.log_fn("memory/rejected_gaussians", n_requested - n_new)
+
+        self.memory_reporter.reset_peak()
+
+        return projected_peak_bytes
+
+    @staticmethod
+    def select_top_scores_within_budget(scores: torch.Tensor, candidates: torch.Tensor, costs: torch.Tensor, budget: int) -> torch.Tensor:
+        """
+        Select the candidates in descending order of scores, until their total cost reaches the budget
+
+        Args:
+            scores: [N]
+            candidates: [N], bool
+            costs: [N], the number of new Gaussians produced by each candidate
+            budget: the maximum number of new Gaussians
+
+        Returns:
+            [N] the selected mask
+        """
+
+        candidate_indices = torch.nonzero(candidates, as_tuple=True)[0]
+        order = torch.argsort(scores[candidate_indices], descending=True, stable=True)
+        sorted_indices = candidate_indices[order]
+        within_budget = torch.cumsum(costs[sorted_indices], dim=0) <= budget
+
+        selected = torch.zeros_like(candidates)
+        selected[sorted_indices[within_budget]] = True
+
+        return selected
+
+    def select_by_budget(
+            self,
+            scores: torch.Tensor,
+            candidates: torch.Tensor,
+            costs: torch.Tensor,
+            gaussian_model,
+            optimizers: List,
+            buffers: Iterable[torch.Tensor] = (),
+    ) -> torch.Tensor:
+        """
+        Returns:
+            [N] the mask of the candidates kept
+        """
+
+        max_new = self.get_max_new_gaussians(gaussian_model, optimizers, buffers)
+        n_requested = torch.sum(costs[candidates]).item()
+
+        selected = candidates
+        if n_requested > max_new:
+            selected = self.select_top_scores_within_budget(scores, candidates, costs, max_new)
+
+        self.after_densify(n_requested, torch.sum(costs[selected]).item())
+
+        return selected
@@ -3,7 +3,7 @@ Most copied from https://github.com/humansensinglab/taming-3dgs
 """
 
 from typing import Literal, List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import torch
 from lightning import LightningModule
 from PIL import ImageFilter
@@ -11,7 +11,9 @@ import torchvision.transforms as transforms
 from fused_ssim import fused_ssim
 from internal.renderers.gsplat_v1_renderer import GSplatV1
 from gsplat.rasterize_to_weights import rasterize_to_weights
+from internal.utils.selection import weighted_sample_without_replacement
 from .density_controller import DensityController
+from .memory_budget import MemoryBudget
 from .vanilla_density_controller import VanillaDensityControllerImpl
 
 
@@ -70,6 +72,9 @@ class Taming3DGSDensityController(DensityController):
 
     score_coeffs: ScoreCoefficients = ScoreCoefficients()
 
+    memory_budget: MemoryBudget = field(default_factory=lambda: MemoryBudget())
+    """Further limit the budget of each densification by the memory"""
+
     def instantiate(self, *args, **kwargs) -> "Taming3DGSDensityControllerModule":
         return Taming3DGSDensityControllerModule(self)
 
@@ -188,6 +193,10 @@ class Taming3DGSDensityControllerModule(VanillaDensityControllerImpl):
 
         curr_points = gaussian_model.n_gaussians
         budget = min(self.counts_array[self.densify_iter_num], total_clones + total_splits + curr_points)
+        n_requested = budget - curr_points
+        if self.memory_budget_governor is not None:
+            max_new = self.memory_budget_governor.get_max_new_gaussians(gaussian_model, optimizers, self.buffers())
+            budget = min(budget, curr_points + max_new)
         clone_budget = ((budget - curr_points) * total_clones) // (total_clones + total_splits)
         split_budget = ((budget - curr_points) * total_splits) // (total_clones + total_splits)
 
@@ -206,12 +215,15 @@ class Taming3DGSDensityControllerModule(VanillaDensityControllerImpl):
             optimizers,
         )
 
+        if self.memory_budget_governor is not None:
+            self.memory_budget_governor.after_densify(n_requested, clone_budget + split_budget)
+
     def _densify_and_clone(self, scores, budget, filter, gaussian_model, optimizers):
         scores = scores * filter.float()
         n_init_points = gaussian_model.n_gaussians
         selected_pts_mask = torch.zeros((n_init_points,), dtype=torch.bool, device=scores.device)
 
-        sampled_indices = torch.multinomial(scores, budget, replacement=False)
+        sampled_indices = weighted_sample_without_replacement(scores, budget)
         selected_pts_mask[sampled_indices] = True
 
         # Copy selected Gaussians
@@ -230,7 +242,7 @@ class Taming3DGSDensityControllerModule(VanillaDensityControllerImpl):
         padded_importance[:scores.shape[0]] = scores
 
         selected_pts_mask = torch.zeros_like(padded_importance, dtype=torch.bool, device=scores.device)
-        sampled_indices = torch.multinomial(padded_importance, budget, replacement=False)
+        sampled_indices = weighted_sample_without_replacement(padded_importance, budget)
         selected_pts_mask[sampled_indices] = True
 
         # Split
@@ -267,11 +279,11 @@ class Taming3DGSDensityControllerModule(VanillaDensityControllerImpl):
             return
 
         n_init_points = gaussian_model.n_gaussians
-        padded_importance = torch.zeros((n_init_points,), dtype=torch.float32)
+        padded_importance = torch.zeros((n_init_points,), dtype=torch.float32, device=scores.device)
         padded_importance[:scores.shape[0]] = 1 / (1e-6 + scores.squeeze())
         selected_pts_mask = torch.zeros_like(padded_importance, dtype=torch.bool, device=scores.device)
 
-        sampled_indices = torch.multinomial(padded_importance, remove_budget, replacement=False)
+        sampled_indices = weighted_sample_without_replacement(padded_importance, remove_budget)
         selected_pts_mask[sampled_indices] = True
         final_prune = torch.logical_and(prune_mask, selected_pts_mask)
 
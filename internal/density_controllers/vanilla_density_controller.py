@@ -1,5 +1,5 @@
 from typing import Tuple, Optional, Union, List, Dict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import torch
 from torch import nn
 from lightning import LightningModule
@@ -7,6 +7,7 @@ from lightning import LightningModule
 from internal.models.vanilla_gaussian import VanillaGaussianModel
 from internal.utils.general_utils import build_rotation
 from .density_controller import DensityController, DensityControllerImpl, Utils
+from .memory_budget import MemoryBudget, MemoryBudgetGovernor
 
 
 @dataclass
@@ -32,6 +33,9 @@ class VanillaDensityController(DensityController):
 
     absgrad: bool = False
 
+    memory_budget: MemoryBudget = field(default_factory=lambda: MemoryBudget())
+    """Limit the number of Gaussians added by densification, the ones with larger gradients are preferred"""
+
     def instantiate(self, *args, **kwargs) -> DensityControllerImpl:
         return VanillaDensityControllerImpl(self)
 
@@ -50,6 +54,24 @@ class VanillaDensityControllerImpl(DensityControllerImpl):
                 print(f"Override scene extent with {self.config.scene_extent_override}")
 
             self._init_state(pl_module.gaussian_model.n_gaussians, pl_module.device)
+            self._setup_memory_budget_governor(pl_module)
+
+    def _setup_memory_budget_governor(self, pl_module: LightningModule, memory_reporter=None):
+        self.memory_budget_governor = None
+        memory_budget = getattr(self.config, "memory_budget", None)
+        if memory_budget is None or memory_budget.budget_gb <= 0:
+            return
+
+        def log_fn(name, value):
+            if pl_module.logger is None:
+                return
+            pl_module.logger.log_metrics({"density/{}".format(name): value}, step=pl_module.trainer.global_step)
+
+        self.memory_budget_governor = MemoryBudgetGovernor(
+            memory_budget,
+            memory_reporter=memory_reporter,
+            log_fn=log_fn,
+        )
 
     def _init_state(self, n_gaussians: int, device):
         max_radii2D = torch.zeros((n_gaussians), device=device)
@@ -119,6 +141,7 @@ class VanillaDensityControllerImpl(DensityControllerImpl):
         # calculate mean grads
         grads = self.xyz_gradient_accum / self.denom
         grads[grads.isnan()] = 0.0
+        grads = self._limit_densification_by_memory_budget(grads, gaussian_model, optimizers)
 
         # densify
         self._densify_and_clone(grads, gaussian_model, optimizers)
@@ -134,6 +157,32 @@ class VanillaDensityControllerImpl(DensityControllerImpl):
 
         torch.cuda.empty_cache()
 
+    def _limit_densification_by_memory_budget(self, grads, gaussian_model: VanillaGaussianModel, optimizers: List, N: int = 2):
+        """
+        Returns:
+            the `grads` of the Gaussians exceeding the budget are set to zero, so they will not be densified
+        """
+
+        if getattr(self, "memory_budget_governor", None) is None:
+            return grads
+
+        grad_norms = torch.norm(grads, dim=-1)
+        candidates = grad_norms >= self.config.densify_grad_threshold
+        # a split one produces N new Gaussians before it is pruned
+        is_split = torch.max(gaussian_model.get_scales(), dim=1).values > self.config.percent_dense * self.cameras_extent
+        costs = torch.where(is_split, N, 1)
+
+        selected = self.memory_budget_governor.select_by_budget(
+            scores=grad_norms,
+            candidates=candidates,
+            costs=costs,
+            gaussian_model=gaussian_model,
+            optimizers=optimizers,
+            buffers=self.buffers(),
+        )
+
+        return torch.where(selected.unsqueeze(-1), grads, torch.zeros_like(grads))
+
     def _densify_and_clone(self, grads, gaussian_model: VanillaGaussianModel, optimizers: List):
         grad_threshold = self.config.densify_grad_threshold
         percent_dense = self.config.percent_dense
@@ -263,4 +312,5 @@ class VanillaDensityControllerImpl(DensityControllerImpl):
         self._init_state(checkpoint["state_dict"]["density_controller.max_radii2D"].shape[0], module.device)
 
     def after_density_changed(self, gaussian_model, optimizers: List, pl_module: LightningModule) -> None:
+        super().after_density_changed(gaussian_model, optimizers, pl_module)
         self._init_state(gaussian_model.n_gaussians, pl_module.device)
@@ -0,0 +1,86 @@
+import argparse
+import torch
+from internal.utils.gaussian_model_loader import GaussianModelLoader
+from internal.viewer.frame_encoder import get_frame_encoder
+from internal.render_server import RenderService, RenderServer
+
+
+def load_models(model_paths: list[str], device) -> dict:
+    """
+    Args:
+        model_paths: `name=path` or `path`, the name defaults to the index
+
+    Returns:
+        `{name: (gaussian_model, renderer)}`
+    """
+
+    models = {}
+    for idx, model_path in enumerate(model_paths):
+        name = str(idx)
+        if "=" in model_path:
+            name, model_path = model_path.split("=", 1)
+        if name in models:
+            raise ValueError("duplicated model name `{}`".format(name))
+
+        model, renderer = GaussianModelLoader.search_and_load(model_path, device)
+        model.freeze()
+        models[name] = (model, renderer)
+        print("Model `{}`: {} Gaussians, renderer: {}".format(name, model.get_xyz.shape[0], renderer.__class__.__name__))
+    return models
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_paths", type=str, nargs="+",
+                        help="`name=path` or `path`, the name defaults to the index")
+    parser.add_argument("--host", "-a", type=str, default="0.0.0.0")
+    parser.add_argument("--port", "-p", type=int, default=8090)
+    parser.add_argument("--websocket_port", "--websocket-port", type=int, default=None,
+                        help="Start the WebSocket server on this port")
+    parser.add_argument("--background_color", "--background-color", "--bkg_color", "-b",
+                        type=str, nargs="+", default=["black"],
+                        help="e.g.: white, black, 0 0 0, 1 1 1")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--max_batch_size", "--max-batch-size", type=int, default=8)
+    parser.add_argument("--max_queue_size", "--max-queue-size", type=int, default=64,
+                        help="The maximum number of the cameras waiting to be rendered, the requests exceeding it are rejected")
+    parser.add_argument("--request_timeout", "--request-timeout", type=float, default=60.)
+    parser.add_argument("--frame_encoder", "--frame-encoder", type=str, default="auto",
+                        help="auto, torchvision or process_pool, PIL is used if not available")
+    parser.add_argument("--verbose", "-v", action="store_true", default=False)
+    parser.add_argument("--float32_matmul_precision", "--fp", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.float32_matmul_precision is not None:
+        torch.set_float32_matmul_precision(args.float32_matmul_precision)
+
+    if len(args.background_color) == 1 and isinstance(args.background_color[0], str):
+        if args.background_color[0] == "white":
+            args.background_color = (1., 1., 1.)
+        else:
+            args.background_color = (0., 0., 0.)
+    else:
+        args.background_color = tuple([float(i) for i in args.background_color])
+
+    device = torch.device(args.device)
+    # the models are resident, loaded only once
+    service = RenderService(
+        load_models(args.model_paths, device),
+        background_color=args.background_color,
+        device=device,
+        max_batch_size=args.max_batch_size,
+        max_queue_size=args.max_queue_size,
+        request_timeout=args.request_timeout,
+        encoder=get_frame_encoder(args.frame_encoder),
+    )
+    server = RenderServer(
+        service,
+        host=args.host,
+        port=args.port,
+        websocket_port=args.websocket_port,
+        verbose=args.verbose,
+    )
+    print("Serving HTTP on {}:{}".format(args.host, server.port))
+    if server.websocket_port is not None:
+        print("Serving WebSocket on {}:{}".format(args.host, server.websocket_port))
+    server.serve_forever()
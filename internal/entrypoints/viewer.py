@@ -44,6 +44,18 @@ def cli():
     parser.add_argument("--vanilla_seganygs", action="store_true", default=False)
     parser.add_argument("--vanilla_mip", action="store_true", default=False)
     parser.add_argument("--vanilla_pvg", action="store_true", default=False)
+    parser.add_argument("--render_cache_size", "--render-cache-size", type=int, default=256,
+                        help="in MB, cache the renderings of the visited poses, 0 to disable")
+    parser.add_argument("--frame_encoder", "--frame-encoder", type=str, default="auto",
+                        help="auto, torchvision, process_pool or viser")
+    parser.add_argument("--sync_load", "--sync-load", action="store_true", default=False,
+                        help="Load the models before starting the server, instead of in the background")
+    parser.add_argument("--watch", action="store_true", default=False,
+                        help="Reload the latest checkpoint of the model output directory once a new one is saved")
+    parser.add_argument("--watch_interval", "--watch-interval", type=float, default=10.,
+                        help="in seconds")
+    parser.add_argument("--progressive", action="store_true", default=False,
+                        help="Order the Gaussians by importance once loaded, then render only the most important ones while moving")
     parser.add_argument("--float32_matmul_precision", "--fp", type=str, default=None)
     args = parser.parse_args()
 
@@ -51,6 +63,8 @@ def cli():
     if args.float32_matmul_precision is not None:
         torch.set_float32_matmul_precision(args.float32_matmul_precision)
     del args.float32_matmul_precision
+    args.async_load = not args.sync_load
+    del args.sync_load
 
     # arguments post process
     if len(args.background_color) == 1 and isinstance(args.background_color[0], str):
@@ -27,7 +27,7 @@ from internal.density_controllers.density_controller import DensityController
 from internal.density_controllers.vanilla_density_controller import VanillaDensityController
 from jsonargparse import lazy_instance
 
-from internal.utils.sh_utils import eval_sh
+from internal.utils.sh_utils import eval_sh_colors
 from internal.utils.graphics_utils import store_ply
 
 
@@ -50,6 +50,7 @@ class GaussianSplatting(LightningModule):
             web_viewer: bool = False,
             initialize_from: str = None,
             renderer_output_types: Optional[List[str]] = None,
+            val_render_cache_size: int = 0,
     ) -> None:
         super().__init__()
         self.automatic_optimization = False
@@ -68,6 +69,12 @@ class GaussianSplatting(LightningModule):
 
         self.renderer_output_types = renderer_output_types
 
+        # in MB, reuse the validation renderings if the model not changed, e.g. validating multiple times without training
+        self.val_render_cache = None
+        if val_render_cache_size > 0:
+            from internal.utils.render_cache import RenderCache
+            self.val_render_cache = RenderCache(max_bytes=val_render_cache_size * 1024 * 1024)
+
         # instantiate density controller
         self.density_controller = density.instantiate()
 
@@ -167,6 +174,9 @@ class GaussianSplatting(LightningModule):
         self.metric.setup(stage=stage, pl_module=self)
         self.density_controller.setup(stage=stage, pl_module=self)
 
+        if stage == "fit":
+            self._setup_light_gaussian_score_accumulator()
+
         # use different image log method based on the logger type
         self.log_image = None
         if isinstance(self.logger, lightning.pytorch.loggers.TensorBoardLogger):
@@ -248,6 +258,14 @@ class GaussianSplatting(LightningModule):
                 bg_color=self.get_background_color().to(camera.R.device),
                 render_types=self.renderer_output_types,
             )
+        if self.val_render_cache is not None:
+            return self.val_render_cache.render(
+                self.renderer,
+                camera,
+                self.gaussian_model,
+                self._fixed_background_color().to(camera.R.device),
+                render_types=self.renderer_output_types,
+            )
         return self.renderer(
             camera,
             self.gaussian_model,
@@ -401,6 +419,66 @@ class GaussianSplatting(LightningModule):
         for scheduler in schedulers:
             scheduler.step()
 
+    def _light_gaussian_anti_aliased(self) -> bool:
+        # try to detect whether anti aliased enabled
+        try:
+            return self.renderer.anti_aliased
+        except:
+            return False
+
+    def _setup_light_gaussian_score_accumulator(self):
+        self.light_gaussian_score_accumulator = None
+        if self.light_gaussian_hparams.score_mode != "accumulated" or len(self.light_gaussian_hparams.prune_steps) == 0:
+            return
+
+        from internal.utils.light_gaussian import LightGaussianScoreAccumulator
+        self.light_gaussian_score_accumulator = LightGaussianScoreAccumulator(
+            n_cameras=len(self.trainer.datamodule.dataparser_outputs.train_set.cameras),
+            anti_aliased=self._light_gaussian_anti_aliased(),
+        )
+        self.light_gaussian_accumulating_for = -1
+        self.on_after_backward_hooks.append(self._accumulate_light_gaussian_score)
+
+    def _accumulate_light_gaussian_score(self, outputs, batch, gaussian_model, global_step, pl_module):
+        accumulator = self.light_gaussian_score_accumulator
+        next_prune_step = accumulator.get_accumulating_prune_step(
+            self.light_gaussian_hparams.prune_steps,
+            global_step,
+            self.light_gaussian_hparams.score_accumulation_steps,
+        )
+        if next_prune_step is None:
+            return
+
+        if self.light_gaussian_accumulating_for != next_prune_step:
+            # start a new accumulation window
+            accumulator.reset(gaussian_model.n_gaussians, gaussian_model.get_xyz.device)
+            self.light_gaussian_accumulating_for = next_prune_step
+
+        if self.light_gaussian_hparams.score_accumulation_source == "render_outputs":
+            accumulator.update_by_render_outputs(gaussian_model, outputs)
+        else:
+            accumulator.update_by_camera(gaussian_model, batch[0])
+
+    def _get_light_gaussian_count_and_score(self, anti_aliased: bool):
+        accumulator = getattr(self, "light_gaussian_score_accumulator", None)
+        if accumulator is not None and accumulator.is_valid_for(self.gaussian_model.n_gaussians):
+            return accumulator.get_count_and_score()
+
+        if accumulator is not None:
+            print("[LightGaussian] no valid accumulated scores, fallback to the exact pass")
+
+        return self._get_light_gaussian_exact_count_and_score(anti_aliased)
+
+    def _get_light_gaussian_exact_count_and_score(self, anti_aliased: bool):
+        from internal.utils.light_gaussian import get_count_and_score
+
+        return get_count_and_score(
+            self.gaussian_model,
+            self.trainer.datamodule.dataparser_outputs.train_set.cameras,
+            anti_aliased,
+            batch_size=self.light_gaussian_hparams.score_batch_size,
+        )
+
     def light_gaussian_prune(self, global_step):
         # TODO: move elsewhere
 
@@ -410,32 +488,36 @@ class GaussianSplatting(LightningModule):
         if global_step not in self.light_gaussian_hparams.prune_steps:
             return
 
-        from internal.utils.light_gaussian import get_count_and_score
         from internal.utils.light_gaussian import calculate_v_imp_score
         from internal.utils.light_gaussian import get_prune_mask
+        from internal.utils.light_gaussian import get_prune_mask_agreement
 
-        # try to detect whether anti aliased enabled
-        try:
-            anti_aliased = self.renderer.anti_aliased
-        except:
-            anti_aliased = False
+        anti_aliased = self._light_gaussian_anti_aliased()
 
         with torch.no_grad():
-            count, score, _, _ = get_count_and_score(
-                self.gaussian_model,
-                self.trainer.datamodule.dataparser_outputs.train_set.cameras,
-                anti_aliased,
-            )
+            count, score, _, _ = self._get_light_gaussian_count_and_score(anti_aliased)
             v_list = calculate_v_imp_score(
                 self.gaussian_model.get_scaling,
                 score,
                 self.light_gaussian_hparams.v_pow,
+                exact=self.light_gaussian_hparams.exact_quantile,
             )
 
             # TODO: `self.light_gaussian_hparams.prune_steps` should be sorted
             prune_step_index = self.light_gaussian_hparams.prune_steps.index(global_step)
             prune_percent = self.light_gaussian_hparams.prune_percent * (self.light_gaussian_hparams.prune_decay ** prune_step_index)
-            prune_mask = get_prune_mask(prune_percent, v_list)
+            prune_mask = get_prune_mask(prune_percent, v_list, exact=self.light_gaussian_hparams.exact_quantile)
+
+            if self.light_gaussian_hparams.score_mode == "accumulated" and self.light_gaussian_hparams.validate_accumulated_score:
+                _, exact_score, _, _ = self._get_light_gaussian_exact_count_and_score(anti_aliased)
+                exact_prune_mask = get_prune_mask(prune_percent, calculate_v_imp_score(
+                    self.gaussian_model.get_scaling,
+                    exact_score,
+                    self.light_gaussian_hparams.v_pow,
+                    exact=self.light_gaussian_hparams.exact_quantile,
+                ), exact=self.light_gaussian_hparams.exact_quantile)
+                agreement, iou = get_prune_mask_agreement(prune_mask, exact_prune_mask)
+                print(f"[LightGaussian] prune mask agreement between accumulated and exact scores: {agreement}, IoU of pruned: {iou}")
 
             print(f"number_of_gaussian={self.gaussian_model.get_xyz.shape[0]}, "
                   f"number_to_prune={prune_mask.sum().item()}, "
@@ -465,16 +547,6 @@ class GaussianSplatting(LightningModule):
 
         super().on_train_batch_end(outputs, batch, batch_idx)
 
-    def on_validation_batch_start(self, batch: Any, batch_idx: int, dataloader_idx: int = 0) -> None:
-        super().on_validation_batch_start(batch, batch_idx, dataloader_idx)
-        if self.web_viewer is not None:
-            self.web_viewer.validation_step(
-                self.gaussian_model,
-                self.renderer,
-                self._fixed_background_color(),
-                batch_idx,
-            )
-
     def validation_step(self, batch, batch_idx, name: str = "val"):
         camera, image_info, _ = batch
         gt_image = image_info[1]
@@ -578,6 +650,10 @@ class GaussianSplatting(LightningModule):
 
         self.val_metrics.clear()
 
+        if self.val_render_cache is not None:
+            self.log(f"{name}/render_cache_hit_rate", self.val_render_cache.hit_rate, on_epoch=True, batch_size=self.batch_size)
+            self.val_render_cache.reset_metrics()
+
     def on_test_epoch_start(self) -> None:
         super().on_test_epoch_start()
         self.on_validation_epoch_start()
@@ -704,7 +780,7 @@ class GaussianSplatting(LightningModule):
         self.trainer.save_checkpoint(checkpoint_path)
         with torch.no_grad():
             xyz = self.gaussian_model.get_xyz
-            rgb = eval_sh(0, self.gaussian_model.get_features[:, :1, :].transpose(1, 2), None)
+            rgb = eval_sh_colors(0, self.gaussian_model.get_features[:, :1, :])
             store_ply(os.path.join(
                 self.hparams["output_path"],
                 "checkpoints",
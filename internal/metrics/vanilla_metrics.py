@@ -3,7 +3,7 @@ from typing import Tuple, Dict, Literal, Any
 import torch
 from torchmetrics.image import PeakSignalNoiseRatio
 from torchmetrics.image.lpip import LearnedPerceptualImagePatchSimilarity
-from internal.utils.ssim import ssim
+from internal.utils.ssim import ssim, separable_ssim, l1_ssim_loss
 
 from .metric import Metric, MetricImpl
 from ..configs.instantiate_config import InstantiatableConfig
@@ -49,23 +49,29 @@ class VanillaMetricsImpl(MetricImpl):
             print("Use L2 loss")
             self.rgb_diff_loss_fn = self._l2_loss
 
-        self.ssim = ssim
+        self.ssim = separable_ssim
         if self.config.fused_ssim:
             print("Fused SSIM enabled")
             self.ssim = self._create_fused_ssim_adapter()
 
+        # compute L1 and D-SSIM in one call when both of them are the default implementations
+        self.fused_l1_ssim = self.config.rgb_diff_loss == "l1" and not self.config.fused_ssim
+
     def _get_basic_metrics(self, pl_module, gaussian_model, batch, outputs):
         camera, image_info, _ = batch
         image_name, gt_image, masked_pixels = image_info
         image = outputs["render"]
 
         # calculate loss
-        if masked_pixels is not None:
-            gt_image = gt_image.clone()
-            gt_image[masked_pixels] = image.detach()[masked_pixels]  # copy masked pixels from prediction to G.T.
-        rgb_diff_loss = self.rgb_diff_loss_fn(outputs["render"], gt_image)
-        ssim_metric = self.ssim(outputs["render"], gt_image)
-        loss = (1.0 - self.lambda_dssim) * rgb_diff_loss + self.lambda_dssim * (1. - ssim_metric)
+        if self.fused_l1_ssim:
+            loss, rgb_diff_loss, ssim_metric = l1_ssim_loss(image, gt_image, self.lambda_dssim, masked_pixels)
+        else:
+            if masked_pixels is not None:
+                # copy masked pixels from prediction to G.T.
+                gt_image = torch.where(masked_pixels, image.detach(), gt_image)
+            rgb_diff_loss = self.rgb_diff_loss_fn(image, gt_image)
+            ssim_metric = self.ssim(image, gt_image)
+            loss = (1.0 - self.lambda_dssim) * rgb_diff_loss + self.lambda_dssim * (1. - ssim_metric)
 
         return {
             "loss": loss,
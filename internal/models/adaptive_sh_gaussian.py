@@ -0,0 +1,334 @@
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional
+import torch
+from torch import nn
+
+from .vanilla_gaussian import VanillaGaussian, VanillaGaussianModel
+
+
+@dataclass
+class AdaptiveSHGaussian(VanillaGaussian):
+    """
+    Each Gaussian has its own SH degree.
+    The rest SHs are stored in packed tensors, one for each degree: `shs_rest_1`, `shs_rest_2`, ...
+
+    Created from a trained model by `AdaptiveSHGaussianModel.setup_from_vanilla_properties()`, training is not supported.
+    """
+
+    cache_dense_shs: bool = False
+    """
+    Keep the zero padded SHs after `pre_activate_all_properties()`, so they are not unpacked by every render.
+    The packed ones are still stored, so the SHs take the memory of both layouts, more than the dense model,
+    only enable it when the memory is not a concern.
+    """
+
+    def instantiate(self, *args, **kwargs) -> "AdaptiveSHGaussianModel":
+        return AdaptiveSHGaussianModel(self)
+
+
+class AdaptiveSHGaussianModel(VanillaGaussianModel):
+    """
+    The Gaussians are ordered by their SH degrees, from 0 to `max_sh_degree`.
+    The number of Gaussians of degree `d > 0` is the length of `shs_rest_d`, the remaining ones are degree 0.
+    """
+
+    def __init__(self, config: AdaptiveSHGaussian) -> None:
+        super().__init__(config)
+
+        names = list(self._names)
+        names.remove("shs_rest")
+        names += self.get_packed_shs_rest_names()
+        self._names = tuple(names)
+
+        # the length of the packed tensors are only known after loading
+        self._register_load_state_dict_pre_hook(self._resize_packed_shs_rest_before_loading)
+
+        # the position of each Gaussian in the order of the last `reorder()`, `None` if the stored order is used
+        self._importance_ranks: Optional[torch.Tensor] = None
+
+        # (state of the SH tensors, the zero padded SHs), see `get_shs()`
+        self._dense_shs_cache: Optional[Tuple[Tuple, torch.Tensor]] = None
+
+    def get_packed_shs_rest_names(self) -> List[str]:
+        return ["shs_rest_{}".format(degree) for degree in range(1, self.config.sh_degree + 1)]
+
+    @staticmethod
+    def n_shs_rest_of_degree(degree: int) -> int:
+        return (degree + 1) ** 2 - 1
+
+    def get_n_gaussians_by_degree(self) -> List[int]:
+        n_by_degree = [self.gaussians[name].shape[0] for name in self.get_packed_shs_rest_names()]
+        return [self.n_gaussians - sum(n_by_degree)] + n_by_degree
+
+    def get_degree_ranges(self) -> List[Tuple[int, int]]:
+        """
+        Returns:
+            the `[begin, end)` of each degree
+        """
+
+        ranges = []
+        begin = 0
+        for n in self.get_n_gaussians_by_degree():
+            ranges.append((begin, begin + n))
+            begin += n
+        return ranges
+
+    def get_sh_degrees(self) -> torch.Tensor:
+        """
+        Returns:
+            [N] the SH degree of each Gaussian
+        """
+
+        return torch.repeat_interleave(
+            torch.arange(self.config.sh_degree + 1, device=self.get_xyz.device),
+            torch.tensor(self.get_n_gaussians_by_degree(), device=self.get_xyz.device),
+        )
+
+    def _create_packed_shs_rest(self, n_by_degree: List[int]) -> Dict[str, torch.Tensor]:
+        return {
+            "shs_rest_{}".format(degree): nn.Parameter(torch.zeros((n_by_degree[degree], self.n_shs_rest_of_degree(degree), 3)).requires_grad_(True))
+            for degree in range(1, self.config.sh_degree + 1)
+        }
+
+    def before_setup_set_properties_from_number(self, n: int, property_dict: Dict[str, torch.Tensor], n_by_degree: Optional[List[int]] = None, *args, **kwargs):
+        """
+        Args:
+            n_by_degree: the number of Gaussians of each degree, all are degree 0 if not provided
+        """
+
+        if n_by_degree is None:
+            n_by_degree = [n] + [0] * self.config.sh_degree
+        assert len(n_by_degree) == self.config.sh_degree + 1 and sum(n_by_degree) == n
+
+        del property_dict["shs_rest"]
+        property_dict.update(self._create_packed_shs_rest(n_by_degree))
+
+    @torch.no_grad()
+    def setup_from_vanilla_properties(self, properties: Dict[str, torch.Tensor], sh_degrees: torch.Tensor):
+        """
+        Args:
+            properties: the properties of a `VanillaGaussianModel` with the same `sh_degree`, not pre-activated
+            sh_degrees: [N] the SH degree assigned to each Gaussian
+        Returns:
+            [N] the indices of the Gaussians in `properties`, in the order of this model
+        """
+
+        assert properties["shs_rest"].shape[1] == self.n_shs_rest_of_degree(self.config.sh_degree), "sh_degree not match"
+
+        sh_degrees = sh_degrees.to(properties["means"].device).clamp(0, self.config.sh_degree)
+        order = torch.argsort(sh_degrees, stable=True)
+        n_by_degree = torch.bincount(sh_degrees, minlength=self.config.sh_degree + 1).tolist()
+
+        self.setup_from_number(len(order), n_by_degree=n_by_degree)
+        self.to(properties["means"].device)
+
+        for name in self.property_names:
+            if name in properties:
+                self.gaussians[name] = nn.Parameter(properties[name][order].clone().requires_grad_(True))
+
+        shs_rest = properties["shs_rest"][order]
+        for degree, (begin, end) in enumerate(self.get_degree_ranges()):
+            if degree == 0:
+                continue
+            self.gaussians["shs_rest_{}".format(degree)] = nn.Parameter(
+                shs_rest[begin:end, :self.n_shs_rest_of_degree(degree)].clone().requires_grad_(True),
+            )
+
+        self.active_sh_degree = self.config.sh_degree
+
+        return order
+
+    def _resize_packed_shs_rest_before_loading(self, state_dict, prefix, *args, **kwargs):
+        for name in self.get_packed_shs_rest_names():
+            key = "{}gaussians.{}".format(prefix, name)
+            if key not in state_dict or name not in self.gaussians:
+                continue
+            if state_dict[key].shape == self.gaussians[name].shape:
+                continue
+            self.gaussians[name] = nn.Parameter(
+                torch.empty(state_dict[key].shape, dtype=self.gaussians[name].dtype, device=self.gaussians[name].device),
+                requires_grad=self.gaussians[name].requires_grad,
+            )
+
+    @torch.no_grad()
+    def reorder(self, order: torch.Tensor):
+        """
+        The Gaussians are kept grouped by their SH degrees, so `order` is only followed within each degree,
+        the position of each Gaussian in `order` is kept for `get_prefix_view()`.
+        """
+
+        ranks = torch.empty_like(order)
+        ranks[order] = torch.arange(order.shape[0], dtype=order.dtype, device=order.device)
+
+        degree_ranges = self.get_degree_ranges()
+        permutation = torch.cat([
+            begin + torch.argsort(ranks[begin:end], stable=True)
+            for begin, end in degree_ranges
+        ])
+
+        packed_names = self.get_packed_shs_rest_names()
+        for name in self.property_names:
+            if name not in packed_names:
+                self.set_property(name, self.get_property(name)[permutation])
+        for degree, (begin, end) in enumerate(degree_ranges):
+            if degree == 0:
+                continue
+            name = "shs_rest_{}".format(degree)
+            self.set_property(name, self.get_property(name)[permutation[begin:end] - begin])
+
+        self._importance_ranks = ranks[permutation]
+
+    def get_prefix_view(self, n: int, overrides: Optional[Dict[str, torch.Tensor]] = None) -> "AdaptiveSHGaussianModel":
+        """
+        The `n` most important Gaussians after `reorder()`, the first `n` ones of the stored order otherwise.
+        They are the prefix of each degree, so the packed SHs are shared,
+        but the other properties are copied unless the selected ones are consecutive.
+        """
+
+        if overrides is None:
+            overrides = {}
+
+        # the prefix of each degree
+        segments = []
+        for begin, end in self.get_degree_ranges():
+            if self._importance_ranks is None:
+                n_selected = min(max(n - begin, 0), end - begin)
+            else:
+                # sorted within each degree
+                n_selected = int(torch.searchsorted(self._importance_ranks[begin:end], n).item())
+            segments.append((begin, begin + n_selected))
+
+        packed_names = self.get_packed_shs_rest_names()
+        non_empty_segments = [i for i in segments if i[1] > i[0]]
+        properties = {}
+        for name, value in self.gaussians.items():
+            value = overrides.get(name, value).detach()
+            if name in packed_names:
+                degree = packed_names.index(name) + 1
+                properties[name] = value[:segments[degree][1] - segments[degree][0]]
+            elif len(non_empty_segments) <= 1:
+                begin, end = non_empty_segments[0] if len(non_empty_segments) == 1 else (0, 0)
+                properties[name] = value[begin:end]
+            else:
+                properties[name] = torch.cat([value[begin:end] for begin, end in non_empty_segments])
+
+        view = self._get_view(properties)
+        view._importance_ranks = None
+
+        # the padded SHs are selected like the other properties, rather than unpacked again for every view
+        view._dense_shs_cache = None
+        dense_shs = self._get_cached_dense_shs()
+        if dense_shs is not None and not any(name in overrides for name in ["shs_dc"] + packed_names):
+            if len(non_empty_segments) <= 1:
+                begin, end = non_empty_segments[0] if len(non_empty_segments) == 1 else (0, 0)
+                dense_shs = dense_shs[begin:end]
+            else:
+                dense_shs = torch.cat([dense_shs[begin:end] for begin, end in non_empty_segments])
+            view._dense_shs_cache = (view._get_shs_state(), dense_shs)
+
+        return view
+
+    def training_setup(self, module: "lightning.LightningModule"):
+        raise NotImplementedError("training is not supported by `AdaptiveSHGaussian`, train a `VanillaGaussian` then convert it")
+
+    # unpack to the dense layout
+
+    def unpack_shs(self) -> torch.Tensor:
+        """
+        Return: [n, (max_sh_degree + 1) ** 2, 3], zero padded
+        """
+
+        shs_dc = self.gaussians["shs_dc"]
+        shs = torch.zeros(
+            (self.n_gaussians, self.n_shs_rest_of_degree(self.config.sh_degree) + 1, 3),
+            dtype=shs_dc.dtype,
+            device=shs_dc.device,
+        )
+        shs[:, :1] = shs_dc
+        for degree, (begin, end) in enumerate(self.get_degree_ranges()):
+            if degree == 0 or begin == end:
+                continue
+            shs[begin:end, 1:self.n_shs_rest_of_degree(degree) + 1] = self.gaussians["shs_rest_{}".format(degree)]
+        return shs
+
+    def _get_shs_state(self) -> Tuple:
+        """
+        Changes when the SH tensors are replaced or updated in place
+        """
+
+        return (self.n_gaussians,) + tuple(
+            (i.data_ptr(), tuple(i.shape), i._version)
+            for i in [self.gaussians["shs_dc"]] + [self.gaussians[name] for name in self.get_packed_shs_rest_names()]
+        )
+
+    def _get_cached_dense_shs(self) -> Optional[torch.Tensor]:
+        if self._dense_shs_cache is None or self._dense_shs_cache[0] != self._get_shs_state():
+            return None
+        return self._dense_shs_cache[1]
+
+    def get_shs(self) -> torch.Tensor:
+        """
+        Return: [n, (max_sh_degree + 1) ** 2, 3], zero padded.
+        Unpacked once and cached on the pre-activated inference path, otherwise unpacked on every call.
+        """
+
+        if self.is_pre_activated is not True or self.config.cache_dense_shs is not True:
+            return self.unpack_shs()
+
+        shs = self._get_cached_dense_shs()
+        if shs is None:
+            # release the stale one first
+            self._dense_shs_cache = None
+            with torch.no_grad():
+                shs = self.unpack_shs()
+            self._dense_shs_cache = (self._get_shs_state(), shs)
+        return shs
+
+    def get_shs_rest(self) -> torch.Tensor:
+        """
+        Return: [n, (max_sh_degree + 1) ** 2 - 1, 3], zero padded
+        """
+
+        return self.get_shs()[:, 1:]
+
+    @property
+    def shs_rest(self) -> torch.Tensor:
+        return self.get_shs_rest()
+
+    def pre_activate_all_properties(self):
+        # SHs stay packed, and are only unpacked on access
+        self.is_pre_activated = True
+
+        self.scales = self.get_scales()
+        self.rotations = self.get_rotations()
+        self.opacities = self.get_opacities()
+
+        self.scale_activation = self._return_as_is
+        self.scale_inverse_activation = self._return_as_is
+        self.rotation_activation = self._return_as_is
+        self.rotation_inverse_activation = self._return_as_is
+        self.opacity_activation = self._return_as_is
+        self.opacity_inverse_activation = self._return_as_is
+
+    def get_non_pre_activated_properties(self):
+        """
+        Return the properties in the layout of `VanillaGaussianModel`, the rest SHs are padded
+        """
+
+        properties = {
+            "means": self.get_xyz,
+            "shs_dc": self.get_shs_dc(),
+            "shs_rest": self.get_shs_rest(),
+            "opacities": self.opacities,
+            "scales": self.scales,
+            "rotations": self.rotations,
+        }
+        if self.is_pre_activated is True:
+            from internal.utils.general_utils import inverse_sigmoid
+            properties["scales"] = torch.log(properties["scales"])
+            properties["opacities"] = inverse_sigmoid(properties["opacities"])
+
+        return properties
+
+    def get_bytes_by_property(self) -> Dict[str, int]:
+        return {name: self.gaussians[name].numel() * self.gaussians[name].element_size() for name in self.property_names}
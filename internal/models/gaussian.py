@@ -1,5 +1,8 @@
 from typing import Union, Any, List, Dict, Tuple, Optional
 from abc import ABC, abstractmethod
+import copy
+import itertools
+import types
 import torch
 from torch import nn
 
@@ -11,6 +14,7 @@ class GaussianModel(nn.Module, ABC):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.gaussians = self.setup_gaussians_container()
+        self._properties_version = 0
 
     @staticmethod
     def setup_gaussians_container():
@@ -35,6 +39,7 @@ class GaussianModel(nn.Module, ABC):
     def set_property(self, name: str, value: torch.Tensor):
         """Set single raw property"""
         self.gaussians[name] = value
+        self._properties_version += 1
 
     def set_properties(self, properties: Dict[str, torch.Tensor]):
         """
@@ -44,6 +49,7 @@ class GaussianModel(nn.Module, ABC):
 
         for name in self.property_names:
             self.gaussians[name] = properties[name]
+        self._properties_version += 1
 
     def update_properties(self, properties: Dict[str, torch.Tensor], strict: bool = True):
         """
@@ -53,6 +59,7 @@ class GaussianModel(nn.Module, ABC):
             if name not in self.gaussians and strict is True:
                 raise RuntimeError("`{}` is not a property".format(name))
             self.gaussians[name] = properties[name]
+        self._properties_version += 1
 
     @property
     def properties(self) -> Dict[str, torch.Tensor]:
@@ -66,6 +73,18 @@ class GaussianModel(nn.Module, ABC):
 
         self.set_properties(properties)
 
+    def get_version(self) -> Tuple[int, ...]:
+        """
+        A key that changes whenever the properties are replaced, or modified in-place (e.g. by an optimizer step).
+        Results derived from the properties, like the cached renderings, are valid as long as it is unchanged.
+        """
+
+        return (self._properties_version,) + tuple(
+            j
+            for i in itertools.chain(self.parameters(), self.buffers())
+            for j in (id(i), i._version)
+        )
+
     def get_n_gaussians(self) -> int:
         return self.gaussians[next(iter(self.gaussians))].shape[0]
 
@@ -76,6 +95,48 @@ class GaussianModel(nn.Module, ABC):
     def freeze(self):
         self.gaussians = FreezableParameterDict(self.gaussians, new_requires_grad=False)
 
+    @torch.no_grad()
+    def reorder(self, order: torch.Tensor):
+        """
+        Permute the Gaussians in-place, one property at a time, so only a single one is copied at any moment.
+        This will not update optimizers.
+
+        Args:
+            order: [N], the indices of the Gaussians in the new order
+        """
+
+        for name in self.property_names:
+            self.set_property(name, self.get_property(name)[order])
+
+    def get_prefix_view(self, n: int, overrides: Optional[Dict[str, torch.Tensor]] = None) -> "GaussianModel":
+        """
+        A model of the first `n` Gaussians for rendering, sharing the storage with this one, so nothing is copied.
+        Usually used after `reorder()`, then the prefix is the most important ones.
+
+        Args:
+            overrides: the properties of all the Gaussians used instead of the stored ones, e.g. the edited opacities
+        """
+
+        if overrides is None:
+            overrides = {}
+        return self._get_view({
+            name: overrides.get(name, value).detach()[:n]
+            for name, value in self.gaussians.items()
+        })
+
+    def _get_view(self, properties: Dict[str, torch.Tensor]) -> "GaussianModel":
+        view = copy.copy(self)
+        # the containers of `nn.Module` must not be shared with this one
+        view._parameters = copy.copy(self._parameters)
+        view._buffers = copy.copy(self._buffers)
+        view._modules = copy.copy(self._modules)
+        # the methods replaced by instance attributes, e.g. by the pre-activation, are bound to this one
+        for name, value in self.__dict__.items():
+            if isinstance(value, types.MethodType) and value.__self__ is self:
+                view.__dict__[name] = types.MethodType(value.__func__, view)
+        view.gaussians = FreezableParameterDict(properties, new_requires_grad=False)
+        return view
+
     @abstractmethod
     def setup_from_pcd(self, xyz, rgb, *args, **kwargs):
         """
@@ -0,0 +1,3 @@
+from .service import RenderService, RenderServerBusy, parse_camera
+from .server import RenderServer
+from .client import LocalRenderClient, HTTPRenderClient, WebSocketRenderClient, RenderRequestError, decode_result
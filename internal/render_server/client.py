@@ -0,0 +1,142 @@
+"""
+The clients of the render server, with the same interface:
+    * `HTTPRenderClient`, `WebSocketRenderClient`: talk to a running server;
+    * `LocalRenderClient`: a stand-in serving the requests with an in-process `RenderService`, for the development and the tests,
+      the responses go through the same handling and encoding as the ones of the server.
+"""
+
+from typing import Any, Dict, List, Optional
+import base64
+import io
+import itertools
+import json
+import urllib.error
+import urllib.request
+import numpy as np
+from .server import handle_request
+from .service import RenderService
+
+
+class RenderRequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__("{}: {}".format(status, message))
+        self.status = status
+
+
+def decode_result(result: Dict[str, Any]) -> np.ndarray:
+    """
+    Returns:
+        [H, W, 3] uint8 for the images, or the float32 array
+    """
+
+    data = base64.b64decode(result["data"])
+    if result["format"] == "npy":
+        return np.load(io.BytesIO(data), allow_pickle=False)
+
+    from PIL import Image
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+class RenderClient:
+    def _request(self, request_type: str, request: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        raise NotImplementedError()
+
+    def render(self, cameras: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Returns:
+            the response, see `RenderService.render()`
+
+        Raises:
+            RenderRequestError: with the status 503 if rejected by the server
+        """
+
+        return self._request("render", {"cameras": cameras})
+
+    def render_arrays(self, cameras: List[Dict[str, Any]]) -> List[np.ndarray]:
+        return [decode_result(i) for i in self.render(cameras)["results"]]
+
+    def get_models(self) -> Dict[str, Dict]:
+        return self._request("models")["models"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._request("stats")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class LocalRenderClient(RenderClient):
+    def __init__(self, service: RenderService):
+        self.service = service.start()
+
+    def _request(self, request_type: str, request: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # round trip through JSON, as the remote ones
+        status, response = handle_request(self.service, request_type, json.loads(json.dumps(request)))
+        if status != 200:
+            raise RenderRequestError(status, response["error"])
+        return json.loads(json.dumps(response))
+
+
+class HTTPRenderClient(RenderClient):
+    def __init__(self, url: str, timeout: float = 120.):
+        """
+        Args:
+            url: e.g. `http://127.0.0.1:8090`
+        """
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, request_type: str, request: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if request_type == "render":
+            http_request = urllib.request.Request(
+                "{}/render".format(self.url),
+                data=json.dumps(request).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+        else:
+            http_request = urllib.request.Request("{}/{}".format(self.url, request_type))
+
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())["error"]
+            except (ValueError, KeyError):
+                message = e.reason
+            raise RenderRequestError(e.code, message)
+
+
+class WebSocketRenderClient(RenderClient):
+    def __init__(self, url: str, timeout: float = 120.):
+        """
+        Args:
+            url: e.g. `ws://127.0.0.1:8091`
+        """
+
+        from websockets.sync.client import connect
+
+        self.connection = connect(url, max_size=None)
+        self.timeout = timeout
+        self.ids = itertools.count()
+
+    def _request(self, request_type: str, request: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        request_id = next(self.ids)
+        self.connection.send(json.dumps({**(request or {}), "id": request_id, "type": request_type}))
+        response = json.loads(self.connection.recv(timeout=self.timeout))
+        assert response.pop("id") == request_id
+        status = response.pop("status")
+        if status != 200:
+            raise RenderRequestError(status, response["error"])
+        return response
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,183 @@
+"""
+The HTTP and the WebSocket front ends of `RenderService`.
+
+HTTP:
+    * `POST /render`: `{"cameras": [...]}`, see `service.py`;
+    * `GET /models`: the names, the sizes and the available outputs of the models;
+    * `GET /stats`: the counters, the queue and the throughput of each stage.
+WebSocket, for the interactive clients keeping a connection:
+    each message is a JSON object, `{"id": ..., "type": "render", "cameras": [...]}`, the `type` is one of `render`, `models` and `stats`,
+    the reply carries the same `id`, and a `status` code same as the HTTP one.
+
+A rejected request gets the status 503, the client should retry after a while.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from concurrent.futures import TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import traceback
+from .service import RenderService, RenderServerBusy
+
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def handle_request(service: RenderService, request_type: str, request: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any]]:
+    """
+    Returns:
+        the HTTP status code, and the response
+    """
+
+    try:
+        if request_type == "render":
+            return 200, service.render(request)
+        if request_type == "models":
+            return 200, {"models": service.get_model_info()}
+        if request_type == "stats":
+            return 200, service.get_stats()
+        return 404, {"error": "unknown request type `{}`".format(request_type)}
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    except RenderServerBusy as e:
+        return 503, {"error": str(e)}
+    except TimeoutError:
+        return 504, {"error": "not rendered in {} seconds".format(service.request_timeout)}
+    except Exception as e:
+        traceback.print_exc()
+        return 500, {"error": repr(e)}
+
+
+def create_http_request_handler(service: RenderService, verbose: bool = False):
+    class RenderRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, response: Dict[str, Any]):
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 503:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path not in ("/models", "/stats"):
+                self._send_json(404, {"error": "not found"})
+                return
+            self._send_json(*handle_request(service, path[1:]))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_REQUEST_BYTES:
+                self.close_connection = True
+                self._send_json(413, {"error": "request too large"})
+                return
+            body = self.rfile.read(length)
+
+            if self.path.rstrip("/") != "/render":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(body)
+            except ValueError:
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+            self._send_json(*handle_request(service, "render", request))
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return RenderRequestHandler
+
+
+def handle_websocket_message(service: RenderService, message) -> Dict[str, Any]:
+    try:
+        request = json.loads(message)
+        if not isinstance(request, dict):
+            raise ValueError()
+    except ValueError:
+        return {"id": None, "status": 400, "error": "invalid JSON"}
+
+    status, response = handle_request(service, str(request.get("type", "render")), request)
+    return {"id": request.get("id", None), "status": status, **response}
+
+
+class RenderServer:
+    def __init__(
+            self,
+            service: RenderService,
+            host: str = "0.0.0.0",
+            port: int = 8090,
+            websocket_port: Optional[int] = None,
+            verbose: bool = False,
+    ):
+        """
+        Args:
+            port: `0` to pick a free one
+            websocket_port: the WebSocket server is not started if `None`, requires `websockets>=11`
+        """
+
+        self.service = service
+
+        self.http_server = ThreadingHTTPServer((host, port), create_http_request_handler(service, verbose=verbose))
+        self.http_server.daemon_threads = True
+
+        self.websocket_server = None
+        if websocket_port is not None:
+            from websockets.sync.server import serve
+
+            def handler(websocket):
+                for message in websocket:
+                    websocket.send(json.dumps(handle_websocket_message(service, message)))
+
+            self.websocket_server = serve(handler, host, websocket_port, max_size=MAX_REQUEST_BYTES)
+
+        self.threads = []
+
+    @property
+    def port(self) -> int:
+        return self.http_server.server_address[1]
+
+    @property
+    def websocket_port(self) -> Optional[int]:
+        if self.websocket_server is None:
+            return None
+        return self.websocket_server.socket.getsockname()[1]
+
+    def start(self):
+        """
+        Serve in the background threads
+        """
+
+        self.service.start()
+        servers = [self.http_server]
+        if self.websocket_server is not None:
+            servers.append(self.websocket_server)
+        for server in servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        if self.websocket_server is not None:
+            self.websocket_server.shutdown()
+        for thread in self.threads:
+            thread.join()
+        self.service.stop()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            for thread in self.threads:
+                thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
@@ -0,0 +1,407 @@
+"""
+Render the requested cameras of the resident models, shared by the HTTP and the WebSocket servers and the local client.
+
+A request is a JSON object with a list of cameras, and each camera is rendered as a job:
+    * the jobs wait in a bounded queue, a request is rejected as a whole with `RenderServerBusy` if there is no room for all of them,
+      so the clients are pushed back instead of the latency growing without bound;
+    * a single worker renders the queued jobs in batches, the ones with the same model, output and image size,
+      by `Renderer.batch_forward()`;
+    * the outputs are encoded by the threads serving the requests, not by the worker;
+    * the time spent by each job in the queue, the rendering and the encoding is reported with its result.
+
+A camera is defined by its intrinsics and its camera-to-world or world-to-camera matrix, in the COLMAP/OpenCV convention,
+i.e. X right, Y down, Z forward:
+    {
+        "width": 640, "height": 480, "fx": 500., "fy": 500., "cx": 320., "cy": 240.,
+        "c2w": [[1., 0., 0., 0.], [0., 1., 0., 0.], [0., 0., 1., -2.], [0., 0., 0., 1.]],
+        "appearance_id": 0, "normalized_appearance_id": 0., "time": 0.,
+        "model": "0", "output": "rgb", "format": "jpeg", "jpeg_quality": 75
+    }
+`fy`, `cx`, `cy`, the appearance, the time, the model, the output and the format are optional.
+The RGB outputs are encoded as `jpeg` or `png`, the others, e.g. the depth maps, as float32 `npy`.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from dataclasses import dataclass, field
+import base64
+import io
+import threading
+import time
+import traceback
+import numpy as np
+import torch
+from internal.cameras.cameras import Cameras
+from internal.renderers import RendererOutputTypes
+from internal.utils.frame_pipeline import StageTimer, to_uint8_image
+from internal.viewer.frame_encoder import FrameEncoder, encode_image_with_pil
+
+IMAGE_FORMATS = ("jpeg", "png")
+
+
+class RenderServerBusy(Exception):
+    """The queue has no room for the request, retry later"""
+
+
+@dataclass
+class RenderJob:
+    model_name: str
+    camera: Any
+    output: str
+    format: str
+    jpeg_quality: int
+    submitted_at: float = field(default_factory=time.perf_counter)
+    future: Future = field(default_factory=Future)
+    batch_size: int = 0
+    started_at: float = 0.
+    rendered_at: float = 0.
+
+    @property
+    def batch_key(self):
+        return self.model_name, self.output, int(self.camera.width), int(self.camera.height)
+
+
+def _get_pose(camera: Dict[str, Any], key: str) -> torch.Tensor:
+    pose = np.asarray(camera[key], dtype=np.float64)
+    if pose.shape == (3, 4):
+        pose = np.concatenate([pose, np.asarray([[0., 0., 0., 1.]])], axis=0)
+    if pose.shape != (4, 4):
+        raise ValueError("`{}` must be a 3x4 or 4x4 matrix".format(key))
+    return torch.from_numpy(pose)
+
+
+def parse_camera(camera: Dict[str, Any], device=None, max_pixels: int = 4096 * 4096):
+    """
+    Returns:
+        a single camera, `Cameras[i]`
+    """
+
+    try:
+        width, height = int(camera["width"]), int(camera["height"])
+        fx = float(camera["fx"])
+        fy = float(camera.get("fy", fx))
+        cx = float(camera.get("cx", width / 2.))
+        cy = float(camera.get("cy", height / 2.))
+        if "c2w" in camera:
+            w2c = torch.linalg.inv(_get_pose(camera, "c2w"))
+        else:
+            w2c = _get_pose(camera, "w2c")
+        appearance_id = int(camera.get("appearance_id", 0))
+        normalized_appearance_id = float(camera.get("normalized_appearance_id", 0.))
+        time_value = float(camera.get("time", 0.))
+    except KeyError as e:
+        raise ValueError("camera without `{}`".format(e.args[0]))
+    except (TypeError, RuntimeError) as e:
+        raise ValueError("invalid camera: {}".format(e))
+
+    if width <= 0 or height <= 0 or width * height > max_pixels:
+        raise ValueError("invalid image size {}x{}".format(width, height))
+
+    return Cameras(
+        R=w2c[None, :3, :3].to(torch.float),
+        T=w2c[None, :3, 3].to(torch.float),
+        fx=torch.tensor([fx]),
+        fy=torch.tensor([fy]),
+        cx=torch.tensor([cx]),
+        cy=torch.tensor([cy]),
+        width=torch.tensor([width], dtype=torch.int),
+        height=torch.tensor([height], dtype=torch.int),
+        appearance_id=torch.tensor([appearance_id], dtype=torch.int),
+        normalized_appearance_id=torch.tensor([normalized_appearance_id]),
+        time=torch.tensor([time_value]),
+        distortion_params=None,
+        camera_type=torch.tensor([0], dtype=torch.int),
+    )[0].to_device(device if device is not None else "cpu")
+
+
+def encode_output(output: torch.Tensor, format: str, jpeg_quality: int = 75, encoder: Optional[FrameEncoder] = None) -> Tuple[bytes, List[int]]:
+    """
+    Args:
+        output: [C, H, W], an image in [0, 1] if `format` is `jpeg` or `png`
+
+    Returns:
+        the encoded bytes, and the shape of the decoded array
+    """
+
+    if format in IMAGE_FORMATS:
+        image = to_uint8_image(output).cpu()
+        if encoder is not None:
+            data = encoder.encode(image, format, jpeg_quality)
+        else:
+            data = encode_image_with_pil(image.numpy(), format, jpeg_quality)
+        return data, list(image.shape)
+
+    array = output.detach().to(torch.float).cpu().numpy()
+    if array.shape[0] == 1:
+        array = array[0]
+    with io.BytesIO() as f:
+        np.save(f, array, allow_pickle=False)
+        return f.getvalue(), list(array.shape)
+
+
+class RenderService:
+    def __init__(
+            self,
+            models: Dict[str, Tuple[Any, Any]],
+            background_color=(0., 0., 0.),
+            device=None,
+            max_batch_size: int = 8,
+            max_queue_size: int = 64,
+            request_timeout: float = 60.,
+            encoder: Optional[FrameEncoder] = None,
+    ):
+        """
+        Args:
+            models: `{name: (gaussian_model, renderer)}`, the first one is the default
+            max_queue_size: the maximum number of the cameras waiting to be rendered
+            request_timeout: in seconds, the jobs not rendered in time are cancelled
+            encoder: encode the images with PIL if `None`
+        """
+
+        if len(models) == 0:
+            raise ValueError("no model")
+        self.models = models
+        self.default_model_name = next(iter(models.keys()))
+        self.device = torch.device(device if device is not None else "cpu")
+        self.background_color = torch.tensor(background_color, dtype=torch.float, device=self.device)
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.request_timeout = request_timeout
+        self.encoder = encoder
+
+        self.available_outputs = {name: renderer.get_available_outputs() for name, (_, renderer) in models.items()}
+
+        self.condition = threading.Condition()
+        self.queue: deque = deque()
+        self.is_stopped = False
+        self.thread: Optional[threading.Thread] = None
+
+        self.timer = StageTimer()
+        self.stats = {
+            "requests": 0,
+            "cameras": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "batches": 0,
+        }
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.is_stopped = True
+            jobs = list(self.queue)
+            self.queue.clear()
+            self.condition.notify_all()
+        for job in jobs:
+            job.future.cancel()
+        if self.thread is not None and threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def get_model_info(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "n_gaussians": int(model.get_xyz.shape[0]),
+                "outputs": list(self.available_outputs[name].keys()),
+            }
+            for name, (model, _) in self.models.items()
+        }
+
+    def _create_job(self, camera: Dict[str, Any]) -> RenderJob:
+        if not isinstance(camera, dict):
+            raise ValueError("a camera must be a JSON object")
+
+        model_name = str(camera.get("model", self.default_model_name))
+        if model_name not in self.models:
+            raise ValueError("unknown model `{}`".format(model_name))
+
+        available_outputs = self.available_outputs[model_name]
+        output = str(camera.get("output", next(iter(available_outputs.keys()))))
+        output_info = available_outputs.get(output, None)
+        if output_info is None:
+            raise ValueError("unknown output `{}`, available: {}".format(output, ", ".join(available_outputs.keys())))
+
+        is_rgb = output_info.type == RendererOutputTypes.RGB
+        format = str(camera.get("format", IMAGE_FORMATS[0] if is_rgb else "npy"))
+        if format not in IMAGE_FORMATS + ("npy",) or (format != "npy" and not is_rgb):
+            raise ValueError("unsupported format `{}` for output `{}`".format(format, output))
+
+        return RenderJob(
+            model_name=model_name,
+            camera=parse_camera(camera, device=self.device),
+            output=output,
+            format=format,
+            jpeg_quality=int(camera.get("jpeg_quality", 75)),
+        )
+
+    def submit(self, cameras: List[Dict[str, Any]]) -> List[RenderJob]:
+        """
+        Queue all the cameras or none of them
+
+        Raises:
+            ValueError: invalid cameras
+            RenderServerBusy: no room for all the cameras
+        """
+
+        if not isinstance(cameras, list) or len(cameras) == 0:
+            raise ValueError("`cameras` must be a non-empty list")
+        if len(cameras) > self.max_queue_size:
+            raise ValueError("too many cameras, at most {} in a request".format(self.max_queue_size))
+        jobs = [self._create_job(i) for i in cameras]
+
+        with self.condition:
+            if self.is_stopped:
+                raise RuntimeError("render service stopped")
+            self.stats["requests"] += 1
+            if len(self.queue) + len(jobs) > self.max_queue_size:
+                self.stats["rejected"] += 1
+                raise RenderServerBusy("{} cameras queued, no room for {} more".format(len(self.queue), len(jobs)))
+            self.stats["cameras"] += len(jobs)
+            self.queue.extend(jobs)
+            self.condition.notify()
+        return jobs
+
+    def render(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Render and encode the cameras of a request, block until done
+
+        Args:
+            request: `{"cameras": [...]}`
+
+        Returns:
+            `{"results": [...], "timing": {...}}`, the `data` of each result is base64 encoded
+
+        Raises:
+            ValueError, RenderServerBusy, TimeoutError
+        """
+
+        received_at = time.perf_counter()
+        if not isinstance(request, dict):
+            raise ValueError("the request must be a JSON object")
+        jobs = self.submit(request.get("cameras", None))
+
+        deadline = received_at + self.request_timeout
+        results = []
+        try:
+            for job in jobs:
+                output = job.future.result(timeout=max(deadline - time.perf_counter(), 0.))
+                results.append(self._encode(job, output))
+        except TimeoutError:
+            with self.condition:
+                self.stats["timeouts"] += 1
+            raise
+        finally:
+            for job in jobs:
+                job.future.cancel()
+
+        return {
+            "results": results,
+            "timing": {
+                "total_ms": (time.perf_counter() - received_at) * 1000.,
+            },
+        }
+
+    def _encode(self, job: RenderJob, output: torch.Tensor) -> Dict[str, Any]:
+        with self.timer.time("encode"):
+            data, shape = encode_output(output, job.format, job.jpeg_quality, self.encoder)
+        encoded_at = time.perf_counter()
+
+        return {
+            "model": job.model_name,
+            "output": job.output,
+            "format": job.format,
+            "shape": shape,
+            "data": base64.b64encode(data).decode("ascii"),
+            "timing": {
+                "queue_ms": (job.started_at - job.submitted_at) * 1000.,
+                "render_ms": (job.rendered_at - job.started_at) * 1000.,
+                "encode_ms": (encoded_at - job.rendered_at) * 1000.,
+                "total_ms": (encoded_at - job.submitted_at) * 1000.,
+                "batch_size": job.batch_size,
+            },
+        }
+
+    def _pop_batch(self) -> Optional[List[RenderJob]]:
+        """
+        Block until some jobs are queued, then pop the oldest one and the ones can be rendered with it
+
+        Returns:
+            None if stopped
+        """
+
+        with self.condition:
+            while len(self.queue) == 0:
+                if self.is_stopped:
+                    return None
+                self.condition.wait()
+            if self.is_stopped:
+                return None
+
+            first = self.queue.popleft()
+            batch = [first]
+            remaining = deque()
+            while len(self.queue) > 0:
+                job = self.queue.popleft()
+                if len(batch) < self.max_batch_size and job.batch_key == first.batch_key:
+                    batch.append(job)
+                else:
+                    remaining.append(job)
+            self.queue = remaining
+
+        # the cancelled ones, e.g. timeout, are skipped
+        return [i for i in batch if i.future.set_running_or_notify_cancel()]
+
+    def _render_batch(self, jobs: List[RenderJob]):
+        started_at = time.perf_counter()
+        model_name, output = jobs[0].model_name, jobs[0].output
+        model, renderer = self.models[model_name]
+        output_key = self.available_outputs[model_name][output].key
+        cameras = [i.camera for i in jobs]
+
+        with torch.no_grad(), self.timer.time("render", n=len(cameras)):
+            if len(cameras) == 1:
+                outputs = [renderer(cameras[0], model, self.background_color, render_types=[output])]
+            else:
+                outputs = renderer.batch_forward(cameras, model, self.background_color, render_types=[output])
+            outputs = [i[output_key] for i in outputs]
+            if self.device.type == "cuda":
+                torch.cuda.synchronize(self.device)
+
+        rendered_at = time.perf_counter()
+        with self.condition:
+            self.stats["batches"] += 1
+        for job, i in zip(jobs, outputs):
+            job.batch_size = len(jobs)
+            job.started_at = started_at
+            job.rendered_at = rendered_at
+            job.future.set_result(i)
+
+    def _run(self):
+        while True:
+            jobs = self._pop_batch()
+            if jobs is None:
+                break
+            if len(jobs) == 0:
+                continue
+            try:
+                self._render_batch(jobs)
+            except Exception as e:
+                traceback.print_exc()
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            stats = {
+                **self.stats,
+                "queued": len(self.queue),
+                "max_queue_size": self.max_queue_size,
+            }
+        stats["fps"] = self.timer.get_fps()
+        return stats
@@ -1,2 +1,9 @@
 from .renderer import RendererOutputTypes, RendererOutputVisualizer, RendererOutputInfo, Renderer, RendererConfig
-from .vanilla_renderer import VanillaRenderer
+
+
+def __getattr__(name):
+    # `VanillaRenderer` requires the CUDA rasterizer, import it on demand, so that the CPU renderers can be used without it
+    if name == "VanillaRenderer":
+        from .vanilla_renderer import VanillaRenderer
+        return VanillaRenderer
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
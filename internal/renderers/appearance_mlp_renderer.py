@@ -4,7 +4,7 @@ from internal.configs.appearance import AppearanceModelParams
 from internal.cameras.cameras import Camera
 from internal.models.gaussian import GaussianModel
 from internal.models.appearance_model import AppearanceModel
-from internal.utils.sh_utils import eval_sh
+from internal.utils.sh_utils import eval_sh_colors
 from .vanilla_renderer import VanillaRenderer
 
 
@@ -40,11 +40,10 @@ class AppearanceMLPRenderer(VanillaRenderer):
             grayscale_factors, gamma = self.appearance_model.get_appearance(viewpoint_camera.normalized_appearance_id)
 
         if self.apply_on_gaussian is True:
-            shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree + 1) ** 2)
             with torch.no_grad():
-                dir_pp = (pc.get_xyz - viewpoint_camera.camera_center.repeat(pc.get_features.shape[0], 1))
+                dir_pp = pc.get_xyz - viewpoint_camera.camera_center
                 dir_pp_normalized = dir_pp / dir_pp.norm(dim=1, keepdim=True)
-            sh2rgb = eval_sh(pc.active_sh_degree, shs_view, dir_pp_normalized)
+            sh2rgb = eval_sh_colors(pc.active_sh_degree, pc.get_features, dir_pp_normalized)
             override_color = torch.clamp_min(sh2rgb + 0.5, 0.0)
             grayscale_factors = grayscale_factors.reshape((1, -1))
             gamma = gamma.reshape((1, -1))
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Sequence, Iterator, Tuple
 import torch
 from .renderer import Renderer
 from .gsplat_renderer import GSPlatRenderer
@@ -44,3 +44,80 @@ class GSplatHitPixelCountRenderer(Renderer):
         )
 
         return count, opacity_score, alpha_score, visibility_score
+
+    @staticmethod
+    def get_tiles_per_gaussian(means2d: torch.Tensor, radii: torch.Tensor, img_width: int, img_height: int, block_size: int = 16) -> torch.Tensor:
+        """
+        The number of the tiles overlapped by each Gaussian, the same as the `num_tiles_hit` of the gsplat v0 projection
+
+        Args:
+            means2d: [..., 2]
+            radii: [...]
+        """
+
+        tile_bounds = torch.tensor([
+            (img_width + block_size - 1) // block_size,
+            (img_height + block_size - 1) // block_size,
+        ], device=means2d.device)
+        tile_centers = means2d / block_size
+        tile_radii = (radii / block_size).unsqueeze(-1)
+        tile_min = torch.minimum(torch.clamp_min(torch.trunc(tile_centers - tile_radii), 0), tile_bounds)
+        tile_max = torch.minimum(torch.clamp_min(torch.trunc(tile_centers + tile_radii + 1), 0), tile_bounds)
+        tiles_per_gaussian = torch.prod(tile_max - tile_min, dim=-1).to(torch.int32)
+        return torch.where(radii > 0, tiles_per_gaussian, 0)
+
+    @classmethod
+    def batch_hit_pixel_count(
+            cls,
+            means3D: torch.Tensor,
+            opacities: torch.Tensor,
+            scales: torch.Tensor,
+            rotations: torch.Tensor,
+            cameras: Sequence,
+            anti_aliased: bool = True,
+            block_size: int = 16,
+            max_batch_size: int = 8,
+    ) -> Iterator[Tuple[int, Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]]]:
+        """
+        Count for multiple cameras.
+        The cameras are grouped by image size, then the projection of up to `max_batch_size` of them is calculated in a single call,
+        only the counting runs for each camera.
+
+        Yields:
+            the index of the camera in `cameras`, and the outputs of `hit_pixel_count()` of it
+        """
+
+        from .gsplat_v1_renderer import GSplatV1RendererModule
+
+        indices_by_image_size = {}
+        for idx, camera in enumerate(cameras):
+            indices_by_image_size.setdefault((int(camera.width.item()), int(camera.height.item())), []).append(idx)
+
+        for (img_width, img_height), indices in indices_by_image_size.items():
+            for chunk_begin in range(0, len(indices), max_batch_size):
+                chunk = indices[chunk_begin:chunk_begin + max_batch_size]
+                preprocessed_cameras = GSplatV1RendererModule.preprocess_cameras([cameras[i].to_device(means3D.device) for i in chunk])
+                radii, means2d, depths, conics, compensations = GSplatV1RendererModule.project(
+                    preprocessed_cameras,
+                    means3D,
+                    scales,
+                    rotations,
+                    anti_aliased=anti_aliased,
+                )
+                tiles_per_gaussian = cls.get_tiles_per_gaussian(means2d, radii, img_width, img_height, block_size)
+
+                for camera_idx, idx in enumerate(chunk):
+                    camera_opacities = opacities
+                    if anti_aliased is True:
+                        camera_opacities = opacities * compensations[camera_idx][:, None]
+                    yield idx, hit_pixel_count(
+                        means2d[camera_idx],
+                        depths[camera_idx],
+                        radii[camera_idx],
+                        conics[camera_idx],
+                        tiles_per_gaussian[camera_idx],
+                        camera_opacities,
+                        img_height=img_height,
+                        img_width=img_width,
+                        block_width=block_size,
+                    )
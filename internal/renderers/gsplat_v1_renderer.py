@@ -1,7 +1,8 @@
 from dataclasses import dataclass
-from typing import Union, Tuple, Any
+from typing import Union, Tuple, Any, Sequence, List, Dict, Optional
 import math
 import torch
+from internal.utils.spatial_index import get_spatial_index
 from .renderer import RendererConfig, Renderer, RendererOutputInfo, RendererOutputTypes
 
 from gsplat.cuda._wrapper import (
@@ -9,6 +10,8 @@ from gsplat.cuda._wrapper import (
     isect_offset_encode,
     isect_tiles,
     spherical_harmonics,
+    # the batched one, [C, N, ...]
+    rasterize_to_pixels as batch_rasterize_to_pixels,
 )
 
 from gsplat.sh_decomposed import spherical_harmonics_decomposed
@@ -33,6 +36,11 @@ class GSplatV1Renderer(RendererConfig):
     tile_based_culling: bool = False
     """Tile-based culling, from StopThePop [Radl et al. 2024]"""
 
+    frustum_culling: bool = False
+    """Project only the Gaussians inside the view frustum, selected by the spatial index attached to the model"""
+
+    frustum_culling_pixel_margin: float = 16.
+
     def instantiate(self, *args, **kwargs) -> "GSplatV1RendererModule":
         return GSplatV1RendererModule(self)
 
@@ -126,13 +134,12 @@ class GSplatV1RendererModule(Renderer):
         if scaling_modifier != 1.:
             scales = scales * scaling_modifier
 
-        projections = GSplatV1.project(
+        projections = self.project(
+            [viewpoint_camera],
             preprocessed_camera,
-            pc.get_means(),
+            pc,
             scales,
-            pc.get_rotations(),
-            eps2d=self.config.filter_2d_kernel_size,
-            anti_aliased=self.config.anti_aliased,
+            scaling_modifier,
         )
         radii, means2d, depths, conics, compensations = projections
 
@@ -286,6 +293,212 @@ class GSplatV1RendererModule(Renderer):
             "isects": isects,
         }
 
+    def project(self, cameras: list, preprocessed_cameras: Tuple, pc, scales: torch.Tensor, scaling_modifier) -> Tuple:
+        """
+        Project the Gaussians to the `cameras`.
+        With the frustum culling enabled, only the ones inside any of the view frustums are projected,
+        then the outputs are scattered back, so the culled ones touch no tile, and the per-Gaussian outputs still cover all the Gaussians.
+        """
+
+        means = pc.get_means()
+        rotations = pc.get_rotations()
+        visible_indices = self.get_visible_indices(cameras, pc, scaling_modifier)
+        if visible_indices is not None:
+            means = means[visible_indices]
+            scales = scales[visible_indices]
+            rotations = rotations[visible_indices]
+
+        projections = GSplatV1.project(
+            preprocessed_cameras,
+            means,
+            scales,
+            rotations,
+            eps2d=self.config.filter_2d_kernel_size,
+            anti_aliased=self.config.anti_aliased,
+        )
+        if visible_indices is None:
+            return projections
+
+        n_gaussians = pc.n_gaussians
+        return tuple(self.scatter_to_all_gaussians(i, visible_indices, n_gaussians) for i in projections)
+
+    def get_visible_indices(self, cameras: list, pc, scaling_modifier) -> Optional[torch.Tensor]:
+        """
+        Returns:
+            [N_visible], the sorted indices of the Gaussians inside the view frustum of any of the `cameras`, `None` if the frustum culling is disabled
+        """
+
+        if self.config.frustum_culling is not True:
+            return None
+
+        spatial_index = get_spatial_index(pc)
+        visible_indices = [spatial_index.cull(
+            camera,
+            scale_modifier=scaling_modifier,
+            pixel_margin=self.config.frustum_culling_pixel_margin,
+        ) for camera in cameras]
+        if len(visible_indices) == 1:
+            return visible_indices[0]
+        return torch.unique(torch.concat(visible_indices))
+
+    @staticmethod
+    def scatter_to_all_gaussians(src: Optional[torch.Tensor], indices: torch.Tensor, n_gaussians: int) -> Optional[torch.Tensor]:
+        """
+        Args:
+            src: [C, N_visible, ...]
+        """
+
+        if src is None:
+            return None
+        return torch.zeros(
+            (src.shape[0], n_gaussians) + src.shape[2:],
+            dtype=src.dtype,
+            device=src.device,
+        ).index_copy(1, indices, src)
+
+    BATCHABLE_RENDER_TYPES = ("rgb", "alpha", "acc_depth", "exp_depth")
+
+    def is_batchable(self, render_types: list) -> bool:
+        if render_types is not None and any(i not in self.BATCHABLE_RENDER_TYPES for i in render_types):
+            return False
+        # the subclasses customizing the per camera properties are rendered one by one
+        for name in ("forward", "get_scales", "get_opacities", "get_rgbs"):
+            if getattr(type(self), name) is not getattr(GSplatV1RendererModule, name):
+                return False
+        return True
+
+    def batch_forward(
+            self,
+            cameras,
+            pc,
+            bg_color: torch.Tensor,
+            scaling_modifier=1.0,
+            render_types: list = None,
+            max_batch_size: int = 8,
+            **kwargs,
+    ) -> List[Dict]:
+        """
+        The cameras with the same image size are projected, SH evaluated and rasterized together, `max_batch_size` at a time.
+        Only the outputs in `BATCHABLE_RENDER_TYPES` are supported, otherwise the cameras are rendered one by one.
+        """
+
+        cameras = list(cameras)
+        if not self.is_batchable(render_types):
+            return super().batch_forward(cameras, pc, bg_color, scaling_modifier, render_types, **kwargs)
+
+        render_type_bits = self.parse_render_types(render_types)
+
+        # group by image size
+        camera_groups = {}
+        for idx, camera in enumerate(cameras):
+            camera_groups.setdefault((int(camera.width.item()), int(camera.height.item())), []).append(idx)
+
+        outputs = [None] * len(cameras)
+        for camera_indices in camera_groups.values():
+            for begin in range(0, len(camera_indices), max_batch_size):
+                batch_indices = camera_indices[begin:begin + max_batch_size]
+                for idx, output in zip(batch_indices, self.render_batch(
+                        [cameras[i] for i in batch_indices],
+                        pc,
+                        bg_color,
+                        scaling_modifier,
+                        render_type_bits,
+                )):
+                    outputs[idx] = output
+
+        return outputs
+
+    def render_batch(self, cameras: list, pc, bg_color: torch.Tensor, scaling_modifier, render_type_bits: int) -> List[Dict]:
+        n_cameras = len(cameras)
+        preprocessed_cameras = GSplatV1.preprocess_cameras(cameras)
+
+        # 1. project, shared by all the cameras
+        scales = pc.get_scales()
+        if scaling_modifier != 1.:
+            scales = scales * scaling_modifier
+
+        projections = self.project(
+            cameras,
+            preprocessed_cameras,
+            pc,
+            scales,
+            scaling_modifier,
+        )
+        radii, means2d, depths, conics, compensations = projections  # [C, N, ...]
+        visibility_filter = radii > 0
+
+        # 2. isect encoding
+        opacities = pc.get_opacities().squeeze(-1).unsqueeze(0).expand(n_cameras, -1)  # [C, N]
+        if self.config.anti_aliased:
+            opacities = opacities * compensations
+
+        isects = self.isect_encode(
+            preprocessed_cameras,
+            projections,
+            opacities,
+            tile_size=self.config.block_size,
+        )
+
+        # 3. colors, the SHs are evaluated camera by camera to share the [N, K, 3] features, and the depths are rasterized as an extra channel
+        is_rgb_required = self.is_type_required(render_type_bits, self._RGB_REQUIRED)
+        is_depth_required = self.is_type_required(render_type_bits, self._ACC_DEPTH_REQUIRED)
+        colors = []
+        backgrounds = []
+        if is_rgb_required:
+            camera_centers = torch.stack([camera.camera_center for camera in cameras])
+            viewdirs = pc.get_means().detach().unsqueeze(0) - camera_centers.unsqueeze(1)  # [C, N, 3]
+            features = pc.get_features
+            rgbs = torch.stack([spherical_harmonics(
+                pc.active_sh_degree,
+                viewdirs[i],
+                features,
+                visibility_filter[i],
+            ) for i in range(n_cameras)])  # [C, N, 3]
+            colors.append(torch.clamp(rgbs + 0.5, min=0.0))
+            backgrounds.append(bg_color.unsqueeze(0).expand(n_cameras, -1))
+        if is_depth_required:
+            colors.append(depths.unsqueeze(-1))
+            backgrounds.append(torch.zeros((n_cameras, 1), dtype=bg_color.dtype, device=bg_color.device))
+
+        # 4. rasterization
+        img_width, img_height = preprocessed_cameras[-1]
+        _, _, flatten_ids, isect_offsets = isects
+        rendered_colors, rendered_alphas = batch_rasterize_to_pixels(
+            means2d=means2d,
+            conics=conics,
+            colors=torch.concat(colors, dim=-1),
+            opacities=opacities,
+            image_width=img_width,
+            image_height=img_height,
+            tile_size=self.config.block_size,
+            isect_offsets=isect_offsets,
+            flatten_ids=flatten_ids,
+            backgrounds=torch.concat(backgrounds, dim=-1),
+        )  # [C, H, W, D], [C, H, W, 1]
+        rendered_colors = rendered_colors.permute(0, 3, 1, 2)
+        rendered_alphas = rendered_alphas.permute(0, 3, 1, 2)
+
+        outputs = []
+        for i in range(n_cameras):
+            output = {
+                "viewspace_points": means2d[i],
+                "visibility_filter": visibility_filter[i],
+                "radii": radii[i],
+            }
+            if is_rgb_required:
+                output["render"] = rendered_colors[i, :3]
+            if is_depth_required:
+                acc_depth_im = rendered_colors[i, -1:]
+                alpha = rendered_alphas[i]
+                output["acc_depth"] = acc_depth_im
+                if self.is_type_required(render_type_bits, self._ALPHA_REQUIRED):
+                    output["alpha"] = alpha
+                if self.is_type_required(render_type_bits, self._EXP_DEPTH_REQUIRED):
+                    output["exp_depth"] = torch.where(alpha > 0, acc_depth_im / alpha, acc_depth_im.detach().max())
+            outputs.append(output)
+
+        return outputs
+
     def get_available_outputs(self):
         return {
             "rgb": RendererOutputInfo("render"),
@@ -316,6 +529,26 @@ class GSplatV1:
 
         return viewmats, Ks, (img_width, img_height)
 
+    @classmethod
+    def preprocess_cameras(cls, cameras: Sequence):
+        """
+        Batched version of `preprocess_camera()`, all the cameras must have the same image size
+        """
+
+        viewmats = torch.stack([camera.world_to_camera.T for camera in cameras])
+
+        Ks = torch.zeros((len(cameras), 3, 3), dtype=torch.float, device=viewmats.device)
+        Ks[:, 0, 0] = torch.stack([camera.fx for camera in cameras])
+        Ks[:, 1, 1] = torch.stack([camera.fy for camera in cameras])
+        Ks[:, 0, 2] = torch.stack([camera.cx for camera in cameras])
+        Ks[:, 1, 2] = torch.stack([camera.cy for camera in cameras])
+        Ks[:, 2, 2] = 1.
+
+        img_width = int(cameras[0].width.item())
+        img_height = int(cameras[0].height.item())
+
+        return viewmats, Ks, (img_width, img_height)
+
     @classmethod
     def project(
         cls,
@@ -331,11 +564,11 @@ class GSplatV1:
         Returns:
             A tuple:
 
-            - **radii**. [1, N]
-            - **means2d**. [1, N, 2]
-            - **depths**. [1, N]
-            - **conics**. [1, N, 3]
-            - **compensations**. [1, N]
+            - **radii**. [C, N]
+            - **means2d**. [C, N, 2]
+            - **depths**. [C, N]
+            - **conics**. [C, N, 3]
+            - **compensations**. [C, N]
         """
 
         return fully_fused_projection(
@@ -364,15 +597,16 @@ class GSplatV1:
         Returns:
             A tuple:
 
-            -   **tiles_per_gauss**. [1, N]
+            -   **tiles_per_gauss**. [C, N]
             -   **isect_ids**. [n_isects]
             -   **flatten_ids**. [n_isects]
-            -   **isect_offsets**. [1, tile_height, tile_width]
+            -   **isect_offsets**. [C, tile_height, tile_width]
         """
 
         img_width, img_height = preprocessed_camera[-1]
 
         radii, means2d, depths, _, _ = projection_results
+        n_cameras = means2d.shape[0]
 
         tile_width = math.ceil(img_width / float(tile_size))
         tile_height = math.ceil(img_height / float(tile_size))
@@ -384,11 +618,11 @@ class GSplatV1:
             tile_width,
             tile_height,
             packed=False,
-            n_cameras=1,
+            n_cameras=n_cameras,
             camera_ids=None,
             gaussian_ids=None,
         )
-        isect_offsets = isect_offset_encode(isect_ids, 1, tile_width, tile_height)
+        isect_offsets = isect_offset_encode(isect_ids, n_cameras, tile_width, tile_height)
 
         return tiles_per_gauss, isect_ids, flatten_ids, isect_offsets
 
@@ -418,15 +652,16 @@ class GSplatV1:
         Returns:
             A tuple:
 
-            -   **tiles_per_gauss**. [1, N]
+            -   **tiles_per_gauss**. [C, N]
             -   **isect_ids**. [n_isects]
             -   **flatten_ids**. [n_isects]
-            -   **isect_offsets**. [1, tile_height, tile_width]
+            -   **isect_offsets**. [C, tile_height, tile_width]
         """
 
         img_width, img_height = preprocessed_camera[-1]
 
         radii, means2d, depths, conics, _ = projection_results
+        n_cameras = means2d.shape[0]
 
         tile_width = math.ceil(img_width / float(tile_size))
         tile_height = math.ceil(img_height / float(tile_size))
@@ -440,14 +675,14 @@ class GSplatV1:
             tile_width,
             tile_height,
             packed=False,
-            n_cameras=1,
+            n_cameras=n_cameras,
             camera_ids=None,
             gaussian_ids=None,
         )
         isect_offsets, flatten_ids = isect_offset_encode_tile_based_culling(
             isect_ids,
             flatten_ids,
-            1,
+            n_cameras,
             tile_width,
             tile_height,
         )
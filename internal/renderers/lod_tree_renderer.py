@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import torch
+
+from .renderer import RendererConfig, Renderer, RendererOutputInfo
+from ..cameras import Camera
+from ..models.gaussian import GaussianModel
+from ..utils.lod_tree import GaussianLoDTree
+
+
+@dataclass
+class LoDTreeRenderer(RendererConfig):
+    tree: str
+    """The file built by `utils/build_lod_tree.py`"""
+
+    threshold: float = 1.
+    """In pixels, a node is rendered instead of its children once its projected error is lower than this"""
+
+    max_gaussians: int = -1
+    """Stop refining when the number of Gaussians would exceed this, -1 means unlimited"""
+
+    frustum_culling: bool = True
+
+    freeze: bool = False
+    """Keep the current cut, for inspecting it from other views"""
+
+    renderer: Optional[RendererConfig] = None
+    """Render the selected Gaussians, `GSplatV1Renderer` by default"""
+
+    def instantiate(self, *args, **kwargs) -> "LoDTreeRendererModule":
+        return LoDTreeRendererModule(self)
+
+
+class LoDTreeRendererModule(Renderer):
+    """
+    The `pc` passed to `forward()` is ignored, the Gaussians of the cut selected from the tree are rendered instead
+    """
+
+    def __init__(self, config: LoDTreeRenderer) -> None:
+        super().__init__()
+        self.config = config
+
+        self.on_model_updated_hooks = []
+
+    def setup(self, stage: str, *args: Any, **kwargs: Any) -> Any:
+        super().setup(stage, *args, **kwargs)
+
+        self.tree = GaussianLoDTree.load(self.config.tree, map_location="cpu")
+        self.selected = None
+
+        # a pre-activated model holding the selected Gaussians
+        from internal.models.vanilla_gaussian import VanillaGaussian
+        self.gaussian_model = VanillaGaussian(sh_degree=self.tree.sh_degree).instantiate()
+        self.gaussian_model.setup_from_number(0)
+        self.gaussian_model.pre_activate_all_properties()
+        self.gaussian_model.freeze()
+        self.gaussian_model.active_sh_degree = self.tree.sh_degree
+
+        renderer_config = self.config.renderer
+        if renderer_config is None:
+            from .gsplat_v1_renderer import GSplatV1Renderer
+            renderer_config = GSplatV1Renderer()
+        self.renderer = renderer_config.instantiate()
+        self.renderer.setup(stage)
+
+    def update_selection(self, viewpoint_camera: Camera):
+        if self.tree.device != viewpoint_camera.camera_center.device:
+            self.tree = self.tree.to(viewpoint_camera.camera_center.device)
+            self.gaussian_model.to(viewpoint_camera.camera_center.device)
+            self.selected = None
+
+        if self.config.freeze and self.selected is not None:
+            return
+
+        selected = self.tree.select(
+            viewpoint_camera,
+            threshold=self.config.threshold,
+            max_gaussians=self.config.max_gaussians,
+            frustum_culling=self.config.frustum_culling,
+        )
+        if self.selected is not None and torch.equal(selected, self.selected):
+            return
+
+        self.selected = selected
+        self.gaussian_model.properties = self.tree.get_properties(selected)
+        for i in self.on_model_updated_hooks:
+            i()
+
+    def forward(
+            self,
+            viewpoint_camera: Camera,
+            pc: GaussianModel,
+            bg_color: torch.Tensor,
+            scaling_modifier=1.0,
+            render_types: list = None,
+            **kwargs,
+    ):
+        self.update_selection(viewpoint_camera)
+
+        return self.renderer(
+            viewpoint_camera,
+            self.gaussian_model,
+            bg_color,
+            scaling_modifier,
+            render_types,
+            **kwargs,
+        )
+
+    def get_available_outputs(self) -> Dict[str, RendererOutputInfo]:
+        return self.renderer.get_available_outputs()
+
+    def setup_web_viewer_tabs(self, viewer, server, tabs):
+        with tabs.add_tab("LoD"):
+            self.viewer_options = ViewerOptions(self, viewer, server)
+
+
+class ViewerOptions:
+    def __init__(self, renderer: LoDTreeRendererModule, viewer, server):
+        super().__init__()
+        self.renderer = renderer
+        self.viewer = viewer
+        self.server = server
+
+        with server.gui.add_folder("Status"):
+            self.markdown = server.gui.add_markdown("")
+        self.update_number_of_gaussians()
+        self.renderer.on_model_updated_hooks.append(self.update_number_of_gaussians)
+
+        with server.gui.add_folder("Settings"):
+            threshold_number = server.gui.add_number(
+                label="Threshold",
+                initial_value=renderer.config.threshold,
+                min=0.,
+                step=0.1,
+                hint="in pixels, the maximum projected error of the rendered nodes",
+            )
+
+            @threshold_number.on_update
+            def _(_):
+                self.renderer.config.threshold = threshold_number.value
+                self.viewer.rerender_for_all_client()
+
+            max_gaussians_number = server.gui.add_number(
+                label="Max Gaussians",
+                initial_value=renderer.config.max_gaussians,
+                min=-1,
+                step=1,
+                hint="-1 means unlimited",
+            )
+
+            @max_gaussians_number.on_update
+            def _(_):
+                self.renderer.config.max_gaussians = int(max_gaussians_number.value)
+                self.viewer.rerender_for_all_client()
+
+            frustum_culling_checkbox = server.gui.add_checkbox("Frustum Culling", initial_value=renderer.config.frustum_culling)
+
+            @frustum_culling_checkbox.on_update
+            def _(_):
+                self.renderer.config.frustum_culling = frustum_culling_checkbox.value
+                self.viewer.rerender_for_all_client()
+
+            freeze_checkbox = server.gui.add_checkbox("Freeze", initial_value=renderer.config.freeze)
+
+            @freeze_checkbox.on_update
+            def _(_):
+                self.renderer.config.freeze = freeze_checkbox.value
+
+    def update_number_of_gaussians(self):
+        self.markdown.content = "Gaussians: {} / {}".format(
+            self.renderer.gaussian_model.n_gaussians,
+            self.renderer.tree.n_leaves,
+        )
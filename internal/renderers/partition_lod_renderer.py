@@ -12,6 +12,7 @@ from .gsplat_v1_renderer import GSplatV1Renderer
 from .renderer import RendererConfig, Renderer
 from ..cameras import Camera
 from ..models.gaussian import GaussianModel
+from ..utils.partition_visibility import get_visible_boxes
 
 
 @dataclass
@@ -20,8 +21,17 @@ class PartitionLoDRenderer(RendererConfig):
     names: list[str]  # from finest to coarsest
     min_images: int = 32
     visibility_filter: bool = False
+    occlusion_culling: bool = False
+    """Cull the partitions hidden behind the ground of the others, requires `visibility_filter`"""
+    occlusion_tile_size: int = 32
     freeze: bool = False
     drop_shs_rest: bool = False
+    slot_size: int = 1024
+    """The granularity of the device memory pool, in Gaussians"""
+    max_device_gaussians: int = -1
+    """The capacity of the device memory pool, -1 means that it grows on demand"""
+    max_host_gaussians: int = -1
+    """The capacity of the host memory cache, -1 means that every loaded model is kept"""
 
     def instantiate(self, *args, **kwargs) -> "PartitionLoDRendererModule":
         return PartitionLoDRendererModule(self)
@@ -60,14 +70,12 @@ class PartitionLoDRendererModule(Renderer):
         self.partition_coordinates = PartitionCoordinates(**partitions["partition_coordinates"])
         self.partition_bounding_boxes = self.partition_coordinates.get_bounding_boxes(partition_size).to(device=device)
 
-        # load partitions' models
-        from internal.utils.gaussian_model_loader import GaussianModelLoader
+        # load partitions' models on demand
+        from internal.utils.gaussian_block_pool import GaussianBlockPool
         from utils.train_partitions import PartitionTraining, PartitionTrainingConfig
-        lods = []  # [N_lods, N_partitions]
-
-        for lod in tqdm(self.config.names):
-            models = []
+        experiment_names = []  # [N_lods, N_partitions]
 
+        for lod in self.config.names:
             partition_training = PartitionTraining(PartitionTrainingConfig(
                 partition_dir=self.config.data,
                 project_name=lod,
@@ -82,27 +90,29 @@ class PartitionLoDRendererModule(Renderer):
                 n_processes=1,
                 process_id=1,
             )
-
-            for partition_idx in tqdm(trainable_partition_idx_list, leave=False):
-                ckpt = torch.load(os.path.join(
-                    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                    "outputs",
-                    lod,
-                    partition_training.get_experiment_name(partition_idx),
-                    "preprocessed.ckpt"
-                ), map_location="cpu")
-                gaussian_model = GaussianModelLoader.initialize_model_from_checkpoint(ckpt, device)
-                if self.config.drop_shs_rest:
-                    gaussian_model.config.sh_degree = 0
-                    gaussian_model.active_sh_degree = 0
-                    gaussian_model.shs_rest = torch.empty((gaussian_model.n_gaussians, 0, 3), device=gaussian_model.shs_dc.device)
-                gaussian_model.pre_activate_all_properties()
-                gaussian_model.freeze()
-                gaussian_model.to(device=device)
-                models.append(gaussian_model)
-
-            lods.append(models)
-        self.lods = lods
+            experiment_names.append([partition_training.get_experiment_name(i) for i in trainable_partition_idx_list])
+        self.n_lods = len(self.config.names)
+
+        self.model_config = None
+        self.renderer_hparams = None
+
+        def load_block(key):
+            lod, partition_idx = key
+            return self._load_block(torch.load(os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "outputs",
+                self.config.names[lod],
+                experiment_names[lod][partition_idx],
+                "preprocessed.ckpt"
+            ), map_location="cpu"))
+
+        self.block_pool = GaussianBlockPool(
+            load_block,
+            device=device,
+            slot_size=self.config.slot_size,
+            max_slots=-1 if self.config.max_device_gaussians < 0 else self.config.max_device_gaussians // self.config.slot_size,
+            max_host_gaussians=self.config.max_host_gaussians,
+        )
 
         # retain trainable partitions only
         trainable_partition_idx = torch.tensor(trainable_partition_idx_list)
@@ -110,14 +120,19 @@ class PartitionLoDRendererModule(Renderer):
         self.partition_coordinates.xy = self.partition_coordinates.xy[trainable_partition_idx]
         self.partition_bounding_boxes.min = self.partition_bounding_boxes.min[trainable_partition_idx]
         self.partition_bounding_boxes.max = self.partition_bounding_boxes.max[trainable_partition_idx]
+        self.n_partitions = len(trainable_partition_idx_list)
 
         # get partition 3D bounding boxes
         partition_min_max_z = []
-        for partition_model in self.lods[0]:
-            partition_z_value = partition_model.get_means() @ self.orientation_transform[:, -1:]
+        for partition_idx in tqdm(range(self.n_partitions), desc="Loading"):
+            partition_means = self.block_pool.get_host_block((0, partition_idx))["means"].to(device=device)
+            partition_z_value = partition_means @ self.orientation_transform[:, -1:]
             partition_min_max_z.append(torch.stack([partition_z_value.min(), partition_z_value.max()]))
         partition_min_max_z = torch.stack(partition_min_max_z)
         # print(partition_min_max_z)
+        # in partition space, i.e. `p_world @ orientation_transform`
+        self.partition_box_min = torch.concat([self.partition_bounding_boxes.min, partition_min_max_z[:, 0:1]], dim=-1)  # [N_partitions, 3]
+        self.partition_box_max = torch.concat([self.partition_bounding_boxes.max, partition_min_max_z[:, 1:2]], dim=-1)
         partition_full_2d_bounding_box = []
         for partition_xy in self.partition_coordinates.xy:
             partition_xy = partition_xy.to(device=device)
@@ -140,33 +155,51 @@ class PartitionLoDRendererModule(Renderer):
         # print(self.partition_full_3d_bounding_box)
 
         # set default LoD distance thresholds
-        self.lod_thresholds = (torch.arange(1, len(self.lods)) * 0.25 * partition_size).to(device=device)  # [N_lods - 1]
+        self.lod_thresholds = (torch.arange(1, self.n_lods) * 0.25 * partition_size).to(device=device)  # [N_lods - 1]
 
         # initialize partition lod states
-        self.n_partitions = len(self.lods[0])
         self.partition_lods = torch.empty(self.n_partitions, dtype=torch.int8, device=device).fill_(127)  # [N_partitions]
         self.is_partition_visible = torch.ones(self.n_partitions, dtype=torch.bool, device=device)
 
         # setup empty Gaussian Model
-        self.gaussian_model = gaussian_model.config.instantiate()
+        self.gaussian_model = self.model_config.instantiate()
         self.gaussian_model.setup_from_number(0)
         self.gaussian_model.pre_activate_all_properties()
         self.gaussian_model.freeze()
-        self.gaussian_model.active_sh_degree = gaussian_model.active_sh_degree
+        self.gaussian_model.active_sh_degree = self.active_sh_degree
         self.gaussian_model.to(device=device)
 
         # setup gsplat renderer
-        renderer_config = GSplatV1Renderer(
-            block_size=getattr(ckpt["hyper_parameters"]["renderer"], "block_size", 16),
-            anti_aliased=getattr(ckpt["hyper_parameters"]["renderer"], "anti_aliased", True),
-            filter_2d_kernel_size=getattr(ckpt["hyper_parameters"]["renderer"], "filter_2d_kernel_size", 0.3),
-            separate_sh=getattr(ckpt["hyper_parameters"]["renderer"], "separate_sh", True),
-            tile_based_culling=getattr(ckpt["hyper_parameters"]["renderer"], "tile_based_culling", False),
-        )
+        renderer_config = self._get_gsplat_renderer_config()
         print(renderer_config)
         self.gsplat_renderer = renderer_config.instantiate()
         self.gsplat_renderer.setup(stage)
 
+    def _load_block(self, ckpt: dict) -> Dict[str, torch.Tensor]:
+        from internal.utils.gaussian_model_loader import GaussianModelLoader
+
+        gaussian_model = GaussianModelLoader.initialize_model_from_checkpoint(ckpt, "cpu")
+        if self.config.drop_shs_rest:
+            gaussian_model.config.sh_degree = 0
+            gaussian_model.active_sh_degree = 0
+            gaussian_model.shs_rest = torch.empty((gaussian_model.n_gaussians, 0, 3))
+        gaussian_model.pre_activate_all_properties()
+        if self.model_config is None:
+            # the model and the renderer settings of the first loaded block are used by all of them
+            self.model_config = gaussian_model.config
+            self.active_sh_degree = gaussian_model.active_sh_degree
+            self.renderer_hparams = ckpt["hyper_parameters"]["renderer"]
+        return {k: v.detach() for k, v in gaussian_model.properties.items()}
+
+    def _get_gsplat_renderer_config(self) -> GSplatV1Renderer:
+        return GSplatV1Renderer(
+            block_size=getattr(self.renderer_hparams, "block_size", 16),
+            anti_aliased=getattr(self.renderer_hparams, "anti_aliased", True),
+            filter_2d_kernel_size=getattr(self.renderer_hparams, "filter_2d_kernel_size", 0.3),
+            separate_sh=getattr(self.renderer_hparams, "separate_sh", True),
+            tile_based_culling=getattr(self.renderer_hparams, "tile_based_culling", False),
+        )
+
     def get_partition_distances(self, p: torch.Tensor):
         p = (p @ self.orientation_transform)[:2]
         dist_min2p = self.partition_bounding_boxes.min - p
@@ -189,59 +222,32 @@ class PartitionLoDRendererModule(Renderer):
         partition_lods = torch.ones_like(self.partition_lods).fill_(-1)
 
         # set lods by distances
-        for i in range(len(self.lods) - 2, -1, -1):
+        for i in range(self.n_lods - 2, -1, -1):
             partition_lods[partition_distances < self.lod_thresholds[i]] = i
 
         # visibility
-        # TODO: optimize visibility based filter, it does not correctly know whether a partition partly in front of the camera is invisible
         is_partition_visible = torch.ones_like(self.is_partition_visible)
         if self.config.visibility_filter:
-            full_perspective_projection = viewpoint_camera.get_full_perspective_projection()
-            partition_corners_in_image_space_in_homogeneous = self.partition_full_3d_bounding_box @ full_perspective_projection[:3, :3] + full_perspective_projection[3, :3]
-            partition_corners_in_image_space = partition_corners_in_image_space_in_homogeneous[..., :2] / (torch.abs(partition_corners_in_image_space_in_homogeneous[..., 2:3]) + 1e-6)  # [N_partitions, 8, 2]
-
-            min_pixel_coor = torch.tensor([0., 0.], dtype=torch.float, device=partition_corners_in_image_space.device)
-            max_pixel_coor = torch.tensor([viewpoint_camera.width, viewpoint_camera.height], dtype=torch.float, device=partition_corners_in_image_space.device)
-
-            is_behind_camera = partition_corners_in_image_space_in_homogeneous[..., -1:] <= 0.  # [N_partitions, 8, 1]
-            is_partition_behind_camera = torch.all(is_behind_camera.squeeze(-1), dim=1)  # [N_partition]
-
-            # move them into the image plane
-            # print("partition_corners_in_image_space[0]={}".format(partition_corners_in_image_space[0].cpu().numpy()))
-            partition_corners_in_image_space = torch.maximum(partition_corners_in_image_space, min_pixel_coor)
-            partition_corners_in_image_space = torch.minimum(partition_corners_in_image_space, max_pixel_coor)
-            # print("partition_corners_in_image_space[0]={}".format(partition_corners_in_image_space[0].cpu().numpy()))
-
-            # prevent selecting valid min and max values from corners behind camera by applying the `behind_camera_corner_xy_offset`
-            # behind_camera_corner_xy_offset = is_behind_camera * max_pixel_coor.max()
-            behind_camera_corner_xy_offset = 0.
-            partition_corners_min = torch.min(partition_corners_in_image_space + behind_camera_corner_xy_offset, dim=1).values  # [N_partitions, 2]
-            partition_corners_max = torch.max(partition_corners_in_image_space - behind_camera_corner_xy_offset, dim=1).values  # [N_partitions, 2]
-            # the results of (partition_corners_max - partition_corners_min) of corners behind camera will <= 0
-            partition_projection_area = torch.prod((partition_corners_max - partition_corners_min).clamp(min=0.), dim=-1)  # [N_partitions]
-            # print("partition_projection_area[0]={}".format(partition_projection_area[0].cpu().numpy()))
-
-            is_partition_visible = torch.gt(partition_projection_area, torch.tensor(0., device=partition_projection_area.device))
-            is_partition_visible = torch.logical_and(is_partition_visible, torch.logical_not(is_partition_behind_camera))
-            is_partition_visible[torch.argmin(partition_distances)] = True
-            # print("is_partition_visible[0]={}".format(is_partition_visible[0]))
+            is_partition_visible = get_visible_boxes(
+                viewpoint_camera,
+                self.partition_box_min,
+                self.partition_box_max,
+                rotation=self.orientation_transform,
+                occlusion_culling=self.config.occlusion_culling,
+                tile_size=self.config.occlusion_tile_size,
+            )
 
         if not self.config.freeze and (not torch.all(torch.eq(self.partition_lods, partition_lods)) or not torch.all(torch.eq(self.is_partition_visible, is_partition_visible))):
             # update stored lods
             self.partition_lods = partition_lods
             self.is_partition_visible = is_partition_visible
-            # update model
-            properties = {}
-            for partition_idx, lod in enumerate(partition_lods):
-                if not is_partition_visible[partition_idx]:
-                    continue
-                for k, v in self.lods[lod.item()][partition_idx].properties.items():
-                    properties.setdefault(k, []).append(v)
-
-            for k in list(properties.keys()):
-                properties[k] = torch.concat(properties[k], dim=0).to(device="cuda")
-
-            self.gaussian_model.properties = properties
+            # update model, only the (partition, LoD) blocks not resident are uploaded
+            visible_partition_idx = torch.nonzero(is_partition_visible).squeeze(-1)
+            self.block_pool.update(list(zip(
+                partition_lods[visible_partition_idx].tolist(),
+                visible_partition_idx.tolist(),
+            )))
+            self.gaussian_model.properties = self.block_pool.get_properties()
 
             for i in self.on_model_updated_hooks:
                 i()
@@ -257,16 +263,6 @@ class PartitionLoDRendererModule(Renderer):
             render_types,
             **kwargs,
         )
-        # if self.config.visibility_filter:
-        #     for idx, corner in enumerate(partition_corners_in_image_space[0]):
-        #         red_value = 1.
-        #         if partition_corners_in_image_space_in_homogeneous[0, idx, 2] <= 0.:
-        #             red_value = 0.
-        #         box_min = torch.clamp(corner - 16, min=0).to(torch.int)
-        #         box_max = corner + 16
-        #         box_max = torch.minimum(box_max, max_pixel_coor).to(torch.int)
-        #         outputs["render"][1:3, box_min[1]:box_max[1], box_min[0]:box_max[0]] = (1 - red_value)
-        #         outputs["render"][0, box_min[1]:box_max[1], box_min[0]:box_max[0]] = red_value
         return outputs
 
     def get_available_outputs(self) -> Dict[str, RendererOutputInfo]:
@@ -325,6 +321,12 @@ class ViewerOptions:
             def _(_):
                 self.renderer.config.visibility_filter = visibility_filter_checkbox.value
 
+            occlusion_culling_checkbox = self.server.gui.add_checkbox("Occlusion Culling", initial_value=self.renderer.config.occlusion_culling)
+
+            @occlusion_culling_checkbox.on_update
+            def _(_):
+                self.renderer.config.occlusion_culling = occlusion_culling_checkbox.value
+
             # visibility filter
             freeze_checkbox = self.server.gui.add_checkbox("Freeze", initial_value=self.renderer.config.freeze)
 
@@ -386,8 +388,14 @@ class ViewerOptions:
             # break
 
     def update_number_of_gaussians(self):
-        self.markdown.content = "Gaussians: {}".format(
+        pool_stats = self.renderer.block_pool.get_stats()
+        self.markdown.content = "Gaussians: {}  \nResident: {}, Slots: {} / {}  \nUploads: {}, Evictions: {}".format(
             self.renderer.gaussian_model.n_gaussians,
+            pool_stats["resident_blocks"],
+            pool_stats["rendered_slots"],
+            pool_stats["slots"],
+            pool_stats["uploads"],
+            pool_stats["evictions"],
         )
 
     def update_labels(self):
@@ -1,9 +1,9 @@
 from dataclasses import dataclass
 import lightning
 import torch
-from typing import Any, Union, List, Tuple, Optional, Dict, Callable
+from typing import Any, Union, List, Tuple, Optional, Dict, Callable, Sequence
 from internal.configs.instantiate_config import InstantiatableConfig
-from internal.cameras.cameras import Camera
+from internal.cameras.cameras import Camera, Cameras
 from internal.models.gaussian import GaussianModel
 
 
@@ -52,6 +52,32 @@ class Renderer(torch.nn.Module):
     ):
         pass
 
+    def batch_forward(
+            self,
+            cameras: Union[Cameras, Sequence[Camera]],
+            pc: GaussianModel,
+            bg_color: torch.Tensor,
+            scaling_modifier=1.0,
+            render_types: list = None,
+            **kwargs,
+    ) -> List[Dict]:
+        """
+        Render multiple cameras, return the outputs of each camera in the same order.
+        The cameras are rendered one by one by default, override this to share the work between them.
+        """
+
+        return [
+            self(
+                camera,
+                pc,
+                bg_color,
+                scaling_modifier=scaling_modifier,
+                render_types=render_types,
+                **kwargs,
+            )
+            for camera in cameras
+        ]
+
     def training_forward(
             self,
             step: int,
@@ -0,0 +1,434 @@
+"""
+Tile-based rasterizer implemented in pure PyTorch, runs on any device, including CPU.
+
+It follows the CUDA rasterizer of the vanilla 3DGS:
+the Gaussians are projected by `project_gaussians()`, and the 2D Gaussians overlapping each tile are sorted by depth,
+then alpha composited front-to-back, and the compositing of a pixel is stopped once its transmittance would drop below a threshold.
+
+All the tiles are processed together, a chunk of Gaussians at a time.
+It is differentiable through autograd, but memory hungry, so only suitable for small scenes.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import math
+import torch
+from internal.cameras.cameras import Camera, Cameras
+from internal.models.gaussian import GaussianModel
+from internal.utils.gaussian_projection import project_gaussians, build_tile_bounds, build_gaussian_sort_key
+from internal.utils.sh_utils import eval_sh_bases, eval_sh_colors
+from internal.utils.spatial_index import get_spatial_index
+from .renderer import RendererConfig, Renderer, RendererOutputInfo, RendererOutputTypes
+
+
+@dataclass
+class TorchTileRenderer(RendererConfig):
+    block_size: int = 16
+
+    anti_aliased: bool = False
+
+    chunk_size: int = 16
+    """The number of Gaussians composited at a time for each tile"""
+
+    tile_batch_size: int = 1024
+    """The number of tiles processed at a time, reduce it to lower the peak memory"""
+
+    transmittance_threshold: float = 1e-4
+    """The compositing of a pixel is stopped once its transmittance would drop below this value"""
+
+    min_alpha: float = 1. / 255.
+
+    max_alpha: float = 0.99
+
+    frustum_culling: bool = False
+    """Skip the Gaussians outside the view frustum by the spatial index attached to the model"""
+
+    frustum_culling_pixel_margin: float = 16.
+
+    def instantiate(self, *args, **kwargs) -> "TorchTileRendererModule":
+        return TorchTileRendererModule(self)
+
+
+class TorchTileRendererModule(Renderer):
+    def __init__(self, config: TorchTileRenderer):
+        super().__init__()
+        self.config = config
+
+    def forward(
+            self,
+            viewpoint_camera: Camera,
+            pc: GaussianModel,
+            bg_color: torch.Tensor,
+            scaling_modifier=1.0,
+            render_types: list = None,
+            **kwargs,
+    ):
+        return self.batch_forward([viewpoint_camera], pc, bg_color, scaling_modifier, render_types, **kwargs)[0]
+
+    def batch_forward(
+            self,
+            cameras: Union[Cameras, Sequence[Camera]],
+            pc: GaussianModel,
+            bg_color: torch.Tensor,
+            scaling_modifier=1.0,
+            render_types: list = None,
+            **kwargs,
+    ) -> List[Dict]:
+        """
+        The properties are activated, and the SH colors of all the cameras are evaluated, only once.
+        The projection and the rasterization are performed camera by camera.
+        """
+
+        cameras = list(cameras)
+
+        means = pc.get_means()
+        scales = pc.get_scales()
+        rotations = pc.get_rotations()
+        opacities = pc.get_opacities().squeeze(-1)
+        features = pc.get_shs()
+
+        visible_indices_list = [None] * len(cameras)
+        if self.config.frustum_culling is True:
+            spatial_index = get_spatial_index(pc)
+            visible_indices_list = [spatial_index.cull(
+                camera,
+                scale_modifier=scaling_modifier,
+                pixel_margin=self.config.frustum_culling_pixel_margin,
+            ) for camera in cameras]
+
+        rgbs_list = self.get_rgbs(cameras, means, features, pc.active_sh_degree, visible_indices_list)
+
+        return [self.render_camera(
+            camera,
+            means,
+            scales,
+            rotations,
+            opacities,
+            rgbs,
+            visible_indices,
+            bg_color,
+            scaling_modifier,
+        ) for camera, rgbs, visible_indices in zip(cameras, rgbs_list, visible_indices_list)]
+
+    @staticmethod
+    def get_rgbs(cameras: List[Camera], means, features, sh_degree: int, visible_indices_list: List[Optional[torch.Tensor]]) -> List[torch.Tensor]:
+        """
+        Evaluate the SHs of all the cameras in one pass
+        """
+
+        if all(i is None for i in visible_indices_list):
+            # [N, C, 3], the cameras are batched in the contraction of each Gaussian, so the SH coefficients are not copied
+            dirs = means.unsqueeze(1) - torch.stack([camera.camera_center for camera in cameras]).unsqueeze(0)
+            dirs = dirs / dirs.norm(dim=-1, keepdim=True)
+            bases = eval_sh_bases(sh_degree, dirs)
+            rgbs = torch.bmm(bases, features[:, :bases.shape[-1]])
+            return list(torch.clamp_min(rgbs + 0.5, 0.).unbind(1))
+
+        # gather the visible Gaussians of each camera
+        dirs = torch.cat([means[i] - camera.camera_center for camera, i in zip(cameras, visible_indices_list)])
+        dirs = dirs / dirs.norm(dim=-1, keepdim=True)
+        rgbs = eval_sh_colors(sh_degree, torch.cat([features[i] for i in visible_indices_list]), dirs)
+        return list(torch.clamp_min(rgbs + 0.5, 0.).split([i.shape[0] for i in visible_indices_list]))
+
+    def render_camera(
+            self,
+            viewpoint_camera: Camera,
+            means: torch.Tensor,
+            scales: torch.Tensor,
+            rotations: torch.Tensor,
+            opacities: torch.Tensor,
+            rgbs: torch.Tensor,
+            visible_indices: Optional[torch.Tensor],
+            bg_color: torch.Tensor,
+            scaling_modifier=1.0,
+    ):
+        """
+        Args:
+            rgbs: the colors of the visible Gaussians only
+            visible_indices: the Gaussians survived from the frustum culling, `None` if all are visible
+        """
+
+        img_height = int(viewpoint_camera.height.item())
+        img_width = int(viewpoint_camera.width.item())
+
+        n_gaussians = means.shape[0]
+        if visible_indices is not None:
+            means = means[visible_indices]
+            scales = scales[visible_indices]
+            rotations = rotations[visible_indices]
+            opacities = opacities[visible_indices]
+
+        projections = project_gaussians(
+            means_3d=means,
+            scales=scales,
+            scale_modifier=scaling_modifier,
+            quaternions=rotations,
+            world_to_camera=viewpoint_camera.world_to_camera,
+            fx=viewpoint_camera.fx,
+            fy=viewpoint_camera.fy,
+            cx=viewpoint_camera.cx,
+            cy=viewpoint_camera.cy,
+            img_height=viewpoint_camera.height,
+            img_width=viewpoint_camera.width,
+            block_width=self.config.block_size,
+        )
+
+        if self.config.anti_aliased is True:
+            opacities = opacities * projections[4]
+
+        # scatter back, the culled Gaussians touch no tile, and `viewspace_points` covers all the Gaussians
+        if visible_indices is not None:
+            projections, rgbs, opacities = [
+                self.scatter_to_all_gaussians(i, visible_indices, n_gaussians)
+                for i in (projections, rgbs, opacities)
+            ]
+        xys, depths, radii, conics, comp, num_tiles_hit, cov3d, mask, rect_min, rect_max = projections
+        if xys.requires_grad:
+            xys.retain_grad()
+
+        tile_bounds = build_tile_bounds(viewpoint_camera.height, viewpoint_camera.width, self.config.block_size, device=xys.device)
+        rgb, alpha, acc_depth = TorchTileRasterizer.rasterize(
+            xys=xys,
+            depths=depths,
+            conics=conics,
+            colors=rgbs,
+            opacities=opacities,
+            num_tiles_hit=num_tiles_hit,
+            rect_min=rect_min,
+            rect_max=rect_max,
+            tile_bounds=tile_bounds,
+            img_height=img_height,
+            img_width=img_width,
+            block_size=self.config.block_size,
+            chunk_size=self.config.chunk_size,
+            tile_batch_size=self.config.tile_batch_size,
+            transmittance_threshold=self.config.transmittance_threshold,
+            min_alpha=self.config.min_alpha,
+            max_alpha=self.config.max_alpha,
+        )
+
+        rgb = rgb + (1. - alpha) * bg_color.to(rgb.dtype)
+
+        return {
+            "render": rgb.permute(2, 0, 1),
+            "alpha": alpha.permute(2, 0, 1),
+            "acc_depth": acc_depth.permute(2, 0, 1),
+            "exp_depth": (acc_depth / alpha.clamp_min(1e-8)).permute(2, 0, 1),
+            "viewspace_points": xys,
+            "viewspace_points_grad_scale": 0.5 * max(img_height, img_width),
+            "visibility_filter": mask,
+            "radii": radii,
+        }
+
+    @classmethod
+    def scatter_to_all_gaussians(cls, src, indices: torch.Tensor, n_gaussians: int):
+        if isinstance(src, (tuple, list)):
+            return type(src)(cls.scatter_to_all_gaussians(i, indices, n_gaussians) for i in src)
+        return torch.zeros(
+            (n_gaussians,) + src.shape[1:],
+            dtype=src.dtype,
+            device=src.device,
+        ).index_copy(0, indices, src)
+
+    def get_available_outputs(self) -> Dict[str, RendererOutputInfo]:
+        return {
+            "rgb": RendererOutputInfo("render"),
+            "alpha": RendererOutputInfo("alpha", type=RendererOutputTypes.GRAY),
+            "acc_depth": RendererOutputInfo("acc_depth", type=RendererOutputTypes.GRAY),
+            "exp_depth": RendererOutputInfo("exp_depth", type=RendererOutputTypes.GRAY),
+        }
+
+
+class TorchTileRasterizer:
+    @staticmethod
+    def get_tile_ranges(sort_key: torch.Tensor, n_tiles: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            sort_key: [n_intersections], sorted
+
+        Returns:
+            [n_tiles] the index of the first intersection of each tile, and the number of intersections
+        """
+
+        tile_ids = torch.bitwise_right_shift(sort_key, 32)
+        counts = torch.bincount(tile_ids, minlength=n_tiles)[:n_tiles]
+        starts = torch.cumsum(counts, dim=0) - counts
+        return starts, counts
+
+    @staticmethod
+    def get_pixel_centers(tile_ids: torch.Tensor, n_tiles_x: int, block_size: int, dtype) -> torch.Tensor:
+        """
+        Returns:
+            [n_tiles, block_size * block_size, 2-xy]
+        """
+
+        offsets = torch.arange(block_size * block_size, device=tile_ids.device)
+        x = (tile_ids % n_tiles_x)[:, None] * block_size + (offsets % block_size)[None, :]
+        y = torch.div(tile_ids, n_tiles_x, rounding_mode="floor")[:, None] * block_size + torch.div(offsets, block_size, rounding_mode="floor")[None, :]
+        return torch.stack([x, y], dim=-1).to(dtype) + 0.5
+
+    @classmethod
+    def composite_tiles(
+            cls,
+            tile_ids: torch.Tensor,  # [T]
+            starts: torch.Tensor,  # [n_tiles]
+            counts: torch.Tensor,  # [n_tiles]
+            sorted_gaussian_ids: torch.Tensor,  # [n_intersections]
+            xys: torch.Tensor,
+            depths: torch.Tensor,
+            conics: torch.Tensor,
+            colors: torch.Tensor,
+            opacities: torch.Tensor,
+            n_tiles_x: int,
+            block_size: int,
+            chunk_size: int,
+            transmittance_threshold: float,
+            min_alpha: float,
+            max_alpha: float,
+    ):
+        """
+        Returns:
+            rgb: [T, P, 3], P is the number of pixels of a tile
+            alpha: [T, P, 1]
+            acc_depth: [T, P, 1]
+        """
+
+        n_tiles = tile_ids.shape[0]
+        n_pixels = block_size * block_size
+        dtype = xys.dtype
+        pixels = cls.get_pixel_centers(tile_ids, n_tiles_x, block_size, dtype)  # [T, P, 2]
+
+        rgb = torch.zeros((n_tiles, n_pixels, 3), dtype=dtype, device=xys.device)
+        acc_depth = torch.zeros((n_tiles, n_pixels), dtype=dtype, device=xys.device)
+        transmittance = torch.ones((n_tiles, n_pixels), dtype=dtype, device=xys.device)
+        is_done = torch.zeros((n_tiles, n_pixels), dtype=torch.bool, device=xys.device)
+
+        tile_starts = starts[tile_ids]
+        tile_counts = counts[tile_ids]
+        chunk_offsets = torch.arange(chunk_size, device=xys.device)
+        # the tiles still require compositing, indexing into `tile_ids`
+        active = torch.nonzero(tile_counts > 0, as_tuple=True)[0]
+
+        n_chunks = math.ceil(tile_counts.max().item() / chunk_size) if n_tiles > 0 else 0
+        for chunk_idx in range(n_chunks):
+            # early termination: the tiles whose Gaussians are exhausted or whose pixels are all saturated
+            active = active[tile_counts[active] > chunk_idx * chunk_size]
+            active = active[~torch.all(is_done[active], dim=-1)]
+            if active.shape[0] == 0:
+                break
+
+            # gather the Gaussians of this chunk, [A, C]
+            local_index = chunk_idx * chunk_size + chunk_offsets[None, :]
+            is_valid = local_index < tile_counts[active, None]
+            gaussian_ids = sorted_gaussian_ids[torch.where(is_valid, tile_starts[active, None] + local_index, 0)].long()
+
+            # evaluate 2D Gaussians, [A, P, C]
+            d = xys[gaussian_ids][:, None, :, :] - pixels[active][:, :, None, :]  # [A, P, C, 2]
+            conic = conics[gaussian_ids][:, None, :, :]  # [A, 1, C, 3]
+            sigma = 0.5 * (conic[..., 0] * d[..., 0] * d[..., 0] + conic[..., 2] * d[..., 1] * d[..., 1]) + conic[..., 1] * d[..., 0] * d[..., 1]
+            alpha = torch.clamp_max(opacities[gaussian_ids][:, None, :] * torch.exp(-sigma), max_alpha)
+            alpha = torch.where(
+                torch.logical_and(torch.logical_and(sigma >= 0., alpha >= min_alpha), is_valid[:, None, :]),
+                alpha,
+                torch.zeros_like(alpha),
+            )
+
+            # stop before the transmittance drops below the threshold, the stopped ones form a suffix
+            transmittance_before = transmittance[active]  # [A, P]
+            with torch.no_grad():
+                transmittance_after = transmittance_before[..., None] * torch.cumprod(1. - alpha, dim=-1)
+                is_kept = torch.logical_and(transmittance_after >= transmittance_threshold, ~is_done[active][..., None])
+                is_done = is_done.index_copy(0, active, torch.logical_not(is_kept[..., -1]))
+            alpha = torch.where(is_kept, alpha, torch.zeros_like(alpha))
+
+            # front-to-back compositing
+            cumprod = torch.cumprod(1. - alpha, dim=-1)
+            exclusive_cumprod = torch.cat([torch.ones_like(cumprod[..., :1]), cumprod[..., :-1]], dim=-1)
+            weights = transmittance_before[..., None] * exclusive_cumprod * alpha  # [A, P, C]
+
+            rgb = rgb.index_add(0, active, torch.einsum("apc,ack->apk", weights, colors[gaussian_ids]))
+            acc_depth = acc_depth.index_add(0, active, torch.sum(weights * depths[gaussian_ids][:, None, :], dim=-1))
+            transmittance = transmittance.index_copy(0, active, transmittance_before * cumprod[..., -1])
+
+        return rgb, (1. - transmittance).unsqueeze(-1), acc_depth.unsqueeze(-1)
+
+    @classmethod
+    def rasterize(
+            cls,
+            xys: torch.Tensor,  # [N, 2]
+            depths: torch.Tensor,  # [N]
+            conics: torch.Tensor,  # [N, 3]
+            colors: torch.Tensor,  # [N, 3]
+            opacities: torch.Tensor,  # [N]
+            num_tiles_hit: torch.Tensor,  # [N]
+            rect_min: torch.Tensor,  # [N, 2]
+            rect_max: torch.Tensor,  # [N, 2]
+            tile_bounds: torch.Tensor,  # [3]
+            img_height: int,
+            img_width: int,
+            block_size: int = 16,
+            chunk_size: int = 16,
+            tile_batch_size: int = 1024,
+            transmittance_threshold: float = 1e-4,
+            min_alpha: float = 1. / 255.,
+            max_alpha: float = 0.99,
+            sort_key: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+    ):
+        """
+        Args:
+            sort_key: the sorted output of `build_gaussian_sort_key()`, will be built if not provided
+
+        Returns:
+            rgb: [H, W, 3]
+            alpha: [H, W, 1]
+            acc_depth: [H, W, 1], the alpha-weighted depth
+        """
+
+        n_tiles_x, n_tiles_y = int(tile_bounds[0].item()), int(tile_bounds[1].item())
+        n_tiles = n_tiles_x * n_tiles_y
+
+        if sort_key is None:
+            with torch.no_grad():
+                sort_key = build_gaussian_sort_key(
+                    depths,
+                    rect_min,
+                    rect_max,
+                    tile_bounds,
+                    torch.cumsum(num_tiles_hit, dim=-1),
+                    sort=True,
+                )
+        sorted_keys, sorted_gaussian_ids = sort_key
+        starts, counts = cls.get_tile_ranges(sorted_keys, n_tiles)
+
+        tile_outputs = [[], [], []]
+        for tile_begin in range(0, n_tiles, tile_batch_size):
+            tile_ids = torch.arange(tile_begin, min(tile_begin + tile_batch_size, n_tiles), device=xys.device)
+            for output_list, output in zip(tile_outputs, cls.composite_tiles(
+                    tile_ids=tile_ids,
+                    starts=starts,
+                    counts=counts,
+                    sorted_gaussian_ids=sorted_gaussian_ids,
+                    xys=xys,
+                    depths=depths,
+                    conics=conics,
+                    colors=colors,
+                    opacities=opacities,
+                    n_tiles_x=n_tiles_x,
+                    block_size=block_size,
+                    chunk_size=chunk_size,
+                    transmittance_threshold=transmittance_threshold,
+                    min_alpha=min_alpha,
+                    max_alpha=max_alpha,
+            )):
+                output_list.append(output)
+
+        # [n_tiles_y, n_tiles_x, block_size, block_size, C] -> [H, W, C]
+        images = []
+        for output_list in tile_outputs:
+            output = torch.cat(output_list, dim=0)
+            n_channels = output.shape[-1]
+            output = output.reshape((n_tiles_y, n_tiles_x, block_size, block_size, n_channels))
+            output = output.permute(0, 2, 1, 3, 4).reshape((n_tiles_y * block_size, n_tiles_x * block_size, n_channels))
+            images.append(output[:img_height, :img_width])
+
+        return tuple(images)
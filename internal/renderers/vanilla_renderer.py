@@ -12,7 +12,7 @@
 import math
 from .renderer import *
 from diff_gaussian_rasterization import GaussianRasterizationSettings, GaussianRasterizer
-from internal.utils.sh_utils import eval_sh
+from internal.utils.sh_utils import eval_sh_colors
 
 
 class VanillaRenderer(Renderer):
@@ -97,10 +97,9 @@ class VanillaRenderer(Renderer):
         colors_precomp = None
         if override_color is None:
             if self.convert_SHs_python is True:
-                shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree + 1) ** 2)
-                dir_pp = (pc.get_xyz - viewpoint_camera.camera_center.repeat(pc.get_features.shape[0], 1))
+                dir_pp = pc.get_xyz - viewpoint_camera.camera_center
                 dir_pp_normalized = dir_pp / dir_pp.norm(dim=1, keepdim=True)
-                sh2rgb = eval_sh(pc.active_sh_degree, shs_view, dir_pp_normalized)
+                sh2rgb = eval_sh_colors(pc.active_sh_degree, pc.get_features, dir_pp_normalized)
                 colors_precomp = torch.clamp_min(sh2rgb + 0.5, 0.0)
             else:
                 shs = pc.get_features
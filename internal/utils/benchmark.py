@@ -0,0 +1,25 @@
+import time
+from typing import Callable
+import torch
+
+
+def synchronize(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def benchmark(fn: Callable, device="cpu", n_iters: int = 10, n_warmup: int = 2) -> float:
+    """
+    :return: the average seconds per call of `fn`
+    """
+
+    for _ in range(n_warmup):
+        fn()
+    synchronize(device)
+
+    started_at = time.perf_counter()
+    for _ in range(n_iters):
+        fn()
+    synchronize(device)
+
+    return (time.perf_counter() - started_at) / n_iters
@@ -0,0 +1,278 @@
+"""
+A staged pipeline writing the rendered frames to a video and image files, used by `render.py`.
+
+The stages run concurrently:
+    1. the caller renders a frame, converts it to uint8 on the device,
+       then copies it asynchronously into a page-locked host buffer, on a separate CUDA stream;
+    2. a thread waits for the copy, then passes the buffer to the video writer;
+    3. a process pool encodes the image files.
+A bounded ring of reusable host buffers connects them, so the rendering is only blocked when all the buffers are in use.
+"""
+
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+import contextlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+import numpy as np
+import torch
+
+
+def to_uint8_image(image: torch.Tensor) -> torch.Tensor:
+    """
+    Args:
+        image: [3, H, W], float, in [0, 1]
+
+    Returns:
+        [H, W, 3], uint8
+    """
+
+    return torch.clamp(image * 255. + 0.5, min=0., max=255.).to(torch.uint8).permute(1, 2, 0)
+
+
+def write_image(image: np.ndarray, path: str) -> float:
+    """
+    Returns:
+        the seconds spent
+    """
+
+    from PIL import Image
+
+    started_at = time.perf_counter()
+    save_kwargs = {}
+    if path.lower().endswith((".jpg", ".jpeg")):
+        save_kwargs["quality"] = 95
+    Image.fromarray(image).save(path, **save_kwargs)
+    return time.perf_counter() - started_at
+
+
+class StageTimer:
+    """
+    Accumulate the busy time and the number of frames of each stage, the stages may run in different threads.
+    The rate of a stage served by a pool is the one of a single worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, stage: str, seconds: float, n: int = 1):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.counts[stage] += n
+
+    @contextlib.contextmanager
+    def time(self, stage: str, n: int = 1):
+        started_at = time.perf_counter()
+        yield
+        self.add(stage, time.perf_counter() - started_at, n)
+
+    def get_fps(self) -> Dict[str, float]:
+        with self.lock:
+            return {k: self.counts[k] / max(v, 1e-9) for k, v in self.seconds.items()}
+
+    def __str__(self):
+        return ", ".join(["{}={:.1f}fps".format(k, v) for k, v in self.get_fps().items()])
+
+
+class HostFrameRing:
+    """
+    Reusable host buffers, each of them is released once all of its consumers have done with it
+    """
+
+    def __init__(self, n_buffers: int, shape: Tuple[int, ...], dtype=torch.uint8, pin_memory: bool = False):
+        self.buffers = [torch.empty(shape, dtype=dtype, pin_memory=pin_memory) for _ in range(n_buffers)]
+        self.lock = threading.Lock()
+        self.ref_counts = [0] * n_buffers
+        self.free_indices = queue.Queue()
+        for i in range(n_buffers):
+            self.free_indices.put(i)
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def acquire(self, n_consumers: int = 1) -> Optional[int]:
+        """
+        Block until a buffer is available, or return `None` once aborted
+        """
+
+        idx = self.free_indices.get()
+        if idx is None:
+            # wake the next waiter up too
+            self.free_indices.put(None)
+            return None
+        self.ref_counts[idx] = n_consumers
+        return idx
+
+    def abort(self):
+        """
+        Wake all the waiters of `acquire()` up
+        """
+
+        self.free_indices.put(None)
+
+    def release(self, idx: int):
+        with self.lock:
+            self.ref_counts[idx] -= 1
+            is_free = self.ref_counts[idx] == 0
+        if is_free:
+            self.free_indices.put(idx)
+
+
+class FramePipeline:
+    def __init__(
+            self,
+            shape: Tuple[int, int],
+            device,
+            video_writer=None,
+            frame_output_path: Optional[str] = None,
+            image_format: str = "png",
+            n_image_workers: int = 8,
+            n_buffers: int = 4,
+    ):
+        """
+        Args:
+            shape: (H, W)
+            video_writer: any object with `add_image(np.ndarray[H, W, 3])`, e.g. `mediapy.VideoWriter`
+            frame_output_path: save each frame to an image file if provided
+        """
+
+        self.device = torch.device(device)
+        self.video_writer = video_writer
+        self.frame_output_path = frame_output_path
+        self.image_format = image_format
+        self.is_cuda = self.device.type == "cuda"
+
+        self.n_consumers = int(video_writer is not None) + int(frame_output_path is not None)
+        self.ring = HostFrameRing(n_buffers, (shape[0], shape[1], 3), pin_memory=self.is_cuda)
+        self.copy_stream = torch.cuda.Stream(self.device) if self.is_cuda else None
+        self.timer = StageTimer()
+        self.stall_seconds = 0.
+
+        self.image_writer = None
+        if frame_output_path is not None:
+            # the workers do not touch CUDA, but forking a process with CUDA initialized is unsafe
+            self.image_writer = ProcessPoolExecutor(max_workers=n_image_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        self.frame_queue = queue.Queue(maxsize=n_buffers)
+        # the first exception raised by any stage, re-raised by `put()` and `close()`
+        self.exception = None
+        self.exception_lock = threading.Lock()
+        self.consumer_thread = threading.Thread(target=self._consume)
+        self.consumer_thread.start()
+
+    def put(self, image: torch.Tensor, frame_idx: int):
+        """
+        Args:
+            image: [3, H, W], float, in [0, 1], on the device
+        """
+
+        if self.exception is not None:
+            raise RuntimeError("frame pipeline failed") from self.exception
+        if self.n_consumers == 0:
+            return
+
+        image = to_uint8_image(image)
+
+        started_at = time.perf_counter()
+        buffer_idx = self.ring.acquire(self.n_consumers)
+        # the rendering is blocked by the slower stages
+        self.stall_seconds += time.perf_counter() - started_at
+        if buffer_idx is None:
+            # aborted by a failed stage
+            raise RuntimeError("frame pipeline failed") from self.exception
+        buffer = self.ring.buffers[buffer_idx]
+
+        event = None
+        if self.is_cuda:
+            self.copy_stream.wait_stream(torch.cuda.current_stream(self.device))
+            with torch.cuda.stream(self.copy_stream):
+                buffer.copy_(image, non_blocking=True)
+                # prevent the caching allocator from reusing the memory before the copy is done
+                image.record_stream(self.copy_stream)
+                event = torch.cuda.Event()
+                event.record(self.copy_stream)
+        else:
+            buffer.copy_(image)
+
+        self.frame_queue.put((buffer_idx, frame_idx, event))
+
+    def _consume(self):
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                break
+            buffer_idx, frame_idx, event = item
+            # the references on the buffer not yet handed over to any consumer
+            n_unreleased = self.n_consumers
+            try:
+                if event is not None:
+                    with self.timer.time("copy"):
+                        event.synchronize()
+                image = self.ring.buffers[buffer_idx].numpy()
+
+                if self.image_writer is not None:
+                    future = self.image_writer.submit(
+                        write_image,
+                        image,
+                        os.path.join(self.frame_output_path, "{:06d}.{}".format(frame_idx, self.image_format)),
+                    )
+                    # the image is pickled later by the feeder thread of the pool, not by `submit()`,
+                    # so the buffer must not be reused until the done callback releases it
+                    future.add_done_callback(self._get_image_written_callback(buffer_idx))
+                    n_unreleased -= 1
+
+                if self.video_writer is not None:
+                    try:
+                        with self.timer.time("video"):
+                            self.video_writer.add_image(image)
+                    finally:
+                        n_unreleased -= 1
+                        self.ring.release(buffer_idx)
+            except Exception as e:
+                # e.g. the pool is broken, the callback is never attached
+                for _ in range(n_unreleased):
+                    self.ring.release(buffer_idx)
+                traceback.print_exc()
+                self._set_exception(e)
+
+    def _set_exception(self, e: BaseException):
+        with self.exception_lock:
+            if self.exception is not None:
+                return
+            self.exception = e
+        # `put()` may be waiting for a buffer
+        self.ring.abort()
+
+    def _get_image_written_callback(self, buffer_idx: int):
+        def callback(future):
+            self.ring.release(buffer_idx)
+            e = future.exception()
+            if e is not None:
+                traceback.print_exception(type(e), e, e.__traceback__)
+                self._set_exception(e)
+                return
+            self.timer.add("image", future.result())
+
+        return callback
+
+    def close(self):
+        self.frame_queue.put(None)
+        self.consumer_thread.join()
+        if self.image_writer is not None:
+            self.image_writer.shutdown(wait=True)
+
+        if self.exception is not None:
+            raise RuntimeError("frame pipeline failed") from self.exception
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
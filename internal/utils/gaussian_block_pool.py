@@ -0,0 +1,240 @@
+"""
+A device memory pool of Gaussian blocks, e.g. the (partition, LoD) models of the `PartitionLoDRenderer`.
+
+The pool is made of fixed-size slots in preallocated device buffers, and a block occupies as many slots as it requires.
+The slots of the blocks to be rendered are kept packed at the beginning of the buffers,
+so the rendered Gaussians are views of the buffers without copying.
+When the set of the blocks to be rendered changes,
+only the blocks not resident are uploaded, and only the slots of the affected blocks are moved.
+The blocks no longer rendered stay resident until their slots are required, and are evicted in LRU order.
+
+The blocks are loaded by the `loader` into the host memory on demand, and cached in a LRU cache too,
+so the scenes larger than both the device and the host memory can be browsed.
+
+The unused part of the last slot of a block is padded by its first Gaussian with zero opacity.
+"""
+
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+from collections import OrderedDict
+import math
+import torch
+
+
+class GaussianBlockPool:
+    def __init__(
+            self,
+            loader: Callable[[Hashable], Dict[str, torch.Tensor]],
+            device,
+            slot_size: int = 1024,
+            max_slots: int = -1,
+            max_host_gaussians: int = -1,
+            transparent_property: Optional[str] = "opacities",
+    ):
+        """
+        Args:
+            loader: load the properties of a block by its key
+            max_slots: -1 means that the buffers grow instead of evicting blocks
+            max_host_gaussians: the capacity of the host LRU cache, -1 means unlimited
+            transparent_property: set to zero for the padding Gaussians
+        """
+
+        self.loader = loader
+        self.device = torch.device(device)
+        self.slot_size = slot_size
+        self.max_slots = max_slots
+        self.max_host_gaussians = max_host_gaussians
+        self.transparent_property = transparent_property
+
+        self.buffers: Dict[str, torch.Tensor] = {}
+        self.slot_owners: List[Optional[Hashable]] = []
+        self.block_slots: OrderedDict[Hashable, List[int]] = OrderedDict()  # the resident blocks, in LRU order
+        self.block_sizes: Dict[Hashable, int] = {}
+        self.n_rendered_slots = 0
+
+        self.host_blocks: OrderedDict[Hashable, Dict[str, torch.Tensor]] = OrderedDict()
+        self.n_host_gaussians = 0
+
+        self.stats = {
+            "host_loads": 0,
+            "uploads": 0,
+            "evictions": 0,
+            "moved_slots": 0,
+        }
+
+    @property
+    def n_slots(self) -> int:
+        return len(self.slot_owners)
+
+    def get_host_block(self, key: Hashable) -> Dict[str, torch.Tensor]:
+        block = self.host_blocks.get(key, None)
+        if block is not None:
+            self.host_blocks.move_to_end(key)
+            return block
+
+        block = {k: v.to(device="cpu") for k, v in self.loader(key).items()}
+        if self.device.type == "cuda":
+            block = {k: v.pin_memory() for k, v in block.items()}
+        self.stats["host_loads"] += 1
+
+        n = next(iter(block.values())).shape[0]
+        self.block_sizes[key] = n
+        self.host_blocks[key] = block
+        self.n_host_gaussians += n
+        # keep the newly loaded one
+        while self.max_host_gaussians > 0 and self.n_host_gaussians > self.max_host_gaussians and len(self.host_blocks) > 1:
+            _, evicted = self.host_blocks.popitem(last=False)
+            self.n_host_gaussians -= next(iter(evicted.values())).shape[0]
+
+        return block
+
+    def get_block_size(self, key: Hashable) -> int:
+        if key not in self.block_sizes:
+            self.get_host_block(key)
+        return self.block_sizes[key]
+
+    def get_n_required_slots(self, key: Hashable) -> int:
+        return max(math.ceil(self.get_block_size(key) / self.slot_size), 1)
+
+    def get_slot_positions(self, slots: Iterable[int]) -> torch.Tensor:
+        slots = torch.tensor(list(slots), dtype=torch.long, device=self.device)
+        return (slots[:, None] * self.slot_size + torch.arange(self.slot_size, device=self.device)).reshape(-1)
+
+    def _grow(self, n_slots: int, template: Dict[str, torch.Tensor]):
+        if self.max_slots > 0:
+            n_slots = min(n_slots, self.max_slots)
+        if n_slots <= self.n_slots:
+            return
+
+        n = n_slots * self.slot_size
+        buffers = {}
+        for k, v in template.items():
+            buffer = torch.empty((n,) + v.shape[1:], dtype=v.dtype, device=self.device)
+            if k in self.buffers:
+                buffer[:self.buffers[k].shape[0]] = self.buffers[k]
+            buffers[k] = buffer
+        self.buffers = buffers
+        self.slot_owners += [None] * (n_slots - self.n_slots)
+
+    def _upload(self, key: Hashable, slots: List[int]):
+        block = self.get_host_block(key)
+        n = self.block_sizes[key]
+        n_padding = len(slots) * self.slot_size - n
+
+        positions = self.get_slot_positions(slots)
+        for k, v in block.items():
+            v = v.to(device=self.device, non_blocking=True)
+            if n_padding > 0:
+                padding = v[:1].expand((n_padding,) + v.shape[1:])
+                if k == self.transparent_property:
+                    padding = torch.zeros_like(padding)
+                v = torch.concat([v, padding], dim=0)
+            self.buffers[k].index_copy_(0, positions, v)
+
+        for i in slots:
+            self.slot_owners[i] = key
+        self.block_slots[key] = list(slots)
+        self.stats["uploads"] += 1
+
+    def _evict(self, key: Hashable):
+        for i in self.block_slots.pop(key):
+            self.slot_owners[i] = None
+        self.stats["evictions"] += 1
+
+    def _move_slots(self, moves: List[tuple]):
+        """
+        Args:
+            moves: (src, dst) pairs, the destinations must be free
+        """
+
+        if len(moves) == 0:
+            return
+
+        src_positions = self.get_slot_positions([i[0] for i in moves])
+        dst_positions = self.get_slot_positions([i[1] for i in moves])
+        for buffer in self.buffers.values():
+            buffer.index_copy_(0, dst_positions, buffer[src_positions])
+
+        for src, dst in moves:
+            key = self.slot_owners[src]
+            slots = self.block_slots[key]
+            slots[slots.index(src)] = dst
+            self.slot_owners[dst] = key
+            self.slot_owners[src] = None
+        self.stats["moved_slots"] += len(moves)
+
+    def update(self, keys: List[Hashable]) -> int:
+        """
+        Make the blocks of the `keys`, and only them, occupy the first slots
+
+        Returns:
+            the number of the Gaussians in the occupied slots, including the padding ones
+        """
+
+        keys = list(dict.fromkeys(keys))
+        key_set = set(keys)
+        n_required_slots = {key: self.get_n_required_slots(key) for key in keys}
+        m = sum(n_required_slots.values())
+        if self.max_slots > 0 and m > self.max_slots:
+            raise RuntimeError("{} slots are required, but the capacity of the pool is {}".format(m, self.max_slots))
+
+        if len(keys) > 0:
+            template = self.buffers if len(self.buffers) > 0 else self.get_host_block(keys[0])
+            self._grow(max(m, self.n_slots), template)
+
+        # 1. move the other blocks out of the first `m` slots, evict them in LRU order if there are not enough free slots
+        def count_moves_out():
+            n_to_move = sum(1 for i in self.slot_owners[:m] if i is not None and i not in key_set)
+            n_free = sum(1 for i in self.slot_owners[m:] if i is None)
+            return n_to_move, n_free
+
+        n_to_move, n_free = count_moves_out()
+        if n_to_move > n_free and self.max_slots <= 0:
+            self._grow(max(self.n_slots + n_to_move - n_free, self.n_slots * 2), self.buffers)
+        else:
+            for key in list(self.block_slots.keys()):
+                if n_to_move <= n_free:
+                    break
+                if key not in key_set:
+                    self._evict(key)
+                    n_to_move, n_free = count_moves_out()
+
+        free_slots = [i for i in range(self.n_slots - 1, m - 1, -1) if self.slot_owners[i] is None]
+        self._move_slots([
+            (i, free_slots.pop())
+            for i in range(m)
+            if self.slot_owners[i] is not None and self.slot_owners[i] not in key_set
+        ])
+
+        # 2. fill the first `m` slots with the slots of the blocks required, which are either outside or not resident
+        holes = [i for i in range(m - 1, -1, -1) if self.slot_owners[i] is None]
+        self._move_slots([
+            (i, holes.pop())
+            for i in range(m, self.n_slots)
+            if self.slot_owners[i] in key_set
+        ])
+        for key in keys:
+            if key not in self.block_slots:
+                self._upload(key, [holes.pop() for _ in range(n_required_slots[key])])
+            self.block_slots.move_to_end(key)
+        assert len(holes) == 0
+
+        self.n_rendered_slots = m
+        return m * self.slot_size
+
+    def get_properties(self) -> Dict[str, torch.Tensor]:
+        """
+        Returns:
+            the views of the Gaussians of the blocks specified by the last `update()`
+        """
+
+        n = self.n_rendered_slots * self.slot_size
+        return {k: v[:n] for k, v in self.buffers.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "resident_blocks": len(self.block_slots),
+            "host_blocks": len(self.host_blocks),
+            "slots": self.n_slots,
+            "rendered_slots": self.n_rendered_slots,
+        }
@@ -1,3 +1,20 @@
+"""
+Edit multiple Gaussian models as a single one.
+
+The models are stored as consecutive segments of a single model, indexed by `model_gaussian_indices`.
+The store is the only copy of the properties, so the memory is about the total size of the models:
+    * the store is filled segment by segment, instead of concatenating the copies of all the models;
+    * the transform of each segment is recorded, then applied to the store in-place lazily,
+      i.e. at the next access of the properties, usually by the renderer.
+      It is always computed from the original state of the segment, so the errors do not accumulate over the edits.
+      The original state is copied on the first transform of a model, only the properties changed by the transforms,
+      so the models never transformed take no extra memory;
+    * the deleted Gaussians are marked in a bitmask and hidden,
+      the store is compacted lazily too, once enough of them are deleted, one property at a time.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import threading
 import torch
 import numpy as np
 from internal.utils import gaussian_utils
@@ -8,14 +25,22 @@ class MultipleGaussianModelEditor:
             self,
             gaussian_models: list,
             device=None,
+            compaction_threshold: float = 0.1,
     ):
         """
         Args:
             gaussian_models: must be same type, sh_degree and pre-activated state
+            compaction_threshold: compact the store once the fraction of the deleted Gaussians exceeds it
         """
+
+        # the edits are recorded by the GUI threads, and applied by the rendering one
+        self._lock = threading.RLock()
+        self._pending_transforms: Dict[int, Tuple[float, tuple, tuple]] = {}
+
         self.device = device
         if self.device is None:
             self.device = gaussian_models[0].means.device
+        self.compaction_threshold = compaction_threshold
 
         # get total number of gaussians and indices of each model
         total_gaussian_num = 0
@@ -38,22 +63,94 @@ class MultipleGaussianModelEditor:
             self.gaussian_model.active_sh_degree = gaussian_models[0].active_sh_degree
 
             # store all properties into this model
-            self.gaussian_model.properties = self._concat_all_properties(gaussian_models, self.device)
+            self.gaussian_model.properties = self._fill_store(gaussian_models, self.model_gaussian_indices, self.device)
 
+        self._selected: Optional[torch.Tensor] = None
+        self._deleted: Optional[torch.Tensor] = None
         self._modified_opacities = None
-        self._original_properties = None
+        # the `(scale, r_wxyz, t_xyz)` applied to each model, all of them are in the original states initially
+        self._transforms = [(1., (1., 0., 0., 0.), (0., 0., 0.)) for _ in range(len(gaussian_models))]
+        # {model index: {property name: the segment of the model in its original state}}, the transforms are applied to them
+        self._references: Dict[int, Dict[str, torch.Tensor]] = {}
 
     def __getattr__(self, item):
+        if item.startswith("_") or item == "gaussian_model":
+            # not initialized yet
+            raise AttributeError(item)
+        self.apply_edits()
         return getattr(self.gaussian_model, item)
 
     @staticmethod
-    def _concat_all_properties(models, device):
+    def _get_packed_ranges(model) -> Dict[str, Tuple[int, int]]:
+        """
+        The properties storing only a range of the Gaussians, i.e. the rest SHs of each degree of `AdaptiveSHGaussianModel`
+
+        Returns:
+            the `[begin, end)` of the Gaussians stored by each of them
+        """
+
+        if not hasattr(model, "get_packed_shs_rest_names"):
+            return {}
+        degree_ranges = model.get_degree_ranges()
+        return {name: degree_ranges[idx + 1] for idx, name in enumerate(model.get_packed_shs_rest_names())}
+
+    @classmethod
+    def _get_transformed_property_names(cls, model) -> List[str]:
+        names = ["means", "scales", "rotations"]
+        packed_names = list(cls._get_packed_ranges(model).keys())
+        if len(packed_names) > 0:
+            return names + packed_names
+        return names + ["shs" if "shs" in model.gaussians else "shs_rest"]
+
+    def _get_segment_range(self, name: str, idx: int, packed_ranges: Dict[str, Tuple[int, int]]) -> Tuple[int, int, int]:
+        """
+        Returns:
+            the `[begin, end)` of the Gaussians of the `idx`-th model stored by the property `name`,
+            and the index of the first Gaussian stored by it
+        """
+
+        begin, end = self.get_model_gaussian_indices(idx)
+        if name not in packed_ranges:
+            return begin, end, 0
+        # only the part in the range of this degree
+        packed_begin, packed_end = packed_ranges[name]
+        begin, end = max(begin, packed_begin), min(end, packed_end)
+        return begin, max(begin, end), packed_begin
+
+    def _get_reference(self, idx: int, packed_ranges: Dict[str, Tuple[int, int]]) -> Dict[str, torch.Tensor]:
+        reference = self._references.get(idx, None)
+        if reference is None:
+            reference = {}
+            for name in self._get_transformed_property_names(self.gaussian_model):
+                begin, end, offset = self._get_segment_range(name, idx, packed_ranges)
+                reference[name] = self.gaussian_model.gaussians[name][begin - offset:end - offset].clone()
+            self._references[idx] = reference
+        return reference
+
+    @classmethod
+    def _fill_store(cls, models, model_gaussian_indices, device) -> Dict[str, torch.Tensor]:
+        if len(cls._get_packed_ranges(models[0])) > 0:
+            raise ValueError("the models storing the SHs of each degree separately can not be merged")
+
         properties = {}
         for name in models[0].property_names:
-            properties[name] = torch.concat([model.get_property(name).to(device) for model in models], dim=0)
+            value = models[0].get_property(name)
+            store = torch.empty((model_gaussian_indices[-1][1],) + value.shape[1:], dtype=value.dtype, device=device)
+            for model, (begin, end) in zip(models, model_gaussian_indices):
+                store[begin:end] = model.get_property(name).detach()
+            properties[name] = store
         return properties
 
+    def get_version(self):
+        self.apply_edits()
+        # the selection only changes the opacities of this editor, but not the properties of the model
+        version = self.gaussian_model.get_version()
+        if self._modified_opacities is None:
+            return version
+        return version + (id(self._modified_opacities), self._modified_opacities._version)
+
     def get_opacities(self):
+        self.apply_edits()
         if self._modified_opacities is None:
             return self.gaussian_model.get_opacities()
         return self._modified_opacities
@@ -62,61 +159,93 @@ class MultipleGaussianModelEditor:
     def get_opacity(self):
         return self.get_opacities()
 
-    def select(self, mask: torch.tensor):
+    @property
+    def deleted_mask(self) -> Optional[torch.Tensor]:
+        """
+        The Gaussians deleted but still in the store, `None` if no such one
+        """
+
+        return self._deleted
+
+    def _update_modified_opacities(self):
+        hidden = self._selected
+        if self._deleted is not None:
+            hidden = self._deleted if hidden is None else hidden | self._deleted
+        if hidden is None:
+            self._modified_opacities = None
+            return
         self._modified_opacities = torch.clone(self.gaussian_model.get_opacities())
-        self._modified_opacities[mask] = 0.
+        self._modified_opacities[hidden] = 0.
+
+    def select(self, mask: torch.tensor):
+        with self._lock:
+            self._selected = mask.to(device=self.gaussian_model.means.device)
+            self._update_modified_opacities()
 
     def delete_gaussians(self, mask: torch.tensor):
-        self._modified_opacities = None
+        with self._lock:
+            mask = mask.to(device=self.gaussian_model.means.device)
+            self._deleted = mask if self._deleted is None else self._deleted | mask
+            self._selected = None
+            self._update_modified_opacities()
 
-        gaussians_to_be_preserved = torch.bitwise_not(mask).to(device=self.gaussian_model.means.device)
+    @torch.no_grad()
+    def compact(self):
+        """
+        Remove the deleted Gaussians from the store
+        """
 
-        # delete for each model
-        new_properties = {}
-        new_original_properties = {}
-        for key, value in self.gaussian_model.properties.items():
-            new_properties[key] = []
-            new_original_properties[key] = []
-            for begin, end in self.model_gaussian_indices:
-                model_property = value[begin:end]
-                model_property_mask = gaussians_to_be_preserved[begin:end]
-                new_properties[key].append(model_property[model_property_mask])
+        with self._lock:
+            if self._deleted is None:
+                return
 
-                # prune original properties if exists
-                if self._original_properties is not None and key in self._original_properties:
-                    model_original_property = self._original_properties[key][begin:end]
-                    model_original_property_mask = gaussians_to_be_preserved[begin:end].to(model_original_property.device)
-                    new_original_properties[key].append(model_original_property[model_original_property_mask])
+            gaussians_to_be_preserved = ~self._deleted
+            # must be calculated before any of the properties is compacted
+            packed_ranges = self._get_packed_ranges(self.gaussian_model)
+            for idx, reference in self._references.items():
+                for name in reference:
+                    begin, end, _ = self._get_segment_range(name, idx, packed_ranges)
+                    reference[name] = reference[name][gaussians_to_be_preserved[begin:end]]
+            # one property at a time, so only a single one is copied at any moment
+            for name in self.gaussian_model.property_names:
+                begin, end = packed_ranges.get(name, (0, gaussians_to_be_preserved.shape[0]))
+                self.gaussian_model.set_property(name, self.gaussian_model.get_property(name)[gaussians_to_be_preserved[begin:end]])
 
-        # recalculate index range
-        total_gaussian_num = 0
-        model_gaussian_indices = []
-        for i in new_properties["means"]:
-            n = i.shape[0]
-            model_gaussian_indices.append((total_gaussian_num, total_gaussian_num + n))
-            total_gaussian_num += n
-        self.model_gaussian_indices = model_gaussian_indices
+            # recalculate index range
+            total_gaussian_num = 0
+            model_gaussian_indices = []
+            for begin, end in self.model_gaussian_indices:
+                n = int(gaussians_to_be_preserved[begin:end].sum().item())
+                model_gaussian_indices.append((total_gaussian_num, total_gaussian_num + n))
+                total_gaussian_num += n
+            self.model_gaussian_indices = model_gaussian_indices
 
-        # concat slices
-        new_properties = {i: torch.concat(new_properties[i], dim=0) for i in new_properties}
-        if self._original_properties is not None:
-            self._original_properties = {key: torch.concat(new_original_properties[key], dim=0) for key in self._original_properties}
+            self._deleted = None
+            self._selected = None
+            self._modified_opacities = None
 
-        self.gaussian_model.properties = new_properties
+    def get_non_pre_activated_properties(self):
+        # the deleted ones are not saved
+        self.compact()
+        self.apply_edits()
+        return self.gaussian_model.get_non_pre_activated_properties()
 
-    def backup_properties(self):
-        # backup activated properties
-        self._original_properties = {
-            "means": self.gaussian_model.get_means().clone(),
-            "scales": self.gaussian_model.get_scales().clone(),
-            "rotations": self.gaussian_model.get_rotations().clone(),
-            "shs": self.gaussian_model.get_shs().clone(),
-        }
+    def get_prefix_view(self, n: int):
+        """
+        The first `n` Gaussians of the store, sharing the storage, with the selected and deleted ones hidden
+        """
+
+        self.apply_edits()
+        with self._lock:
+            if self._modified_opacities is None:
+                return self.gaussian_model.get_prefix_view(n)
+            return self.gaussian_model.get_prefix_view(n, overrides={
+                "opacities": self.gaussian_model.opacity_inverse_activation(self._modified_opacities),
+            })
 
     def get_model_gaussian_indices(self, idx: int):
         return self.model_gaussian_indices[idx]
 
-    @torch.no_grad()
     def transform_with_vectors(
             self,
             idx: int,
@@ -124,50 +253,125 @@ class MultipleGaussianModelEditor:
             r_wxyz: np.ndarray,
             t_xyz: np.ndarray,
     ):
-        device = self.gaussian_model.means.device
+        """
+        Transform the `idx`-th model from its original state.
+        The transform is applied at the next access of the properties, only the latest one of each model is applied.
+        """
 
-        begin, end = self.get_model_gaussian_indices(idx)
+        if scale <= 0.:
+            raise ValueError("the scale must be positive")
+        transform = (float(scale), tuple(np.asarray(r_wxyz, dtype=np.float64).tolist()), tuple(np.asarray(t_xyz, dtype=np.float64).tolist()))
+        with self._lock:
+            self._pending_transforms[idx] = transform
+
+    def get_transform(self, idx: int) -> Tuple[float, tuple, tuple]:
+        """
+        Returns:
+            the latest `(scale, r_wxyz, t_xyz)` of the `idx`-th model, applied or not
+        """
+
+        with self._lock:
+            return self._pending_transforms.get(idx, self._transforms[idx])
+
+    @staticmethod
+    def get_transform_matrix(transform) -> torch.Tensor:
+        """
+        Returns:
+            [4, 4], float64, `p_transformed = M @ p`
+        """
+
+        scale, r_wxyz, t_xyz = transform
+        matrix = torch.eye(4, dtype=torch.float64)
+        if r_wxyz != (0., 0., 0., 0.):
+            matrix[:3, :3] = torch.from_numpy(gaussian_utils.qvec2rotmat(np.asarray(r_wxyz, dtype=np.float64)))
+        matrix[:3, :3] *= scale
+        matrix[:3, 3] = torch.tensor(t_xyz, dtype=torch.float64)
+        return matrix
+
+    @staticmethod
+    def _get_quaternion(transform) -> torch.Tensor:
+        r_wxyz = transform[1]
+        if r_wxyz == (0., 0., 0., 0.):
+            r_wxyz = (1., 0., 0., 0.)
+        return torch.nn.functional.normalize(torch.tensor(r_wxyz, dtype=torch.float64), dim=-1)
+
+    @torch.no_grad()
+    def apply_edits(self):
+        """
+        Apply the pending transforms, and compact the store if required
+        """
 
-        if self._original_properties is None:
-            # only create a backup for the first call
-            self.backup_properties()
+        with self._lock:
+            if len(self._pending_transforms) > 0:
+                pending_transforms = self._pending_transforms
+                self._pending_transforms = {}
+                for idx, transform in pending_transforms.items():
+                    self._apply_transform(idx, transform)
+
+            if self._deleted is not None and self._deleted.float().mean().item() > self.compaction_threshold:
+                self.compact()
+
+    def _apply_transform(self, idx: int, transform):
+        previous_transform = self._transforms[idx]
+        if transform == previous_transform:
+            return
 
         model = self.gaussian_model
-        # pick properties corresponds to the specified `idx` of model
-        xyz = self._original_properties["means"][begin:end].clone().to(device)
-        # TODO: avoid memory copy if no rotation or scaling happened compared to previous state
-        scaling = self._original_properties["scales"][begin:end].clone().to(device)
-        rotation = self._original_properties["rotations"][begin:end].clone().to(device)
-        features = self._original_properties["shs"][begin:end].clone().to(device)  # consume a lot of memory
-
-        # rescale
-        xyz, scaling = gaussian_utils.GaussianTransformUtils.rescale(
-            xyz,
-            scaling,
-            scale
-        )
-        # rotate
-        xyz, rotation, new_features = gaussian_utils.GaussianTransformUtils.rotate_by_wxyz_quaternions(
-            xyz=xyz,
-            rotations=rotation,
-            features=features,
-            quaternions=torch.tensor(r_wxyz).to(xyz),
-        )
-        # translate
-        xyz = gaussian_utils.GaussianTransformUtils.translation(xyz, *t_xyz.tolist())
-
-        # `model.NAME = value` not works if value is a nn.Parameter
-        new_properties = {
-            "means": xyz,
-            "scales": model.scale_inverse_activation(scaling),
-            "rotations": model.rotation_inverse_activation(rotation),
-            "shs_dc": new_features[:, :1, :],
-            "shs_rest": new_features[:, 1:, :],
-            # the pre-activated model only has `shs`
-            "shs": new_features,
-        }
-        # since only a slice of each property need to be updated, operating on `model.gaussians` directly is required
-        for key, value in new_properties.items():
-            if key not in model.gaussians:
-                continue
-            model.gaussians[key][begin:end] = value
+        device = model.means.device
+        packed_ranges = self._get_packed_ranges(model)
+        reference = self._get_reference(idx, packed_ranges)
+
+        def set_segment(name: str, value: torch.Tensor):
+            begin, end, offset = self._get_segment_range(name, idx, packed_ranges)
+            model.gaussians[name][begin - offset:end - offset] = value
+
+        # from the original state
+        matrix = self.get_transform_matrix(transform)
+        A = matrix[:3, :3].to(device=device, dtype=model.means.dtype)
+        b = matrix[:3, 3].to(device=device, dtype=model.means.dtype)
+        set_segment("means", reference["means"] @ A.T + b)
+
+        if transform[0] != previous_transform[0]:
+            scales = reference["scales"]
+            if transform[0] != 1.:
+                scales = model.scale_inverse_activation(model.scale_activation(scales) * transform[0])
+            set_segment("scales", scales)
+
+        if transform[1] != previous_transform[1]:
+            quaternion = self._get_quaternion(transform)
+            is_rotated = not torch.equal(quaternion, torch.tensor([1., 0., 0., 0.], dtype=torch.float64))
+            rotations = reference["rotations"]
+            if is_rotated:
+                rotations = model.rotation_inverse_activation(torch.nn.functional.normalize(gaussian_utils.GaussianTransformUtils.quat_multiply(
+                    model.rotation_activation(rotations),
+                    quaternion.to(dtype=rotations.dtype, device=device),
+                )))
+            set_segment("rotations", rotations)
+
+            # the DCs are rotation invariant, all the other degrees are rotated by a single matmul
+            rotation_matrix = matrix[:3, :3] / transform[0]
+            for name in self._get_transformed_property_names(model)[3:]:
+                shs = reference[name]
+                if not is_rotated:
+                    pass
+                elif name == "shs":
+                    shs = torch.concat([shs[:, :1], self._rotate_shs_rest(shs[:, 1:], rotation_matrix)], dim=1)
+                else:
+                    shs = self._rotate_shs_rest(shs, rotation_matrix)
+                set_segment(name, shs)
+
+        self._transforms[idx] = transform
+
+    @staticmethod
+    def _rotate_shs_rest(shs_rest: torch.Tensor, rotation_matrix: torch.Tensor) -> torch.Tensor:
+        """
+        Returns:
+            `[N, n_shs_rest, 3]` rotated, or `shs_rest` itself if nothing to rotate
+        """
+
+        if shs_rest.shape[0] == 0 or shs_rest.shape[1] == 0:
+            return shs_rest
+        D = gaussian_utils.GaussianTransformUtils.get_shs_rotation_matrix(rotation_matrix, shs_rest.shape[1])
+        if D is None:
+            return shs_rest
+        return D.to(device=shs_rest.device, dtype=shs_rest.dtype) @ shs_rest
@@ -4,7 +4,6 @@ import torch
 from typing import Tuple
 from internal.models.gaussian import Gaussian
 from internal.renderers import RendererConfig
-from internal.renderers.vanilla_renderer import VanillaRenderer
 
 
 class GaussianModelLoader:
@@ -173,6 +172,7 @@ class GaussianModelLoader:
         else:
             from internal.models.vanilla_gaussian import VanillaGaussian
             model = VanillaGaussian(sh_degree=gaussian_ply_utils.sh_degrees).instantiate()
+            from internal.renderers.vanilla_renderer import VanillaRenderer
             renderer_type = VanillaRenderer
         model.setup_from_number(gaussian_ply_utils.xyz.shape[0])
         model.to(device)
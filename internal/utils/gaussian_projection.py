@@ -1,6 +1,5 @@
 from typing import Tuple
 import torch
-import struct
 
 
 def project_gaussians(
@@ -17,6 +16,7 @@ def project_gaussians(
         img_width: torch.Tensor,
         block_width: int,
         min_depth: float = 0.01,
+        compile: bool = False,
 ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
     """
     Args
@@ -33,127 +33,133 @@ def project_gaussians(
        img_width (int): width of the rendered image.
        block_width (int): side length of tiles inside projection/rasterization in pixels (always square). 16 is a good default value, must be between 2 and 16 inclusive.
        min_depth (float): minimum z depth threshold.
+       compile (bool): run the projection with `torch.compile`, the first call is slow
     """
 
-    block_height = block_width
+    project_fn = _get_compiled_project_gaussians() if compile else _project_gaussians
+
+    *outputs, cov_2d_det = project_fn(
+        means_3d,
+        scales,
+        scale_modifier,
+        quaternions,
+        world_to_camera,
+        fx,
+        fy,
+        cx,
+        cy,
+        img_height,
+        img_width,
+        block_width,
+        min_depth,
+    )
+    if torch.any(cov_2d_det == 0):
+        raise RuntimeError("zero determinant cov_2d found")
+
+    return tuple(outputs)
+
+
+_compiled_project_gaussians = None
+
+
+def _get_compiled_project_gaussians():
+    global _compiled_project_gaussians
+    if _compiled_project_gaussians is None:
+        _compiled_project_gaussians = torch.compile(_project_gaussians, dynamic=True)
+    return _compiled_project_gaussians
 
+
+def _project_gaussians(
+        means_3d,
+        scales,
+        scale_modifier,
+        quaternions,
+        world_to_camera,
+        fx,
+        fy,
+        cx,
+        cy,
+        img_height,
+        img_width,
+        block_width: int,
+        min_depth: float,
+):
     # transform from world space to camera space
     means_3d_in_camera_space = torch.matmul(means_3d, world_to_camera[:3, :3]) + world_to_camera[3, :3]
-    with torch.no_grad():
-        is_min_depth_satisfied = means_3d_in_camera_space[:, 2] >= min_depth
-    # means_3d_in_camera_space_min_depth_satisfied = means_3d_in_camera_space[is_min_depth_satisfied]
+    is_min_depth_satisfied = (means_3d_in_camera_space[:, 2] >= min_depth).detach()
 
-    # calculate 3D covariance matrix
-    cov_3d = compute_cov_3d(scales, scale_modifier, quaternions=quaternions)
+    # calculate 3D covariance matrix, [n, 6]
+    cov_3d = compute_cov_3d_triu(scales, scale_modifier, quaternions=quaternions)
 
-    # calculate 2D covariance matrix
-    max_x_on_normalized_plane = (0.5 * img_width) / fx
-    max_y_on_normalized_plane = (0.5 * img_height) / fy
-    cov_2d = compute_cov_2d(
+    # calculate 2D covariance matrix, [n, 3]
+    cov_2d_00, cov_2d_01, cov_2d_11 = compute_cov_2d_triu(
         means_3d_in_camera_space,
-        tan_fovx=max_x_on_normalized_plane,
-        tan_fovy=max_y_on_normalized_plane,
+        tan_fovx=(0.5 * img_width) / fx,
+        tan_fovy=(0.5 * img_height) / fy,
         focal_x=fx,
         focal_y=fy,
-        cov_3d=cov_3d,
+        cov_3d_triu=cov_3d,
         world_to_camera=world_to_camera,
-    )
+    ).unbind(-1)
     # compute 2D covariance determinant
-    cov_2d_det_orig = torch.linalg.det(cov_2d)
+    cov_2d_det_orig = cov_2d_00 * cov_2d_11 - cov_2d_01 * cov_2d_01
     # Apply low-pass filter: every Gaussian should be at least
-    # one pixel wide/high. Discard 3rd row and column.
-    cov_2d_00 = cov_2d[:, 0, 0] + 0.3
-    cov_2d_11 = cov_2d[:, 1, 1] + 0.3
-    cov_2d = torch.stack([cov_2d_00, cov_2d[:, 0, 1], cov_2d[:, 1, 0], cov_2d_11], dim=-1).reshape((cov_2d.shape[0], 2, 2))
+    # one pixel wide/high.
+    cov_2d_00 = cov_2d_00 + 0.3
+    cov_2d_11 = cov_2d_11 + 0.3
     # compute new determinant
-    cov_2d_det = torch.linalg.det(cov_2d)
-    if torch.any(cov_2d_det == 0):
-        raise RuntimeError("zero determinant cov_2d found")
+    cov_2d_det = cov_2d_00 * cov_2d_11 - cov_2d_01 * cov_2d_01
     # compute compensation factor
     compensation = torch.sqrt(torch.clamp_min(cov_2d_det_orig / cov_2d_det, 0.))
 
     # invert 2D covariance matrix (conic)
     inv_det = 1. / cov_2d_det
-    conic = torch.concat([
-        (cov_2d[:, 1, 1] * inv_det).unsqueeze(-1),
-        (-cov_2d[:, 0, 1] * inv_det).unsqueeze(-1),
-        (cov_2d[:, 0, 0] * inv_det).unsqueeze(-1),
+    conic = torch.stack([
+        cov_2d_11 * inv_det,
+        -cov_2d_01 * inv_det,
+        cov_2d_00 * inv_det,
     ], dim=-1)
 
     # transform means 3D to image plane
     ## project through camera intrinsics
-    means_3d_on_normalized_plane = means_3d_in_camera_space / (means_3d_in_camera_space[:, 2:] + 1e-6)
-    ## build intrinsics matrix
     ## 0.5 offset should be added here to reach same quality as NDC projection,
     ## but the rasterizer will do it, so just simply use original cx and cy
-    intrinsics_matrix = torch.tensor([
-        [fx, 0, cx],
-        [0, fy, cy],
-        [0, 0, 1],
-    ], dtype=means_3d_on_normalized_plane.dtype, device=means_3d_on_normalized_plane.device)
-    means_2d_on_image_plane = torch.matmul(means_3d_on_normalized_plane, intrinsics_matrix.T)
+    means_3d_on_normalized_plane = means_3d_in_camera_space / (means_3d_in_camera_space[:, 2:] + 1e-6)
+    means_2d_on_image_plane = torch.stack([
+        fx * means_3d_on_normalized_plane[:, 0] + cx * means_3d_on_normalized_plane[:, 2],
+        fy * means_3d_on_normalized_plane[:, 1] + cy * means_3d_on_normalized_plane[:, 2],
+    ], dim=-1)
 
     # compute gaussian extent in screen space
-    ## calculate two eigenvalues of the 2D covariance matrix
-    mid = 0.5 * (cov_2d[:, 0, 0] + cov_2d[:, 1, 1])
-    mid_squared = mid * mid
-    mid_squared_and_det_diff = mid_squared[:, None] - cov_2d_det[:, None]
-    clamped_mid_squared_and_det_diff = torch.clamp_min(mid_squared_and_det_diff, 0.1)
-    sqrt_diff = torch.sqrt(clamped_mid_squared_and_det_diff)
-    ## two eigenvalues, [n, 1]
-    lambda1 = mid[:, None] + sqrt_diff
-    lambda2 = mid[:, None] - sqrt_diff
-    ## use the maximum one as the radius
-    radius = torch.ceil(3. * torch.sqrt(torch.maximum(lambda1, lambda2))).int()  # [n, 1]
+    ## use the larger eigenvalue of the 2D covariance matrix as the radius
+    mid = 0.5 * (cov_2d_00 + cov_2d_11)
+    lambda1 = mid + torch.sqrt(torch.clamp_min(mid * mid - cov_2d_det, 0.1))
+    radius = torch.ceil(3. * torch.sqrt(lambda1)).int()  # [n]
 
     # calculate touched tiles
-    tile_grid = torch.tensor([
-        (img_width + block_width - 1) // block_width,
-        (img_height + block_height - 1) // block_height,
-        1,
-    ], device=radius.device).long()
-    block = torch.tensor([block_width, block_height, 1], dtype=torch.int, device=radius.device)
-    block_xy = block[0:2].unsqueeze(0)  # [1, 2[xy]]
+    tile_grid_xy = torch.stack([
+        torch.as_tensor((img_width + block_width - 1) // block_width),
+        torch.as_tensor((img_height + block_width - 1) // block_width),
+    ]).to(device=radius.device, dtype=torch.int)
     ## get rect, inclusive min, exclusive max (differ to the vanilla version)
-    rect_min = ((means_2d_on_image_plane[:, 0:2] - radius) / block_xy).int()
-    # rect_max = ((means_2d_on_image_plane[:, 0:2] + radius + block_xy - 1) / block_xy).int()  # this will report CUDA memory access error
-    rect_max = ((means_2d_on_image_plane[:, 0:2] + radius) / block_xy).int() + 1
-    for rect in [rect_min, rect_max]:
-        for i in range(2):
-            rect[:, i] = torch.clamp(rect[:, i], min=0, max=tile_grid[i])
+    rect_min = ((means_2d_on_image_plane - radius[:, None]) / block_width).int()
+    rect_max = ((means_2d_on_image_plane + radius[:, None]) / block_width).int() + 1
+    rect_min = torch.minimum(torch.clamp_min(rect_min, 0), tile_grid_xy)
+    rect_max = torch.minimum(torch.clamp_min(rect_max, 0), tile_grid_xy)
     rect_diff = rect_max - rect_min
     touched_tile_count = rect_diff[:, 0] * rect_diff[:, 1]
 
     mask = torch.logical_and(is_min_depth_satisfied, touched_tile_count > 0)
     invert_mask = ~mask
-    radii = torch.where(invert_mask, 0, radius.squeeze(-1))
+    radii = torch.where(invert_mask, 0, radius)
     conic = torch.where(invert_mask[..., None], 0, conic)
-    xys = torch.where(invert_mask[..., None], 0, means_2d_on_image_plane[:, 0:2])
-    cov3d = torch.where(invert_mask[..., None, None], 0, cov_3d)
-    # cov2d = torch.where(invert_mask[..., None, None], 0, cov_2d)
+    xys = torch.where(invert_mask[..., None], 0, means_2d_on_image_plane)
+    cov3d = triu_to_symmetric(torch.where(invert_mask[..., None], 0, cov_3d))
     compensation = torch.where(invert_mask, 0, compensation)
     num_tiles_hit = torch.where(invert_mask, 0, touched_tile_count)
     depths = torch.where(invert_mask, 0, means_3d_in_camera_space[:, 2])
 
-    return xys, depths, radii, conic, compensation, num_tiles_hit, cov3d, mask, rect_min, rect_max
-
-    # # build masks
-    # with torch.no_grad():
-    #     is_touched_any_tiles_after_min_depth_filter = touched_tile_count > 0
-    #     min_depth_satisfied_indices = torch.nonzero(is_min_depth_satisfied).squeeze(-1)
-    #     touched_tile_indices = min_depth_satisfied_indices[is_touched_any_tiles_after_min_depth_filter]
-    #     is_touched_any_tiles = torch.zeros((means_3d.shape[0],), dtype=torch.bool, device=means_3d.device)
-    #     is_touched_any_tiles[touched_tile_indices] = True
-    #
-    # # xys[n, 2], depths[n], radii[n], conics[n, 3], comp[n], num_tiles_hit[n], cov3d[n, 6], mask[n]
-    # return means_2d_on_image_plane[is_touched_any_tiles_after_min_depth_filter][:, :2], \
-    #     means_3d_in_camera_space_min_depth_satisfied[is_touched_any_tiles_after_min_depth_filter, 2], \
-    #     radius[is_touched_any_tiles_after_min_depth_filter].squeeze(-1), \
-    #     conic[is_touched_any_tiles_after_min_depth_filter], \
-    #     compensation[is_touched_any_tiles_after_min_depth_filter], \
-    #     touched_tile_count[is_touched_any_tiles_after_min_depth_filter], \
-    #     cov_3d[is_touched_any_tiles_after_min_depth_filter], \
-    #     is_touched_any_tiles
+    return xys, depths, radii, conic, compensation, num_tiles_hit, cov3d, mask, rect_min, rect_max, cov_2d_det
 
 
 def build_tile_bounds(
@@ -176,60 +182,138 @@ def build_gaussian_sort_key(
         rect_max: torch.Tensor,  # [n, 2-xy]
         tile_bounds: torch.Tensor,  # [3]
         cumsum_tiles_hit: torch.Tensor,  # [n]
+        sort: bool = False,
 ):
-    total_tiles_hit = cumsum_tiles_hit[-1].item()
-    sort_key = torch.zeros((total_tiles_hit,), dtype=torch.int64, device=depths.device)
-    gaussian_ids = torch.zeros((total_tiles_hit,), dtype=torch.int32, device=depths.device)
+    """
+    Build an intersection for each tile touched by each Gaussian.
+    The key of an intersection is `(tile_id << 32) | depth`, where `depth` is the bits of the float32 depth.
 
-    # the cumsum of the previous gaussian is the base index
-    base_index_list = torch.concat([
-        torch.tensor([0], dtype=cumsum_tiles_hit.dtype, device=cumsum_tiles_hit.device),
-        cumsum_tiles_hit,
-    ], dim=0)
+    The intersections of a Gaussian start at the previous element of `cumsum_tiles_hit`,
+    and its tiles are enumerated row by row inside `[rect_min, rect_max)`.
 
-    for gaussian_idx in range(depths.shape[0]):
-        # Get raw byte representation of the float value at the given index
-        raw_bytes = struct.pack("f", depths[gaussian_idx])
+    Args:
+        sort: sort the intersections by their keys, i.e., by tile and then by depth
 
-        # Interpret those bytes as an int32_t
-        depth_id_n = struct.unpack("i", raw_bytes)[0]
+    Returns:
+        sort_key: [n_intersections], int64
+        gaussian_ids: [n_intersections], int32
+    """
+
+    device = depths.device
+    n_gaussians = depths.shape[0]
+    total_tiles_hit = cumsum_tiles_hit[-1].item() if n_gaussians > 0 else 0
 
-        index = base_index_list[gaussian_idx].item()
+    # the number of tiles and the base index of each Gaussian
+    cumsum_tiles_hit = cumsum_tiles_hit.to(device=device, dtype=torch.int64)
+    base_index = torch.nn.functional.pad(cumsum_tiles_hit[:-1], (1, 0))
+    n_tiles_hit = cumsum_tiles_hit - base_index
+
+    gaussian_ids = torch.repeat_interleave(
+        torch.arange(n_gaussians, dtype=torch.int64, device=device),
+        n_tiles_hit,
+        output_size=total_tiles_hit,
+    )
 
-        for i in range(rect_min[gaussian_idx][1], rect_max[gaussian_idx][1]):
-            row_tile_id_offset = tile_bounds[0] * i
-            for j in range(rect_min[gaussian_idx][0], rect_max[gaussian_idx][0]):
-                tile_id = row_tile_id_offset + j
-                sort_key[index] = (tile_id << 32) | depth_id_n
-                gaussian_ids[index] = gaussian_idx
+    # the position of each intersection inside the rect of its Gaussian
+    rect_min = rect_min.to(device=device, dtype=torch.int64)
+    rect_width = (rect_max[:, 0].to(device=device, dtype=torch.int64) - rect_min[:, 0]).clamp_min(1)
+    local_index = torch.arange(total_tiles_hit, dtype=torch.int64, device=device) - base_index[gaussian_ids]
+    local_width = rect_width[gaussian_ids]
+    tile_y = rect_min[gaussian_ids, 1] + torch.div(local_index, local_width, rounding_mode="floor")
+    tile_x = rect_min[gaussian_ids, 0] + torch.remainder(local_index, local_width)
+    tile_id = tile_y * tile_bounds[0].to(device=device, dtype=torch.int64) + tile_x
 
-                index += 1
+    # reinterpret the float32 depths as int32, then sign extend to int64
+    depth_id = depths.detach().to(torch.float32).contiguous().view(torch.int32).to(torch.int64)
+
+    sort_key = torch.bitwise_or(torch.bitwise_left_shift(tile_id, 32), depth_id[gaussian_ids])
+    gaussian_ids = gaussian_ids.to(torch.int32)
+
+    if sort:
+        sort_key, order = torch.sort(sort_key, stable=True)
+        gaussian_ids = gaussian_ids[order]
 
     return sort_key, gaussian_ids
 
 
 def build_rotation_matrix(quaternions):
-    # normalize quaternion
-    # quaternion_norm = torch.norm(quaternions, dim=-1)
-    # normalized_quaternion = quaternions / quaternion_norm[:, None]
-    normalized_quaternion = quaternions
-    # build rotation matrix
-    r = normalized_quaternion[:, 0]
-    x = normalized_quaternion[:, 1]
-    y = normalized_quaternion[:, 2]
-    z = normalized_quaternion[:, 3]
-    rotation_matrix = torch.zeros((quaternions.shape[0], 3, 3), dtype=quaternions.dtype, device=quaternions.device)
-    rotation_matrix[:, 0, 0] = 1 - 2 * (y * y + z * z)
-    rotation_matrix[:, 0, 1] = 2 * (x * y - r * z)
-    rotation_matrix[:, 0, 2] = 2 * (x * z + r * y)
-    rotation_matrix[:, 1, 0] = 2 * (x * y + r * z)
-    rotation_matrix[:, 1, 1] = 1 - 2 * (x * x + z * z)
-    rotation_matrix[:, 1, 2] = 2 * (y * z - r * x)
-    rotation_matrix[:, 2, 0] = 2 * (x * z - r * y)
-    rotation_matrix[:, 2, 1] = 2 * (y * z + r * x)
-    rotation_matrix[:, 2, 2] = 1 - 2 * (x * x + y * y)
-
-    return rotation_matrix
+    """
+    :param quaternions: [n, 4] in wxyz, not normalized here
+    :return: [n, 3, 3]
+    """
+
+    r, x, y, z = quaternions.unbind(-1)
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    rx, ry, rz = r * x, r * y, r * z
+
+    return torch.stack([
+        1 - 2 * (yy + zz), 2 * (xy - rz), 2 * (xz + ry),
+        2 * (xy + rz), 1 - 2 * (xx + zz), 2 * (yz - rx),
+        2 * (xz - ry), 2 * (yz + rx), 1 - 2 * (xx + yy),
+    ], dim=-1).reshape(quaternions.shape[:-1] + (3, 3))
+
+
+def rotation_matrix_to_quaternion(matrices):
+    """
+    :param matrices: [n, 3, 3], proper rotation matrices
+    :return: [n, 4] in wxyz, normalized, the inverse of `build_rotation_matrix()`
+    """
+
+    m = matrices.reshape(matrices.shape[:-2] + (9,))
+    m00, m01, m02, m10, m11, m12, m20, m21, m22 = m.unbind(-1)
+
+    # 4 candidates, each is accurate when its largest component is not close to zero
+    candidates = torch.stack([
+        torch.stack([1. + m00 + m11 + m22, m21 - m12, m02 - m20, m10 - m01], dim=-1),
+        torch.stack([m21 - m12, 1. + m00 - m11 - m22, m01 + m10, m02 + m20], dim=-1),
+        torch.stack([m02 - m20, m01 + m10, 1. - m00 + m11 - m22, m12 + m21], dim=-1),
+        torch.stack([m10 - m01, m02 + m20, m12 + m21, 1. - m00 - m11 + m22], dim=-1),
+    ], dim=-2)  # [n, 4, 4]
+    best = torch.argmax(torch.stack([m00 + m11 + m22, m00, m11, m22], dim=-1), dim=-1)
+    quaternions = torch.gather(candidates, -2, best[..., None, None].expand(best.shape + (1, 4))).squeeze(-2)
+
+    return torch.nn.functional.normalize(quaternions, dim=-1)
+
+
+# the indices of the upper triangular elements in the flattened 3x3 matrix, and the inverse mapping
+TRIU_INDICES = [0, 1, 2, 4, 5, 8]
+TRIU_TO_SYMMETRIC_INDICES = [0, 1, 2, 1, 3, 4, 2, 4, 5]
+
+
+def triu_to_symmetric(triu: torch.Tensor) -> torch.Tensor:
+    """
+    :param triu: [n, 6], (xx, xy, xz, yy, yz, zz)
+    :return: [n, 3, 3]
+    """
+
+    return triu[..., TRIU_TO_SYMMETRIC_INDICES].reshape(triu.shape[:-1] + (3, 3))
+
+
+def symmetric_to_triu(matrix: torch.Tensor) -> torch.Tensor:
+    return matrix.reshape(matrix.shape[:-2] + (9,))[..., TRIU_INDICES]
+
+
+def compute_cov_3d_triu(scales, scale_modifier, quaternions):
+    """
+    :param scales: [n, 3]
+    :param scale_modifier:
+    :param quaternions: [n, 4] in wxyz
+    :return: [n, 6] the upper triangular elements (xx, xy, xz, yy, yz, zz) of R S S^T R^T
+    """
+
+    # scale the columns of R, M = R S
+    m = build_rotation_matrix(quaternions) * (scales * scale_modifier)[:, None, :]
+    m0, m1, m2 = m.unbind(1)  # rows
+
+    return torch.stack([
+        (m0 * m0).sum(-1),
+        (m0 * m1).sum(-1),
+        (m0 * m2).sum(-1),
+        (m1 * m1).sum(-1),
+        (m1 * m2).sum(-1),
+        (m2 * m2).sum(-1),
+    ], dim=-1)
 
 
 def compute_cov_3d(scales, scale_modifier, quaternions):
@@ -237,51 +321,61 @@ def compute_cov_3d(scales, scale_modifier, quaternions):
     :param scales:
     :param scale_modifier:
     :param quaternions: in wxyz
-    :return:
+    :return: [n, 3, 3]
     """
-    n_gaussians, n_scales = scales.shape
-    # build scaling matrix
-    scaling_matrix = torch.zeros((n_gaussians, n_scales, n_scales), dtype=scales.dtype, device=scales.device)
-    for i in range(n_scales):
-        scaling_matrix[:, i, i] = scales[:, i] * scale_modifier
-
-    # build rotation matrix
-    rotation_matrix = build_rotation_matrix(quaternions)
 
-    m = torch.bmm(rotation_matrix, scaling_matrix)
-    sigma = torch.matmul(m, m.transpose(1, 2))
+    return triu_to_symmetric(compute_cov_3d_triu(scales, scale_modifier, quaternions))
 
-    return sigma
 
+def compute_cov_2d_triu(t, tan_fovx, tan_fovy, focal_x, focal_y, cov_3d_triu, world_to_camera):
+    """
+    :param t: [n, 3] means in camera space
+    :param cov_3d_triu: [n, 6] from `compute_cov_3d_triu()`
+    :return: [n, 3] the elements (00, 01, 11) of J W Sigma W^T J^T
+    """
 
-def compute_cov_2d(t, tan_fovx, tan_fovy, focal_x, focal_y, cov_3d, world_to_camera):
     limx = 1.3 * tan_fovx
     limy = 1.3 * tan_fovy
-    txtz = t[:, 0] / t[:, 2]
-    tytz = t[:, 1] / t[:, 2]
-
-    clamped_x = torch.clamp(txtz, min=-limx, max=limx) * t[:, 2]
-    clamped_y = torch.clamp(tytz, min=-limy, max=limy) * t[:, 2]
-
-    means_in_camera_space = torch.stack([clamped_x, clamped_y, t[:, 2]], dim=-1)
-
-    # build Jacobian matrix J
-    J = torch.zeros(
-        (means_in_camera_space.shape[0], 3, 3),
-        dtype=means_in_camera_space.dtype,
-        device=means_in_camera_space.device
-    )
-    J[:, 0, 0] = focal_x / means_in_camera_space[:, 2]
-    J[:, 0, 2] = -(focal_x * means_in_camera_space[:, 0]) / (means_in_camera_space[:, 2] * means_in_camera_space[:, 2])
-    J[:, 1, 1] = focal_y / means_in_camera_space[:, 2]
-    J[:, 1, 2] = -(focal_y * means_in_camera_space[:, 1]) / (means_in_camera_space[:, 2] * means_in_camera_space[:, 2])
-    # the third row of J is ignored
-
-    # build transform matrix W
-    W = world_to_camera[:3, :3].T
+    tz = t[:, 2]
+    tx = torch.clamp(t[:, 0] / tz, min=-limx, max=limx) * tz
+    ty = torch.clamp(t[:, 1] / tz, min=-limy, max=limy) * tz
+
+    # the non-zero elements of the Jacobian J, the third row of J is ignored
+    tz2 = tz * tz
+    j00 = focal_x / tz
+    j02 = -(focal_x * tx) / tz2
+    j11 = focal_y / tz
+    j12 = -(focal_y * ty) / tz2
+
+    # rows of T = J W, where W = world_to_camera[:3, :3].T
+    w = world_to_camera[:3, :3]
+    t0 = j00[:, None] * w[:, 0] + j02[:, None] * w[:, 2]  # [n, 3]
+    t1 = j11[:, None] * w[:, 1] + j12[:, None] * w[:, 2]
+
+    # Sigma T^T
+    xx, xy, xz, yy, yz, zz = cov_3d_triu.unbind(-1)
+
+    def cov_mul(v):
+        return torch.stack([
+            xx * v[:, 0] + xy * v[:, 1] + xz * v[:, 2],
+            xy * v[:, 0] + yy * v[:, 1] + yz * v[:, 2],
+            xz * v[:, 0] + yz * v[:, 1] + zz * v[:, 2],
+        ], dim=-1)
+
+    cov_t0 = cov_mul(t0)
+    cov_t1 = cov_mul(t1)
+
+    return torch.stack([
+        (t0 * cov_t0).sum(-1),
+        (t1 * cov_t0).sum(-1),
+        (t1 * cov_t1).sum(-1),
+    ], dim=-1)
 
-    T = torch.matmul(J, W[None, :])
 
-    cov_2d = T @ cov_3d @ T.transpose(1, 2)
+def compute_cov_2d(t, tan_fovx, tan_fovy, focal_x, focal_y, cov_3d, world_to_camera):
+    """
+    :return: [n, 2, 2]
+    """
 
-    return cov_2d[:, :2, :2]
+    cov_2d = compute_cov_2d_triu(t, tan_fovx, tan_fovy, focal_x, focal_y, symmetric_to_triu(cov_3d), world_to_camera)
+    return cov_2d[:, [0, 1, 1, 2]].reshape((-1, 2, 2))
@@ -112,7 +112,10 @@ class GaussianPlyUtils:
 
     @classmethod
     def load_from_model(cls, model):
-        return cls.load_from_model_properties(model.properties, sh_degree=model.max_sh_degree)
+        # models with non-dense storages, e.g. `AdaptiveSHGaussianModel`, provide properties in the vanilla layout by this method
+        get_properties = getattr(model, "get_non_pre_activated_properties", None)
+        properties = model.properties if get_properties is None else get_properties()
+        return cls.load_from_model_properties(properties, sh_degree=model.max_sh_degree)
 
     @classmethod
     def load_from_state_dict(cls, state_dict):
@@ -120,10 +123,35 @@ class GaussianPlyUtils:
             return cls.load_from_new_state_dict(state_dict)
         return cls.load_from_old_state_dict(state_dict)
 
+    @staticmethod
+    def unpack_shs_rest(state_dict, prefix: str):
+        """
+        Convert the degree-bucketed `shs_rest_{degree}` of `AdaptiveSHGaussianModel` to the dense `shs_rest`, zero padded
+        """
+
+        packed = []
+        while "{}shs_rest_{}".format(prefix, len(packed) + 1) in state_dict:
+            packed.append(state_dict["{}shs_rest_{}".format(prefix, len(packed) + 1)])
+        assert len(packed) > 0, "neither `shs_rest` nor `shs_rest_1` found"
+
+        means = state_dict["{}means".format(prefix)]
+        shs_rest = torch.zeros((means.shape[0], packed[-1].shape[1], packed[-1].shape[2]), dtype=packed[-1].dtype, device=packed[-1].device)
+        # the Gaussians are ordered by degree, and the degree 0 ones come first
+        begin = means.shape[0] - sum([i.shape[0] for i in packed])
+        for i in packed:
+            shs_rest[begin:begin + i.shape[0], :i.shape[1]] = i
+            begin += i.shape[0]
+
+        return shs_rest
+
     @classmethod
     def load_from_new_state_dict(cls, state_dict):
         prefix = "gaussian_model.gaussians."
 
+        if "{}shs_rest".format(prefix) not in state_dict:
+            state_dict = dict(state_dict)
+            state_dict["{}shs_rest".format(prefix)] = cls.unpack_shs_rest(state_dict, prefix)
+
         init_args = {
             "sh_degrees": cls.detect_sh_degree_from_shs_rest(state_dict["{}shs_rest".format(prefix)]),
         }
@@ -221,8 +249,9 @@ class GaussianPlyUtils:
         dtype_full = [(attribute, 'f4') for attribute in construct_list_of_attributes()]
         attribute_list = [xyz, normals, f_dc, f_rest, opacities, scale, rotation]
         if with_colors is True:
-            from internal.utils.sh_utils import eval_sh
-            rgbs = np.clip((eval_sh(0, self.features_dc, None) + 0.5), 0., 1.)
+            from internal.utils.sh_utils import eval_sh_colors
+            rgbs = eval_sh_colors(0, torch.from_numpy(f_dc[:, None, :])).numpy()
+            rgbs = np.clip(rgbs + 0.5, 0., 1.)
             rgbs = (rgbs * 255).astype(np.uint8)
 
             dtype_full += [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
@@ -292,73 +321,55 @@ class GaussianTransformUtils:
         return xyz, rotation
 
     @staticmethod
-    def transform_shs(features, rotation_matrix):
+    def get_shs_rotation_matrix(rotation_matrix, n_shs_rest: int):
         """
         https://github.com/graphdeco-inria/gaussian-splatting/issues/176#issuecomment-2147223570
+
+        Returns:
+            [n_shs_rest, n_shs_rest], the block diagonal matrix of the Wigner D matrices of each degree,
+            so all the degrees are rotated by a single matmul: `shs_rest = D @ shs_rest`.
+            None if e3nn is not installed.
         """
 
         try:
             from e3nn import o3
-            import einops
-            from einops import einsum
         except:
             print("Please run `pip install e3nn einops` to enable SHs rotation")
-            return features
-
-        if features.shape[1] == 1:
-            return features
+            return None
 
-        features = features.clone()
-
-        shs_feat = features[:, 1:, :]
-
-        ## rotate shs
-        P = torch.tensor([[0, 0, 1], [1, 0, 0], [0, 1, 0]], dtype=shs_feat.dtype, device=shs_feat.device)  # switch axes: yzx -> xyz
+        ## switch axes: yzx -> xyz
+        P = torch.tensor([[0, 0, 1], [1, 0, 0], [0, 1, 0]], dtype=rotation_matrix.dtype, device=rotation_matrix.device)
         inversed_P = torch.tensor([
             [0, 1, 0],
             [0, 0, 1],
             [1, 0, 0],
-        ], dtype=shs_feat.dtype, device=shs_feat.device)
+        ], dtype=rotation_matrix.dtype, device=rotation_matrix.device)
         permuted_rotation_matrix = inversed_P @ rotation_matrix @ P
         rot_angles = o3._rotation.matrix_to_angles(permuted_rotation_matrix.cpu())
 
         # Construction coefficient
-        D_1 = o3.wigner_D(1, rot_angles[0], - rot_angles[1], rot_angles[2]).to(device=shs_feat.device)
-        D_2 = o3.wigner_D(2, rot_angles[0], - rot_angles[1], rot_angles[2]).to(device=shs_feat.device)
-        D_3 = o3.wigner_D(3, rot_angles[0], - rot_angles[1], rot_angles[2]).to(device=shs_feat.device)
-
-        # rotation of the shs features
-        one_degree_shs = shs_feat[:, 0:3]
-        one_degree_shs = einops.rearrange(one_degree_shs, 'n shs_num rgb -> n rgb shs_num')
-        one_degree_shs = einsum(
-            D_1,
-            one_degree_shs,
-            "... i j, ... j -> ... i",
-        )
-        one_degree_shs = einops.rearrange(one_degree_shs, 'n rgb shs_num -> n shs_num rgb')
-        shs_feat[:, 0:3] = one_degree_shs
-
-        if shs_feat.shape[1] >= 4:
-            two_degree_shs = shs_feat[:, 3:8]
-            two_degree_shs = einops.rearrange(two_degree_shs, 'n shs_num rgb -> n rgb shs_num')
-            two_degree_shs = einsum(
-                D_2,
-                two_degree_shs,
-                "... i j, ... j -> ... i",
-            )
-            two_degree_shs = einops.rearrange(two_degree_shs, 'n rgb shs_num -> n shs_num rgb')
-            shs_feat[:, 3:8] = two_degree_shs
-
-            if shs_feat.shape[1] >= 9:
-                three_degree_shs = shs_feat[:, 8:15]
-                three_degree_shs = einops.rearrange(three_degree_shs, 'n shs_num rgb -> n rgb shs_num')
-                three_degree_shs = einsum(
-                    D_3,
-                    three_degree_shs,
-                    "... i j, ... j -> ... i",
-                )
-                three_degree_shs = einops.rearrange(three_degree_shs, 'n rgb shs_num -> n shs_num rgb')
-                shs_feat[:, 8:15] = three_degree_shs
+        D = torch.eye(n_shs_rest, dtype=rotation_matrix.dtype)
+        begin = 0
+        for degree in range(1, 4):
+            end = begin + 2 * degree + 1
+            if end > n_shs_rest:
+                break
+            D[begin:end, begin:end] = o3.wigner_D(degree, rot_angles[0], - rot_angles[1], rot_angles[2])
+            begin = end
+
+        return D.to(device=rotation_matrix.device)
+
+    @classmethod
+    def transform_shs(cls, features, rotation_matrix):
+        if features.shape[1] == 1:
+            return features
+
+        D = cls.get_shs_rotation_matrix(rotation_matrix, features.shape[1] - 1)
+        if D is None:
+            return features
+
+        features = features.clone()
+        features[:, 1:] = D.to(features.dtype) @ features[:, 1:]
 
         return features
 
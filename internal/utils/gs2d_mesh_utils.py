@@ -14,22 +14,25 @@ from tqdm.auto import tqdm
 class GS2DMeshUtils:
     @classmethod
     @torch.no_grad()
-    def render_views(cls, model, renderer, cameras: Iterable, bg_color: torch.Tensor):
+    def render_views(cls, model, renderer, cameras: Iterable, bg_color: torch.Tensor, batch_size: int = 8):
         rgbmaps = []
         depthmaps = []
 
-        for i, viewpoint_cam in tqdm(enumerate(cameras), total=len(cameras), desc="Rendering RGB and depth maps"):
-            render_pkg = renderer(viewpoint_cam, model, bg_color)
-            rgb = render_pkg['render']
-            # alpha = render_pkg['rend_alpha']
-            # normal = torch.nn.functional.normalize(render_pkg['rend_normal'], dim=0)
-            depth = render_pkg['surf_depth']
-            # depth_normal = render_pkg['surf_normal']
-            rgbmaps.append(rgb.cpu())
-            depthmaps.append(depth.cpu())
-            # self.alphamaps.append(alpha.cpu())
-            # self.normals.append(normal.cpu())
-            # self.depth_normals.append(depth_normal.cpu())
+        cameras = list(cameras)
+        with tqdm(total=len(cameras), desc="Rendering RGB and depth maps") as progress_bar:
+            for batch_begin in range(0, len(cameras), batch_size):
+                for render_pkg in renderer.batch_forward(cameras[batch_begin:batch_begin + batch_size], model, bg_color):
+                    rgb = render_pkg['render']
+                    # alpha = render_pkg['rend_alpha']
+                    # normal = torch.nn.functional.normalize(render_pkg['rend_normal'], dim=0)
+                    depth = render_pkg['surf_depth']
+                    # depth_normal = render_pkg['surf_normal']
+                    rgbmaps.append(rgb.cpu())
+                    depthmaps.append(depth.cpu())
+                    # self.alphamaps.append(alpha.cpu())
+                    # self.normals.append(normal.cpu())
+                    # self.depth_normals.append(depth_normal.cpu())
+                    progress_bar.update()
 
         return rgbmaps, depthmaps
 
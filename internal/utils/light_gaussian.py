@@ -1,13 +1,22 @@
-from typing import Iterable, Tuple
+import math
+from typing import Iterable, Tuple, Optional
 import torch
-from internal.renderers.gsplat_hit_pixel_count_renderer import GSplatHitPixelCountRenderer
+from internal.utils.selection import kth_largest, histogram_kth_smallest, quantile
 
 
 def get_count_and_score(
         gaussian_model,
         cameras: Iterable,
         anti_aliased: bool,
+        batch_size: int = 8,
 ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Args:
+        batch_size: the number of the cameras projected together
+    """
+
+    from internal.renderers.gsplat_hit_pixel_count_renderer import GSplatHitPixelCountRenderer
+
     device = gaussian_model.get_xyz.device
     num_gaussians = gaussian_model.get_xyz.shape[0]
 
@@ -33,16 +42,22 @@ def get_count_and_score(
         device=device,
     )
 
+    # the activated properties are shared by all the cameras
+    means = gaussian_model.get_xyz
+    opacities = gaussian_model.get_opacity
+    scales = gaussian_model.get_scaling
+    rotations = gaussian_model.get_rotation
+
     # count for each training camera
-    for camera in cameras:
-        count, opacity_score, alpha_score, visibility_score = GSplatHitPixelCountRenderer.hit_pixel_count(
-            means3D=gaussian_model.get_xyz,
-            opacities=gaussian_model.get_opacity,
-            scales=gaussian_model.get_scaling,
-            rotations=gaussian_model.get_rotation,
-            viewpoint_camera=camera.to_device(device),
+    for _, (count, opacity_score, alpha_score, visibility_score) in GSplatHitPixelCountRenderer.batch_hit_pixel_count(
+            means3D=means,
+            opacities=opacities,
+            scales=scales,
+            rotations=rotations,
+            cameras=list(cameras),
             anti_aliased=anti_aliased,
-        )
+            max_batch_size=batch_size,
+    ):
         # add to total
         count_total += count
         opacity_score_total += opacity_score
@@ -52,30 +67,170 @@ def get_count_and_score(
     return count_total, opacity_score_total, alpha_score_total, visibility_score_total
 
 
-def calculate_v_imp_score(scales, importance_scores, v_pow):
+class LightGaussianScoreAccumulator:
+    """
+    Accumulate the LightGaussian counts and scores during training,
+    so that pruning does not need to re-render all the training cameras.
+
+    Two sources are supported:
+        * `update_by_camera()`: run the hit pixel counting for the camera of the current training step,
+            the scores are exact for the cameras seen since the last reset.
+        * `update_by_render_outputs()`: estimate from the outputs of the training render, without any extra pass.
+            The footprint `pi * radii^2` is used as the number of hit pixels, and occlusion is ignored.
+
+    The accumulated values are scaled by `n_cameras / total_weight`,
+    so they are unbiased estimations of the values returned by `get_count_and_score()` when cameras are sampled uniformly.
+    """
+
+    def __init__(self, n_cameras: int, anti_aliased: bool = False):
+        self.n_cameras = n_cameras
+        self.anti_aliased = anti_aliased
+
+        self.count = None
+        self.opacity_score = None
+        self.alpha_score = None
+        self.visibility_score = None
+        self.total_weight = 0.
+
+    @property
+    def n_gaussians(self) -> int:
+        if self.count is None:
+            return 0
+        return self.count.shape[0]
+
+    def reset(self, n_gaussians: int, device):
+        self.count = torch.zeros((n_gaussians,), dtype=torch.float, device=device)
+        self.opacity_score = torch.zeros((n_gaussians,), dtype=torch.float, device=device)
+        self.alpha_score = torch.zeros((n_gaussians,), dtype=torch.float, device=device)
+        self.visibility_score = torch.zeros((n_gaussians,), dtype=torch.float, device=device)
+        self.total_weight = 0.
+
+    def is_valid_for(self, n_gaussians: int) -> bool:
+        return self.n_gaussians == n_gaussians and self.total_weight > 0
+
+    @staticmethod
+    def get_accumulating_prune_step(prune_steps: Iterable[int], global_step: int, accumulation_steps: int) -> Optional[int]:
+        """
+        :return: the prune step whose accumulation window, the `accumulation_steps` steps up to and including it, contains `global_step`,
+            `None` if there is no such one
+        """
+        next_prune_steps = [i for i in prune_steps if i >= global_step]
+        if len(next_prune_steps) == 0:
+            return None
+        next_prune_step = min(next_prune_steps)
+        if next_prune_step - global_step >= accumulation_steps:
+            return None
+        return next_prune_step
+
+    def _ensure_size(self, n_gaussians: int, device):
+        # the accumulated values are invalid once the density changed
+        if self.n_gaussians != n_gaussians:
+            self.reset(n_gaussians, device)
+
+    def update(
+            self,
+            count: torch.Tensor,
+            opacity_score: torch.Tensor,
+            alpha_score: torch.Tensor,
+            visibility_score: torch.Tensor,
+            weight: float = 1.,
+    ):
+        """
+        :param weight: the inverse sampling probability of the camera, relative to uniform sampling
+        """
+
+        self._ensure_size(count.shape[0], count.device)
+
+        self.count.add_(count, alpha=weight)
+        self.opacity_score.add_(opacity_score, alpha=weight)
+        self.alpha_score.add_(alpha_score, alpha=weight)
+        self.visibility_score.add_(visibility_score, alpha=weight)
+        self.total_weight += weight
+
+    @torch.no_grad()
+    def update_by_camera(self, gaussian_model, camera, weight: float = 1.):
+        from internal.renderers.gsplat_hit_pixel_count_renderer import GSplatHitPixelCountRenderer
+
+        device = gaussian_model.get_xyz.device
+        count, opacity_score, alpha_score, visibility_score = GSplatHitPixelCountRenderer.hit_pixel_count(
+            means3D=gaussian_model.get_xyz,
+            opacities=gaussian_model.get_opacity,
+            scales=gaussian_model.get_scaling,
+            rotations=gaussian_model.get_rotation,
+            viewpoint_camera=camera.to_device(device),
+            anti_aliased=self.anti_aliased,
+        )
+        self.update(count, opacity_score, alpha_score, visibility_score, weight=weight)
+
+    @torch.no_grad()
+    def update_by_render_outputs(self, gaussian_model, outputs: dict, weight: float = 1.):
+        radii = outputs["radii"]
+        if radii.shape[0] != gaussian_model.n_gaussians:
+            # the density has been changed after rendering
+            return
+
+        visibility_filter = outputs["visibility_filter"].float()
+        footprint = math.pi * torch.square(radii.float()) * visibility_filter
+        opacity_footprint = gaussian_model.get_opacity.squeeze(-1) * footprint
+
+        self.update(footprint, opacity_footprint, opacity_footprint, visibility_filter, weight=weight)
+
+    def get_count_and_score(self) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        assert self.total_weight > 0, "no any update since the last reset"
+
+        scale = self.n_cameras / self.total_weight
+        return self.count * scale, self.opacity_score * scale, self.alpha_score * scale, self.visibility_score * scale
+
+
+def calculate_v_imp_score(scales, importance_scores, v_pow, exact: bool = True):
     """
     Copied from LightGaussian: https://github.com/VITA-Group/LightGaussian
 
     :param scales: The scales of the 3D Gaussians, typically obtain via getter `model.get_scaling`.
     :param importance_scores: The importance scores for each Gaussian component.
     :param v_pow: The power to which the volume ratios are raised.
+    :param exact: `False` to approximate the 90th percentile volume by a histogram.
     :return: A list of adjusted values (v_list) used for pruning.
     """
     # Calculate the volume of each Gaussian component
     volume = torch.prod(scales, dim=1)
     # Determine the kth_percent_largest value
     index = int(len(volume) * 0.9)
-    sorted_volume, _ = torch.sort(volume, descending=True)
-    kth_percent_largest = sorted_volume[index]
+    if exact:
+        kth_percent_largest = kth_largest(volume, index)
+    else:
+        kth_percent_largest = histogram_kth_smallest(volume, len(volume) - 1 - index)
     # Calculate v_list
     v_list = torch.pow(volume / kth_percent_largest, v_pow)
     v_list = v_list * importance_scores
     return v_list
 
 
-def get_prune_mask(percent, importance_score):
-    sorted_tensor, _ = torch.sort(importance_score, dim=0)
-    index_nth_percentile = int(percent * (sorted_tensor.shape[0] - 1))
-    value_nth_percentile = sorted_tensor[index_nth_percentile]
+@torch.no_grad()
+def calculate_importance_order(gaussian_model, opacity_score: Optional[torch.Tensor] = None, v_pow: float = 0.1) -> torch.Tensor:
+    """
+    Order the Gaussians by the volume-weighted importance score of LightGaussian, the most important first.
+
+    :param opacity_score: the one returned by `get_count_and_score()`, the opacities are used if `None`,
+        then the score is the opacity times the normalized volume, no camera is required.
+    :return: [N], int64, the indices of the Gaussians
+    """
+    if opacity_score is None:
+        opacity_score = gaussian_model.get_opacity.reshape(-1)
+    v_imp_score = calculate_v_imp_score(gaussian_model.get_scaling, opacity_score, v_pow)
+    return torch.argsort(v_imp_score, descending=True, stable=True)
+
+
+def get_prune_mask(percent, importance_score, exact: bool = True):
+    value_nth_percentile = quantile(importance_score.reshape(-1), percent, exact=exact)
     prune_mask = (importance_score <= value_nth_percentile).squeeze()
     return prune_mask
+
+
+def get_prune_mask_agreement(prune_mask: torch.Tensor, reference_prune_mask: torch.Tensor) -> Tuple[float, float]:
+    """
+    :return: the fraction of the Gaussians with the same decision, and the IoU of the pruned ones
+    """
+    agreement = (prune_mask == reference_prune_mask).float().mean().item()
+    iou = ((prune_mask & reference_prune_mask).sum() / (prune_mask | reference_prune_mask).sum().clamp_min(1)).item()
+    return agreement, iou
@@ -0,0 +1,424 @@
+"""
+A hierarchical level of detail tree of Gaussians, built bottom-up from a trained model.
+
+The leaves are the Gaussians of the model, and the tree is an octree over their Morton codes.
+Going up level by level, the subtrees in the same octree cell are merged into a parent Gaussian matching their moments:
+the mean and covariance of the mixture weighted by `opacity * surface area`,
+the opacity preserving the opacity weighted area, and the SHs weighted in the same way as the mean.
+A subtree alone in its cell is carried to the next level as is, so a node has 2 to 8 children.
+
+The nodes are stored in flat arrays in the order they are created, from the leaves to the root,
+and the children are stored in the CSR format.
+A node is bounded by the AABB of the n-sigma extents of itself and its subtree,
+and the radius of the AABB is its world space error bound, which decreases monotonically from the root to the leaves.
+`GaussianLoDTree.select()` traverses the tree top-down,
+and stops at the nodes whose error bound projected to the screen is smaller than the threshold,
+so the cost of both the selection and the rendering depends on the resolution instead of the size of the scene.
+"""
+
+from typing import Dict
+import torch
+from internal.utils.gaussian_projection import compute_cov_3d, rotation_matrix_to_quaternion
+from internal.utils.spatial_index import GaussianSpatialIndex
+
+
+def compute_morton_codes(points: torch.Tensor, min_xyz: torch.Tensor, max_xyz: torch.Tensor, bits: int = 16) -> torch.Tensor:
+    """
+    Args:
+        points: [N, 3]
+        bits: per axis, up to 21
+
+    Returns:
+        [N], int64
+    """
+
+    quantized = ((points - min_xyz) / (max_xyz - min_xyz).clamp(min=1e-8) * ((1 << bits) - 1)).round()
+    quantized = quantized.clamp(0, (1 << bits) - 1).to(torch.int64)
+
+    codes = torch.zeros(points.shape[0], dtype=torch.int64, device=points.device)
+    for i in range(bits):
+        for axis in range(3):
+            codes |= ((quantized[:, axis] >> i) & 1) << (3 * i + axis)
+    return codes
+
+
+class GaussianLoDTree:
+    PROPERTY_NAMES = ("means", "scales", "rotations", "opacities", "shs")
+
+    def __init__(
+            self,
+            properties: Dict[str, torch.Tensor],
+            parents: torch.Tensor,
+            child_starts: torch.Tensor,
+            child_counts: torch.Tensor,
+            child_indices: torch.Tensor,
+            levels: torch.Tensor,
+            aabb_min: torch.Tensor,
+            aabb_max: torch.Tensor,
+    ):
+        """
+        Args:
+            properties: activated, the `shs` are [M, K, 3]
+            parents: [M], -1 for the root
+            child_starts: [M], the position of the first child in `child_indices`
+            child_counts: [M], zero for the leaves
+            child_indices: [M - 1], the children of the nodes, those of a node are contiguous
+            levels: [M], the depth of the octree cell, zero for the leaves
+            aabb_min: [M, 3], bounding the subtree
+            aabb_max: [M, 3]
+        """
+
+        self.properties = properties
+        self.parents = parents
+        self.child_starts = child_starts
+        self.child_counts = child_counts
+        self.child_indices = child_indices
+        self.levels = levels
+        self.aabb_min = aabb_min
+        self.aabb_max = aabb_max
+
+        self.aabb_centers = (aabb_min + aabb_max) * 0.5
+        self.aabb_half_extents = (aabb_max - aabb_min) * 0.5
+        self.errors = torch.linalg.vector_norm(self.aabb_half_extents, dim=-1)
+
+    @property
+    def n_nodes(self) -> int:
+        return self.parents.shape[0]
+
+    @property
+    def n_leaves(self) -> int:
+        return int((self.child_counts == 0).sum().item())
+
+    @property
+    def root(self) -> int:
+        return self.n_nodes - 1
+
+    @property
+    def device(self) -> torch.device:
+        return self.parents.device
+
+    @property
+    def sh_degree(self) -> int:
+        return int(self.properties["shs"].shape[1] ** 0.5) - 1
+
+    @staticmethod
+    def compute_areas(scales: torch.Tensor) -> torch.Tensor:
+        # proportional to the surface area of the ellipsoid, approximately
+        return scales[:, 0] * scales[:, 1] + scales[:, 1] * scales[:, 2] + scales[:, 0] * scales[:, 2]
+
+    @classmethod
+    def merge(
+            cls,
+            means: torch.Tensor,
+            covariances: torch.Tensor,
+            opacities: torch.Tensor,
+            shs: torch.Tensor,
+            areas: torch.Tensor,
+            parent_ids: torch.Tensor,
+            n_parents: int,
+    ):
+        """
+        Merge Gaussians into `n_parents` Gaussians matching their moments
+
+        Args:
+            means: [N, 3]
+            covariances: [N, 3, 3]
+            opacities: [N, 1]
+            shs: [N, K, 3]
+            areas: [N]
+            parent_ids: [N], in [0, n_parents)
+
+        Returns:
+            means, covariances, scales, rotations, opacities, shs, areas of the parents
+        """
+
+        def weighted_sum(values: torch.Tensor, value_weights: torch.Tensor) -> torch.Tensor:
+            return torch.zeros((n_parents,) + values.shape[1:], dtype=values.dtype, device=values.device).index_add_(
+                0,
+                parent_ids,
+                values * value_weights.reshape((-1,) + (1,) * (values.dim() - 1)),
+            )
+
+        weights = opacities.squeeze(-1) * areas + 1e-12
+        normalized_weights = weights / weighted_sum(weights, torch.ones_like(weights))[parent_ids]
+
+        parent_means = weighted_sum(means, normalized_weights)
+        offsets = means - parent_means[parent_ids]
+        parent_covariances = weighted_sum(covariances + offsets[:, :, None] * offsets[:, None, :], normalized_weights)
+        parent_shs = weighted_sum(shs, normalized_weights)
+
+        # decompose the covariances into scales and rotations
+        eigenvalues, eigenvectors = torch.linalg.eigh(parent_covariances)
+        parent_scales = torch.sqrt(eigenvalues.clamp(min=1e-12))
+        # make them proper rotations
+        eigenvectors[:, :, -1] *= torch.sign(torch.linalg.det(eigenvectors))[:, None]
+        parent_rotations = rotation_matrix_to_quaternion(eigenvectors)
+
+        # preserve the opacity weighted area, otherwise the coarse levels look more transparent or opaque
+        parent_areas = cls.compute_areas(parent_scales)
+        parent_opacities = (weighted_sum(opacities, areas) / parent_areas[:, None].clamp(min=1e-12)).clamp(max=1.)
+
+        return parent_means, parent_covariances, parent_scales, parent_rotations, parent_opacities, parent_shs, parent_areas
+
+    @classmethod
+    @torch.no_grad()
+    def build(
+            cls,
+            means: torch.Tensor,
+            scales: torch.Tensor,
+            rotations: torch.Tensor,
+            opacities: torch.Tensor,
+            shs: torch.Tensor,
+            bits: int = 16,
+            n_sigma: float = 3.,
+    ) -> "GaussianLoDTree":
+        """
+        Args:
+            means: [N, 3]
+            scales: [N, 3], activated
+            rotations: [N, 4], normalized quaternions in wxyz
+            opacities: [N, 1], activated
+            shs: [N, K, 3]
+            bits: the depth of the octree
+        """
+
+        n = means.shape[0]
+        device = means.device
+
+        # the leaves, sorted along the Morton curve
+        codes = compute_morton_codes(means, means.min(dim=0).values, means.max(dim=0).values, bits=bits)
+        codes, order = torch.sort(codes)
+        half_extents = GaussianSpatialIndex.compute_half_extents(scales[order], rotations[order], n_sigma)
+        nodes = {
+            "means": means[order],
+            "covariances": compute_cov_3d(scales[order], 1., rotations[order]),
+            "scales": scales[order],
+            "rotations": rotations[order],
+            "opacities": opacities[order],
+            "shs": shs[order],
+            "areas": cls.compute_areas(scales[order]),
+            "aabb_min": means[order] - half_extents,
+            "aabb_max": means[order] + half_extents,
+            "levels": torch.zeros((n,), dtype=torch.long, device=device),
+        }
+
+        # the nodes created, starting from the leaves
+        created = [nodes]
+        child_index_list = []
+        child_count_list = [torch.zeros((n,), dtype=torch.long, device=device)]
+        n_created = n
+
+        # the roots of the subtrees in the current octree cells, they are ordered by their codes
+        current_ids = torch.arange(n, device=device)
+        current_codes = codes
+        current = nodes
+
+        for level in range(1, bits + 1):
+            if current_ids.shape[0] == 1:
+                break
+
+            # the subtrees in the same cell of this level are merged, those alone in their cells are carried to the next level as is
+            _, group_ids, group_counts = torch.unique_consecutive(current_codes >> (3 * level), return_inverse=True, return_counts=True)
+            is_merged = group_counts[group_ids] > 1
+            if not torch.any(is_merged):
+                continue
+
+            merged_group_counts = group_counts[group_counts > 1]
+            n_parents = merged_group_counts.shape[0]
+            parent_ids = torch.cumsum(group_counts > 1, dim=0)[group_ids[is_merged]] - 1
+            children = {k: v[is_merged] for k, v in current.items()}
+
+            parent_means, parent_covariances, parent_scales, parent_rotations, parent_opacities, parent_shs, parent_areas = cls.merge(
+                children["means"],
+                children["covariances"],
+                children["opacities"],
+                children["shs"],
+                children["areas"],
+                parent_ids,
+                n_parents,
+            )
+
+            # bound both the subtree and the parent itself
+            parent_half_extents = GaussianSpatialIndex.compute_half_extents(parent_scales, parent_rotations, n_sigma)
+            index = parent_ids[:, None].expand(-1, 3)
+            parents = {
+                "means": parent_means,
+                "covariances": parent_covariances,
+                "scales": parent_scales,
+                "rotations": parent_rotations,
+                "opacities": parent_opacities,
+                "shs": parent_shs,
+                "areas": parent_areas,
+                "aabb_min": torch.minimum(
+                    parent_means - parent_half_extents,
+                    torch.full_like(parent_means, torch.inf).scatter_reduce(0, index, children["aabb_min"], reduce="amin"),
+                ),
+                "aabb_max": torch.maximum(
+                    parent_means + parent_half_extents,
+                    torch.full_like(parent_means, -torch.inf).scatter_reduce(0, index, children["aabb_max"], reduce="amax"),
+                ),
+                "levels": torch.full((n_parents,), level, dtype=torch.long, device=device),
+            }
+            created.append(parents)
+            child_index_list.append(current_ids[is_merged])
+            child_count_list.append(merged_group_counts)
+
+            # replace the merged subtrees by their parents, keep the order
+            is_first = torch.ones_like(is_merged)
+            is_first[1:] = group_ids[1:] != group_ids[:-1]
+            is_kept = torch.logical_or(~is_merged, is_first)
+            kept_is_merged = is_merged[is_kept]
+            new_ids = current_ids[is_kept]
+            new_ids[kept_is_merged] = n_created + torch.arange(n_parents, device=device)
+            new_nodes = {}
+            for k, v in current.items():
+                v = v[is_kept].clone()
+                v[kept_is_merged] = parents[k]
+                new_nodes[k] = v
+
+            current_ids = new_ids
+            current_codes = current_codes[is_kept]
+            current = new_nodes
+            n_created += n_parents
+
+        assert current_ids.shape[0] == 1
+
+        child_counts = torch.concat(child_count_list, dim=0)
+        child_indices = torch.concat(child_index_list, dim=0) if len(child_index_list) > 0 else torch.zeros((0,), dtype=torch.long, device=device)
+        child_starts = torch.cumsum(child_counts, dim=0) - child_counts
+        node_ids = torch.arange(child_counts.shape[0], device=device)
+        parents = torch.full_like(node_ids, -1)
+        parents[child_indices] = torch.repeat_interleave(node_ids, child_counts)
+
+        return cls(
+            properties={k: torch.concat([i[k] for i in created], dim=0) for k in cls.PROPERTY_NAMES},
+            parents=parents,
+            child_starts=child_starts,
+            child_counts=child_counts,
+            child_indices=child_indices,
+            levels=torch.concat([i["levels"] for i in created], dim=0),
+            aabb_min=torch.concat([i["aabb_min"] for i in created], dim=0),
+            aabb_max=torch.concat([i["aabb_max"] for i in created], dim=0),
+        )
+
+    @classmethod
+    def from_gaussian_model(cls, gaussian_model, **kwargs) -> "GaussianLoDTree":
+        return cls.build(
+            means=gaussian_model.get_means(),
+            scales=gaussian_model.get_scales(),
+            rotations=gaussian_model.get_rotations(),
+            opacities=gaussian_model.get_opacities(),
+            shs=gaussian_model.get_shs(),
+            **kwargs,
+        )
+
+    def state_dict(self) -> Dict:
+        return {
+            "properties": self.properties,
+            "parents": self.parents,
+            "child_starts": self.child_starts,
+            "child_counts": self.child_counts,
+            "child_indices": self.child_indices,
+            "levels": self.levels,
+            "aabb_min": self.aabb_min,
+            "aabb_max": self.aabb_max,
+        }
+
+    def save(self, path: str):
+        torch.save(self.state_dict(), path)
+
+    @classmethod
+    def load(cls, path: str, map_location=None) -> "GaussianLoDTree":
+        return cls(**torch.load(path, map_location=map_location))
+
+    def to(self, device) -> "GaussianLoDTree":
+        return self.__class__(
+            properties={k: v.to(device) for k, v in self.properties.items()},
+            **{k: v.to(device) for k, v in self.state_dict().items() if k != "properties"},
+        )
+
+    def get_children(self, nodes: torch.Tensor) -> torch.Tensor:
+        """
+        Returns:
+            the concatenated children of the `nodes`
+        """
+
+        counts = self.child_counts[nodes]
+        first_positions = torch.cumsum(counts, dim=0) - counts
+        positions = torch.repeat_interleave(self.child_starts[nodes] - first_positions, counts)
+        return self.child_indices[positions + torch.arange(positions.shape[0], device=positions.device)]
+
+    def get_properties(self, indices: torch.Tensor) -> Dict[str, torch.Tensor]:
+        return {k: v[indices] for k, v in self.properties.items()}
+
+    def get_projected_errors(self, nodes: torch.Tensor, camera_center: torch.Tensor, focal: torch.Tensor) -> torch.Tensor:
+        """
+        The upper bound of the error in pixels, projected from the nearest point of the AABB to the camera center
+
+        Returns:
+            [N], infinity if the camera is inside the AABB
+        """
+
+        outside = torch.maximum(self.aabb_min[nodes] - camera_center, camera_center - self.aabb_max[nodes]).clamp(min=0.)
+        distances = torch.linalg.vector_norm(outside, dim=-1)
+        return self.errors[nodes] * focal / distances
+
+    def select(
+            self,
+            camera,
+            threshold: float = 1.,
+            max_gaussians: int = -1,
+            frustum_culling: bool = True,
+            near: float = 0.01,
+            pixel_margin: float = 16.,
+    ) -> torch.Tensor:
+        """
+        Select a cut of the tree
+
+        Args:
+            threshold: in pixels, a node is rendered instead of its children when its projected error is lower than this
+            max_gaussians: stop refining when the cut would exceed this number, -1 means unlimited
+
+        Returns:
+            [N_selected], the indices of the nodes
+        """
+
+        focal = torch.maximum(camera.fx, camera.fy)
+        if frustum_culling:
+            normals, offsets = GaussianSpatialIndex.get_frustum_planes(camera, near=near, pixel_margin=pixel_margin)
+
+        selected_list = []
+        n_selected = 0
+        frontier = torch.tensor([self.root], dtype=torch.long, device=self.device)
+        while frontier.shape[0] > 0:
+            if frustum_culling:
+                frontier = frontier[GaussianSpatialIndex.is_box_in_frustum(
+                    self.aabb_centers[frontier],
+                    self.aabb_half_extents[frontier],
+                    normals,
+                    offsets,
+                )]
+
+            child_counts = self.child_counts[frontier]
+            is_final = torch.logical_or(
+                child_counts == 0,
+                self.get_projected_errors(frontier, camera.camera_center, focal) <= threshold,
+            )
+            to_refine = frontier[~is_final]
+            n_final = frontier.shape[0] - to_refine.shape[0]
+
+            # keep the whole frontier if refining it exceeds the budget
+            child_counts = child_counts[~is_final]
+            if max_gaussians > 0 and n_selected + n_final + child_counts.sum().item() > max_gaussians:
+                selected_list.append(frontier)
+                break
+
+            selected_list.append(frontier[is_final])
+            n_selected += n_final
+
+            frontier = self.get_children(to_refine)
+
+        return torch.sort(torch.concat(selected_list)).values
+
+    def select_leaves(self) -> torch.Tensor:
+        return torch.nonzero(self.child_counts == 0).squeeze(-1)
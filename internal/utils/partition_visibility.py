@@ -0,0 +1,220 @@
+"""
+Visibility tests of the partitions, used by the `PartitionLoDRenderer` to decide which partitions to render.
+
+A partition is bounded by a box, which is axis aligned in the partition space, i.e. `p_partition = p_world @ rotation`.
+All the tests are conservative: a partition is culled only if it is certainly invisible.
+
+Frustum culling is a separating axis test between the boxes and the view frustum, which is the pyramid bounded by the near plane.
+The candidate axes are the normals of the frustum planes and the axes of the boxes,
+so the boxes straddling the camera plane or lying outside a corner of the frustum are classified correctly.
+
+Occlusion culling uses the bottom face of each box as a proxy of the opaque ground of that partition.
+The proxies are rasterized into a coarse depth map, in which every tile stores the farthest proxy depth over the whole tile,
+or infinity if no single proxy covers the tile entirely.
+A box is occluded when its nearest depth is farther than every tile its projection overlaps.
+"""
+
+from typing import Optional, Tuple
+import math
+import torch
+from internal.utils.spatial_index import GaussianSpatialIndex
+
+
+def get_pixel_rays(camera, pixels: torch.Tensor) -> torch.Tensor:
+    """
+    Args:
+        pixels: [..., 2]
+
+    Returns:
+        [..., 3], the directions in world space, scaled to unit depth
+    """
+
+    directions = torch.concat([
+        (pixels[..., 0:1] - camera.cx) / camera.fx,
+        (pixels[..., 1:2] - camera.cy) / camera.fy,
+        torch.ones_like(pixels[..., 0:1]),
+    ], dim=-1)
+    # `world_to_camera` is transposed: d_world = d_camera @ w2c[:3, :3].T
+    return directions @ camera.world_to_camera[:3, :3].to(directions.dtype).T
+
+
+def get_frustum_corners(camera, near: float = 0.01, pixel_margin: float = 0.) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Returns:
+        corners: [4, 3], the corners of the near plane in world space
+        directions: [4, 3], the directions of the edges starting from the corners
+    """
+
+    width, height = camera.width.to(camera.fx.dtype), camera.height.to(camera.fx.dtype)
+    zero = torch.zeros_like(width) - pixel_margin
+    pixels = torch.stack([
+        torch.stack([zero, zero]),
+        torch.stack([width + pixel_margin, zero]),
+        torch.stack([zero, height + pixel_margin]),
+        torch.stack([width + pixel_margin, height + pixel_margin]),
+    ])
+    directions = get_pixel_rays(camera, pixels)
+    return camera.camera_center.to(directions.dtype) + near * directions, directions
+
+
+def is_box_in_frustum(
+        camera,
+        box_min: torch.Tensor,
+        box_max: torch.Tensor,
+        rotation: Optional[torch.Tensor] = None,
+        near: float = 0.01,
+        pixel_margin: float = 0.,
+) -> torch.Tensor:
+    """
+    Args:
+        box_min, box_max: [N, 3], in partition space
+        rotation: [3, 3], from world space to partition space, identity by default
+
+    Returns:
+        [N] bool
+    """
+
+    if rotation is None:
+        rotation = torch.eye(3)
+    rotation = rotation.to(dtype=box_min.dtype, device=box_min.device)
+    centers = 0.5 * (box_min + box_max)
+    half_extents = 0.5 * (box_max - box_min)
+
+    # the frustum planes, `n @ p_world + d` equals to `(n @ rotation) @ p_partition + d`
+    normals, offsets = GaussianSpatialIndex.get_frustum_planes(camera, near=near, pixel_margin=pixel_margin)
+    normals = normals.to(dtype=box_min.dtype) @ rotation
+    is_visible = GaussianSpatialIndex.is_box_in_frustum(centers, half_extents, normals, offsets.to(dtype=box_min.dtype))
+
+    # the box axes, on which the frustum is projected to a interval bounded by the near corners, unless an edge extends to infinity
+    corners, directions = get_frustum_corners(camera, near=near, pixel_margin=pixel_margin)
+    corners, directions = corners.to(dtype=box_min.dtype) @ rotation, directions.to(dtype=box_min.dtype) @ rotation
+    frustum_min = torch.where(torch.all(directions >= 0., dim=0), corners.min(dim=0).values, -math.inf)  # [3]
+    frustum_max = torch.where(torch.all(directions <= 0., dim=0), corners.max(dim=0).values, math.inf)
+    is_visible &= torch.all(box_max >= frustum_min, dim=-1) & torch.all(box_min <= frustum_max, dim=-1)
+
+    return is_visible
+
+
+def get_box_corners(box_min: torch.Tensor, box_max: torch.Tensor) -> torch.Tensor:
+    """
+    Returns:
+        [N, 8, 3]
+    """
+
+    selectors = torch.tensor([[i & 1, (i >> 1) & 1, (i >> 2) & 1] for i in range(8)], dtype=torch.bool, device=box_min.device)
+    return torch.where(selectors, box_max[:, None, :], box_min[:, None, :])
+
+
+def get_occluder_depth_map(
+        camera,
+        box_min: torch.Tensor,
+        box_max: torch.Tensor,
+        rotation: Optional[torch.Tensor] = None,
+        tile_size: int = 32,
+        near: float = 0.01,
+) -> torch.Tensor:
+    """
+    Rasterize the bottom faces of the boxes, which are seen from above only, into a coarse depth map
+
+    Returns:
+        [n_tiles_y, n_tiles_x], the conservative depth of each tile, infinity if not covered
+    """
+
+    if rotation is None:
+        rotation = torch.eye(3)
+    rotation = rotation.to(dtype=box_min.dtype, device=box_min.device)
+    width, height = int(camera.width), int(camera.height)
+    n_tiles_x, n_tiles_y = math.ceil(width / tile_size), math.ceil(height / tile_size)
+
+    # the rays passing through the corners of the tiles
+    xs = torch.clamp(torch.arange(n_tiles_x + 1, device=box_min.device) * tile_size, max=width).to(box_min.dtype)
+    ys = torch.clamp(torch.arange(n_tiles_y + 1, device=box_min.device) * tile_size, max=height).to(box_min.dtype)
+    pixels = torch.stack(torch.meshgrid(xs, ys, indexing="xy"), dim=-1)  # [n_tiles_y + 1, n_tiles_x + 1, 2]
+    directions = get_pixel_rays(camera, pixels).to(box_min.dtype) @ rotation  # depth normalized, so `t` is the depth
+    origin = camera.camera_center.to(box_min.dtype) @ rotation
+
+    # intersect with the plane `z = box_min.z` of every box
+    t = (box_min[:, 2] - origin[2])[:, None, None] / directions[None, :, :, 2]  # [N, n_tiles_y + 1, n_tiles_x + 1]
+    hits = origin[:2] + t[..., None] * directions[None, :, :, :2]
+    is_hit = torch.logical_and(
+        torch.all((hits >= box_min[:, None, None, :2]) & (hits <= box_max[:, None, None, :2]), dim=-1),
+        (directions[None, :, :, 2] < 0.) & (t > near),
+    )
+    t = torch.where(is_hit, t, math.inf)
+
+    # a face covers a tile if it covers the 4 corners, since both of them are convex in the image,
+    # and the depth of a plane reaches its maximum over a tile at a corner
+    tile_depths = torch.stack([
+        t[:, :-1, :-1],
+        t[:, :-1, 1:],
+        t[:, 1:, :-1],
+        t[:, 1:, 1:],
+    ], dim=-1).max(dim=-1).values  # [N, n_tiles_y, n_tiles_x]
+    return tile_depths.min(dim=0).values
+
+
+def is_box_occluded(
+        camera,
+        box_min: torch.Tensor,
+        box_max: torch.Tensor,
+        depth_map: torch.Tensor,
+        rotation: Optional[torch.Tensor] = None,
+        tile_size: int = 32,
+        near: float = 0.01,
+) -> torch.Tensor:
+    """
+    Returns:
+        [N] bool
+    """
+
+    if rotation is None:
+        rotation = torch.eye(3)
+    rotation = rotation.to(dtype=box_min.dtype, device=box_min.device)
+
+    # the corners in camera space, `world_to_camera` is transposed
+    world_to_camera = camera.world_to_camera.to(box_min.dtype)
+    corners = get_box_corners(box_min, box_max) @ rotation.T @ world_to_camera[:3, :3] + world_to_camera[3, :3]  # [N, 8, 3]
+    depths = corners[..., 2]
+    min_depths = depths.min(dim=-1).values
+    # the projection is bounded by the projected corners only if all of them are in front of the camera
+    is_in_front = min_depths > near
+
+    xy = corners[..., :2] / torch.clamp(depths, min=near)[..., None]
+    pixels = xy * torch.stack([camera.fx, camera.fy]).to(xy.dtype) + torch.stack([camera.cx, camera.cy]).to(xy.dtype)
+    n_tiles = torch.tensor([depth_map.shape[1], depth_map.shape[0]], device=box_min.device)
+    tile_min = torch.clamp(torch.floor(pixels.min(dim=1).values / tile_size), min=0).long()
+    tile_max = torch.minimum(torch.floor(pixels.max(dim=1).values / tile_size).long(), n_tiles - 1)  # [N, 2]
+
+    # the farthest depth in the overlapped tiles
+    tile_x = torch.arange(depth_map.shape[1], device=box_min.device)
+    tile_y = torch.arange(depth_map.shape[0], device=box_min.device)
+    is_overlapped = torch.logical_and(
+        ((tile_y[None, :] >= tile_min[:, 1:2]) & (tile_y[None, :] <= tile_max[:, 1:2]))[:, :, None],
+        ((tile_x[None, :] >= tile_min[:, 0:1]) & (tile_x[None, :] <= tile_max[:, 0:1]))[:, None, :],
+    )  # [N, n_tiles_y, n_tiles_x]
+    max_occluder_depths = torch.where(is_overlapped, depth_map[None], -math.inf).amax(dim=(1, 2))
+
+    # the boxes projected outside the image are left to the frustum test
+    return is_in_front & torch.any(is_overlapped.flatten(1), dim=-1) & (min_depths > max_occluder_depths)
+
+
+def get_visible_boxes(
+        camera,
+        box_min: torch.Tensor,
+        box_max: torch.Tensor,
+        rotation: Optional[torch.Tensor] = None,
+        occlusion_culling: bool = False,
+        tile_size: int = 32,
+        near: float = 0.01,
+        pixel_margin: float = 0.,
+) -> torch.Tensor:
+    """
+    Returns:
+        [N] bool
+    """
+
+    is_visible = is_box_in_frustum(camera, box_min, box_max, rotation=rotation, near=near, pixel_margin=pixel_margin)
+    if occlusion_culling:
+        depth_map = get_occluder_depth_map(camera, box_min, box_max, rotation=rotation, tile_size=tile_size, near=near)
+        is_visible &= ~is_box_occluded(camera, box_min, box_max, depth_map, rotation=rotation, tile_size=tile_size, near=near)
+    return is_visible
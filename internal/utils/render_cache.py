@@ -0,0 +1,217 @@
+"""
+A LRU cache of the renderer outputs, for rendering the same views repeatedly without changing the model,
+e.g. the viewer revisiting a pose, or validating again without training steps in between.
+
+An entry is keyed by the version of the Gaussian model (see `GaussianModel.get_version()`) and of the renderer's parameters,
+the camera parameters, the background color, the scaling modifier and the render types,
+so editing the properties, an optimizer step or changing the active SH degree make the old entries unreachable,
+and they are evicted eventually.
+Only the renderings not requiring gradients are cached.
+The cached tensors are returned directly, so they should not be modified in-place.
+"""
+
+from typing import Optional, Dict, Any, Hashable
+from collections import OrderedDict
+import itertools
+import threading
+import torch
+
+CAMERA_KEY_FIELDS = (
+    "world_to_camera",
+    "fx",
+    "fy",
+    "cx",
+    "cy",
+    "width",
+    "height",
+    "appearance_id",
+    "normalized_appearance_id",
+    "time",
+    "distortion_params",
+    "camera_type",
+)
+
+
+class RenderCache:
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+        # the viewer renders for each client in its own thread
+        self.lock = threading.Lock()
+
+        self.entries: OrderedDict[Hashable, Dict[str, Any]] = OrderedDict()
+        self.entry_bytes: Dict[Hashable, int] = {}
+        self.n_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self) -> float:
+        n = self.hits + self.misses
+        if n == 0:
+            return 0.
+        return self.hits / n
+
+    def get_metrics(self) -> Dict[str, float]:
+        return {
+            "hit_rate": self.hit_rate,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "memory_mb": self.n_bytes / 1024 / 1024,
+        }
+
+    def reset_metrics(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def _clear(self):
+        self.entries.clear()
+        self.entry_bytes.clear()
+        self.n_bytes = 0
+
+    @staticmethod
+    def get_camera_key(camera) -> Hashable:
+        tensors = []
+        for name in CAMERA_KEY_FIELDS:
+            value = getattr(camera, name, None)
+            if value is None:
+                # make `None` distinguishable from a zero-sized tensor
+                value = torch.tensor([torch.nan], device=camera.world_to_camera.device)
+            value = value.reshape(-1).to(torch.float64)
+            tensors.append(torch.concat([value.new_tensor([value.shape[0]]), value]))
+        return str(camera.world_to_camera.device), torch.concat(tensors).cpu().numpy().tobytes()
+
+    @staticmethod
+    def get_module_version(module) -> Hashable:
+        if not isinstance(module, torch.nn.Module):
+            return None
+        return tuple(
+            j
+            for i in itertools.chain(module.parameters(), module.buffers())
+            for j in (id(i), i._version)
+        )
+
+    def get_key(
+            self,
+            renderer,
+            camera,
+            pc,
+            bg_color: torch.Tensor,
+            scaling_modifier: float = 1.0,
+            render_types: list = None,
+            **kwargs,
+    ) -> Optional[Hashable]:
+        """
+        Returns:
+            None if the rendering can not be cached
+        """
+
+        if torch.is_grad_enabled() or len(kwargs) > 0:
+            return None
+        get_version = getattr(pc, "get_version", None)
+        if get_version is None:
+            return None
+
+        return (
+            id(pc),
+            get_version(),
+            id(renderer),
+            self.get_module_version(renderer),
+            self.get_camera_key(camera),
+            tuple(bg_color.reshape(-1).tolist()) if isinstance(bg_color, torch.Tensor) else bg_color,
+            float(scaling_modifier),
+            None if render_types is None else tuple(render_types),
+        )
+
+    @staticmethod
+    def get_outputs_bytes(outputs: Dict[str, Any]) -> int:
+        # count the shared storages once
+        storages = {}
+        for value in outputs.values():
+            if isinstance(value, torch.Tensor):
+                storage = value.untyped_storage()
+                storages[(value.device, storage.data_ptr())] = storage.nbytes()
+        return sum(storages.values())
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        outputs = self.entries.get(key, None)
+        if outputs is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        # shallow copy, avoid the cached one being modified by the caller
+        return dict(outputs)
+
+    def put(self, key: Hashable, outputs: Dict[str, Any]):
+        n_bytes = self.get_outputs_bytes(outputs)
+        if n_bytes > self.max_bytes:
+            return
+
+        with self.lock:
+            self._put(key, outputs, n_bytes)
+
+    def _put(self, key: Hashable, outputs: Dict[str, Any], n_bytes: int):
+        if key in self.entries:
+            self._remove(key)
+        while self.n_bytes + n_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+        self.entries[key] = dict(outputs)
+        self.entry_bytes[key] = n_bytes
+        self.n_bytes += n_bytes
+
+    def _remove(self, key: Hashable):
+        del self.entries[key]
+        self.n_bytes -= self.entry_bytes.pop(key)
+
+    def render(
+            self,
+            renderer,
+            camera,
+            pc,
+            bg_color: torch.Tensor,
+            scaling_modifier: float = 1.0,
+            render_types: list = None,
+            **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Same as `renderer(camera, pc, bg_color, scaling_modifier, render_types, **kwargs)`, but return the cached outputs if available
+        """
+
+        key = self.get_key(renderer, camera, pc, bg_color, scaling_modifier, render_types, **kwargs)
+        if key is not None:
+            outputs = self.get(key)
+            if outputs is not None:
+                return outputs
+
+        outputs = renderer(
+            camera,
+            pc,
+            bg_color,
+            scaling_modifier=scaling_modifier,
+            render_types=render_types,
+            **kwargs,
+        )
+
+        if key is not None:
+            self.put(key, outputs)
+
+        return outputs
@@ -0,0 +1,104 @@
+"""
+Selection without a full sort.
+
+`torch.sort` allocates the sorted values and an int64 index tensor,
+which is unnecessary when only a single order statistic or the top-k set is required.
+"""
+
+from typing import Optional
+import torch
+
+
+def kth_smallest(values: torch.Tensor, k: int) -> torch.Tensor:
+    """
+    :param values: 1D tensor
+    :param k: 0-based rank, i.e. `torch.sort(values).values[k]`
+    """
+
+    assert 0 <= k < values.shape[0], "k={} out of range [0, {})".format(k, values.shape[0])
+    return torch.kthvalue(values, k + 1).values
+
+
+def kth_largest(values: torch.Tensor, k: int) -> torch.Tensor:
+    """
+    :param k: 0-based rank, i.e. `torch.sort(values, descending=True).values[k]`
+    """
+
+    return kth_smallest(values, values.shape[0] - 1 - k)
+
+
+def histogram_kth_smallest(values: torch.Tensor, k: int, n_bins: int = 4096) -> torch.Tensor:
+    """
+    Approximate `kth_smallest()` by a histogram, the error is bounded by `(max - min) / n_bins`.
+    Only the histogram is allocated, so the memory usage does not depend on the number of values.
+    """
+
+    assert 0 <= k < values.shape[0], "k={} out of range [0, {})".format(k, values.shape[0])
+
+    values = values.float()
+    min_value, max_value = torch.aminmax(values)
+    if min_value == max_value:
+        return min_value
+
+    histogram = torch.histc(values, bins=n_bins, min=min_value.item(), max=max_value.item())
+    cdf = torch.cumsum(histogram, dim=0)
+    # the first bin whose cumulative count covers rank k
+    bin_index = torch.searchsorted(cdf, torch.tensor([k + 1], dtype=cdf.dtype, device=cdf.device)).clamp(max=n_bins - 1)
+    # linear interpolation inside the bin
+    n_before = cdf[bin_index] - histogram[bin_index]
+    fraction = ((k + 0.5 - n_before) / histogram[bin_index].clamp_min(1.)).clamp(0., 1.)
+    bin_width = (max_value - min_value) / n_bins
+    return (min_value + (bin_index + fraction) * bin_width).squeeze(0).clamp(min_value, max_value)
+
+
+def quantile(values: torch.Tensor, q: float, exact: bool = True, n_bins: int = 4096) -> torch.Tensor:
+    """
+    The value at the 0-based rank `int(q * (N - 1))`, the same as indexing the sorted tensor.
+
+    :param exact: `False` to use the histogram approximation
+    """
+
+    k = int(q * (values.shape[0] - 1))
+    if exact:
+        return kth_smallest(values, k)
+    return histogram_kth_smallest(values, k, n_bins=n_bins)
+
+
+def topk_mask(values: torch.Tensor, k: int, largest: bool = True) -> torch.Tensor:
+    """
+    :return: a bool mask with `k` `True`, marking the top-k values
+    """
+
+    mask = torch.zeros(values.shape, dtype=torch.bool, device=values.device)
+    if k <= 0:
+        return mask
+    if k >= values.shape[0]:
+        mask.fill_(True)
+        return mask
+    mask[torch.topk(values, k, largest=largest, sorted=False).indices] = True
+    return mask
+
+
+def weighted_sample_without_replacement(
+        weights: torch.Tensor,
+        k: int,
+        generator: Optional[torch.Generator] = None,
+) -> torch.Tensor:
+    """
+    Draw `k` indices with probabilities proportional to `weights`, without replacement.
+
+    Equivalent in distribution to `torch.multinomial(weights, k, replacement=False)`,
+    implemented as the top-k of the exponential keys `-log(u) / w` (Efraimidis & Spirakis),
+    which is a single `topk` instead of `k` sequential draws,
+    and is not limited to 2^24 categories as the CUDA `torch.multinomial`.
+    """
+
+    n_nonzero = torch.count_nonzero(weights).item()
+    assert k <= n_nonzero, "cannot sample {} from {} non-zero weights without replacement".format(k, n_nonzero)
+    if k == 0:
+        return torch.empty((0,), dtype=torch.long, device=weights.device)
+
+    u = torch.rand(weights.shape, dtype=torch.float, device=weights.device, generator=generator)
+    # `-log(u)` is Exp(1) distributed, zero weights get infinite keys and will never be selected
+    keys = -torch.log(u.clamp_min(torch.finfo(u.dtype).tiny)) / weights.float()
+    return torch.topk(keys, k, largest=False, sorted=False).indices
@@ -112,17 +112,160 @@ def eval_sh(deg, sh, dirs):
     return result
 
 
-def eval_gaussian_model_sh(viewpoint_camera, pc):
-    shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree + 1) ** 2)
+def eval_sh_bases(deg, dirs):
+    """
+    The SH bases at unit directions, in the order and with the signs used by `eval_sh`.
+    Args:
+        deg: int SH deg, 0-4 supported
+        dirs: [..., 3] unit directions
+    Returns:
+        [..., (deg + 1) ** 2]
+    """
+    assert deg <= 4 and deg >= 0
+
+    bases = [torch.full_like(dirs[..., 0], C0)]
+    if deg > 0:
+        x, y, z = dirs.unbind(-1)
+        bases += [-C1 * y, C1 * z, -C1 * x]
+
+        if deg > 1:
+            xx, yy, zz = x * x, y * y, z * z
+            xy, yz, xz = x * y, y * z, x * z
+            bases += [
+                C2[0] * xy,
+                C2[1] * yz,
+                C2[2] * (2.0 * zz - xx - yy),
+                C2[3] * xz,
+                C2[4] * (xx - yy),
+            ]
+
+            if deg > 2:
+                bases += [
+                    C3[0] * y * (3 * xx - yy),
+                    C3[1] * xy * z,
+                    C3[2] * y * (4 * zz - xx - yy),
+                    C3[3] * z * (2 * zz - 3 * xx - 3 * yy),
+                    C3[4] * x * (4 * zz - xx - yy),
+                    C3[5] * z * (xx - yy),
+                    C3[6] * x * (xx - 3 * yy),
+                ]
+
+                if deg > 3:
+                    bases += [
+                        C4[0] * xy * (xx - yy),
+                        C4[1] * yz * (3 * xx - yy),
+                        C4[2] * xy * (7 * zz - 1),
+                        C4[3] * yz * (7 * zz - 3),
+                        C4[4] * (zz * (35 * zz - 30) + 3),
+                        C4[5] * xz * (7 * zz - 3),
+                        C4[6] * (xx - yy) * (7 * zz - 1),
+                        C4[7] * xz * (xx - 3 * yy),
+                        C4[8] * (xx * (xx - 3 * yy) - yy * (3 * xx - yy)),
+                    ]
+    return torch.stack(bases, dim=-1)
+
+
+def eval_sh_with_bases(bases, shs):
+    """
+    Contract the SH coefficients with the bases computed by `eval_sh_bases`, all the channels at once.
+    Args:
+        bases: [..., K]
+        shs: [..., K', C] the layout of the Gaussian models, K' >= K
+    Returns:
+        [..., C]
+    """
+    n_bases = bases.shape[-1]
+    return torch.matmul(bases.unsqueeze(-2), shs[..., :n_bases, :]).squeeze(-2)
+
+
+def eval_sh_colors(deg, shs, dirs=None, chunk_size: int = -1, dtype=None):
+    """
+    Batched version of `eval_sh`, takes the SHs in the layout of the Gaussian models without transposing.
+    Args:
+        deg: int SH deg, 0-4 supported
+        shs: [N, K, C], K >= (deg + 1) ** 2
+        dirs: [N, 3] unit directions, not required by degree 0
+        chunk_size: the number of Gaussians evaluated at a time to bound the memory of the temporaries, `-1` to evaluate all at once
+        dtype: compute in this dtype, e.g. `torch.half`, the outputs are converted back to the dtype of `shs`
+    Returns:
+        [N, C], without the `+ 0.5` offset
+    """
+    if deg == 0:
+        # no direction dependent term
+        return C0 * shs[:, 0]
+
+    n = shs.shape[0]
+    if chunk_size <= 0 or chunk_size >= n:
+        chunk_size = max(n, 1)
+
+    outputs = []
+    for begin in range(0, n, chunk_size):
+        chunk_shs = shs[begin:begin + chunk_size, :(deg + 1) ** 2]
+        chunk_dirs = dirs[begin:begin + chunk_size]
+        if dtype is not None:
+            chunk_shs = chunk_shs.to(dtype)
+            chunk_dirs = chunk_dirs.to(dtype)
+        outputs.append(eval_sh_with_bases(eval_sh_bases(deg, chunk_dirs), chunk_shs).to(shs.dtype))
+
+    if len(outputs) == 1:
+        return outputs[0]
+    return torch.cat(outputs, dim=0)
+
+
+def eval_gaussian_model_sh(viewpoint_camera, pc, chunk_size: int = -1, dtype=None):
     # view directions
-    xyz = pc.get_xyz
-    dir_pp = (xyz - viewpoint_camera.camera_center.repeat(pc.get_features.shape[0], 1))
+    dir_pp = pc.get_xyz - viewpoint_camera.camera_center
     dir_pp_normalized = dir_pp / dir_pp.norm(dim=1, keepdim=True)
 
-    rgb = eval_sh(pc.active_sh_degree, sh=shs_view, dirs=dir_pp_normalized)
+    rgb = eval_sh_colors(pc.active_sh_degree, pc.get_features, dir_pp_normalized, chunk_size=chunk_size, dtype=dtype)
     return torch.clamp_min(rgb + 0.5, 0.0)
 
 
+def sh_band_energy(shs_rest):
+    """
+    The squared L2 norm of each SH band, summed over color channels.
+    Since the basis is orthonormal, `energy / (4 * pi)` is the mean squared color contributed by the band over all view directions.
+    Args:
+        shs_rest: [N, (deg + 1) ** 2 - 1, C]
+    Returns:
+        [N, deg], the energy of band 1 to `deg`
+    """
+    n_rest = shs_rest.shape[1]
+    energy = []
+    band = 1
+    while (band + 1) ** 2 - 1 <= n_rest:
+        energy.append(torch.sum(torch.square(shs_rest[:, band ** 2 - 1:(band + 1) ** 2 - 1]), dim=(1, 2)))
+        band += 1
+    if len(energy) == 0:
+        return shs_rest.new_zeros((shs_rest.shape[0], 0))
+    return torch.stack(energy, dim=-1)
+
+
+def sh_truncation_mse(shs_rest):
+    """
+    The mean squared color error, averaged over view directions and channels, after truncating the SHs to each degree.
+    Returns:
+        [N, deg + 1], the last column is always zero
+    """
+    energy = sh_band_energy(shs_rest)
+    # the energy of the bands above each degree
+    tail_energy = torch.flip(torch.cumsum(torch.flip(energy, dims=[-1]), dim=-1), dims=[-1])
+    tail_energy = torch.cat([tail_energy, tail_energy.new_zeros((tail_energy.shape[0], 1))], dim=-1)
+    return tail_energy / (4 * torch.pi * shs_rest.shape[-1])
+
+
+def assign_sh_degrees(shs_rest, threshold: float):
+    """
+    Pick the lowest SH degree for each Gaussian, whose truncation RMS color error is not greater than `threshold`.
+    Returns:
+        [N] int, in range [0, deg]
+    """
+    mse = sh_truncation_mse(shs_rest)
+    qualified = mse <= threshold ** 2
+    # the first qualified degree, the max one always qualifies
+    return torch.argmax(qualified.int(), dim=-1)
+
+
 def RGB2SH(rgb):
     return (rgb - 0.5) / C0
 
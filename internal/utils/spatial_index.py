@@ -0,0 +1,258 @@
+"""
+A uniform grid over the Gaussians, used to cull those outside the view frustum before projecting them.
+
+Each Gaussian is bounded by the axis aligned box of its n-sigma ellipsoid, and assigned to the grid cell containing its mean.
+A cell is bounded by the union of the boxes of its Gaussians,
+so a frame only tests the cells against the frustum planes, then the Gaussians of the surviving cells.
+
+The index is attached to the Gaussian model by `get_spatial_index()` and shared by the renderers.
+It is rebuilt lazily when the number of Gaussians or the property tensors are replaced,
+e.g. by densification, and the bounding boxes are refitted without reassigning the cells when the properties are updated in place,
+e.g. by an optimizer step.
+The density controllers invalidate it in `DensityControllerImpl.after_density_changed()`.
+"""
+
+from typing import Optional, Tuple
+import torch
+from internal.utils.gaussian_projection import build_rotation_matrix
+
+
+class GaussianSpatialIndex:
+    def __init__(
+            self,
+            gaussians_per_cell: int = 256,
+            max_resolution: int = 128,
+            n_sigma: float = 3.,
+    ):
+        self.gaussians_per_cell = gaussians_per_cell
+        self.max_resolution = max_resolution
+        self.n_sigma = n_sigma
+
+        self.is_valid = False
+        self.state = None
+
+        self.resolution = None  # [3]
+        self.order = None  # [N], the Gaussian indices sorted by cell
+        self.cell_starts = None  # [n_cells], the first position of each non-empty cell in `order`
+        self.cell_counts = None  # [n_cells]
+        self.cell_ids = None  # [N], the cell of each position in `order`
+        self.centers = None  # [N, 3]
+        self.half_extents = None  # [N, 3]
+        self.cell_min = None  # [n_cells, 3], the bounding box of the means
+        self.cell_max = None  # [n_cells, 3]
+        self.cell_max_half_extents = None  # [n_cells, 3]
+
+    @property
+    def n_cells(self) -> int:
+        return self.cell_counts.shape[0]
+
+    def invalidate(self):
+        self.is_valid = False
+
+    @staticmethod
+    def compute_half_extents(scales: torch.Tensor, rotations: torch.Tensor, n_sigma: float = 3.) -> torch.Tensor:
+        """
+        The half extents of the axis aligned bounding boxes of the n-sigma ellipsoids
+
+        Args:
+            scales: [N, 3], activated
+            rotations: [N, 4], normalized quaternions in wxyz
+
+        Returns:
+            [N, 3], `n_sigma * sqrt(diag(R S S^T R^T))`
+        """
+
+        m = build_rotation_matrix(rotations) * scales[:, None, :]
+        return n_sigma * torch.linalg.vector_norm(m, dim=-1)
+
+    @staticmethod
+    def get_model_state(gaussian_model):
+        """
+        Changes when the property tensors are replaced or updated in place
+        """
+
+        return tuple(
+            (i.data_ptr(), tuple(i.shape), i._version)
+            for i in (gaussian_model.means, gaussian_model.scales, gaussian_model.rotations)
+        )
+
+    def update(self, gaussian_model) -> "GaussianSpatialIndex":
+        state = self.get_model_state(gaussian_model)
+        if self.is_valid and state == self.state:
+            return self
+
+        with torch.no_grad():
+            means = gaussian_model.get_means()
+            scales = gaussian_model.get_scales()
+            rotations = gaussian_model.get_rotations()
+            is_rebuild_required = not self.is_valid or self.state is None or any(
+                i[:2] != j[:2] for i, j in zip(state, self.state)
+            )
+            if is_rebuild_required:
+                self.build(means, scales, rotations)
+            else:
+                self.refit(means, scales, rotations)
+
+        self.state = state
+        return self
+
+    def build(self, means: torch.Tensor, scales: torch.Tensor, rotations: torch.Tensor):
+        n_gaussians = means.shape[0]
+        device = means.device
+
+        if n_gaussians > 0:
+            scene_min = means.min(dim=0).values
+            scene_max = means.max(dim=0).values
+        else:
+            scene_min = scene_max = torch.zeros((3,), dtype=means.dtype, device=device)
+        scene_size = scene_max - scene_min
+        # avoid zero volume caused by a flat scene
+        scene_size = torch.clamp_min(scene_size, scene_size.max().item() * 1e-3 + 1e-6)
+
+        # cubic cells, `gaussians_per_cell` Gaussians per cell on average
+        n_target_cells = max(n_gaussians // self.gaussians_per_cell, 1)
+        cell_size = (torch.prod(scene_size) / n_target_cells) ** (1. / 3.)
+        resolution = torch.clamp(torch.ceil(scene_size / cell_size), min=1, max=self.max_resolution).long()
+
+        cell_xyz = torch.floor((means - scene_min) / scene_size * resolution).long()
+        cell_xyz = torch.minimum(cell_xyz.clamp_min(0), resolution - 1)
+        flatten_cell_ids = (cell_xyz[:, 2] * resolution[1] + cell_xyz[:, 1]) * resolution[0] + cell_xyz[:, 0]
+
+        sorted_cell_ids, self.order = torch.sort(flatten_cell_ids, stable=True)
+        _, self.cell_counts = torch.unique_consecutive(sorted_cell_ids, return_counts=True)
+        self.cell_starts = torch.cumsum(self.cell_counts, dim=0) - self.cell_counts
+        self.cell_ids = torch.repeat_interleave(torch.arange(self.cell_counts.shape[0], device=device), self.cell_counts)
+        self.resolution = resolution
+
+        self.refit(means, scales, rotations)
+        self.is_valid = True
+
+    def refit(self, means: torch.Tensor, scales: torch.Tensor, rotations: torch.Tensor):
+        """
+        Recompute the bounding boxes, keeping the cell assignments
+        """
+
+        self.centers = means.detach()
+        self.half_extents = self.compute_half_extents(scales.detach(), rotations.detach(), self.n_sigma)
+
+        index = self.cell_ids[:, None].expand(-1, 3)
+        sorted_means = self.centers[self.order]
+
+        def reduce(src, initial, reduction):
+            return torch.full(
+                (self.n_cells, 3),
+                initial,
+                dtype=src.dtype,
+                device=src.device,
+            ).scatter_reduce(0, index, src, reduce=reduction, include_self=False)
+
+        self.cell_min = reduce(sorted_means, float("inf"), "amin")
+        self.cell_max = reduce(sorted_means, float("-inf"), "amax")
+        self.cell_max_half_extents = reduce(self.half_extents[self.order], 0., "amax")
+
+    @staticmethod
+    def get_frustum_planes(camera, near: float = 0.01, pixel_margin: float = 0.) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns:
+            normals: [5, 3], pointing inward, in world space
+            offsets: [5], a point `p` is inside the frustum when `p @ normals.T + offsets >= 0` for all the planes
+        """
+
+        fx, fy, cx, cy = camera.fx, camera.fy, camera.cx, camera.cy
+        width, height = camera.width.to(fx.dtype), camera.height.to(fx.dtype)
+        zeros, ones = torch.zeros_like(fx), torch.ones_like(fx)
+
+        # in camera space: left, right, top, bottom, near
+        normals = torch.stack([
+            torch.stack([ones, zeros, (cx + pixel_margin) / fx]),
+            torch.stack([-ones, zeros, (width - cx + pixel_margin) / fx]),
+            torch.stack([zeros, ones, (cy + pixel_margin) / fy]),
+            torch.stack([zeros, -ones, (height - cy + pixel_margin) / fy]),
+            torch.stack([zeros, zeros, ones]),
+        ])
+        offsets = torch.stack([zeros, zeros, zeros, zeros, -near * ones])
+
+        # `world_to_camera` is transposed: p_camera = p_world @ w2c[:3, :3] + w2c[3, :3]
+        world_to_camera = camera.world_to_camera.to(normals.dtype)
+        return normals @ world_to_camera[:3, :3].T, offsets + normals @ world_to_camera[3, :3]
+
+    @staticmethod
+    def is_box_in_frustum(centers: torch.Tensor, half_extents: torch.Tensor, normals: torch.Tensor, offsets: torch.Tensor) -> torch.Tensor:
+        """
+        A box is culled only if it is entirely on the outer side of one of the planes, so the test is conservative
+
+        Returns:
+            [N] bool
+        """
+
+        distances = centers @ normals.T + offsets + half_extents @ torch.abs(normals).T
+        return torch.all(distances >= 0., dim=-1)
+
+    def cull(
+            self,
+            camera,
+            scale_modifier: float = 1.,
+            near: float = 0.01,
+            pixel_margin: float = 0.,
+            per_gaussian: bool = True,
+    ) -> torch.Tensor:
+        """
+        Args:
+            per_gaussian: test the Gaussians of the surviving cells individually
+
+        Returns:
+            [N_visible], the sorted indices of the Gaussians intersecting with the view frustum
+        """
+
+        assert self.is_valid, "the spatial index is not built"
+
+        normals, offsets = self.get_frustum_planes(camera, near=near, pixel_margin=pixel_margin)
+        normals = normals.to(device=self.centers.device, dtype=self.centers.dtype)
+        offsets = offsets.to(device=self.centers.device, dtype=self.centers.dtype)
+
+        # cells
+        is_cell_visible = self.is_box_in_frustum(
+            0.5 * (self.cell_min + self.cell_max),
+            0.5 * (self.cell_max - self.cell_min) + scale_modifier * self.cell_max_half_extents,
+            normals,
+            offsets,
+        )
+        visible_cells = torch.nonzero(is_cell_visible, as_tuple=True)[0]
+        visible_cell_counts = self.cell_counts[visible_cells]
+        candidates = torch.repeat_interleave(
+            self.cell_starts[visible_cells] - (torch.cumsum(visible_cell_counts, dim=0) - visible_cell_counts),
+            visible_cell_counts,
+        ) + torch.arange(visible_cell_counts.sum().item(), device=visible_cells.device)
+        candidates = self.order[candidates]
+
+        # Gaussians
+        if per_gaussian:
+            candidates = candidates[self.is_box_in_frustum(
+                self.centers[candidates],
+                scale_modifier * self.half_extents[candidates],
+                normals,
+                offsets,
+            )]
+
+        return torch.sort(candidates).values
+
+
+def get_spatial_index(gaussian_model, **kwargs) -> GaussianSpatialIndex:
+    """
+    Get the spatial index attached to the `gaussian_model`, create or update it if required
+
+    Args:
+        kwargs: passed to the `GaussianSpatialIndex` when creating
+    """
+
+    spatial_index: Optional[GaussianSpatialIndex] = getattr(gaussian_model, "_spatial_index", None)
+    if spatial_index is None:
+        spatial_index = GaussianSpatialIndex(**kwargs)
+        gaussian_model._spatial_index = spatial_index
+    return spatial_index.update(gaussian_model)
+
+
+def invalidate_spatial_index(gaussian_model):
+    spatial_index: Optional[GaussianSpatialIndex] = getattr(gaussian_model, "_spatial_index", None)
+    if spatial_index is not None:
+        spatial_index.invalidate()
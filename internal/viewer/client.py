@@ -1,31 +1,58 @@
+from typing import Optional
 import time
 import threading
 import traceback
+from concurrent.futures import CancelledError
 import numpy as np
 import torch
 import viser
 import viser.transforms as vtf
 from internal.cameras.cameras import Cameras
 from internal.utils.graphics_utils import fov2focal
+from internal.viewer.streaming import AdaptiveStreamingController, ProgressiveRenderingController
+from internal.viewer.frame_encoder import FrameHandoff, can_send_encoded, send_frame
 
 
 class ClientThread(threading.Thread):
-    def __init__(self, viewer, renderer, client: viser.ClientHandle):
+    IDLE_SECONDS = 0.2
+    """The camera is considered stopped if it has not been updated for this long"""
+
+    STATS_UPDATE_INTERVAL = 0.5
+
+    def __init__(self, viewer, renderer, client: viser.ClientHandle, scheduler=None, frame_encoder=None):
+        """
+        Args:
+            scheduler: a `RenderScheduler` shared by the clients, this thread renders by itself if not provided
+            frame_encoder: a `FrameEncoder`, the frames are encoded by viser if not provided
+        """
+
         super().__init__()
         self.viewer = viewer
         self.renderer = renderer
         self.client = client
+        self.scheduler = scheduler
 
+        # set by the camera updates and the option changes, multiple updates during rendering result in a single frame of the latest pose
         self.render_trigger = threading.Event()
 
         self.last_move_time = 0
 
         self.last_camera = None  # store camera information
 
-        self.state = "low"  # low or high render resolution
+        self.state = "high"  # "low" if the last frame is not refined
 
         self.stop_client = False  # whether stop this thread
 
+        self.streaming_controller = AdaptiveStreamingController()
+        self.progressive_controller = ProgressiveRenderingController()
+        self.target_fps = 0.
+        # the number of the Gaussians rendered by the last frame, `None` if all of them
+        self.last_n_gaussians = None
+        self.frame_handoff = FrameHandoff(frame_encoder if can_send_encoded(client) else None)
+        self.stats_updated_at = 0.
+        with client.gui.add_folder("Stream"):
+            self.stats_markdown = client.gui.add_markdown("")
+
         if viewer.default_camera_position is not None:
             client.camera.position = np.asarray(viewer.default_camera_position)
         if viewer.default_camera_look_at is not None:
@@ -37,7 +64,7 @@ class ClientThread(threading.Thread):
         def _(cam: viser.CameraHandle) -> None:
             with self.client.atomic():
                 self.last_camera = cam
-                self.state = "low"  # switch to low resolution mode when a new camera received
+                self.streaming_controller.record_camera_update()
                 self.render_trigger.set()
 
     @classmethod
@@ -96,11 +123,15 @@ class ClientThread(threading.Thread):
 
         return camera
 
-    def render_and_send(self):
+    def render_and_send(self, max_res: int, jpeg_quality: int, is_moving: bool = True, n_gaussians: Optional[int] = None):
+        """
+        Args:
+            n_gaussians: render only the most important ones of the model ordered by importance, all of them if `None`
+        """
+
         with self.client.atomic():
             self.last_move_time = time.time()
 
-            max_res, jpeg_quality = self.get_render_options()
             camera = self.get_camera(
                 self.client.camera,
                 image_size=max_res,
@@ -109,40 +140,121 @@ class ClientThread(threading.Thread):
                 camera_transform=self.viewer.camera_transform,
             ).to_device(self.viewer.device)
 
+        kwargs = {"scaling_modifier": self.viewer.scaling_modifier.value}
+        if n_gaussians is not None:
+            kwargs["n_gaussians"] = n_gaussians
+
+        started_at = time.perf_counter()
         with torch.no_grad():
-            image = self.renderer.get_outputs(camera, scaling_modifier=self.viewer.scaling_modifier.value)
-            image = torch.clamp(image, max=1.)
-            image = torch.permute(image, (1, 2, 0))
-            self.client.set_background_image(
-                image.cpu().numpy(),
-                format=self.viewer.image_format,
-                jpeg_quality=jpeg_quality,
+            if self.scheduler is None:
+                image = self.renderer.get_outputs(camera, **kwargs)
+            else:
+                # the waiting time is included, so the resolution is lowered when the device is shared by more clients
+                image = self.scheduler.submit(
+                    self.client.client_id,
+                    camera,
+                    max_fps=self.target_fps if is_moving else 0.,
+                    **kwargs,
+                ).result()
+        rendered_at = time.perf_counter()
+        n_pixels = image.shape[1] * image.shape[2]
+        frame = self.frame_handoff(image, format=self.viewer.image_format, jpeg_quality=int(jpeg_quality))
+        with self.frame_handoff.timer.time("send"):
+            send_frame(self.client, frame, format=self.viewer.image_format, jpeg_quality=int(jpeg_quality))
+        sent_at = time.perf_counter()
+
+        self.streaming_controller.record_frame(
+            n_pixels,
+            render_seconds=rendered_at - started_at,
+            send_seconds=sent_at - rendered_at,
+            is_moving=is_moving,
+        )
+        if n_gaussians is not None:
+            self.progressive_controller.record_frame(
+                n_gaussians,
+                render_seconds=rendered_at - started_at,
+                send_seconds=sent_at - rendered_at,
+            )
+        self.last_n_gaussians = n_gaussians
+        self.update_stats()
+
+    def update_stats(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self.stats_updated_at < self.STATS_UPDATE_INTERVAL:
+            return
+        self.stats_updated_at = now
+
+        stats = self.streaming_controller.get_stats()
+        stage_ms = ", ".join(["{}: {:.1f}ms".format(k.capitalize(), 1000. / v) for k, v in self.frame_handoff.timer.get_fps().items()])
+        self.stats_markdown.content = "FPS: {:.1f}, Res: {}, JPEG: {}  \nRender: {:.1f}ms, Send: {:.1f}ms  \n{}  \nFrames: {}, Camera Updates: {}".format(
+            stats["fps"],
+            stats["res"],
+            stats["jpeg_quality"],
+            stats["render_ms"],
+            stats["send_ms"],
+            stage_ms,
+            stats["frames"],
+            stats["camera_updates"],
+        )
+        if self.is_progressive:
+            progressive_stats = self.progressive_controller.get_stats()
+            self.stats_markdown.content += "  \nGaussians when Moving: {} ({:.1%})".format(
+                progressive_stats["n_gaussians"],
+                progressive_stats["fraction"],
             )
 
+    @property
+    def is_progressive(self) -> bool:
+        progressive_checkbox = getattr(self.viewer, "progressive_checkbox", None)
+        return progressive_checkbox is not None and progressive_checkbox.value
+
+    def update_streaming_limits(self):
+        target_fps = getattr(self.viewer, "target_fps", None)
+        self.target_fps = 0. if target_fps is None else target_fps.value
+        # the number of Gaussians is adapted instead of the resolution in progressive mode
+        self.progressive_controller.target_fps = self.target_fps
+        self.streaming_controller.set_limits(
+            max_res_when_moving=self.viewer.max_res_when_moving.value,
+            max_jpeg_quality_when_moving=self.viewer.jpeg_quality_when_moving.value,
+            max_res_when_static=self.viewer.max_res_when_static.value,
+            jpeg_quality_when_static=self.viewer.jpeg_quality_when_static.value,
+            target_fps=0. if self.is_progressive else self.target_fps,
+        )
+
     def run(self):
         while True:
-            trigger_wait_return = self.render_trigger.wait(0.2)  # TODO: avoid wasting CPU
+            # block until triggered, or until the camera stops if the last frame is not refined
+            is_triggered = self.render_trigger.wait(None if self.state == "high" else self.IDLE_SECONDS)
             # stop client thread?
             if self.stop_client is True:
                 break
-            if not trigger_wait_return:
-                # skip if camera is none
-                if self.last_camera is None:
-                    continue
-
-                # if we haven't received a trigger in a while, switch to high resolution
-                if self.state == "low":
-                    self.state = "high"  # switch to high resolution mode
-                    # skip rendering if resolution not higher
-                    if self.viewer.max_res_when_moving.value >= self.viewer.max_res_when_static.value and self.viewer.jpeg_quality_when_moving.value >= self.viewer.jpeg_quality_when_static.value:
-                        continue
-                else:
-                    continue  # skip if already in high resolution mode
-
-            self.render_trigger.clear()
 
             try:
-                self.render_and_send()
+                self.update_streaming_limits()
+                if is_triggered:
+                    self.render_trigger.clear()
+                    self.state = "low"
+                    n_gaussians = None
+                    if self.is_progressive:
+                        n_gaussians = self.progressive_controller.get_n_gaussians(self.renderer.gaussian_model.n_gaussians)
+                    self.render_and_send(*self.streaming_controller.get_moving_options(), is_moving=True, n_gaussians=n_gaussians)
+                    continue
+
+                # the camera stopped, refine progressively unless it moves again
+                self.state = "high"
+                self.streaming_controller.record_idle()
+                refinement_options = self.streaming_controller.get_refinement_options()
+                if len(refinement_options) == 0 and self.last_n_gaussians is not None:
+                    # the last frame is not rendered with all the Gaussians
+                    refinement_options = [(self.streaming_controller.max_res_when_static, self.streaming_controller.jpeg_quality_when_static)]
+                for max_res, jpeg_quality in refinement_options:
+                    if self.render_trigger.is_set() or self.stop_client is True:
+                        break
+                    self.render_and_send(max_res, jpeg_quality, is_moving=False)
+                self.update_stats(force=True)
+            except CancelledError:
+                # disconnected
+                break
             except Exception as err:
                 print("error occurred when rendering for client")
                 traceback.print_exc()
@@ -150,14 +262,13 @@ class ClientThread(threading.Thread):
 
         self._destroy()
 
-    def get_render_options(self):
-        if self.state == "low":
-            return self.viewer.max_res_when_moving.value, int(self.viewer.jpeg_quality_when_moving.value)
-        return self.viewer.max_res_when_static.value, int(self.viewer.jpeg_quality_when_static.value)
+    def rerender(self):
+        self.render_trigger.set()
 
     def stop(self):
         self.stop_client = True
-        # self.render_trigger.set()  # TODO: potential thread leakage?
+        # wake up the thread
+        self.render_trigger.set()
 
     def _destroy(self):
         print("client thread #{} destroyed".format(self.client.client_id))
@@ -0,0 +1,191 @@
+"""
+Hand the rendered frames over to the viewer clients.
+
+A frame is converted to uint8 HWC on the device first, so only a quarter of the float32 one is transferred,
+into a pinned host buffer reused as long as the resolution is unchanged.
+Then it is encoded by a pluggable encoder, instead of by viser:
+    * `TorchvisionFrameEncoder`: `torchvision.io.encode_jpeg()`, on the device if supported, and `encode_png()`;
+    * `ProcessPoolFrameEncoder`: PIL in worker processes, off the GIL of the rendering and the server threads.
+The encoded bytes are sent to the client directly, through the viser internals of the pinned version,
+or decoded and passed to the public `set_background_image()` if they are unavailable.
+"""
+
+from typing import Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import io
+import multiprocessing
+import numpy as np
+import torch
+from internal.utils.frame_pipeline import StageTimer, to_uint8_image
+
+
+class FrameEncoder:
+    supports_device: bool = False
+    """Whether the CUDA tensors can be encoded without copying them to the host"""
+
+    def encode(self, image: torch.Tensor, format: str = "jpeg", jpeg_quality: int = 75) -> bytes:
+        """
+        Args:
+            image: [H, W, 3], uint8
+        """
+
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class TorchvisionFrameEncoder(FrameEncoder):
+    def __init__(self):
+        import torchvision.io
+
+        self.io = torchvision.io
+        self.supports_device = False
+        if torch.cuda.is_available():
+            try:
+                self.io.encode_jpeg(torch.zeros((3, 8, 8), dtype=torch.uint8, device="cuda"))
+                self.supports_device = True
+            except Exception:
+                pass
+
+    def encode(self, image: torch.Tensor, format: str = "jpeg", jpeg_quality: int = 75) -> bytes:
+        image = image.permute(2, 0, 1)
+        if format == "png" or (image.is_cuda and not self.supports_device):
+            image = image.cpu()
+        image = image.contiguous()
+
+        if format == "png":
+            data = self.io.encode_png(image)
+        else:
+            data = self.io.encode_jpeg(image, quality=int(jpeg_quality))
+        return data.cpu().numpy().tobytes()
+
+
+def encode_image_with_pil(image: np.ndarray, format: str = "jpeg", jpeg_quality: int = 75) -> bytes:
+    from PIL import Image
+
+    save_kwargs = {"format": format.upper()}
+    if format == "jpeg":
+        save_kwargs["quality"] = int(jpeg_quality)
+    with io.BytesIO() as f:
+        Image.fromarray(image).save(f, **save_kwargs)
+        return f.getvalue()
+
+
+class ProcessPoolFrameEncoder(FrameEncoder):
+    def __init__(self, n_workers: int = 2):
+        # forking a process with CUDA initialized is unsafe
+        self.pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def encode(self, image: torch.Tensor, format: str = "jpeg", jpeg_quality: int = 75) -> bytes:
+        return self.pool.submit(encode_image_with_pil, image.cpu().numpy(), format, jpeg_quality).result()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_frame_encoder(name: str = "auto") -> Optional[FrameEncoder]:
+    """
+    Args:
+        name: one of `auto`, `torchvision`, `process_pool` and `viser`, `None` is returned for `viser`
+    """
+
+    if name == "auto":
+        try:
+            return TorchvisionFrameEncoder()
+        except ImportError:
+            return None
+    if name == "torchvision":
+        return TorchvisionFrameEncoder()
+    if name == "process_pool":
+        return ProcessPoolFrameEncoder()
+    if name == "viser":
+        return None
+    raise ValueError("unknown frame encoder `{}`".format(name))
+
+
+def decode_image_with_pil(data: bytes) -> np.ndarray:
+    from PIL import Image
+
+    with io.BytesIO(data) as f:
+        return np.asarray(Image.open(f).convert("RGB"))
+
+
+def get_background_image_message_type():
+    """
+    Returns:
+        the private viser message class, `None` if unavailable in the installed version
+    """
+
+    try:
+        from viser import _messages
+    except ImportError:
+        return None
+    return getattr(_messages, "BackgroundImageMessage", None)
+
+
+def can_send_encoded(client) -> bool:
+    return hasattr(getattr(client, "scene", None), "_websock_interface") and get_background_image_message_type() is not None
+
+
+def send_frame(client, frame: Union[bytes, np.ndarray], format: str = "jpeg", jpeg_quality: int = 75):
+    """
+    Args:
+        frame: the encoded bytes, or an uint8 array encoded by viser
+    """
+
+    if not isinstance(frame, np.ndarray) and not can_send_encoded(client):
+        frame = decode_image_with_pil(frame)
+
+    if isinstance(frame, np.ndarray):
+        client.scene.set_background_image(frame, format=format, jpeg_quality=jpeg_quality)
+        return
+
+    client.scene._websock_interface.queue_message(get_background_image_message_type()(
+        media_type="image/{}".format(format),
+        base64_rgb=base64.b64encode(frame).decode("ascii"),
+        base64_depth=None,
+    ))
+
+
+class FrameHandoff:
+    def __init__(self, encoder: Optional[FrameEncoder] = None):
+        """
+        Args:
+            encoder: the frames are passed to viser as uint8 arrays if `None`
+        """
+
+        self.encoder = encoder
+        self.host_buffer: Optional[torch.Tensor] = None
+        self.timer = StageTimer()
+
+    def _get_host_buffer(self, image: torch.Tensor) -> torch.Tensor:
+        if self.host_buffer is None or self.host_buffer.shape != image.shape:
+            self.host_buffer = torch.empty(image.shape, dtype=torch.uint8, pin_memory=image.is_cuda)
+        return self.host_buffer
+
+    def __call__(self, image: torch.Tensor, format: str = "jpeg", jpeg_quality: int = 75) -> Union[bytes, np.ndarray]:
+        """
+        Args:
+            image: [3, H, W], float, in [0, 1], on any device
+
+        Returns:
+            the encoded bytes, or an uint8 array if no encoder, which is valid until the next call
+        """
+
+        with self.timer.time("convert"):
+            image = to_uint8_image(image)
+
+        if self.encoder is not None and self.encoder.supports_device and image.is_cuda and format == "jpeg":
+            with self.timer.time("encode"):
+                return self.encoder.encode(image, format, jpeg_quality)
+
+        with self.timer.time("copy"):
+            host_buffer = self._get_host_buffer(image)
+            host_buffer.copy_(image)
+
+        if self.encoder is None:
+            return host_buffer.numpy()
+        with self.timer.time("encode"):
+            return self.encoder.encode(host_buffer, format, jpeg_quality)
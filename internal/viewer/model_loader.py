@@ -0,0 +1,225 @@
+"""
+Load the models in the background, so the viewer is served while loading, then swap them in once loaded.
+
+    * `BackgroundModelLoader` runs the loading jobs one at a time on a worker thread,
+      a job submitted while another one is waiting replaces it, so only the latest checkpoint is loaded,
+      the progress is reported with the elapsed time refreshed periodically;
+    * `CheckpointWatcher` polls a model output directory with the `GaussianModelLoader.search_load_file()` semantics,
+      a new checkpoint is reported once its size and modification time are unchanged between two polls,
+      so a file still being written is not loaded.
+"""
+
+from typing import Any, Callable, Optional, Tuple
+import os
+import threading
+import time
+import traceback
+from internal.utils.gaussian_model_loader import GaussianModelLoader
+
+
+class BackgroundModelLoader:
+    def __init__(
+            self,
+            on_status: Optional[Callable[[str], None]] = None,
+            status_interval: float = 1.,
+    ):
+        """
+        Args:
+            on_status: called with the progress, from the loading threads
+            status_interval: in seconds, the interval of refreshing the elapsed time
+        """
+
+        self.on_status = on_status
+        self.status_interval = status_interval
+
+        self.condition = threading.Condition()
+        self.pending: Optional[Tuple[str, Callable[[], Any], Callable[[Any], None]]] = None
+        self.current: Optional[str] = None
+        self.is_stopped = False
+
+        self.stats = {
+            "loaded": 0,
+            "failed": 0,
+            "replaced": 0,
+        }
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, description: str, load_fn: Callable[[], Any], on_loaded: Callable[[Any], None]):
+        """
+        Call `on_loaded(load_fn())` on the worker thread.
+        The current job is not interrupted, but a waiting one is replaced.
+        """
+
+        with self.condition:
+            if self.is_stopped:
+                raise RuntimeError("model loader stopped")
+            if self.pending is not None:
+                self.stats["replaced"] += 1
+            self.pending = (description, load_fn, on_loaded)
+            self.condition.notify_all()
+
+    @property
+    def is_busy(self) -> bool:
+        with self.condition:
+            return self.pending is not None or self.current is not None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until all the submitted jobs are done
+
+        Returns:
+            `False` on timeout
+        """
+
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending is None and self.current is None, timeout)
+
+    def stop(self):
+        with self.condition:
+            self.is_stopped = True
+            self.pending = None
+            self.condition.notify_all()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def _set_status(self, status: str):
+        if self.on_status is None:
+            return
+        try:
+            self.on_status(status)
+        except Exception:
+            traceback.print_exc()
+
+    def _report_progress(self, description: str, started_at: float, done: threading.Event):
+        while not done.wait(self.status_interval):
+            self._set_status("Loading `{}`... {:.0f}s".format(description, time.perf_counter() - started_at))
+
+    def _run_job(self, description: str, load_fn: Callable[[], Any], on_loaded: Callable[[Any], None]):
+        print("loading {}...".format(description))
+        started_at = time.perf_counter()
+        self._set_status("Loading `{}`...".format(description))
+
+        done = threading.Event()
+        progress_thread = threading.Thread(target=self._report_progress, args=(description, started_at, done), daemon=True)
+        progress_thread.start()
+        try:
+            on_loaded(load_fn())
+        except Exception as e:
+            traceback.print_exc()
+            with self.condition:
+                self.stats["failed"] += 1
+            status = "Failed to load `{}`: {}".format(description, e)
+        else:
+            with self.condition:
+                self.stats["loaded"] += 1
+            status = "Loaded `{}` in {:.1f}s".format(description, time.perf_counter() - started_at)
+        finally:
+            done.set()
+            progress_thread.join()
+        print(status)
+        self._set_status(status)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.is_stopped:
+                    self.condition.wait()
+                if self.is_stopped:
+                    break
+                job = self.pending
+                self.pending = None
+                self.current = job[0]
+
+            try:
+                self._run_job(*job)
+            finally:
+                with self.condition:
+                    self.current = None
+                    self.condition.notify_all()
+
+
+class CheckpointWatcher:
+    def __init__(
+            self,
+            model_path: str,
+            on_new_checkpoint: Callable[[str], None],
+            interval: float = 10.,
+            loaded_from: Optional[str] = None,
+    ):
+        """
+        Args:
+            model_path: a model output directory, or a checkpoint file overwritten in-place
+            on_new_checkpoint: called with the path of the new checkpoint, from the watching thread
+            loaded_from: the checkpoint already loaded, not reported unless modified
+        """
+
+        self.model_path = model_path
+        self.on_new_checkpoint = on_new_checkpoint
+        self.interval = interval
+
+        self.loaded_signature = self._get_signature(loaded_from) if loaded_from is not None else None
+        self.candidate_signature = None
+
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _get_signature(path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return path, stat.st_size, stat.st_mtime_ns
+
+    def _search(self) -> Optional[str]:
+        try:
+            return GaussianModelLoader.search_load_file(self.model_path)
+        except AssertionError:
+            # nothing saved yet
+            return None
+
+    def poll(self) -> Optional[str]:
+        """
+        Returns:
+            the path of the new checkpoint, `None` if no such one, or it is still being written
+        """
+
+        load_from = self._search()
+        if load_from is None:
+            return None
+        signature = self._get_signature(load_from)
+        if signature is None or signature == self.loaded_signature:
+            self.candidate_signature = None
+            return None
+
+        if signature != self.candidate_signature:
+            # wait for the next poll, it may still be being written
+            self.candidate_signature = signature
+            return None
+
+        self.loaded_signature = signature
+        self.candidate_signature = None
+        return load_from
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                load_from = self.poll()
+                if load_from is not None:
+                    print("new checkpoint {} found".format(load_from))
+                    self.on_new_checkpoint(load_from)
+            except Exception:
+                traceback.print_exc()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None and threading.current_thread() is not self.thread:
+            self.thread.join()
@@ -1,7 +1,9 @@
-from typing import Tuple
+from typing import Tuple, Optional
+import threading
 import torch
 import internal.renderers as renderers
 from internal.utils.visualizers import Visualizers
+from internal.utils.render_cache import RenderCache
 
 
 class ViewerRenderer:
@@ -10,12 +12,17 @@ class ViewerRenderer:
             gaussian_model,
             renderer: renderers.Renderer,
             background_color,
+            render_cache: Optional[RenderCache] = None,
     ):
         super().__init__()
 
         self.gaussian_model = gaussian_model
         self.renderer = renderer
         self.background_color = background_color
+        self.render_cache = render_cache
+        self.render_cache_label = None
+        # held while rendering, so the model is not swapped in the middle of a frame
+        self.model_lock = threading.Lock()
 
         # TODO: initial value should get from renderer
         self.output_info: Tuple[str, renderers.RendererOutputInfo, renderers.RendererOutputVisualizer] = (
@@ -115,19 +122,116 @@ class ViewerRenderer:
 
             self._setup_depth_map_options(viewer, server)
 
+            if self.render_cache is not None:
+                self.render_cache_label = server.gui.add_markdown(content="")
+                self._update_render_cache_label()
+
         # update default output type to the first one, must be placed after gui setup
         self._set_output_type(name=first_type_name, renderer_output_info=available_outputs[first_type_name])
 
-    def get_outputs(self, camera, scaling_modifier: float = 1.):
+    def swap_model(self, gaussian_model, renderer=None):
+        """
+        Replace the model, and the renderer if provided, between two frames.
+        The states of a renderer of the same type are loaded into the current one,
+        so the options bound to it in the web UI are kept.
+
+        Returns:
+            the replaced model and renderer, released once the caller drops them
+        """
+
+        with self.model_lock:
+            previous = self.gaussian_model, self.renderer
+            self.gaussian_model = gaussian_model
+            if renderer is not None:
+                self.renderer = self._get_swapped_renderer(renderer)
+        self.clear_render_cache()
+        return previous
+
+    def _get_swapped_renderer(self, renderer):
+        if type(renderer) is not type(self.renderer) or not isinstance(renderer, torch.nn.Module):
+            if type(renderer) is not type(self.renderer):
+                print("[WARNING] renderer changed from {} to {}, its options in the web UI are not updated".format(
+                    self.renderer.__class__.__name__,
+                    renderer.__class__.__name__,
+                ))
+            return renderer
+        try:
+            self.renderer.load_state_dict(renderer.state_dict())
+        except RuntimeError:
+            return renderer
+        return self.renderer
+
+    def get_outputs(self, camera, scaling_modifier: float = 1., n_gaussians: Optional[int] = None):
+        """
+        Args:
+            n_gaussians: render only the first `n_gaussians` ones of the model, all of them if `None`
+        """
+
+        with self.model_lock:
+            return self._get_outputs(camera, scaling_modifier, n_gaussians)
+
+    def _get_model(self, n_gaussians: Optional[int]):
+        if n_gaussians is None:
+            return self.gaussian_model
+        return self.gaussian_model.get_prefix_view(n_gaussians)
+
+    def _get_outputs(self, camera, scaling_modifier: float = 1., n_gaussians: Optional[int] = None):
         render_type, output_info, output_processor = self.output_info
 
-        render_outputs = self.renderer(
-            camera,
-            self.gaussian_model,
-            self.background_color,
-            scaling_modifier=scaling_modifier,
-            render_types=[render_type],
+        # the prefix views are short-lived, not cached
+        if self.render_cache is None or n_gaussians is not None:
+            render_outputs = self.renderer(
+                camera,
+                self._get_model(n_gaussians),
+                self.background_color,
+                scaling_modifier=scaling_modifier,
+                render_types=[render_type],
+            )
+        else:
+            render_outputs = self.render_cache.render(
+                self.renderer,
+                camera,
+                self.gaussian_model,
+                self.background_color,
+                scaling_modifier=scaling_modifier,
+                render_types=[render_type],
+            )
+            self._update_render_cache_label()
+        return self._process_outputs(render_outputs)
+
+    def clear_render_cache(self):
+        """
+        Required when the outputs are changed by the states not covered by the cache key, e.g. the renderer options
+        """
+
+        if self.render_cache is not None:
+            self.render_cache.clear()
+
+    def _update_render_cache_label(self):
+        if self.render_cache_label is None:
+            return
+        metrics = self.render_cache.get_metrics()
+        self.render_cache_label.content = "Cache: hit rate={:.1%}, {} entries, {:.1f}MB".format(
+            metrics["hit_rate"],
+            metrics["entries"],
+            metrics["memory_mb"],
         )
+
+    def get_batch_outputs(self, cameras, scaling_modifier: float = 1., n_gaussians: Optional[int] = None):
+        render_type = self.output_info[0]
+
+        with self.model_lock:
+            return [self._process_outputs(i) for i in self.renderer.batch_forward(
+                cameras,
+                self._get_model(n_gaussians),
+                self.background_color,
+                scaling_modifier=scaling_modifier,
+                render_types=[render_type],
+            )]
+
+    def _process_outputs(self, render_outputs):
+        _, output_info, output_processor = self.output_info
+
         image = output_processor(render_outputs[output_info.key], render_outputs, output_info)
         if image.shape[0] == 1:
             image = image.repeat(3, 1, 1)
@@ -0,0 +1,217 @@
+"""
+A render scheduler shared by all the viewer clients.
+
+The client threads submit the camera of their latest pose and wait for the image, so they only encode and send the frames,
+while a single worker renders for all of them:
+    * a client has at most one pending request, a newer one replaces the camera of the pending one;
+    * the clients are served in the order of their last served time, so each of them gets a fair share of the device;
+    * a client is not served again until its minimum frame interval has elapsed, so the faster clients do not starve the others;
+    * the requests with an identical camera are rendered once;
+    * the requests with the same image size are rendered together by `ViewerRenderer.get_batch_outputs()`;
+    * a request may render only the most important Gaussians, i.e. a prefix of the ordered model, while the camera is moving.
+"""
+
+from typing import Any, Dict, Hashable, List, Optional
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import threading
+import time
+import traceback
+import torch
+from internal.utils.render_cache import RenderCache
+
+
+@dataclass
+class RenderRequest:
+    client_id: Hashable
+    camera: Any
+    scaling_modifier: float
+    min_interval: float
+    key: Hashable
+    n_gaussians: Optional[int] = None
+    future: Future = field(default_factory=Future)
+
+
+class RenderScheduler:
+    def __init__(self, viewer_renderer, max_batch_size: int = 4):
+        self.viewer_renderer = viewer_renderer
+        self.max_batch_size = max_batch_size
+
+        self.condition = threading.Condition()
+        self.pending: Dict[Hashable, RenderRequest] = {}
+        self.last_served_at: Dict[Hashable, float] = {}
+        self.is_stopped = False
+
+        self.stats = {
+            "requests": 0,
+            "replaced": 0,
+            "renders": 0,
+            "batches": 0,
+            "deduplicated": 0,
+        }
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def get_request_key(camera, scaling_modifier: float, n_gaussians: Optional[int] = None) -> Hashable:
+        return RenderCache.get_camera_key(camera), float(scaling_modifier), n_gaussians
+
+    def submit(
+            self,
+            client_id: Hashable,
+            camera,
+            scaling_modifier: float = 1.,
+            max_fps: float = 0.,
+            n_gaussians: Optional[int] = None,
+    ) -> Future:
+        """
+        Args:
+            max_fps: the frame rate limit of this client, `<= 0` means unlimited
+            n_gaussians: render only the first `n_gaussians` ones of the model, all of them if `None`
+
+        Returns:
+            a future of the image, [3, H, W], on the rendering device
+        """
+
+        key = self.get_request_key(camera, scaling_modifier, n_gaussians)
+        min_interval = 1. / max_fps if max_fps > 0 else 0.
+        with self.condition:
+            if self.is_stopped:
+                raise RuntimeError("render scheduler stopped")
+            self.stats["requests"] += 1
+
+            request = self.pending.get(client_id, None)
+            if request is not None and not request.future.cancelled():
+                # the pending requests have not been started, so only the latest pose is rendered
+                request.camera, request.scaling_modifier, request.min_interval, request.key = camera, scaling_modifier, min_interval, key
+                request.n_gaussians = n_gaussians
+                self.stats["replaced"] += 1
+            else:
+                request = RenderRequest(client_id, camera, scaling_modifier, min_interval, key, n_gaussians)
+                self.pending[client_id] = request
+            self.condition.notify()
+            return request.future
+
+    def remove_client(self, client_id: Hashable):
+        with self.condition:
+            request = self.pending.pop(client_id, None)
+            self.last_served_at.pop(client_id, None)
+        if request is not None:
+            request.future.cancel()
+
+    def stop(self):
+        with self.condition:
+            self.is_stopped = True
+            requests = list(self.pending.values())
+            self.pending.clear()
+            self.condition.notify_all()
+        for request in requests:
+            request.future.cancel()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def _get_ready_at(self, request: RenderRequest) -> float:
+        last_served_at = self.last_served_at.get(request.client_id, None)
+        if last_served_at is None:
+            return 0.
+        return last_served_at + request.min_interval
+
+    def _pop_batch(self) -> Optional[List[RenderRequest]]:
+        """
+        Block until some requests are ready, then pop the most starved one and the compatible ones
+
+        Returns:
+            None if stopped
+        """
+
+        with self.condition:
+            while True:
+                if self.is_stopped:
+                    return None
+
+                now = time.perf_counter()
+                ready = [i for i in self.pending.values() if self._get_ready_at(i) <= now]
+                if len(ready) > 0:
+                    break
+
+                timeout = None
+                if len(self.pending) > 0:
+                    timeout = min(self._get_ready_at(i) for i in self.pending.values()) - now
+                self.condition.wait(timeout)
+
+            ready.sort(key=lambda i: self.last_served_at.get(i.client_id, -1.))
+            image_size = self._get_image_size(ready[0])
+            batch = [
+                i for i in ready
+                if self._get_image_size(i) == image_size
+                and i.scaling_modifier == ready[0].scaling_modifier
+                and i.n_gaussians == ready[0].n_gaussians
+            ]
+            # the identical requests are not counted in the batch size
+            n_unique = 0
+            keys = set()
+            selected = []
+            for request in batch:
+                if request.key not in keys:
+                    if n_unique >= self.max_batch_size:
+                        continue
+                    keys.add(request.key)
+                    n_unique += 1
+                selected.append(request)
+
+            for request in selected:
+                del self.pending[request.client_id]
+                self.last_served_at[request.client_id] = now
+            # no more replacements
+            return [i for i in selected if i.future.set_running_or_notify_cancel()]
+
+    @staticmethod
+    def _get_image_size(request: RenderRequest):
+        return int(request.camera.width), int(request.camera.height)
+
+    def _render(self, requests: List[RenderRequest]):
+        unique_requests: Dict[Hashable, RenderRequest] = {}
+        for request in requests:
+            unique_requests.setdefault(request.key, request)
+        cameras = [i.camera for i in unique_requests.values()]
+        kwargs = {"scaling_modifier": requests[0].scaling_modifier}
+        if requests[0].n_gaussians is not None:
+            kwargs["n_gaussians"] = requests[0].n_gaussians
+
+        with torch.no_grad():
+            if len(cameras) == 1:
+                # the render cache is only used by the single camera path
+                images = [self.viewer_renderer.get_outputs(cameras[0], **kwargs)]
+            else:
+                images = self.viewer_renderer.get_batch_outputs(cameras, **kwargs)
+        images = dict(zip(unique_requests.keys(), images))
+
+        with self.condition:
+            self.stats["renders"] += len(cameras)
+            self.stats["batches"] += 1
+            self.stats["deduplicated"] += len(requests) - len(cameras)
+        for request in requests:
+            request.future.set_result(images[request.key])
+
+    def _run(self):
+        while True:
+            requests = self._pop_batch()
+            if requests is None:
+                break
+            if len(requests) == 0:
+                continue
+            try:
+                self._render(requests)
+            except Exception as e:
+                traceback.print_exc()
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.condition:
+            return {
+                **self.stats,
+                "pending": len(self.pending),
+            }
@@ -0,0 +1,148 @@
+"""
+A double-buffered read-only copy of a Gaussian model, for rendering a model being trained from another thread.
+
+The training thread publishes the model into the back buffer, then swaps the buffers,
+while the renderer reads the front one, so neither of them waits for the other:
+    * the parameters and the buffers are copied in-place on the training stream,
+      the copy is a device-to-device one, queued without blocking the training thread;
+    * the buffer is deep copied only when its structure changes, e.g. after densification;
+    * a publishing is skipped if the back buffer is still being rendered;
+    * the renderer waits for the copy on its own stream.
+"""
+
+from typing import Optional
+import contextlib
+import copy
+import itertools
+import threading
+import torch
+
+
+class ModelSnapshot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buffers = [None, None]
+        self.ready_events = [None, None]
+        self.n_readers = [0, 0]
+        self.front = -1
+        self.step = -1
+
+        self.n_published = 0
+        self.n_skipped = 0
+
+    @property
+    def is_available(self) -> bool:
+        return self.front >= 0
+
+    @staticmethod
+    def _get_tensors(model):
+        return list(itertools.chain(model.parameters(), model.buffers()))
+
+    @classmethod
+    def _is_copyable(cls, dst, src) -> bool:
+        if dst is None or type(dst) is not type(src):
+            return False
+        dst_tensors, src_tensors = cls._get_tensors(dst), cls._get_tensors(src)
+        if len(dst_tensors) != len(src_tensors):
+            return False
+        for d, s in zip(dst_tensors, src_tensors):
+            if d.shape != s.shape or d.dtype != s.dtype or d.device != s.device:
+                return False
+        return True
+
+    @classmethod
+    def _clone(cls, model):
+        snapshot = copy.deepcopy(model)
+        for i in snapshot.parameters():
+            i.grad = None
+            i.requires_grad_(False)
+        return snapshot.eval()
+
+    @torch.no_grad()
+    def publish(self, model, step: int = -1) -> bool:
+        """
+        Returns:
+            whether published, `False` if the back buffer is in use
+        """
+
+        with self.lock:
+            back = 1 - self.front if self.front >= 0 else 0
+            if self.n_readers[back] > 0:
+                self.n_skipped += 1
+                return False
+
+        dst = self.buffers[back]
+        if self._is_copyable(dst, model):
+            for d, s in zip(self._get_tensors(dst), self._get_tensors(model)):
+                d.copy_(s, non_blocking=True)
+        else:
+            dst = self._clone(model)
+
+        event = None
+        device = self._get_device(dst)
+        if device.type == "cuda":
+            event = torch.cuda.Event()
+            event.record(torch.cuda.current_stream(device))
+
+        with self.lock:
+            self.buffers[back] = dst
+            self.ready_events[back] = event
+            self.front = back
+            self.step = step
+            self.n_published += 1
+        return True
+
+    @staticmethod
+    def _get_device(model) -> torch.device:
+        tensor = next(itertools.chain(model.parameters(), model.buffers()), None)
+        return torch.device("cpu") if tensor is None else tensor.device
+
+    def acquire(self):
+        """
+        Returns:
+            the index of the front buffer, and the model in it, must be released after use
+        """
+
+        with self.lock:
+            if self.front < 0:
+                raise RuntimeError("no snapshot is published")
+            idx = self.front
+            self.n_readers[idx] += 1
+            model, event = self.buffers[idx], self.ready_events[idx]
+
+        if event is not None:
+            # make the current stream wait for the copy, without blocking the host
+            torch.cuda.current_stream().wait_event(event)
+        return idx, model
+
+    def release(self, idx: int):
+        with self.lock:
+            self.n_readers[idx] -= 1
+
+    def render(self, render_fn, render_stream: Optional[torch.cuda.Stream] = None):
+        """
+        Call `render_fn(model)` with the front buffer.
+        The outputs are ready to be read from any stream on return.
+        """
+
+        stream_context = torch.cuda.stream(render_stream) if render_stream is not None else contextlib.nullcontext()
+        idx = None
+        try:
+            with torch.no_grad(), stream_context:
+                idx, model = self.acquire()
+                outputs = render_fn(model)
+            if render_stream is not None:
+                # the back buffer may be overwritten once released
+                render_stream.synchronize()
+        finally:
+            if idx is not None:
+                self.release(idx)
+        return outputs
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "step": self.step,
+                "published": self.n_published,
+                "skipped": self.n_skipped,
+            }
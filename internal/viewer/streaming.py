@@ -0,0 +1,271 @@
+"""
+Pick the resolution and the JPEG quality of the frames streamed to a viewer client.
+
+While the camera is moving, the frames are rendered at the resolution predicted to hit the target frame rate,
+from the measured seconds per pixel of rendering, encoding and sending.
+The JPEG quality is lowered only if the minimum resolution still misses the target,
+and raised back when there is enough headroom.
+Once the camera stops, the frame is refined progressively up to the static resolution and quality.
+
+With a model ordered by importance, the number of Gaussians can be adapted instead of the resolution:
+only the most important ones, a prefix of the model, are rendered while moving,
+as many as predicted to fit the frame time left by sending, then all of them once the camera stops.
+"""
+
+import math
+import time
+from typing import List, Tuple, Dict, Optional
+
+
+class AdaptiveStreamingController:
+    def __init__(
+            self,
+            target_fps: float = 24.,
+            min_res: int = 128,
+            min_jpeg_quality: int = 30,
+            res_step: int = 32,
+            jpeg_quality_step: int = 10,
+            smoothing: float = 0.3,
+            n_refinement_steps: int = 2,
+    ):
+        """
+        Args:
+            target_fps: `<= 0` disables the adaptation, the maximum resolution and quality when moving are used
+            res_step: the resolution is a multiple of it, to avoid changing it on every frame
+            smoothing: the weight of the latest measurement in the moving average
+            n_refinement_steps: the number of frames rendered after the camera stops, the last one is in the static resolution
+        """
+
+        self.target_fps = target_fps
+        self.min_res = min_res
+        self.min_jpeg_quality = min_jpeg_quality
+        self.res_step = res_step
+        self.jpeg_quality_step = jpeg_quality_step
+        self.smoothing = smoothing
+        self.n_refinement_steps = n_refinement_steps
+
+        # updated from the GUI
+        self.max_res_when_moving = 1280
+        self.max_jpeg_quality_when_moving = 60
+        self.max_res_when_static = 1920
+        self.jpeg_quality_when_static = 100
+
+        self.res = None
+        self.jpeg_quality = None
+
+        # moving averages
+        self.seconds_per_pixel = None
+        self.render_seconds = 0.
+        self.send_seconds = 0.
+        self.frame_interval = None
+        self.last_frame_at = None
+
+        self.n_frames = 0
+        self.n_camera_updates = 0
+
+    def set_limits(
+            self,
+            max_res_when_moving: int,
+            max_jpeg_quality_when_moving: int,
+            max_res_when_static: int,
+            jpeg_quality_when_static: int,
+            target_fps: float,
+    ):
+        self.max_res_when_moving = int(max_res_when_moving)
+        self.max_jpeg_quality_when_moving = int(max_jpeg_quality_when_moving)
+        self.max_res_when_static = int(max_res_when_static)
+        self.jpeg_quality_when_static = int(jpeg_quality_when_static)
+        self.target_fps = target_fps
+
+    @property
+    def is_adaptive(self) -> bool:
+        return self.target_fps > 0
+
+    def _moving_average(self, previous, value):
+        if previous is None:
+            return value
+        return (1. - self.smoothing) * previous + self.smoothing * value
+
+    def _quantize_res(self, res: float, max_res: int) -> int:
+        res = int(res) // self.res_step * self.res_step
+        return max(min(res, max_res), min(self.min_res, max_res))
+
+    def get_moving_options(self) -> Tuple[int, int]:
+        """
+        Returns:
+            the max resolution and the JPEG quality for the next frame while the camera is moving
+        """
+
+        if not self.is_adaptive:
+            return self.max_res_when_moving, self.max_jpeg_quality_when_moving
+        if self.res is None:
+            # start from the best, then adapt
+            self.res, self.jpeg_quality = self.max_res_when_moving, self.max_jpeg_quality_when_moving
+        return min(self.res, self.max_res_when_moving), min(self.jpeg_quality, self.max_jpeg_quality_when_moving)
+
+    def get_refinement_options(self) -> List[Tuple[int, int]]:
+        """
+        Returns:
+            the resolutions and JPEG qualities of the frames rendered progressively after the camera stops,
+            from the coarse to the fine one, empty if the last moving frame is already as good as the static one
+        """
+
+        moving_res, moving_jpeg_quality = self.get_moving_options()
+        if moving_res >= self.max_res_when_static and moving_jpeg_quality >= self.jpeg_quality_when_static:
+            return []
+
+        steps = []
+        n_steps = max(self.n_refinement_steps, 1)
+        for i in range(1, n_steps + 1):
+            # geometric in the number of pixels
+            ratio = i / n_steps
+            res = moving_res * math.pow(self.max_res_when_static / max(moving_res, 1), ratio)
+            jpeg_quality = moving_jpeg_quality + (self.jpeg_quality_when_static - moving_jpeg_quality) * ratio
+            if i == n_steps:
+                res, jpeg_quality = self.max_res_when_static, self.jpeg_quality_when_static
+            option = (self._quantize_res(res, self.max_res_when_static), int(round(jpeg_quality)))
+            if len(steps) == 0 or option != steps[-1]:
+                steps.append(option)
+        return steps
+
+    def record_camera_update(self):
+        self.n_camera_updates += 1
+
+    def record_idle(self):
+        # the pause is not a frame interval
+        self.last_frame_at = None
+
+    def record_frame(self, n_pixels: int, render_seconds: float, send_seconds: float, is_moving: bool = True):
+        """
+        Update the measurements, then adjust the options of the next moving frame
+        """
+
+        now = time.perf_counter()
+        if self.last_frame_at is not None and is_moving:
+            self.frame_interval = self._moving_average(self.frame_interval, now - self.last_frame_at)
+        self.last_frame_at = now if is_moving else None
+
+        self.n_frames += 1
+        self.render_seconds = self._moving_average(self.render_seconds, render_seconds)
+        self.send_seconds = self._moving_average(self.send_seconds, send_seconds)
+        self.seconds_per_pixel = self._moving_average(self.seconds_per_pixel, (render_seconds + send_seconds) / max(n_pixels, 1))
+
+        if not self.is_adaptive or not is_moving:
+            return
+
+        budget = 1. / self.target_fps
+        res, jpeg_quality = self.get_moving_options()
+        # `res` is the longer side, assuming the aspect ratio is unchanged
+        aspect_factor = max(res * res / max(n_pixels, 1), 1.)
+        predicted_res = math.sqrt(budget / self.seconds_per_pixel * aspect_factor)
+        new_res = self._quantize_res(predicted_res, self.max_res_when_moving)
+
+        # hysteresis
+        if abs(new_res - res) >= max(self.res_step, 0.1 * res):
+            self.res = new_res
+
+        # adjust the quality at the bounds of the resolution
+        predicted_seconds = self.seconds_per_pixel * n_pixels
+        if self.res <= self.min_res and predicted_seconds > budget:
+            self.jpeg_quality = max(jpeg_quality - self.jpeg_quality_step, self.min_jpeg_quality)
+        elif self.res >= self.max_res_when_moving and predicted_seconds < 0.7 * budget:
+            self.jpeg_quality = min(jpeg_quality + self.jpeg_quality_step, self.max_jpeg_quality_when_moving)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "fps": 0. if self.frame_interval is None else 1. / max(self.frame_interval, 1e-6),
+            "render_ms": self.render_seconds * 1000,
+            "send_ms": self.send_seconds * 1000,
+            "res": self.get_moving_options()[0],
+            "jpeg_quality": self.get_moving_options()[1],
+            "frames": self.n_frames,
+            "camera_updates": self.n_camera_updates,
+        }
+
+
+class ProgressiveRenderingController:
+    def __init__(
+            self,
+            target_fps: float = 24.,
+            min_n_gaussians: int = 1024,
+            initial_fraction: float = 0.1,
+            max_growth: float = 2.,
+            hysteresis: float = 0.05,
+            smoothing: float = 0.3,
+    ):
+        """
+        Args:
+            target_fps: `<= 0` disables the adaptation, all the Gaussians are rendered
+            initial_fraction: the fraction of the Gaussians rendered by the first moving frame
+            max_growth: the maximum ratio of the increase between two frames, so a single fast frame does not cause a slow one
+            hysteresis: the relative change below which the number is kept, to avoid flickering
+            smoothing: the weight of the latest measurement in the moving average
+        """
+
+        self.target_fps = target_fps
+        self.min_n_gaussians = min_n_gaussians
+        self.initial_fraction = initial_fraction
+        self.max_growth = max_growth
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+
+        self.n_gaussians: Optional[int] = None
+        self.n_total: Optional[int] = None
+
+        # moving averages
+        self.render_seconds = 0.
+        self.send_seconds = None
+
+    @property
+    def is_adaptive(self) -> bool:
+        return self.target_fps > 0
+
+    def _moving_average(self, previous, value):
+        if previous is None:
+            return value
+        return (1. - self.smoothing) * previous + self.smoothing * value
+
+    def _clamp(self, n: float) -> int:
+        return int(max(min(n, self.n_total), min(self.min_n_gaussians, self.n_total)))
+
+    def get_n_gaussians(self, n_total: int) -> int:
+        """
+        Returns:
+            the number of the most important Gaussians rendered by the next moving frame
+        """
+
+        if n_total != self.n_total:
+            # the model is replaced, start over
+            self.n_total = n_total
+            self.n_gaussians = None
+        if not self.is_adaptive:
+            return n_total
+        if self.n_gaussians is None:
+            self.n_gaussians = self._clamp(n_total * self.initial_fraction)
+        return self.n_gaussians
+
+    def record_frame(self, n_gaussians: int, render_seconds: float, send_seconds: float):
+        """
+        Update the measurements, then adjust the number of the next moving frame
+        """
+
+        self.render_seconds = self._moving_average(self.render_seconds, render_seconds)
+        self.send_seconds = self._moving_average(self.send_seconds, send_seconds)
+        if not self.is_adaptive or self.n_total is None or self.n_gaussians is None:
+            return
+
+        # the sending is not affected by the number of Gaussians, but at least a quarter of the frame time is left for rendering
+        frame_seconds = 1. / self.target_fps
+        budget = max(frame_seconds - self.send_seconds, 0.25 * frame_seconds)
+        # proportional to the latest frame, it converges to the one fits the budget even with a fixed overhead
+        predicted = n_gaussians * budget / max(render_seconds, 1e-6)
+        new_n_gaussians = self._clamp(min(predicted, n_gaussians * self.max_growth))
+
+        if abs(new_n_gaussians - self.n_gaussians) >= self.hysteresis * self.n_gaussians:
+            self.n_gaussians = new_n_gaussians
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "n_gaussians": 0 if self.n_gaussians is None else self.n_gaussians,
+            "fraction": 0. if not self.n_total or self.n_gaussians is None else self.n_gaussians / self.n_total,
+        }
@@ -1,14 +1,14 @@
-import queue
-import traceback
+import threading
 
 import numpy as np
 import torch
 import viser
 
 import viser.transforms as vtf
-from queue import Queue
 
 from internal.viewer.viewer import Viewer
+from internal.viewer.snapshot import ModelSnapshot
+from internal.viewer.frame_encoder import get_frame_encoder
 from internal.cameras.cameras import Cameras
 
 
@@ -18,20 +18,46 @@ class MockGaussianModel:
 
 
 class TrainingViewerRenderer:
-    def __init__(self, camera_queue: Queue, renderer_output_queue: Queue):
-        self.camera_queue = camera_queue
-        self.renderer_output_queue = renderer_output_queue
+    """
+    Render the latest snapshot of the model being trained, in the thread of the `RenderScheduler`
+    """
+
+    def __init__(self, snapshot: ModelSnapshot):
+        self.snapshot = snapshot
         self.gaussian_model = MockGaussianModel
+        self.renderer = None
+        self.background_color = None
+        self.render_stream = None
 
     def setup_options(self, *args, **kwargs):
         return
 
+    def clear_render_cache(self):
+        return
+
+    def set_renderer(self, renderer, background_color: torch.Tensor):
+        self.renderer = renderer
+        self.background_color = background_color
+
     def get_outputs(self, camera, scaling_modifier: float = 1.):
-        # TODO: support multiple client
-        # if multiple clients connected, they may get images mismatch to their camera poses,
-        # but I think fix it is unnecessary
-        self.camera_queue.put((camera, scaling_modifier))
-        return self.renderer_output_queue.get()
+        if self.renderer is None or not self.snapshot.is_available:
+            return torch.zeros((3, int(camera.height), int(camera.width)))
+
+        def render(gaussian_model):
+            device = self.background_color.device
+            if device.type == "cuda" and self.render_stream is None:
+                self.render_stream = torch.cuda.Stream(device)
+            return self.renderer(
+                camera.to_device(device),
+                gaussian_model,
+                bg_color=self.background_color,
+                scaling_modifier=scaling_modifier,
+            )["render"]
+
+        return self.snapshot.render(render, render_stream=self.render_stream)
+
+    def get_batch_outputs(self, cameras, scaling_modifier: float = 1.):
+        return [self.get_outputs(camera, scaling_modifier=scaling_modifier) for camera in cameras]
 
 
 # TODO: refactoring the the viewer
@@ -49,10 +75,13 @@ class TrainingViewer(Viewer):
         self.host = host
         self.port = port
         self.image_format = "jpeg"
+        self.frame_encoder = get_frame_encoder()
         self.enable_transform = False
         self.show_cameras = True
         self.show_edit_panel = False
         self.show_render_panel = False
+        self.watch = False
+        self.is_importance_ordered = False
         self.default_camera_position = None
         self.default_camera_look_at = None
         self.camera_transform = torch.eye(4)
@@ -68,13 +97,14 @@ class TrainingViewer(Viewer):
             available_appearance_options = {str(i): available_appearance_options[i] for i in available_appearance_options}
         self.available_appearance_options = available_appearance_options
 
-        self.camera_queue = Queue()
-        self.renderer_output_queue = Queue()
-        self.viewer_renderer = TrainingViewerRenderer(self.camera_queue, self.renderer_output_queue)
+        # the clients are rendered from it, in another thread
+        self.snapshot = ModelSnapshot()
+        self.viewer_renderer = TrainingViewerRenderer(self.snapshot)
 
         self.clients = {}
 
         self.is_training_paused = False
+        self.resume_event = threading.Event()
 
     def add_cameras_to_scene(self, viser_server):
         self.camera_handles = []
@@ -129,6 +159,7 @@ class TrainingViewer(Viewer):
         def _(_):
             self.pause_training_button.visible = False
             self.resume_training_button.visible = True
+            self.resume_event.clear()
             self.is_training_paused = True
 
         self.resume_training_button = server.gui.add_button("Resume Training", icon=viser.Icon.PLAYER_PLAY_FILLED, visible=False)
@@ -139,12 +170,19 @@ class TrainingViewer(Viewer):
             self.resume_training_button.visible = False
             # mark training resumed
             self.is_training_paused = False
-            # send None to camera queue to wake blocking thread up
-            self.camera_queue.put((None, None))
+            # wake the training thread up
+            self.resume_event.set()
 
         self.global_step_label = server.gui.add_markdown(content="Step: 0")
 
-        self.render_frequency_slider = server.gui.add_slider("Render Freq", initial_value=10, min=1, max=100, step=1)
+        self.render_frequency_slider = server.gui.add_slider(
+            "Render Freq",
+            initial_value=10,
+            min=1,
+            max=100,
+            step=1,
+            hint="Publish a snapshot of the model every this many steps",
+        )
 
     def start(self):
         super().start(False, server_config_fun=self.setup_training_panel, enable_renderer_options=False)
@@ -153,43 +191,24 @@ class TrainingViewer(Viewer):
         self.jpeg_quality_when_static.value = 100
         self.jpeg_quality_when_moving.value = 100
 
-    def process_all_render_requests(self, gaussian_model, renderer, background_color):
-        device = gaussian_model.get_xyz.device
-        while True:
-            try:
-                if self.is_training_paused is True:
-                    client_camera, scaling_modifier = self.camera_queue.get()
-                    if client_camera is None:
-                        break
-                else:
-                    client_camera, scaling_modifier = self.camera_queue.get_nowait()
-            except queue.Empty:
-                break
-
-            try:
-                with torch.no_grad():
-                    self.renderer_output_queue.put(renderer(
-                        client_camera.to_device(device),
-                        gaussian_model,
-                        bg_color=background_color.to(device),
-                        scaling_modifier=scaling_modifier,
-                    )["render"])
-            except:
-                traceback.print_exc()
+    def publish_snapshot(self, gaussian_model, renderer, background_color, step: int):
+        self.viewer_renderer.set_renderer(renderer, background_color.to(gaussian_model.get_xyz.device))
+        if self.snapshot.publish(gaussian_model, step):
+            self.rerender_for_all_client()
 
     def training_step(self, gaussian_model, renderer, background_color, step: int):
-        self.global_step_label.content = f"Step: {step}"
-
-        if self.is_training_paused is False:
-            if self.camera_queue.empty() is True:
-                if step % int(self.render_frequency_slider.value) == 0:
-                    self.rerender_for_all_client()
-                else:
-                    return
+        """
+        Only the snapshot is copied by the training thread, the rendering is done in another one
+        """
 
-        self.process_all_render_requests(gaussian_model, renderer, background_color)
+        self.global_step_label.content = f"Step: {step}"
 
-    def validation_step(self, gaussian_model, renderer, background_color, step: int):
-        if self.camera_queue.empty() is True:
+        if self.is_training_paused is True:
+            # the model is unchanged until resumed
+            if self.snapshot.step != step:
+                self.publish_snapshot(gaussian_model, renderer, background_color, step)
+            self.resume_event.wait()
             return
-        self.process_all_render_requests(gaussian_model, renderer, background_color)
+
+        if step % int(self.render_frequency_slider.value) == 0 or not self.snapshot.is_available:
+            self.publish_snapshot(gaussian_model, renderer, background_color, step)
@@ -285,6 +285,10 @@ class EditPanel:
         if selected_gaussians_indices is None:
             selected_gaussians_indices = self._get_selected_gaussians_indices()
         colors[selected_gaussians_indices] = 255 - torch.tensor(self.point_cloud_color.value).to(colors)
+        # the deleted ones may still be in the model before compaction
+        deleted_mask = getattr(self.viewer.gaussian_model, "deleted_mask", None)
+        if deleted_mask is not None:
+            xyz, colors = xyz[~deleted_mask], colors[~deleted_mask]
 
         point_sparsify = int(self.point_sparsify.value)
         self.show_point_cloud(xyz[::point_sparsify].cpu().numpy(), colors[::point_sparsify].cpu().numpy())
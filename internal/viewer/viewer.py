@@ -1,5 +1,7 @@
 import os
 from pathlib import Path
+import functools
+import gc
 import time
 import json
 from typing import Tuple, Literal, List
@@ -14,6 +16,11 @@ from internal.renderers import VanillaRenderer
 from internal.utils.gaussian_model_loader import GaussianModelLoader
 from internal.utils.gaussian_model_editor import MultipleGaussianModelEditor
 from internal.viewer import ClientThread, ViewerRenderer
+from internal.viewer.scheduler import RenderScheduler
+from internal.viewer.frame_encoder import get_frame_encoder
+from internal.viewer.model_loader import BackgroundModelLoader, CheckpointWatcher
+from internal.utils.render_cache import RenderCache
+from internal.utils.light_gaussian import calculate_importance_order
 from internal.viewer.ui import populate_render_tab, TransformPanel, EditPanel
 from internal.viewer.ui.up_direction_folder import UpDirectionFolder
 
@@ -49,7 +56,22 @@ class Viewer:
             vanilla_seganygs: bool = False,
             vanilla_mip: bool = False,
             vanilla_pvg: bool = False,
+            render_cache_size: int = 256,
+            frame_encoder: Literal["auto", "torchvision", "process_pool", "viser"] = "auto",
+            async_load: bool = True,
+            watch: bool = False,
+            watch_interval: float = 10.,
+            progressive: bool = False,
     ):
+        """
+        Args:
+            async_load: load the models in the background, the server is started before they are loaded
+            watch: reload the latest checkpoint of `model_paths[0]` once a new one is saved
+            watch_interval: in seconds
+            progressive: order the Gaussians by importance once loaded,
+                then only the most important ones are rendered while the camera is moving
+        """
+
         self.device = torch.device("cuda")
 
         self.model_paths = model_paths
@@ -57,6 +79,7 @@ class Viewer:
         self.port = port
         self.background_color = background_color
         self.image_format = image_format
+        self.frame_encoder = get_frame_encoder(frame_encoder)
         self.sh_degree = sh_degree
         self.enable_transform = enable_transform
         self.show_cameras = show_cameras
@@ -78,6 +101,59 @@ class Viewer:
         if no_render_panel is True:
             self.show_render_panel = False
 
+        self.render_cache_size = render_cache_size
+        self.viewer_renderer = None
+        self.loaded_from = None
+        self.clients = {}
+
+        self.watch = watch
+        self.watch_interval = watch_interval
+        self.checkpoint_watcher = None
+        self.model_status_label = None
+
+        self.progressive = progressive
+        self.is_importance_ordered = False
+        self.model_loader = BackgroundModelLoader(on_status=self._update_model_status)
+
+        self._load_initial_models = functools.partial(
+            self._load_models,
+            model_paths=model_paths,
+            background_color=background_color,
+            enable_transform=enable_transform,
+            reorient=reorient,
+            cameras_json=cameras_json,
+            up=up,
+            gsplat_v1_example=gsplat_v1_example,
+            gsplat_v1_example_aa=gsplat_v1_example_aa,
+            vanilla_pvg=vanilla_pvg,
+            vanilla_deformable=vanilla_deformable,
+            vanilla_gs4d=vanilla_gs4d,
+            vanilla_gs2d=vanilla_gs2d,
+            seganygs=seganygs,
+            vanilla_seganygs=vanilla_seganygs,
+            vanilla_mip=vanilla_mip,
+        )
+        if async_load is False:
+            self._load_initial_models()
+
+    def _load_models(
+            self,
+            model_paths: list[str],
+            background_color: Tuple,
+            enable_transform: bool,
+            reorient: str,
+            cameras_json: str,
+            up: list[float],
+            gsplat_v1_example: bool,
+            gsplat_v1_example_aa: bool,
+            vanilla_pvg: bool,
+            vanilla_deformable: bool,
+            vanilla_gs4d: bool,
+            vanilla_gs2d: bool,
+            seganygs: str,
+            vanilla_seganygs: bool,
+            vanilla_mip: bool,
+    ):
         def turn_off_edit_and_video_render_panel():
             self.show_edit_panel = False
             self.show_render_panel = False
@@ -102,10 +178,14 @@ class Viewer:
             model.setup_from_number(0)
             model.pre_activate_all_properties()
             model.eval()
-            from internal.renderers.partition_lod_renderer import PartitionLoDRenderer
             with open(model_paths[0], "r") as f:
                 lod_config = yaml.safe_load(f)
-            renderer = PartitionLoDRenderer(**lod_config).instantiate()
+            if "tree" in lod_config:
+                from internal.renderers.lod_tree_renderer import LoDTreeRenderer
+                renderer = LoDTreeRenderer(**lod_config).instantiate()
+            else:
+                from internal.renderers.partition_lod_renderer import PartitionLoDRenderer
+                renderer = PartitionLoDRenderer(**lod_config).instantiate()
             renderer.setup("validation")
             training_output_base_dir = os.getcwd()
             dataset_type = "Colmap"
@@ -172,6 +252,10 @@ class Viewer:
                 renderer = self._load_vanilla_mip(load_from)
                 turn_off_edit_and_video_render_panel()
 
+            # only the plain ones can be reloaded by `reload_model()`
+            if len(model_paths) == 1 and seganygs is None and not (vanilla_deformable or vanilla_gs4d or vanilla_gs2d or vanilla_seganygs or vanilla_mip):
+                self.loaded_from = load_from
+
         # reorient the scene
         cameras_json_path = cameras_json
         if cameras_json_path is None:
@@ -203,6 +287,14 @@ class Viewer:
 
             model.freeze()
 
+            if self.progressive is True:
+                # the prefix of the store must be the most important ones, so the plain models only
+                if self.loaded_from is None:
+                    print("[WARNING] progressive rendering is not supported by the loaded model")
+                else:
+                    self._order_by_importance(model)
+                    self.is_importance_ordered = True
+
             if self.show_edit_panel is True or enable_transform is True:
                 model = MultipleGaussianModelEditor([model], device=self.device)
         else:
@@ -236,10 +328,9 @@ class Viewer:
             model,
             renderer,
             torch.tensor(background_color, dtype=torch.float, device=self.device),
+            render_cache=RenderCache(max_bytes=self.render_cache_size * 1024 * 1024) if self.render_cache_size > 0 else None,
         )
 
-        self.clients = {}
-
     @staticmethod
     def _search_load_file(model_path: str) -> str:
         return GaussianModelLoader.search_load_file(model_path)
@@ -476,6 +567,76 @@ class Viewer:
 
         return model, renderer, training_output_base_dir, dataset_type, checkpoint
 
+    @staticmethod
+    def _order_by_importance(model):
+        print("ordering the Gaussians by importance...")
+        started_at = time.perf_counter()
+        model.reorder(calculate_importance_order(model))
+        print("ordered in {:.1f}s".format(time.perf_counter() - started_at))
+
+    def _update_model_status(self, status: str):
+        if self.model_status_label is not None:
+            self.model_status_label.content = status
+
+    def reload_model(self, load_from: str):
+        """
+        Load a checkpoint or a point cloud in the background, then swap it in.
+        The current model is rendered until then, and released after the swap.
+        """
+
+        if self.loaded_from is None:
+            raise RuntimeError("the loaded model can not be reloaded")
+        self.model_loader.submit(load_from, functools.partial(self._load_model_for_swap, load_from), self._swap_model)
+
+    def _load_model_for_swap(self, load_from: str):
+        model, renderer, _, _, checkpoint = self._load_model_from_file(load_from)
+        if hasattr(self, "active_sh_degree_slider"):
+            model.active_sh_degree = min(self.active_sh_degree_slider.value, model.max_sh_degree)
+        model.freeze()
+        if self.is_importance_ordered is True:
+            self._order_by_importance(model)
+
+        if isinstance(self.gaussian_model, MultipleGaussianModelEditor):
+            editor = MultipleGaussianModelEditor([model], device=self.device)
+            # keep the transform, but the deletions are not applicable to the new model
+            editor.transform_with_vectors(0, *self.gaussian_model.get_transform(0))
+            model = editor
+
+        return load_from, model, renderer, checkpoint
+
+    def _swap_model(self, loaded):
+        load_from, model, renderer, checkpoint = loaded
+        previous = self.viewer_renderer.swap_model(model, renderer)
+        self.gaussian_model = model
+        self.checkpoint = checkpoint
+        self.loaded_from = load_from
+
+        # the memory of the previous one is released only after the swap
+        del loaded, previous
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        if getattr(self, "edit_panel", None) is not None:
+            with self._server.atomic():
+                # apply the selection to the new model
+                self.edit_panel._update_scene()
+        else:
+            self.rerender_for_all_client()
+
+    def _start_checkpoint_watcher(self):
+        if self.watch is False:
+            return
+        if self.loaded_from is None:
+            print("[WARNING] the loaded model can not be reloaded, checkpoint watching is disabled")
+            return
+        self.checkpoint_watcher = CheckpointWatcher(
+            self.model_paths[0],
+            self.reload_model,
+            interval=self.watch_interval,
+            loaded_from=self.loaded_from,
+        ).start()
+
     def show_message(self, message: str, client=None):
         target = client
         if client is None:
@@ -494,13 +655,39 @@ class Viewer:
     def start(self, block: bool = True, server_config_fun=None, tab_config_fun=None, enable_renderer_options: bool = True):
         # create viser server
         server = viser.ViserServer(host=self.host, port=self.port)
-        server.scene.set_up_direction(self.up_direction)
         self._server = server
         server.gui.configure_theme(
             control_layout="collapsible",
             show_logo=False,
         )
 
+        setup_gui = functools.partial(
+            self._setup_gui,
+            server,
+            server_config_fun=server_config_fun,
+            tab_config_fun=tab_config_fun,
+            enable_renderer_options=enable_renderer_options,
+        )
+        if self.viewer_renderer is None or self.watch is True:
+            self.model_status_label = server.gui.add_markdown(content="")
+        if self.viewer_renderer is None:
+            # served while loading, the options depending on the models are added once loaded
+            def on_loaded(_):
+                setup_gui()
+                self._start_checkpoint_watcher()
+
+            self.model_loader.submit(", ".join(self.model_paths), self._load_initial_models, on_loaded)
+        else:
+            setup_gui()
+            self._start_checkpoint_watcher()
+
+        if block is True:
+            while True:
+                time.sleep(999)
+
+    def _setup_gui(self, server, server_config_fun=None, tab_config_fun=None, enable_renderer_options: bool = True):
+        server.scene.set_up_direction(self.up_direction)
+
         if server_config_fun is not None:
             server_config_fun(self, server)
 
@@ -543,6 +730,21 @@ class Viewer:
                     step=1,
                     initial_value=60,
                 )
+                self.target_fps = server.gui.add_slider(
+                    "Target FPS when Moving",
+                    min=0,
+                    max=60,
+                    step=1,
+                    initial_value=24,
+                    hint="Lower the resolution and the JPEG quality when moving to reach it, 0 disables the adaptation",
+                )
+                if self.is_importance_ordered is True:
+                    self.progressive_checkbox = server.gui.add_checkbox(
+                        "Progressive when Moving",
+                        initial_value=True,
+                        hint="Reach the target FPS by rendering only the most important Gaussians instead of lowering the resolution, "
+                             "all of them are rendered once the camera stops",
+                    )
 
             self.viewer_renderer.setup_options(self, server)
 
@@ -659,14 +861,13 @@ class Viewer:
         if enable_renderer_options is True:
             self.viewer_renderer.renderer.setup_web_viewer_tabs(self, server, tabs)
 
-        # register hooks
+        # all the clients render through it
+        self.render_scheduler = RenderScheduler(self.viewer_renderer)
+
+        # register hooks, also called for the clients connected while loading
         server.on_client_connect(self._handle_new_client)
         server.on_client_disconnect(self._handle_client_disconnect)
 
-        if block is True:
-            while True:
-                time.sleep(999)
-
     def _handle_appearance_embedding_slider_updated(self, event: viser.GuiEvent):
         """
         Change appearance group dropdown to "@Direct" on slider updated
@@ -729,14 +930,15 @@ class Viewer:
         Render for specific client
         """
         try:
-            # switch to low resolution mode first, then notify the client to render
-            self.clients[client_id].state = "low"
-            self.clients[client_id].render_trigger.set()
+            # a frame in the moving resolution is rendered first, then refined
+            self.clients[client_id].rerender()
         except:
             # ignore errors
             pass
 
     def rerender_for_all_client(self):
+        # options changed, the cached renderings may be outdated
+        self.viewer_renderer.clear_render_cache()
         for i in self.clients:
             self.rerender_for_client(i)
 
@@ -746,7 +948,13 @@ class Viewer:
         """
 
         # create client thread
-        client_thread = ClientThread(self, self.viewer_renderer, client)
+        client_thread = ClientThread(
+            self,
+            self.viewer_renderer,
+            client,
+            scheduler=self.render_scheduler,
+            frame_encoder=self.frame_encoder,
+        )
         client_thread.start()
         # store this thread
         self.clients[client.client_id] = client_thread
@@ -758,6 +966,7 @@ class Viewer:
 
         try:
             self.clients[client.client_id].stop()
+            self.render_scheduler.remove_client(client.client_id)
             del self.clients[client.client_id]
         except Exception as err:
             print(err)
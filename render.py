@@ -1,22 +1,18 @@
 import glob
 import os
-import queue
 import subprocess
 import argparse
 import json
-import threading
-import traceback
 
 import numpy as np
 import lightning
 import torch
-import torchvision
 import mediapy
 from tqdm import tqdm
 from internal.cameras.cameras import Cameras
-from internal.renderers.vanilla_renderer import VanillaRenderer
 from internal.utils.gaussian_model_loader import GaussianModelLoader
 from internal.utils.gaussian_model_editor import MultipleGaussianModelEditor
+from internal.utils.frame_pipeline import FramePipeline
 from internal.viewer.renderer import ViewerRenderer
 
 
@@ -46,13 +42,14 @@ def initializer_viewer_renderer(
         model_list = []
         renderer = None
 
-        load_device = torch.device("cuda") if len(model_paths) == 1 or enable_transform is False else torch.device("cpu")
+        load_device = device if len(model_paths) == 1 or enable_transform is False else torch.device("cpu")
         for model_path in model_paths:
             model, renderer = GaussianModelLoader.search_and_load(model_path, load_device)
             model.freeze()
             model_list.append(model)
 
         if len(model_paths) > 1:
+            from internal.renderers.vanilla_renderer import VanillaRenderer
             renderer = VanillaRenderer()
         if renderer_override is not None:
             print(f"Renderer: {renderer_override.__class__}")
@@ -119,66 +116,6 @@ def parse_model_transformations(camera_path: dict) -> list[list]:
     return frame_transformation_list
 
 
-def save_image(image, output_path):
-    torchvision.utils.save_image(image, output_path)
-
-
-def process_save_image_queue(image_queue: queue.Queue, frame_output_path: str):
-    while True:
-        image_information = image_queue.get()
-        if image_information is None:
-            break
-        try:
-            save_image(image_information[0], os.path.join(frame_output_path, "{:06d}.png".format(image_information[1])))
-        except:
-            traceback.print_exc()
-
-
-def process_image_to_video_queue(image_queue: queue.Queue, video_writer: mediapy.VideoWriter):
-    while True:
-        image_information = image_queue.get()
-        if image_information is None:
-            break
-        video_writer.add_image(image_information[0].permute(1, 2, 0).numpy())
-
-
-def process_image_queue(image_save_batch: int, image_queue: queue.Queue, video_writer: mediapy.VideoWriter, frame_output_path: str):
-    class MockQueue:
-        def put(self, *args, **kwargs):
-            return
-
-    # create image to file threads
-    save_image_threads = []
-    frame_saving_queue = MockQueue()
-    if frame_output_path is not None:
-        frame_saving_queue = queue.Queue(maxsize=max(image_save_batch // 2, 1))
-        for _ in range(image_save_batch):
-            thread = threading.Thread(target=process_save_image_queue, args=(frame_saving_queue, frame_output_path))
-            save_image_threads.append(thread)
-            thread.start()
-
-    # create image to video thread
-    image_to_video_queue = queue.Queue(maxsize=1)
-    image_to_video_thread = threading.Thread(target=process_image_to_video_queue, args=(image_to_video_queue, video_writer))
-    image_to_video_thread.start()
-
-    # forward rendered image to threads
-    while True:
-        image_information = image_queue.get()
-        if image_information is None:
-            break
-        frame_saving_queue.put(image_information)
-        image_to_video_queue.put(image_information)
-
-    # wait for all threads finishing
-    for _ in range(len(save_image_threads)):
-        frame_saving_queue.put(None)
-    for i in save_image_threads:
-        i.join()
-    image_to_video_queue.put(None)
-    image_to_video_thread.join()
-
-
 def render_frames(
         cameras: Cameras,
         model_transformations: list,
@@ -187,33 +124,82 @@ def render_frames(
         video_writer: mediapy.VideoWriter,
         image_save_batch: int,
         device,
+        batch_size: int = 1,
+        frame_indices: list[int] = None,
+        image_format: str = "png",
+        n_buffers: int = 4,
 ):
-    image_queue = queue.Queue(maxsize=1)
-    image_process_thread = threading.Thread(target=process_image_queue, args=(
-        image_save_batch,
-        image_queue,
-        video_writer,
-        frame_output_path,
-    ))
-    image_process_thread.start()
-
-    for idx in tqdm(range(len(cameras)), desc="rendering frames"):
-        # model transform
-        for model_idx, model_transformation in enumerate(model_transformations[idx]):
-            viewer_renderer.gaussian_model.transform_with_vectors(
-                model_idx,
-                scale=model_transformation["size"],
-                r_wxyz=np.asarray(model_transformation["wxyz"]),
-                t_xyz=np.asarray(model_transformation["position"]),
-            )
+    if frame_indices is None:
+        frame_indices = list(range(len(cameras)))
 
-        # render
-        camera = cameras[idx].to_device(device)
-        image = viewer_renderer.get_outputs(camera).cpu()
-        image_queue.put((image, idx))
+    # the models are transformed frame by frame, so batching is not possible
+    if any(len(model_transformations[i]) > 0 for i in frame_indices):
+        batch_size = 1
 
-    image_queue.put(None)
-    image_process_thread.join()
+    pipeline = FramePipeline(
+        shape=(cameras[0].height.item(), cameras[0].width.item()),
+        device=device,
+        video_writer=video_writer,
+        frame_output_path=frame_output_path,
+        image_format=image_format,
+        n_image_workers=image_save_batch,
+        n_buffers=n_buffers,
+    )
+    with pipeline:
+        progress_bar = tqdm(total=len(frame_indices), desc="rendering frames")
+        for batch_begin in range(0, len(frame_indices), batch_size):
+            batch_indices = frame_indices[batch_begin:batch_begin + batch_size]
+
+            # the copies of the previous frames are overlapped with rendering this batch
+            with pipeline.timer.time("render", len(batch_indices)):
+                # model transform
+                for idx in batch_indices:
+                    for model_idx, model_transformation in enumerate(model_transformations[idx]):
+                        viewer_renderer.gaussian_model.transform_with_vectors(
+                            model_idx,
+                            scale=model_transformation["size"],
+                            r_wxyz=np.asarray(model_transformation["wxyz"]),
+                            t_xyz=np.asarray(model_transformation["position"]),
+                        )
+
+                # render
+                images = viewer_renderer.get_batch_outputs([cameras[idx].to_device(device) for idx in batch_indices])
+
+            for idx, image in zip(batch_indices, images):
+                pipeline.put(image, idx)
+            progress_bar.update(len(batch_indices))
+        progress_bar.close()
+
+    print("{}, stalled={:.1f}s".format(pipeline.timer, pipeline.stall_seconds))
+
+
+def get_chunk_output_path(output_path: str, chunk_idx: int, n_chunks: int) -> str:
+    if n_chunks == 1:
+        return output_path
+    root, ext = os.path.splitext(output_path)
+    return "{}.{:03d}-of-{:03d}{}".format(root, chunk_idx, n_chunks, ext)
+
+
+def concat_video_chunks(output_path: str, n_chunks: int):
+    chunk_paths = [get_chunk_output_path(output_path, i, n_chunks) for i in range(n_chunks)]
+    list_file = output_path + ".chunks.txt"
+    with open(list_file, "w") as f:
+        for i in chunk_paths:
+            f.write("file '{}'\n".format(os.path.abspath(i)))
+    # the chunks share the same encoding parameters, so concatenating them does not require re-encoding
+    subprocess.run([
+        "ffmpeg",
+        "-y",
+        "-loglevel", "error",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_file,
+        "-c", "copy",
+        output_path,
+    ], check=True)
+    os.unlink(list_file)
+    for i in chunk_paths:
+        os.unlink(i)
 
 
 if __name__ == "__main__":
@@ -224,12 +210,25 @@ if __name__ == "__main__":
     parser.add_argument("--save-images", "--save-image", "--save_image", "--save-frames", action="store_true",
                         help="Whether save each frame to an image file")
     parser.add_argument("--image-save-batch", "-b", type=int, default=8,
-                        help="increase this to speedup rendering, but more memory will be consumed")
+                        help="The number of processes saving the frames, increase this to speedup rendering")
+    parser.add_argument("--image-format", type=str, default="png", choices=["png", "jpg"])
+    parser.add_argument("--n-buffers", type=int, default=4,
+                        help="The number of host frame buffers, increase this to tolerate slower encoders, but more memory will be consumed")
+    parser.add_argument("--n-chunks", type=int, default=1,
+                        help="Split the frames into this number of contiguous ranges, each of them is rendered into a segment file")
+    parser.add_argument("--chunk-id", type=int, default=-1,
+                        help="Render this chunk only, e.g. one chunk per GPU in different processes. "
+                             "The segments are concatenated by the process finishing the last one. "
+                             "-1 renders all the chunks.")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="The number of frames rendered together, only take effect when the models are not transformed")
     parser.add_argument("--disable-transform", action="store_true", default=False)
     parser.add_argument("--vanilla_gs2d", action="store_true", default=False)
+    parser.add_argument("--cpu", action="store_true", default=False,
+                        help="Render on CPU with the pure PyTorch rasterizer, only the vanilla 3DGS is supported")
     args = parser.parse_args()
 
-    device = torch.device("cuda")
+    device = torch.device("cpu") if args.cpu else torch.device("cuda")
 
     with open(args.camera_path_filename, "r") as f:
         camera_path = json.load(f)
@@ -240,6 +239,10 @@ if __name__ == "__main__":
         from internal.renderers.vanilla_2dgs_renderer import Vanilla2DGSRenderer
 
         renderer_override = Vanilla2DGSRenderer()
+    elif args.cpu is True:
+        from internal.renderers.torch_tile_renderer import TorchTileRenderer
+
+        renderer_override = TorchTileRenderer().instantiate()
 
     # instantiate renderer
     # TODO: set output type
@@ -265,24 +268,54 @@ if __name__ == "__main__":
     if args.save_images is True:
         frame_output_path = args.output_path + "_frames"
         os.makedirs(frame_output_path, exist_ok=True)
-        for i in glob.glob(os.path.join(frame_output_path, "*.png")):
-            os.unlink(i)
+        if args.chunk_id < 0:
+            for i in glob.glob(os.path.join(frame_output_path, "*.{}".format(args.image_format))):
+                os.unlink(i)
 
     # start rendering
-    with torch.no_grad(), mediapy.VideoWriter(
-            path=args.output_path,
-            shape=(cameras[0].height.item(), cameras[0].width.item()),
-            fps=camera_path["fps"],
-    ) as video_writer:
-        render_frames(
-            cameras,
-            model_transformations,
-            viewer_renderer=renderer,
-            frame_output_path=frame_output_path,
-            video_writer=video_writer,
-            image_save_batch=args.image_save_batch,
-            device=device,
-        )
+    chunk_id_list = list(range(args.n_chunks)) if args.chunk_id < 0 else [args.chunk_id]
+    for chunk_id in chunk_id_list:
+        chunk_output_path = get_chunk_output_path(args.output_path, chunk_id, args.n_chunks)
+        # written to a temporary file, so the completed chunks can be identified by other processes
+        chunk_incomplete_path = "{}.incomplete{}".format(*os.path.splitext(chunk_output_path))
+        with torch.no_grad(), mediapy.VideoWriter(
+                path=chunk_incomplete_path,
+                shape=(cameras[0].height.item(), cameras[0].width.item()),
+                fps=camera_path["fps"],
+        ) as video_writer:
+            render_frames(
+                cameras,
+                model_transformations,
+                viewer_renderer=renderer,
+                frame_output_path=frame_output_path,
+                video_writer=video_writer,
+                image_save_batch=args.image_save_batch,
+                device=device,
+                batch_size=args.batch_size,
+                frame_indices=np.array_split(np.arange(len(cameras)), args.n_chunks)[chunk_id].tolist(),
+                image_format=args.image_format,
+                n_buffers=args.n_buffers,
+            )
+        os.replace(chunk_incomplete_path, chunk_output_path)
+
+    if args.n_chunks > 1:
+        is_all_chunks_completed = all(os.path.exists(get_chunk_output_path(args.output_path, i, args.n_chunks)) for i in range(args.n_chunks))
+        if is_all_chunks_completed:
+            # the processes finishing at the same time concatenate only once
+            concat_lock_path = args.output_path + ".concat.lock"
+            try:
+                os.close(os.open(concat_lock_path, os.O_CREAT | os.O_EXCL))
+            except FileExistsError:
+                print(f"Concatenation skipped: '{concat_lock_path}' exists, the chunks are being concatenated by another process. "
+                      f"Delete it if no other process is running, then rerun to concatenate")
+                exit(0)
+            try:
+                concat_video_chunks(args.output_path, args.n_chunks)
+            finally:
+                os.unlink(concat_lock_path)
+        else:
+            print("Waiting for the other chunks, the video will be concatenated by the process finishing the last one")
+            exit(0)
 
     if frame_output_path is not None:
         print(f"Video frames saved to '{frame_output_path}'")
@@ -0,0 +1,4 @@
+from internal.entrypoints.render_server import cli
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,146 @@
+import unittest
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.models.adaptive_sh_gaussian import AdaptiveSHGaussian
+from internal.utils.gaussian_utils import GaussianPlyUtils
+from internal.utils.sh_utils import eval_sh, sh_truncation_mse, assign_sh_degrees
+
+
+class AdaptiveSHGaussianTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_vanilla_model(self, n: int = 1024):
+        model = VanillaGaussian(sh_degree=3).instantiate()
+        model.setup_from_number(n)
+        with torch.no_grad():
+            for value in model.properties.values():
+                value.copy_(torch.randn(value.shape, generator=self.generator))
+        return model
+
+    def test_truncation_mse(self):
+        shs_rest = torch.randn((16, 15, 3), generator=self.generator) * 0.1
+        shs = torch.cat([torch.zeros((16, 1, 3)), shs_rest], dim=1).transpose(1, 2)  # [N, 3, 16]
+
+        dirs = torch.randn((100_000, 3), generator=self.generator)
+        dirs = dirs / dirs.norm(dim=-1, keepdim=True)
+
+        truncation_mse = sh_truncation_mse(shs_rest)
+        self.assertEqual(truncation_mse.shape, (16, 4))
+        self.assertTrue(torch.all(truncation_mse[:, -1] == 0.))
+
+        full = eval_sh(3, shs[:, None], dirs[None])  # [N, n_dirs, 3]
+        for degree in range(3):
+            truncated = eval_sh(degree, shs[:, None], dirs[None])
+            mse = torch.mean(torch.square(full - truncated), dim=(1, 2))
+            self.assertTrue(torch.allclose(mse, truncation_mse[:, degree], rtol=0.05))
+
+        degrees = assign_sh_degrees(shs_rest, threshold=0.02)
+        for i, degree in enumerate(degrees.tolist()):
+            self.assertLessEqual(truncation_mse[i, degree], 0.02 ** 2)
+            if degree > 0:
+                self.assertGreater(truncation_mse[i, degree - 1], 0.02 ** 2)
+
+    def test_adaptive_sh_gaussian(self):
+        vanilla_model = self.get_vanilla_model()
+        properties = {k: v.detach() for k, v in vanilla_model.properties.items()}
+        sh_degrees = torch.randint(0, 4, (vanilla_model.n_gaussians,), generator=self.generator)
+
+        model = AdaptiveSHGaussian(sh_degree=3).instantiate()
+        order = model.setup_from_vanilla_properties(properties, sh_degrees)
+
+        self.assertEqual(model.n_gaussians, vanilla_model.n_gaussians)
+        self.assertEqual(model.get_n_gaussians_by_degree(), torch.bincount(sh_degrees, minlength=4).tolist())
+        self.assertTrue(torch.equal(model.get_sh_degrees(), sh_degrees[order]))
+        self.assertTrue(torch.equal(model.get_means(), properties["means"][order]))
+
+        # the padded SHs equal to the truncated ones
+        expected_shs_rest = properties["shs_rest"][order].clone()
+        for i, degree in enumerate(sh_degrees[order].tolist()):
+            expected_shs_rest[i, (degree + 1) ** 2 - 1:] = 0.
+        self.assertTrue(torch.equal(model.get_shs_rest(), expected_shs_rest))
+        self.assertEqual(model.get_shs().shape, (model.n_gaussians, 16, 3))
+
+        # smaller than the dense one
+        self.assertLess(
+            sum(model.get_bytes_by_property().values()),
+            sum([i.numel() * i.element_size() for i in properties.values()]),
+        )
+
+        # reload from state dict
+        state_dict = model.state_dict()
+        reloaded_model = AdaptiveSHGaussian(sh_degree=3).instantiate()
+        reloaded_model.setup_from_number(model.n_gaussians)
+        reloaded_model.load_state_dict(state_dict)
+        self.assertEqual(reloaded_model.get_n_gaussians_by_degree(), model.get_n_gaussians_by_degree())
+        self.assertTrue(torch.equal(reloaded_model.get_shs(), model.get_shs()))
+
+        # export with padding
+        ply_utils = GaussianPlyUtils.load_from_model(model)
+        self.assertTrue(torch.equal(ply_utils.features_rest, expected_shs_rest))
+        ply_utils = GaussianPlyUtils.load_from_state_dict({"gaussian_model.{}".format(k): v for k, v in state_dict.items()})
+        self.assertTrue(torch.equal(ply_utils.features_rest, expected_shs_rest))
+        self.assertEqual(ply_utils.sh_degrees, 3)
+
+        # pre-activated
+        model.pre_activate_all_properties()
+        self.assertTrue(torch.allclose(
+            model.get_non_pre_activated_properties()["scales"],
+            properties["scales"][order],
+            atol=1e-6,
+        ))
+
+    def test_dense_shs_cache(self):
+        vanilla_model = self.get_vanilla_model(64)
+        properties = {k: v.detach() for k, v in vanilla_model.properties.items()}
+        model = AdaptiveSHGaussian(sh_degree=3, cache_dense_shs=True).instantiate()
+        model.setup_from_vanilla_properties(properties, torch.randint(0, 4, (64,), generator=self.generator))
+        model.freeze()
+        expected = model.get_shs().clone()
+
+        # unpacked on every call
+        self.assertIsNot(model.get_shs(), model.get_shs())
+
+        # unpacked once
+        model.pre_activate_all_properties()
+        shs = model.get_shs()
+        self.assertTrue(torch.equal(shs, expected))
+        self.assertIs(model.get_shs(), shs)
+        self.assertIs(model.get_features, shs)
+        self.assertTrue(torch.equal(model.get_shs_rest(), expected[:, 1:]))
+
+        # updated in place
+        with torch.no_grad():
+            model.gaussians["shs_rest_2"].mul_(2.)
+        begin, end = model.get_degree_ranges()[2]
+        expected[begin:end, 1:9] *= 2.
+        self.assertTrue(torch.equal(model.get_shs(), expected))
+
+        # replaced
+        model.set_property("shs_dc", torch.zeros_like(model.get_property("shs_dc")))
+        expected[:, :1] = 0.
+        self.assertTrue(torch.equal(model.get_shs(), expected))
+
+        # the views select from the cached ones
+        shs = model.get_shs()
+        view = model.get_prefix_view(10)
+        self.assertEqual(view.get_shs().data_ptr(), shs.data_ptr())
+        self.assertTrue(torch.equal(view.get_shs(), expected[:10]))
+        model.reorder(torch.randperm(64, generator=self.generator))
+        view = model.get_prefix_view(32)
+        self.assertTrue(torch.equal(view.get_shs(), view.unpack_shs()))
+        self.assertIs(view.get_shs(), view.get_shs())
+
+        # disabled by default
+        model = AdaptiveSHGaussian(sh_degree=3).instantiate()
+        model.setup_from_vanilla_properties(properties, torch.zeros((64,), dtype=torch.long))
+        model.freeze()
+        model.pre_activate_all_properties()
+        self.assertIsNot(model.get_shs(), model.get_shs())
+
+
+if __name__ == '__main__':
+    unittest.main()
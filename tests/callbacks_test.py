@@ -0,0 +1,54 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import torch
+from internal.callbacks import KeepRunningIfWebViewerEnabled
+
+
+class MockWebViewer:
+    def __init__(self):
+        self.is_training_paused = False
+        self.snapshots = []
+
+    def publish_snapshot(self, gaussian_model, renderer, background_color, step: int):
+        self.snapshots.append((gaussian_model, renderer, background_color, step))
+
+
+class KeepRunningIfWebViewerEnabledTestCase(unittest.TestCase):
+    def get_pl_module(self, web_viewer):
+        background_color = torch.zeros((3,))
+        return SimpleNamespace(
+            web_viewer=web_viewer,
+            gaussian_model=object(),
+            renderer=object(),
+            _fixed_background_color=lambda: background_color,
+        )
+
+    def test_on_train_end(self):
+        web_viewer = MockWebViewer()
+        pl_module = self.get_pl_module(web_viewer)
+        trainer = SimpleNamespace(global_step=30_000)
+
+        # interrupted by `Ctrl+C` while waiting
+        with mock.patch("internal.callbacks.time.sleep", side_effect=[None, None, KeyboardInterrupt]) as sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                KeepRunningIfWebViewerEnabled().on_train_end(trainer, pl_module)
+        self.assertEqual(sleep.call_count, 3)
+
+        # published once
+        self.assertTrue(web_viewer.is_training_paused)
+        self.assertEqual(len(web_viewer.snapshots), 1)
+        gaussian_model, renderer, background_color, step = web_viewer.snapshots[0]
+        self.assertIs(gaussian_model, pl_module.gaussian_model)
+        self.assertIs(renderer, pl_module.renderer)
+        self.assertTrue(torch.equal(background_color, pl_module._fixed_background_color()))
+        self.assertEqual(step, 30_000)
+
+    def test_web_viewer_disabled(self):
+        with mock.patch("internal.callbacks.time.sleep") as sleep:
+            KeepRunningIfWebViewerEnabled().on_train_end(SimpleNamespace(global_step=1), self.get_pl_module(None))
+        sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
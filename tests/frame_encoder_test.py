@@ -0,0 +1,113 @@
+import unittest
+import base64
+import io
+from types import SimpleNamespace
+from unittest.mock import patch
+import numpy as np
+import torch
+from PIL import Image
+from internal.viewer.frame_encoder import (
+    FrameHandoff,
+    TorchvisionFrameEncoder,
+    ProcessPoolFrameEncoder,
+    get_frame_encoder,
+    can_send_encoded,
+    send_frame,
+)
+
+
+def decode(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+class MockWebsockInterface:
+    def __init__(self):
+        self.messages = []
+
+    def queue_message(self, message):
+        self.messages.append(message)
+
+
+class FrameEncoderTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        generator = torch.Generator()
+        generator.manual_seed(42)
+        # smooth, so the JPEG error is small
+        self.image = torch.nn.functional.interpolate(torch.rand((1, 3, 6, 8), generator=generator), size=(48, 64), mode="bilinear")[0]
+        self.expected = torch.clamp(self.image * 255. + 0.5, max=255.).to(torch.uint8).permute(1, 2, 0).numpy()
+
+    def assert_frame(self, data: bytes, format: str):
+        decoded = decode(data)
+        self.assertEqual(decoded.shape, (48, 64, 3))
+        if format == "png":
+            np.testing.assert_array_equal(decoded, self.expected)
+        else:
+            self.assertLess(np.abs(decoded.astype(np.float32) - self.expected).mean(), 3.)
+
+    def test_encoders(self):
+        encoders = [TorchvisionFrameEncoder(), ProcessPoolFrameEncoder(n_workers=1)]
+        try:
+            for encoder in encoders:
+                handoff = FrameHandoff(encoder)
+                for format in ["jpeg", "png"]:
+                    for _ in range(2):
+                        self.assert_frame(handoff(self.image, format=format, jpeg_quality=95), format)
+                # the host buffer is reused
+                host_buffer = handoff.host_buffer
+                handoff(self.image)
+                self.assertIs(handoff.host_buffer, host_buffer)
+                handoff(self.image[:, :32])
+                self.assertEqual(handoff.host_buffer.shape, (32, 64, 3))
+
+                fps = handoff.timer.get_fps()
+                self.assertEqual(set(fps.keys()), {"convert", "copy", "encode"})
+                self.assertEqual(handoff.timer.counts["encode"], 6)
+        finally:
+            for encoder in encoders:
+                encoder.close()
+
+    def test_without_encoder(self):
+        handoff = FrameHandoff(get_frame_encoder("viser"))
+        frame = handoff(self.image)
+        self.assertIsInstance(frame, np.ndarray)
+        np.testing.assert_array_equal(frame, self.expected)
+        self.assertNotIn("encode", handoff.timer.get_fps())
+
+        with self.assertRaises(ValueError):
+            get_frame_encoder("unknown")
+
+    def test_send_frame(self):
+        client = SimpleNamespace(scene=SimpleNamespace(_websock_interface=MockWebsockInterface()))
+        self.assertTrue(can_send_encoded(client))
+        self.assertFalse(can_send_encoded(SimpleNamespace()))
+
+        data = FrameHandoff(TorchvisionFrameEncoder())(self.image, format="png")
+        send_frame(client, data, format="png")
+        message = client.scene._websock_interface.messages[0]
+        self.assertEqual(message.media_type, "image/png")
+        self.assertEqual(base64.b64decode(message.base64_rgb), data)
+
+        # encoded by viser
+        images = []
+        client = SimpleNamespace(scene=SimpleNamespace(
+            set_background_image=lambda image, format, jpeg_quality: images.append((image, format, jpeg_quality)),
+        ))
+        self.assertFalse(can_send_encoded(client))
+        send_frame(client, self.expected, format="jpeg", jpeg_quality=60)
+        self.assertIs(images[0][0], self.expected)
+        self.assertEqual(images[0][1:], ("jpeg", 60))
+
+        # fallback to the public API
+        send_frame(client, data, format="png")
+        np.testing.assert_array_equal(images[1][0], self.expected)
+        self.assertEqual(images[1][1], "png")
+
+        client.scene._websock_interface = MockWebsockInterface()
+        self.assertTrue(can_send_encoded(client))
+        with patch("internal.viewer.frame_encoder.get_background_image_message_type", return_value=None):
+            self.assertFalse(can_send_encoded(client))
+            send_frame(client, data, format="png")
+        self.assertEqual(len(client.scene._websock_interface.messages), 0)
+        np.testing.assert_array_equal(images[2][0], self.expected)
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+import unittest
+import numpy as np
+import torch
+from PIL import Image
+from internal.utils.frame_pipeline import to_uint8_image, HostFrameRing, FramePipeline
+
+
+class MockVideoWriter:
+    def __init__(self):
+        self.images = []
+
+    def add_image(self, image: np.ndarray):
+        self.images.append(image.copy())
+
+
+class FramePipelineTestCase(unittest.TestCase):
+    def get_images(self, n: int):
+        generator = torch.Generator()
+        generator.manual_seed(42)
+        return [torch.rand((3, 24, 32), generator=generator) for _ in range(n)]
+
+    def test_to_uint8_image(self):
+        image = torch.tensor([-0.1, 0., 0.5, 1., 1.1])[:, None, None].expand(5, 1, 3).permute(2, 0, 1)
+        self.assertEqual(to_uint8_image(image)[:, 0, 0].tolist(), [0, 0, 128, 255, 255])
+        self.assertEqual(to_uint8_image(torch.rand((3, 4, 5))).shape, (4, 5, 3))
+
+    def test_ring(self):
+        ring = HostFrameRing(2, (1,))
+        a = ring.acquire(n_consumers=2)
+        b = ring.acquire()
+
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(ring.acquire()))
+        thread.start()
+        ring.release(a)
+        thread.join(timeout=0.1)
+        # still referenced by the other consumer
+        self.assertTrue(thread.is_alive())
+        ring.release(a)
+        thread.join(timeout=5.)
+        self.assertEqual(acquired, [a])
+        ring.release(b)
+
+        # all the waiters are woken up once aborted
+        ring = HostFrameRing(1, (1,))
+        ring.acquire()
+        acquired = []
+        threads = [threading.Thread(target=lambda: acquired.append(ring.acquire())) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        ring.abort()
+        for thread in threads:
+            thread.join(timeout=5.)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(acquired, [None, None])
+
+    def test_pipeline(self):
+        images = self.get_images(16)
+        video_writer = MockVideoWriter()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with FramePipeline(
+                    shape=(24, 32),
+                    device="cpu",
+                    video_writer=video_writer,
+                    frame_output_path=tmpdir,
+                    n_image_workers=2,
+                    n_buffers=2,
+            ) as pipeline:
+                for idx, image in enumerate(images):
+                    pipeline.put(image, idx)
+
+            expected = [to_uint8_image(i).numpy() for i in images]
+            # in order
+            self.assertEqual(len(video_writer.images), len(images))
+            for actual, image in zip(video_writer.images, expected):
+                self.assertTrue(np.array_equal(actual, image))
+            # lossless
+            for idx, image in enumerate(expected):
+                self.assertTrue(np.array_equal(np.asarray(Image.open(os.path.join(tmpdir, "{:06d}.png".format(idx)))), image))
+
+        fps = pipeline.timer.get_fps()
+        self.assertIn("video", fps)
+        self.assertIn("image", fps)
+
+    def test_image_writing_failed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pipeline = FramePipeline(
+                shape=(24, 32),
+                device="cpu",
+                video_writer=MockVideoWriter(),
+                frame_output_path=os.path.join(tmpdir, "not_exists"),
+                n_image_workers=1,
+                n_buffers=2,
+            )
+            for idx, image in enumerate(self.get_images(2)):
+                pipeline.put(image, idx)
+            with self.assertRaises(RuntimeError) as context:
+                pipeline.close()
+            self.assertIsInstance(context.exception.__cause__, FileNotFoundError)
+
+    def test_image_writer_broken(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pipeline = FramePipeline(
+                shape=(24, 32),
+                device="cpu",
+                video_writer=MockVideoWriter(),
+                frame_output_path=tmpdir,
+                n_image_workers=1,
+                n_buffers=2,
+            )
+            # `submit()` raises
+            pipeline.image_writer.shutdown()
+
+            errors = []
+
+            def put_all():
+                try:
+                    for idx, image in enumerate(self.get_images(16)):
+                        pipeline.put(image, idx)
+                except RuntimeError as e:
+                    errors.append(e)
+
+            # not blocked by the buffers never released
+            thread = threading.Thread(target=put_all)
+            thread.start()
+            thread.join(timeout=10.)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(len(errors), 1)
+
+            with self.assertRaises(RuntimeError) as context:
+                pipeline.close()
+            self.assertIs(context.exception.__cause__, errors[0].__cause__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import torch
+from internal.utils.gaussian_block_pool import GaussianBlockPool
+
+
+class GaussianBlockPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        generator = torch.Generator()
+        generator.manual_seed(42)
+        sizes = [5, 8, 13, 1, 20, 7]
+        self.blocks = {
+            i: {
+                "means": torch.randn((n, 3), generator=generator),
+                "opacities": torch.rand((n, 1), generator=generator) * 0.9 + 0.1,
+                "shs": torch.randn((n, 4, 3), generator=generator),
+            }
+            for i, n in enumerate(sizes)
+        }
+        self.loaded = []
+
+    def loader(self, key):
+        self.loaded.append(key)
+        return self.blocks[key]
+
+    def assert_properties(self, pool: GaussianBlockPool, keys):
+        properties = pool.get_properties()
+        # exclude the padding ones
+        is_valid = properties["opacities"].squeeze(-1) > 0.
+        if len(keys) == 0:
+            self.assertEqual(is_valid.sum().item(), 0)
+            return
+        for k in properties:
+            expected = torch.concat([self.blocks[i][k] for i in keys], dim=0)
+            actual = properties[k][is_valid]
+            self.assertEqual(actual.shape, expected.shape)
+            # the order of the blocks is not preserved
+            self.assertTrue(torch.equal(
+                torch.sort(actual.reshape(actual.shape[0], -1), dim=0).values,
+                torch.sort(expected.reshape(expected.shape[0], -1), dim=0).values,
+            ))
+
+    def test_update(self):
+        pool = GaussianBlockPool(self.loader, "cpu", slot_size=4)
+
+        for keys in [[0, 1, 2], [1, 2, 3], [4], [0, 1, 2, 3, 4, 5], [], [5, 2]]:
+            pool.update(keys)
+            self.assert_properties(pool, keys)
+
+        # resident blocks are neither reloaded nor uploaded again
+        self.assertEqual(sorted(self.loaded), list(range(6)))
+        n_uploads = pool.stats["uploads"]
+        pool.update([5, 2])
+        pool.update([2, 5])
+        self.assertEqual(pool.stats["uploads"], n_uploads)
+        self.assertEqual(pool.stats["evictions"], 0)
+
+    def test_bounded(self):
+        # 2 + 2 + 4 slots
+        pool = GaussianBlockPool(self.loader, "cpu", slot_size=4, max_slots=8, max_host_gaussians=26)
+
+        pool.update([0, 1, 2])
+        self.assert_properties(pool, [0, 1, 2])
+        self.assertEqual(pool.n_slots, 8)
+
+        pool.update([4])
+        self.assert_properties(pool, [4])
+        self.assertGreater(pool.stats["evictions"], 0)
+        self.assertLessEqual(pool.n_slots, 8)
+        self.assertLessEqual(pool.n_host_gaussians, 26)
+
+        # reloaded after being evicted from the host cache
+        pool.update([0, 3])
+        self.assert_properties(pool, [0, 3])
+        self.assertEqual(self.loaded.count(0), 2)
+
+        with self.assertRaises(RuntimeError):
+            pool.update([2, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
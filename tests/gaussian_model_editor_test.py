@@ -0,0 +1,222 @@
+import unittest
+import numpy as np
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.models.adaptive_sh_gaussian import AdaptiveSHGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.utils.gaussian_model_editor import MultipleGaussianModelEditor
+from internal.utils.gaussian_utils import GaussianTransformUtils
+
+
+class GaussianModelEditorTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_model(self, n: int, pre_activate: bool):
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        rand_kwargs = {"generator": self.generator}
+        model.means = torch.rand((n, 3), **rand_kwargs) - 0.5
+        model.scales = torch.log(torch.rand((n, 3), **rand_kwargs) * 0.1 + 0.05)
+        model.rotations = torch.randn((n, 4), **rand_kwargs)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), **rand_kwargs) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), **rand_kwargs)
+        model.shs_rest = torch.randn((n, 3, 3), **rand_kwargs) * 0.2
+        model.active_sh_degree = 1
+        if pre_activate:
+            model.pre_activate_all_properties()
+        return model
+
+    def get_expected(self, model, scale, r_wxyz, t_xyz):
+        xyz, scales = GaussianTransformUtils.rescale(model.get_means(), model.get_scales(), scale)
+        xyz, rotations, shs = GaussianTransformUtils.rotate_by_wxyz_quaternions(
+            xyz,
+            model.get_rotations(),
+            model.get_shs(),
+            torch.tensor(r_wxyz, dtype=torch.float),
+        )
+        xyz = GaussianTransformUtils.translation(xyz, *t_xyz.tolist())
+        return xyz, scales, rotations, shs
+
+    def assert_model(self, editor, begin, end, expected):
+        for actual, expected_value in zip(
+                [editor.get_means(), editor.get_scales(), editor.get_rotations(), editor.get_shs()],
+                expected,
+        ):
+            self.assertTrue(torch.allclose(actual[begin:end], expected_value, atol=1e-5))
+
+    def test_transform(self):
+        for pre_activate in [False, True]:
+            with self.subTest(pre_activate=pre_activate):
+                models = [self.get_model(16, pre_activate), self.get_model(24, pre_activate)]
+                editor = MultipleGaussianModelEditor(models, "cpu")
+                scale = 2.
+                r_wxyz = np.asarray([np.cos(0.3), 0., np.sin(0.3), 0.])
+                t_xyz = np.asarray([1., -2., 3.])
+
+                editor.transform_with_vectors(1, scale, r_wxyz, t_xyz)
+                self.assert_model(editor, 16, 40, self.get_expected(models[1], scale, r_wxyz, t_xyz))
+                # the others are not changed
+                self.assert_model(editor, 0, 16, self.get_expected(models[0], 1., np.asarray([1., 0., 0., 0.]), np.zeros(3)))
+
+                # nothing to do if unchanged
+                version = editor.get_version()
+                editor.transform_with_vectors(1, scale, r_wxyz.copy(), t_xyz.copy())
+                self.assertEqual(editor.get_version(), version)
+
+                # only the means are updated if only the translation is changed
+                scales_version = editor.gaussians["scales"]._version
+                rotations_version = editor.gaussians["rotations"]._version
+                t_xyz = np.asarray([0., 1., 0.])
+                editor.transform_with_vectors(1, scale, r_wxyz, t_xyz)
+                self.assertEqual(editor.gaussians["scales"]._version, scales_version)
+                self.assertEqual(editor.gaussians["rotations"]._version, rotations_version)
+                self.assert_model(editor, 16, 40, self.get_expected(models[1], scale, r_wxyz, t_xyz))
+
+                # back to the original state
+                editor.transform_with_vectors(1, 1., np.asarray([1., 0., 0., 0.]), np.zeros(3))
+                self.assert_model(editor, 16, 40, self.get_expected(models[1], 1., np.asarray([1., 0., 0., 0.]), np.zeros(3)))
+
+    def test_lazy_and_chained_transforms(self):
+        models = [self.get_model(16, False), self.get_model(24, False)]
+        originals = [{k: v.clone() for k, v in model.properties.items()} for model in models]
+        editor = MultipleGaussianModelEditor(models, "cpu")
+        # filled without changing the models
+        self.assertTrue(torch.equal(editor.gaussian_model.gaussians["means"], torch.concat([i["means"] for i in originals])))
+
+        # recorded only
+        means = editor.gaussian_model.gaussians["means"].clone()
+        editor.transform_with_vectors(0, 0.5, np.asarray([np.cos(0.2), np.sin(0.2), 0., 0.]), np.asarray([1., 0., 0.]))
+        self.assertTrue(torch.equal(editor.gaussian_model.gaussians["means"], means))
+        self.assertEqual(editor.get_transform(0), (0.5, (np.cos(0.2), np.sin(0.2), 0., 0.), (1., 0., 0.)))
+        self.assertEqual(editor.get_transform(1), (1., (1., 0., 0., 0.), (0., 0., 0.)))
+
+        # applied to the original state, only the transformed model is copied
+        generator = np.random.default_rng(42)
+        for _ in range(8):
+            scale = float(generator.uniform(0.5, 2.))
+            r_wxyz = generator.normal(size=4)
+            r_wxyz /= np.linalg.norm(r_wxyz)
+            t_xyz = generator.normal(size=3)
+            editor.transform_with_vectors(0, scale, r_wxyz, t_xyz)
+            self.assert_model(editor, 0, 16, self.get_expected(models[0], scale, r_wxyz, t_xyz))
+        self.assertEqual(list(editor._references.keys()), [0])
+        self.assertEqual(set(editor._references[0].keys()), {"means", "scales", "rotations", "shs_rest"})
+
+        # the models passed in are not modified
+        for model, original in zip(models, originals):
+            for k, v in original.items():
+                self.assertTrue(torch.equal(model.get_property(k), v))
+
+        with self.assertRaises(ValueError):
+            editor.transform_with_vectors(0, 0., np.asarray([1., 0., 0., 0.]), np.zeros(3))
+
+    def test_no_drift(self):
+        for pre_activate in [False, True]:
+            with self.subTest(pre_activate=pre_activate):
+                models = [self.get_model(16, pre_activate), self.get_model(24, pre_activate)]
+                originals = [{k: v.clone() for k, v in model.properties.items()} for model in models]
+                editor = MultipleGaussianModelEditor(models, "cpu")
+
+                # e.g. dragging a slider
+                generator = np.random.default_rng(42)
+                for _ in range(500):
+                    scale = float(generator.uniform(0.5, 2.))
+                    r_wxyz = generator.normal(size=4)
+                    r_wxyz /= np.linalg.norm(r_wxyz)
+                    editor.transform_with_vectors(1, scale, r_wxyz, generator.normal(size=3))
+                    editor.apply_edits()
+
+                scale, r_wxyz, t_xyz = 2., np.asarray([np.cos(0.3), 0., np.sin(0.3), 0.]), np.asarray([1., -2., 3.])
+                editor.transform_with_vectors(1, scale, r_wxyz, t_xyz)
+                self.assert_model(editor, 16, 40, self.get_expected(models[1], scale, r_wxyz, t_xyz))
+
+                # restored exactly
+                editor.transform_with_vectors(1, 1., np.asarray([1., 0., 0., 0.]), np.zeros(3))
+                editor.apply_edits()
+                for name, value in originals[1].items():
+                    self.assertTrue(torch.equal(editor.gaussian_model.get_property(name)[16:40], value), name)
+                for name, value in originals[0].items():
+                    self.assertTrue(torch.equal(editor.gaussian_model.get_property(name)[:16], value), name)
+
+    def test_delete(self):
+        models = [self.get_model(16, False), self.get_model(24, False)]
+        editor = MultipleGaussianModelEditor(models, "cpu", compaction_threshold=0.2)
+
+        # hidden only
+        mask = torch.zeros((40,), dtype=torch.bool)
+        mask[[0, 1, 20]] = True
+        editor.delete_gaussians(mask)
+        self.assertEqual(editor.get_xyz.shape[0], 40)
+        self.assertTrue(torch.all(editor.get_opacities()[mask] == 0.))
+        self.assertTrue(torch.equal(editor.deleted_mask, mask))
+
+        # compacted once exceeding the threshold
+        mask = torch.zeros((40,), dtype=torch.bool)
+        mask[30:36] = True
+        editor.delete_gaussians(mask)
+        self.assertEqual(editor.get_xyz.shape[0], 31)
+        self.assertIsNone(editor.deleted_mask)
+        self.assertEqual(editor.model_gaussian_indices, [(0, 14), (14, 31)])
+        preserved = torch.ones((24,), dtype=torch.bool)
+        preserved[[4, 14, 15, 16, 17, 18, 19]] = False
+        self.assertTrue(torch.equal(editor.get_means()[14:], models[1].get_means()[preserved]))
+
+        # the transforms work on the compacted segments
+        scale, r_wxyz, t_xyz = 2., np.asarray([np.cos(0.3), 0., 0., np.sin(0.3)]), np.asarray([0., 1., 2.])
+        editor.transform_with_vectors(1, scale, r_wxyz, t_xyz)
+        expected = self.get_expected(models[1], scale, r_wxyz, t_xyz)
+        self.assert_model(editor, 14, 31, [i[preserved] for i in expected])
+
+        # compacted before saving
+        mask = torch.zeros((31,), dtype=torch.bool)
+        mask[0] = True
+        editor.delete_gaussians(mask)
+        self.assertEqual(editor.get_non_pre_activated_properties()["means"].shape[0], 30)
+
+    def test_adaptive_sh_model(self):
+        for pre_activate in [False, True]:
+            with self.subTest(pre_activate=pre_activate):
+                vanilla_model = self.get_model(32, False)
+                properties = {k: v.detach() for k, v in vanilla_model.properties.items()}
+                model = AdaptiveSHGaussian(sh_degree=1).instantiate()
+                model.setup_from_vanilla_properties(properties, torch.randint(0, 2, (32,), generator=self.generator))
+                if pre_activate:
+                    model.pre_activate_all_properties()
+                model.freeze()
+                n_by_degree = model.get_n_gaussians_by_degree()
+                original = {
+                    "means": model.get_means().clone(),
+                    "scales": model.get_scales().clone(),
+                    "rotations": model.get_rotations().clone(),
+                    "shs": model.get_shs().clone(),
+                }
+                original_model = type("Original", (), {
+                    "get_means": lambda _: original["means"],
+                    "get_scales": lambda _: original["scales"],
+                    "get_rotations": lambda _: original["rotations"],
+                    "get_shs": lambda _: original["shs"],
+                })()
+
+                editor = MultipleGaussianModelEditor([model], "cpu", compaction_threshold=0.5)
+                scale, r_wxyz, t_xyz = 2., np.asarray([np.cos(0.3), 0., np.sin(0.3), 0.]), np.asarray([1., -2., 3.])
+                editor.transform_with_vectors(0, scale, r_wxyz, t_xyz)
+                self.assert_model(editor, 0, 32, self.get_expected(original_model, scale, r_wxyz, t_xyz))
+
+                # the deleted ones are removed from their degrees
+                mask = torch.zeros((32,), dtype=torch.bool)
+                mask[[0, n_by_degree[0]]] = True
+                editor.delete_gaussians(mask)
+                editor.compact()
+                self.assertEqual(editor.gaussian_model.get_n_gaussians_by_degree(), [n_by_degree[0] - 1, n_by_degree[1] - 1])
+                self.assert_model(editor, 0, 30, [i[~mask] for i in self.get_expected(original_model, scale, r_wxyz, t_xyz)])
+
+        with self.assertRaises(ValueError):
+            MultipleGaussianModelEditor([model, model], "cpu")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import unittest
+import torch
+from internal.utils import gaussian_projection
+
+
+# the previous dense matrix implementations
+
+
+def reference_build_rotation_matrix(quaternions):
+    r, x, y, z = quaternions[:, 0], quaternions[:, 1], quaternions[:, 2], quaternions[:, 3]
+    rotation_matrix = torch.zeros((quaternions.shape[0], 3, 3), dtype=quaternions.dtype, device=quaternions.device)
+    rotation_matrix[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    rotation_matrix[:, 0, 1] = 2 * (x * y - r * z)
+    rotation_matrix[:, 0, 2] = 2 * (x * z + r * y)
+    rotation_matrix[:, 1, 0] = 2 * (x * y + r * z)
+    rotation_matrix[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    rotation_matrix[:, 1, 2] = 2 * (y * z - r * x)
+    rotation_matrix[:, 2, 0] = 2 * (x * z - r * y)
+    rotation_matrix[:, 2, 1] = 2 * (y * z + r * x)
+    rotation_matrix[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return rotation_matrix
+
+
+def reference_compute_cov_3d(scales, scale_modifier, quaternions):
+    n_gaussians, n_scales = scales.shape
+    scaling_matrix = torch.zeros((n_gaussians, n_scales, n_scales), dtype=scales.dtype, device=scales.device)
+    for i in range(n_scales):
+        scaling_matrix[:, i, i] = scales[:, i] * scale_modifier
+    m = torch.bmm(reference_build_rotation_matrix(quaternions), scaling_matrix)
+    return torch.matmul(m, m.transpose(1, 2))
+
+
+def reference_compute_cov_2d(t, tan_fovx, tan_fovy, focal_x, focal_y, cov_3d, world_to_camera):
+    limx = 1.3 * tan_fovx
+    limy = 1.3 * tan_fovy
+    clamped_x = torch.clamp(t[:, 0] / t[:, 2], min=-limx, max=limx) * t[:, 2]
+    clamped_y = torch.clamp(t[:, 1] / t[:, 2], min=-limy, max=limy) * t[:, 2]
+    means_in_camera_space = torch.stack([clamped_x, clamped_y, t[:, 2]], dim=-1)
+
+    J = torch.zeros((t.shape[0], 3, 3), dtype=t.dtype, device=t.device)
+    J[:, 0, 0] = focal_x / means_in_camera_space[:, 2]
+    J[:, 0, 2] = -(focal_x * means_in_camera_space[:, 0]) / (means_in_camera_space[:, 2] * means_in_camera_space[:, 2])
+    J[:, 1, 1] = focal_y / means_in_camera_space[:, 2]
+    J[:, 1, 2] = -(focal_y * means_in_camera_space[:, 1]) / (means_in_camera_space[:, 2] * means_in_camera_space[:, 2])
+    T = torch.matmul(J, world_to_camera[:3, :3].T[None, :])
+    return (T @ cov_3d @ T.transpose(1, 2))[:, :2, :2]
+
+
+def reference_project_gaussians(means_3d, scales, scale_modifier, quaternions, world_to_camera, fx, fy, cx, cy, img_height, img_width, block_width, min_depth=0.01):
+    means_3d_in_camera_space = torch.matmul(means_3d, world_to_camera[:3, :3]) + world_to_camera[3, :3]
+    is_min_depth_satisfied = means_3d_in_camera_space[:, 2] >= min_depth
+    cov_3d = reference_compute_cov_3d(scales, scale_modifier, quaternions)
+    cov_2d = reference_compute_cov_2d(
+        means_3d_in_camera_space,
+        tan_fovx=(0.5 * img_width) / fx,
+        tan_fovy=(0.5 * img_height) / fy,
+        focal_x=fx,
+        focal_y=fy,
+        cov_3d=cov_3d,
+        world_to_camera=world_to_camera,
+    )
+    cov_2d_det_orig = torch.linalg.det(cov_2d)
+    cov_2d = torch.stack([cov_2d[:, 0, 0] + 0.3, cov_2d[:, 0, 1], cov_2d[:, 1, 0], cov_2d[:, 1, 1] + 0.3], dim=-1).reshape((-1, 2, 2))
+    cov_2d_det = torch.linalg.det(cov_2d)
+    compensation = torch.sqrt(torch.clamp_min(cov_2d_det_orig / cov_2d_det, 0.))
+    inv_det = 1. / cov_2d_det
+    conic = torch.stack([cov_2d[:, 1, 1] * inv_det, -cov_2d[:, 0, 1] * inv_det, cov_2d[:, 0, 0] * inv_det], dim=-1)
+
+    means_3d_on_normalized_plane = means_3d_in_camera_space / (means_3d_in_camera_space[:, 2:] + 1e-6)
+    intrinsics_matrix = torch.tensor([[fx, 0, cx], [0, fy, cy], [0, 0, 1]], dtype=means_3d.dtype)
+    means_2d_on_image_plane = torch.matmul(means_3d_on_normalized_plane, intrinsics_matrix.T)
+
+    mid = 0.5 * (cov_2d[:, 0, 0] + cov_2d[:, 1, 1])
+    sqrt_diff = torch.sqrt(torch.clamp_min(mid[:, None] * mid[:, None] - cov_2d_det[:, None], 0.1))
+    radius = torch.ceil(3. * torch.sqrt(torch.maximum(mid[:, None] + sqrt_diff, mid[:, None] - sqrt_diff))).int()
+
+    tile_grid = torch.tensor([(img_width + block_width - 1) // block_width, (img_height + block_width - 1) // block_width, 1]).long()
+    block_xy = torch.tensor([[block_width, block_width]], dtype=torch.int)
+    rect_min = ((means_2d_on_image_plane[:, 0:2] - radius) / block_xy).int()
+    rect_max = ((means_2d_on_image_plane[:, 0:2] + radius) / block_xy).int() + 1
+    for rect in [rect_min, rect_max]:
+        for i in range(2):
+            rect[:, i] = torch.clamp(rect[:, i], min=0, max=tile_grid[i])
+    rect_diff = rect_max - rect_min
+    touched_tile_count = rect_diff[:, 0] * rect_diff[:, 1]
+
+    invert_mask = ~torch.logical_and(is_min_depth_satisfied, touched_tile_count > 0)
+    return (
+        torch.where(invert_mask[..., None], 0, means_2d_on_image_plane[:, 0:2]),
+        torch.where(invert_mask, 0, means_3d_in_camera_space[:, 2]),
+        torch.where(invert_mask, 0, radius.squeeze(-1)),
+        torch.where(invert_mask[..., None], 0, conic),
+        torch.where(invert_mask, 0, compensation),
+        torch.where(invert_mask, 0, touched_tile_count),
+        torch.where(invert_mask[..., None, None], 0, cov_3d),
+        ~invert_mask,
+        rect_min,
+        rect_max,
+    )
+
+
+class GaussianProjectionMathTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_inputs(self, n: int = 4096, dtype=torch.double):
+        rand_kwargs = {"generator": self.generator, "dtype": dtype}
+        rotation = torch.linalg.qr(torch.randn((3, 3), **rand_kwargs))[0]
+        world_to_camera = torch.eye(4, dtype=dtype)
+        world_to_camera[:3, :3] = rotation
+        world_to_camera[3, :3] = torch.tensor([0.1, -0.2, 3.], dtype=dtype)
+        quaternions = torch.randn((n, 4), **rand_kwargs)
+        return {
+            "means_3d": ((torch.rand((n, 3), **rand_kwargs) - 0.5) * 8.).requires_grad_(True),
+            "scales": (torch.rand((n, 3), **rand_kwargs) * 0.3 + 1e-3).requires_grad_(True),
+            "scale_modifier": 1.2,
+            "quaternions": (quaternions / quaternions.norm(dim=-1, keepdim=True)).requires_grad_(True),
+            "world_to_camera": world_to_camera,
+            "fx": torch.tensor(500., dtype=dtype),
+            "fy": torch.tensor(510., dtype=dtype),
+            "cx": torch.tensor(320., dtype=dtype),
+            "cy": torch.tensor(240., dtype=dtype),
+            "img_height": torch.tensor(480),
+            "img_width": torch.tensor(640),
+            "block_width": 16,
+        }
+
+    def assert_values_and_gradients_close(self, outputs, expected, inputs):
+        differentiable = [i for i in inputs if isinstance(i, torch.Tensor) and i.requires_grad]
+        for output, expected_output in zip(outputs, expected):
+            self.assertEqual(output.shape, expected_output.shape)
+            self.assertEqual(output.dtype, expected_output.dtype)
+            if output.dtype.is_floating_point:
+                self.assertTrue(torch.allclose(output, expected_output, rtol=1e-6, atol=1e-9))
+            else:
+                self.assertTrue(torch.equal(output, expected_output))
+
+            if output.requires_grad:
+                weights = torch.rand(output.shape, generator=self.generator, dtype=output.dtype)
+                grads = torch.autograd.grad((output * weights).sum(), differentiable, allow_unused=True, retain_graph=True)
+                expected_grads = torch.autograd.grad((expected_output * weights).sum(), differentiable, allow_unused=True, retain_graph=True)
+                for grad, expected_grad in zip(grads, expected_grads):
+                    self.assertEqual(grad is None, expected_grad is None)
+                    if grad is not None:
+                        self.assertTrue(torch.allclose(grad, expected_grad, rtol=1e-6, atol=1e-9))
+
+    def test_cov_3d(self):
+        inputs = self.get_inputs()
+        self.assertTrue(torch.equal(
+            gaussian_projection.build_rotation_matrix(inputs["quaternions"]),
+            reference_build_rotation_matrix(inputs["quaternions"]),
+        ))
+
+        args = (inputs["scales"], inputs["scale_modifier"], inputs["quaternions"])
+        self.assert_values_and_gradients_close(
+            [gaussian_projection.compute_cov_3d(*args)],
+            [reference_compute_cov_3d(*args)],
+            args,
+        )
+
+        cov_3d_triu = gaussian_projection.compute_cov_3d_triu(*args)
+        self.assertTrue(torch.equal(gaussian_projection.triu_to_symmetric(cov_3d_triu), gaussian_projection.compute_cov_3d(*args)))
+        self.assertTrue(torch.equal(gaussian_projection.symmetric_to_triu(gaussian_projection.triu_to_symmetric(cov_3d_triu)), cov_3d_triu))
+
+    def test_cov_2d(self):
+        inputs = self.get_inputs()
+        t = torch.matmul(inputs["means_3d"], inputs["world_to_camera"][:3, :3]) + inputs["world_to_camera"][3, :3]
+        cov_3d = reference_compute_cov_3d(inputs["scales"], inputs["scale_modifier"], inputs["quaternions"])
+        args = (t, 0.5 * 640 / inputs["fx"], 0.5 * 480 / inputs["fy"], inputs["fx"], inputs["fy"], cov_3d, inputs["world_to_camera"])
+        self.assert_values_and_gradients_close(
+            [gaussian_projection.compute_cov_2d(*args)],
+            [reference_compute_cov_2d(*args)],
+            [inputs["means_3d"], inputs["scales"], inputs["quaternions"]],
+        )
+
+    def test_project_gaussians(self):
+        inputs = self.get_inputs()
+        outputs = gaussian_projection.project_gaussians(**inputs)
+        expected = reference_project_gaussians(**inputs)
+
+        # the test covers both the visible and invisible ones
+        self.assertTrue(torch.any(expected[7]))
+        self.assertTrue(torch.any(~expected[7]))
+
+        self.assert_values_and_gradients_close(outputs, expected, [inputs["means_3d"], inputs["scales"], inputs["quaternions"]])
+
+    def test_compiled_project_gaussians(self):
+        inputs = self.get_inputs(n=1024, dtype=torch.float)
+        try:
+            outputs = gaussian_projection.project_gaussians(**inputs, compile=True)
+        except Exception as e:
+            self.skipTest("torch.compile is not available: {}".format(e))
+        expected = gaussian_projection.project_gaussians(**inputs)
+
+        for output, expected_output in zip(outputs, expected):
+            if output.dtype.is_floating_point:
+                self.assertTrue(torch.allclose(output, expected_output, rtol=1e-4, atol=1e-4))
+            else:
+                # the radii and rects may differ by one at the rounding boundaries
+                self.assertLessEqual((output.int() - expected_output.int()).abs().max().item(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import struct
+import torch
+from internal.utils.gaussian_projection import build_tile_bounds, build_gaussian_sort_key
+
+
+def build_gaussian_sort_key_loop(depths, rect_min, rect_max, tile_bounds, cumsum_tiles_hit):
+    """
+    The previous Python loop implementation
+    """
+
+    total_tiles_hit = cumsum_tiles_hit[-1].item()
+    sort_key = torch.zeros((total_tiles_hit,), dtype=torch.int64, device=depths.device)
+    gaussian_ids = torch.zeros((total_tiles_hit,), dtype=torch.int32, device=depths.device)
+
+    base_index_list = torch.concat([
+        torch.tensor([0], dtype=cumsum_tiles_hit.dtype, device=cumsum_tiles_hit.device),
+        cumsum_tiles_hit,
+    ], dim=0)
+
+    for gaussian_idx in range(depths.shape[0]):
+        depth_id_n = struct.unpack("i", struct.pack("f", depths[gaussian_idx]))[0]
+        index = base_index_list[gaussian_idx].item()
+        for i in range(rect_min[gaussian_idx][1], rect_max[gaussian_idx][1]):
+            row_tile_id_offset = tile_bounds[0] * i
+            for j in range(rect_min[gaussian_idx][0], rect_max[gaussian_idx][0]):
+                tile_id = row_tile_id_offset + j
+                sort_key[index] = (tile_id << 32) | depth_id_n
+                gaussian_ids[index] = gaussian_idx
+                index += 1
+
+    return sort_key, gaussian_ids
+
+
+class GaussianSortKeyTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_dummy_projections(self, n: int, img_width: int = 200, img_height: int = 150, block_width: int = 16):
+        # the same as `project_gaussians()`
+        tile_bounds = build_tile_bounds(torch.tensor(img_height), torch.tensor(img_width), block_width, device="cpu")
+        means_2d = torch.rand((n, 2), generator=self.generator) * torch.tensor([img_width, img_height]) * 1.4 - 0.2 * torch.tensor([img_width, img_height])
+        radius = torch.randint(0, 40, (n, 1), generator=self.generator, dtype=torch.int)
+        rect_min = ((means_2d - radius) / block_width).int()
+        rect_max = ((means_2d + radius) / block_width).int() + 1
+        for rect in [rect_min, rect_max]:
+            for i in range(2):
+                rect[:, i] = torch.clamp(rect[:, i], min=0, max=tile_bounds[i])
+        rect_diff = rect_max - rect_min
+        touched_tile_count = rect_diff[:, 0] * rect_diff[:, 1]
+
+        mask = torch.logical_and(torch.rand((n,), generator=self.generator) > 0.1, touched_tile_count > 0)
+        depths = torch.where(mask, torch.rand((n,), generator=self.generator) * 100., 0.)
+        num_tiles_hit = torch.where(mask, touched_tile_count, 0)
+
+        # only the valid ones are enumerated by the loop implementation
+        rect_max = torch.where(mask[:, None], rect_max, rect_min)
+
+        return depths, rect_min, rect_max, tile_bounds, torch.cumsum(num_tiles_hit, dim=-1)
+
+    def test_bit_exact(self):
+        depths, rect_min, rect_max, tile_bounds, cumsum_tiles_hit = self.get_dummy_projections(2048)
+        self.assertGreater(cumsum_tiles_hit[-1].item(), 0)
+
+        # the tile id overflows in int32 in the loop version
+        expected = build_gaussian_sort_key_loop(depths, rect_min, rect_max, tile_bounds.long(), cumsum_tiles_hit)
+
+        for tile_bounds_dtype in [torch.int, torch.long]:
+            sort_key, gaussian_ids = build_gaussian_sort_key(depths, rect_min, rect_max, tile_bounds.to(tile_bounds_dtype), cumsum_tiles_hit)
+            self.assertEqual(sort_key.dtype, torch.int64)
+            self.assertEqual(gaussian_ids.dtype, torch.int32)
+            self.assertTrue(torch.equal(sort_key, expected[0]))
+            self.assertTrue(torch.equal(gaussian_ids, expected[1]))
+
+        # tile id at high 32 bits, depth bits at low 32 bits
+        self.assertTrue(torch.all((sort_key >> 32) < tile_bounds[0] * tile_bounds[1]))
+        self.assertTrue(torch.equal(
+            (sort_key & 0xFFFFFFFF).to(torch.int32).view(torch.float32),
+            depths[gaussian_ids.long()],
+        ))
+
+        # sorted
+        sorted_key, sorted_gaussian_ids = build_gaussian_sort_key(depths, rect_min, rect_max, tile_bounds, cumsum_tiles_hit, sort=True)
+        expected_sorted_key, order = torch.sort(expected[0], stable=True)
+        self.assertTrue(torch.equal(sorted_key, expected_sorted_key))
+        self.assertTrue(torch.equal(sorted_gaussian_ids, expected[1][order]))
+
+    def test_no_intersections(self):
+        depths, rect_min, rect_max, tile_bounds, _ = self.get_dummy_projections(16)
+        sort_key, gaussian_ids = build_gaussian_sort_key(depths, rect_min, rect_max, tile_bounds, torch.zeros((16,), dtype=torch.int))
+        self.assertEqual(sort_key.shape, (0,))
+        self.assertEqual(gaussian_ids.shape, (0,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.cameras.cameras import Cameras
+
+try:
+    from internal.renderers.gsplat_hit_pixel_count_renderer import GSplatHitPixelCountRenderer
+except ImportError as e:
+    # requires gsplat
+    GSplatHitPixelCountRenderer = None
+    import_error = e
+
+
+def get_camera(tx: float, width: int = 64, height: int = 48):
+    return Cameras(
+        R=torch.eye(3)[None],
+        T=torch.tensor([[-tx, 0., 2.]]),
+        fx=torch.tensor([0.8 * width]),
+        fy=torch.tensor([0.8 * width]),
+        cx=torch.tensor([0.5 * width]),
+        cy=torch.tensor([0.5 * height]),
+        width=torch.tensor([width], dtype=torch.int),
+        height=torch.tensor([height], dtype=torch.int),
+        appearance_id=torch.zeros((1,), dtype=torch.int),
+        normalized_appearance_id=torch.zeros((1,)),
+        distortion_params=None,
+        camera_type=torch.zeros((1,), dtype=torch.int),
+    )[0]
+
+
+class GSplatHitPixelCountTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        if GSplatHitPixelCountRenderer is None:
+            self.skipTest(str(import_error))
+        if not torch.cuda.is_available():
+            self.skipTest("CUDA is not available")
+
+        generator = torch.Generator()
+        generator.manual_seed(42)
+        n = 1024
+        model = VanillaGaussian(sh_degree=0).instantiate()
+        model.setup_from_number(n)
+        model.means = torch.rand((n, 3), generator=generator) - 0.5
+        model.scales = torch.log(torch.rand((n, 3), generator=generator) * 0.05 + 0.01)
+        model.rotations = torch.randn((n, 4), generator=generator)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), generator=generator) * 0.98 + 0.01)
+        self.model = model.to("cuda")
+
+    def test_batch_hit_pixel_count(self):
+        cameras = [get_camera(0.1 * i) for i in range(5)] + [get_camera(0., width=40), get_camera(0.2, width=40)]
+        kwargs = {
+            "means3D": self.model.get_xyz,
+            "opacities": self.model.get_opacity,
+            "scales": self.model.get_scaling,
+            "rotations": self.model.get_rotation,
+        }
+
+        outputs = dict(GSplatHitPixelCountRenderer.batch_hit_pixel_count(cameras=cameras, max_batch_size=3, **kwargs))
+        self.assertEqual(sorted(outputs.keys()), list(range(len(cameras))))
+        for idx, camera in enumerate(cameras):
+            expected = GSplatHitPixelCountRenderer.hit_pixel_count(viewpoint_camera=camera.to_device("cuda"), **kwargs)
+            for actual_value, expected_value in zip(outputs[idx], expected):
+                # the projections of v0 and v1 differ slightly at the boundaries
+                self.assertLess((actual_value.float() - expected_value.float()).abs().sum() / expected_value.float().abs().sum(), 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+import unittest
+import math
+import torch
+from internal.configs.light_gaussian import LightGaussian
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.utils.light_gaussian import (
+    LightGaussianScoreAccumulator,
+    calculate_v_imp_score,
+    get_prune_mask,
+    get_prune_mask_agreement,
+)
+
+try:
+    from internal.gaussian_splatting import GaussianSplatting
+except ImportError as e:
+    # requires the CUDA rasterizers
+    GaussianSplatting = None
+    import_error = e
+
+
+class LightGaussianScoreAccumulatorTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_camera_scores(self, n_cameras: int, n_gaussians: int):
+        """
+        The synthetic outputs of the hit pixel counting, one tuple per camera
+        """
+
+        scores = []
+        for _ in range(n_cameras):
+            count = torch.randint(0, 64, (n_gaussians,), generator=self.generator).float()
+            opacity_score = count * torch.rand((n_gaussians,), generator=self.generator)
+            alpha_score = opacity_score * torch.rand((n_gaussians,), generator=self.generator)
+            visibility_score = (count > 0).float()
+            scores.append((count, opacity_score, alpha_score, visibility_score))
+        return scores
+
+    def test_update(self):
+        scores = self.get_camera_scores(8, 32)
+        exact = [torch.stack(i).sum(dim=0) for i in zip(*scores)]
+
+        # all the cameras once
+        accumulator = LightGaussianScoreAccumulator(n_cameras=8)
+        self.assertEqual(accumulator.n_gaussians, 0)
+        self.assertFalse(accumulator.is_valid_for(32))
+        for i in scores:
+            accumulator.update(*i)
+        self.assertTrue(accumulator.is_valid_for(32))
+        self.assertFalse(accumulator.is_valid_for(31))
+        for actual, expected in zip(accumulator.get_count_and_score(), exact):
+            self.assertTrue(torch.allclose(actual, expected))
+
+        # every camera twice, scaled back to the camera set
+        accumulator = LightGaussianScoreAccumulator(n_cameras=8)
+        for i in scores + scores:
+            accumulator.update(*i)
+        self.assertEqual(accumulator.total_weight, 16.)
+        for actual, expected in zip(accumulator.get_count_and_score(), exact):
+            self.assertTrue(torch.allclose(actual, expected))
+
+        # a part of the cameras, extrapolated
+        accumulator = LightGaussianScoreAccumulator(n_cameras=8)
+        for i in scores[:2]:
+            accumulator.update(*i)
+        for actual, partial in zip(accumulator.get_count_and_score(), zip(*scores[:2])):
+            self.assertTrue(torch.allclose(actual, 4. * torch.stack(partial).sum(dim=0)))
+
+    def test_weight(self):
+        scores = self.get_camera_scores(4, 32)
+        exact = [torch.stack(i).sum(dim=0) for i in zip(*scores)]
+
+        # the first camera is sampled twice as often as the others, so its weight is the half
+        accumulator = LightGaussianScoreAccumulator(n_cameras=4)
+        for i in [scores[0], scores[0], scores[1], scores[2], scores[3]]:
+            accumulator.update(*i, weight=0.5 if i is scores[0] else 1.)
+        self.assertEqual(accumulator.total_weight, 4.)
+        for actual, expected in zip(accumulator.get_count_and_score(), exact):
+            self.assertTrue(torch.allclose(actual, expected))
+
+    def test_reset_on_density_changed(self):
+        scores = self.get_camera_scores(2, 32)
+        accumulator = LightGaussianScoreAccumulator(n_cameras=2)
+        accumulator.update(*scores[0])
+
+        accumulator.update(*[i[:16] for i in scores[1]])
+        self.assertEqual(accumulator.n_gaussians, 16)
+        self.assertEqual(accumulator.total_weight, 1.)
+        for actual, expected in zip(accumulator.get_count_and_score(), scores[1]):
+            self.assertTrue(torch.allclose(actual, 2. * expected[:16]))
+
+        accumulator.reset(16, "cpu")
+        self.assertFalse(accumulator.is_valid_for(16))
+        with self.assertRaises(AssertionError):
+            accumulator.get_count_and_score()
+
+    def test_update_by_render_outputs(self):
+        model = VanillaGaussian(sh_degree=0).instantiate()
+        model.setup_from_number(4)
+        model.opacities = inverse_sigmoid(torch.tensor([[0.5], [0.25], [0.75], [0.5]]))
+
+        accumulator = LightGaussianScoreAccumulator(n_cameras=1)
+        accumulator.update_by_render_outputs(model, {
+            "radii": torch.tensor([2, 1, 0, 3], dtype=torch.int),
+            "visibility_filter": torch.tensor([True, True, False, False]),
+        })
+        count, opacity_score, alpha_score, visibility_score = accumulator.get_count_and_score()
+        self.assertTrue(torch.allclose(count, torch.tensor([4 * math.pi, math.pi, 0., 0.])))
+        self.assertTrue(torch.allclose(opacity_score, torch.tensor([2 * math.pi, 0.25 * math.pi, 0., 0.])))
+        self.assertTrue(torch.allclose(alpha_score, opacity_score))
+        self.assertTrue(torch.equal(visibility_score, torch.tensor([1., 1., 0., 0.])))
+
+        # rendered before the density changed
+        accumulator.update_by_render_outputs(model, {
+            "radii": torch.ones((3,), dtype=torch.int),
+            "visibility_filter": torch.ones((3,), dtype=torch.bool),
+        })
+        self.assertEqual(accumulator.total_weight, 1.)
+
+    def test_get_accumulating_prune_step(self):
+        prune_steps = [20, 10]
+        self.assertEqual(
+            [LightGaussianScoreAccumulator.get_accumulating_prune_step(prune_steps, i, 3) for i in range(6, 23)],
+            [None, None, 10, 10, 10, None, None, None, None, None, None, None, 20, 20, 20, None, None],
+        )
+        self.assertIsNone(LightGaussianScoreAccumulator.get_accumulating_prune_step([], 1, 3))
+
+    def test_prune_mask(self):
+        n_gaussians = 256
+        scores = self.get_camera_scores(6, n_gaussians)
+        scales = torch.rand((n_gaussians, 3), generator=self.generator) + 0.01
+        _, exact_score, _, _ = [torch.stack(i).sum(dim=0) for i in zip(*scores)]
+
+        accumulator = LightGaussianScoreAccumulator(n_cameras=6)
+        for i in scores[::-1]:
+            accumulator.update(*i)
+        _, accumulated_score, _, _ = accumulator.get_count_and_score()
+
+        v_list = calculate_v_imp_score(scales, accumulated_score, 0.1)
+        prune_mask = get_prune_mask(0.25, v_list)
+        # the lowest ranked ones are pruned
+        self.assertAlmostEqual(prune_mask.float().mean().item(), 0.25, delta=0.01)
+        self.assertLess(v_list[prune_mask].max(), v_list[~prune_mask].min())
+
+        exact_prune_mask = get_prune_mask(0.25, calculate_v_imp_score(scales, exact_score, 0.1))
+        self.assertEqual(get_prune_mask_agreement(prune_mask, exact_prune_mask), (1., 1.))
+
+        # half of the pruned ones are different
+        mask = prune_mask.clone()
+        pruned = torch.nonzero(mask).squeeze(-1)
+        kept = torch.nonzero(~mask).squeeze(-1)
+        mask[pruned[:8]] = False
+        mask[kept[:8]] = True
+        agreement, iou = get_prune_mask_agreement(mask, prune_mask)
+        self.assertAlmostEqual(agreement, 1. - 16. / n_gaussians)
+        n_pruned = prune_mask.sum().item()
+        self.assertAlmostEqual(iou, (n_pruned - 8) / (n_pruned + 8), places=6)
+
+
+class LightGaussianAccumulationHookTestCase(unittest.TestCase):
+    class Host:
+        """
+        Provides the attributes required by the LightGaussian methods of `GaussianSplatting`
+        """
+
+        def __init__(self, gaussian_model, hparams: LightGaussian):
+            self.gaussian_model = gaussian_model
+            self.light_gaussian_hparams = hparams
+            self.light_gaussian_score_accumulator = LightGaussianScoreAccumulator(n_cameras=4)
+            self.light_gaussian_accumulating_for = -1
+            self.exact_pass_count = 0
+
+        def _get_light_gaussian_exact_count_and_score(self, anti_aliased: bool):
+            self.exact_pass_count += 1
+            return tuple(torch.full((self.gaussian_model.n_gaussians,), -1.) for _ in range(4))
+
+    def setUp(self):
+        super().setUp()
+        if GaussianSplatting is None:
+            self.skipTest(str(import_error))
+
+        for name in ["_accumulate_light_gaussian_score", "_get_light_gaussian_count_and_score"]:
+            setattr(self.Host, name, getattr(GaussianSplatting, name))
+
+    def get_model(self, n: int):
+        model = VanillaGaussian(sh_degree=0).instantiate()
+        model.setup_from_number(n)
+        model.opacities = inverse_sigmoid(torch.full((n, 1), 0.5))
+        return model
+
+    def test_accumulation_window(self):
+        model = self.get_model(8)
+        host = self.Host(model, LightGaussian(
+            prune_steps=[10, 20],
+            score_mode="accumulated",
+            score_accumulation_steps=3,
+            score_accumulation_source="render_outputs",
+        ))
+        accumulator = host.light_gaussian_score_accumulator
+        outputs = {
+            "radii": torch.ones((8,), dtype=torch.int),
+            "visibility_filter": torch.ones((8,), dtype=torch.bool),
+        }
+
+        for step in range(1, 11):
+            host._accumulate_light_gaussian_score(outputs, None, model, step, host)
+            self.assertEqual(accumulator.total_weight, max(step - 7, 0))
+        self.assertEqual(host.light_gaussian_accumulating_for, 10)
+
+        # the accumulated ones are used by the prune step
+        count, score, _, _ = host._get_light_gaussian_count_and_score(False)
+        self.assertEqual(host.exact_pass_count, 0)
+        self.assertTrue(torch.allclose(count, torch.full((8,), 4 * math.pi)))
+        self.assertTrue(torch.allclose(score, torch.full((8,), 2 * math.pi)))
+
+        # pruned, fallback to the exact pass
+        host.gaussian_model = model = self.get_model(6)
+        count, _, _, _ = host._get_light_gaussian_count_and_score(False)
+        self.assertEqual(host.exact_pass_count, 1)
+        self.assertTrue(torch.equal(count, torch.full((6,), -1.)))
+
+        # a new window
+        outputs = {k: v[:6] for k, v in outputs.items()}
+        for step in range(11, 19):
+            host._accumulate_light_gaussian_score(outputs, None, model, step, host)
+        self.assertEqual(host.light_gaussian_accumulating_for, 20)
+        self.assertEqual(accumulator.n_gaussians, 6)
+        self.assertEqual(accumulator.total_weight, 1.)
+        host._get_light_gaussian_count_and_score(False)
+        self.assertEqual(host.exact_pass_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import os
+import tempfile
+import unittest
+import torch
+from internal.cameras.cameras import Cameras
+from internal.utils.gaussian_projection import build_rotation_matrix, rotation_matrix_to_quaternion, compute_cov_3d
+from internal.utils.lod_tree import GaussianLoDTree
+from internal.renderers.lod_tree_renderer import LoDTreeRenderer
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+
+
+class LoDTreeTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_camera(self, distance: float, width: int = 64, height: int = 48):
+        # looking at the center of the scene toward +z
+        return Cameras(
+            R=torch.eye(3)[None],
+            T=torch.tensor([[0., 0., distance]]),
+            fx=torch.tensor([0.8 * width]),
+            fy=torch.tensor([0.8 * width]),
+            cx=torch.tensor([0.5 * width]),
+            cy=torch.tensor([0.5 * height]),
+            width=torch.tensor([width], dtype=torch.int),
+            height=torch.tensor([height], dtype=torch.int),
+            appearance_id=torch.zeros((1,), dtype=torch.int),
+            normalized_appearance_id=torch.zeros((1,)),
+            distortion_params=None,
+            camera_type=torch.zeros((1,), dtype=torch.int),
+        )[0]
+
+    def get_properties(self, n: int):
+        rand_kwargs = {"generator": self.generator}
+        return {
+            "means": torch.rand((n, 3), **rand_kwargs) - 0.5,
+            "scales": torch.rand((n, 3), **rand_kwargs) * 0.02 + 0.005,
+            "rotations": torch.nn.functional.normalize(torch.randn((n, 4), **rand_kwargs), dim=-1),
+            "opacities": torch.rand((n, 1), **rand_kwargs) * 0.9 + 0.05,
+            "shs": torch.randn((n, 4, 3), **rand_kwargs),
+        }
+
+    def test_rotation_matrix_to_quaternion(self):
+        quaternions = torch.nn.functional.normalize(torch.randn((1024, 4), generator=self.generator, dtype=torch.double), dim=-1)
+        recovered = rotation_matrix_to_quaternion(build_rotation_matrix(quaternions))
+        # q and -q are the same rotation
+        self.assertTrue(torch.allclose(recovered * torch.sign((recovered * quaternions).sum(-1, keepdim=True)), quaternions))
+
+    def test_merge(self):
+        properties = self.get_properties(2)
+        properties = {k: v.double() for k, v in properties.items()}
+        covariances = compute_cov_3d(properties["scales"], 1., properties["rotations"])
+        areas = GaussianLoDTree.compute_areas(properties["scales"])
+
+        means, merged_covariances, scales, rotations, opacities, shs, _ = GaussianLoDTree.merge(
+            properties["means"],
+            covariances,
+            properties["opacities"],
+            properties["shs"],
+            areas,
+            torch.tensor([0, 0]),
+            1,
+        )
+
+        # moments of the mixture
+        weights = properties["opacities"].squeeze(-1) * areas
+        weights = weights / weights.sum()
+        expected_mean = (weights[:, None] * properties["means"]).sum(0)
+        offsets = properties["means"] - expected_mean
+        expected_covariance = (weights[:, None, None] * (covariances + offsets[:, :, None] * offsets[:, None, :])).sum(0)
+        self.assertTrue(torch.allclose(means[0], expected_mean))
+        self.assertTrue(torch.allclose(merged_covariances[0], expected_covariance))
+        self.assertTrue(torch.allclose(shs[0], (weights[:, None, None] * properties["shs"]).sum(0)))
+        # the scales and rotations represent the covariance
+        self.assertTrue(torch.allclose(compute_cov_3d(scales, 1., rotations)[0], expected_covariance))
+        self.assertTrue(torch.all(opacities <= 1.))
+
+    def test_build(self):
+        n = 3000
+        properties = self.get_properties(n)
+        tree = GaussianLoDTree.build(**properties)
+
+        self.assertEqual(tree.n_leaves, n)
+        self.assertEqual(tree.child_counts.sum().item(), tree.n_nodes - 1)
+        self.assertEqual(tree.parents[tree.root].item(), -1)
+        self.assertEqual(tree.levels[tree.root].item(), tree.levels.max().item())
+        self.assertEqual(tree.child_indices.shape[0], tree.n_nodes - 1)
+        # the leaves are the input Gaussians
+        leaves = tree.select_leaves()
+        self.assertEqual(leaves.shape[0], n)
+        self.assertTrue(torch.equal(
+            torch.sort(tree.properties["means"][leaves], dim=0).values,
+            torch.sort(properties["means"], dim=0).values,
+        ))
+
+        internal_nodes = torch.nonzero(tree.child_counts).squeeze(-1)
+        self.assertTrue(torch.all(tree.child_counts[internal_nodes] >= 2))
+        self.assertTrue(torch.all(tree.child_counts[internal_nodes] <= 8))
+        children = tree.get_children(internal_nodes)
+        parents = torch.repeat_interleave(internal_nodes, tree.child_counts[internal_nodes])
+        self.assertTrue(torch.equal(tree.parents[children], parents))
+        self.assertTrue(torch.all(tree.levels[children] < tree.levels[parents]))
+        # the boxes and the error bounds are nested
+        self.assertTrue(torch.all(tree.aabb_min[parents] <= tree.aabb_min[children]))
+        self.assertTrue(torch.all(tree.aabb_max[parents] >= tree.aabb_max[children]))
+        self.assertTrue(torch.all(tree.errors[parents] >= tree.errors[children]))
+
+    def test_select(self):
+        n = 3000
+        tree = GaussianLoDTree.build(**self.get_properties(n))
+
+        def assert_is_cut(selected):
+            # each leaf is covered by exactly one selected node
+            is_selected = torch.zeros((tree.n_nodes,), dtype=torch.long)
+            is_selected[selected] = 1
+            # the number of the selected nodes on the path from the root
+            covered = is_selected.clone()
+            has_parent = tree.parents >= 0
+            for _ in range(tree.levels.max().item() + 1):
+                covered[has_parent] = is_selected[has_parent] + covered[tree.parents[has_parent]]
+            self.assertTrue(torch.all(covered[tree.select_leaves()] == 1))
+
+        near = tree.select(self.get_camera(2.), threshold=1., frustum_culling=False)
+        far = tree.select(self.get_camera(200.), threshold=1., frustum_culling=False)
+        assert_is_cut(near)
+        assert_is_cut(far)
+        self.assertLess(far.shape[0], near.shape[0])
+        self.assertLess(far.shape[0], 64)
+
+        # zero threshold selects all the leaves
+        self.assertTrue(torch.equal(tree.select(self.get_camera(200.), threshold=0., frustum_culling=False), tree.select_leaves()))
+
+        # bounded
+        for max_gaussians in [1, 100, 1000]:
+            selected = tree.select(self.get_camera(2.), threshold=0., max_gaussians=max_gaussians, frustum_culling=False)
+            self.assertLessEqual(selected.shape[0], max_gaussians)
+            assert_is_cut(selected)
+
+        # frustum culling, the camera is inside the scene
+        culled = tree.select(self.get_camera(0.), threshold=0.)
+        self.assertGreater(culled.shape[0], 0)
+        self.assertLess(culled.shape[0], n)
+
+    def test_renderer(self):
+        tree = GaussianLoDTree.build(**self.get_properties(1000))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tree_path = os.path.join(tmpdir, "lod_tree.pt")
+            tree.save(tree_path)
+
+            renderer = LoDTreeRenderer(tree=tree_path, renderer=TorchTileRenderer()).instantiate()
+            renderer.setup("validation")
+
+        bg_color = torch.zeros((3,))
+        with torch.no_grad():
+            for distance, threshold in [(2., 1.), (200., 1.), (2., 0.)]:
+                renderer.config.threshold = threshold
+                camera = self.get_camera(distance)
+                outputs = renderer(camera, None, bg_color)
+                self.assertEqual(outputs["render"].shape, (3, 48, 64))
+                self.assertTrue(torch.equal(renderer.selected, tree.select(camera, threshold=threshold)))
+                self.assertEqual(renderer.gaussian_model.n_gaussians, renderer.selected.shape[0])
+            # all the leaves
+            self.assertEqual(renderer.gaussian_model.n_gaussians, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import MagicMock
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.density_controllers.memory_budget import MemoryBudget, MemoryBudgetGovernor
+from internal.density_controllers.vanilla_density_controller import VanillaDensityController
+
+
+class MockMemoryReporter:
+    def __init__(self, peak_bytes: int):
+        self.peak_bytes = peak_bytes
+        self.n_resets = 0
+
+    def get_peak_bytes(self) -> int:
+        return self.peak_bytes
+
+    def reset_peak(self) -> None:
+        self.n_resets += 1
+
+
+class MemoryBudgetTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_model_and_optimizers(self, n: int):
+        model = VanillaGaussian().instantiate()
+        model.setup_from_number(n)
+        model.means = (torch.rand((n, 3), generator=self.generator) - 0.5) * 10.
+        # both clone and split candidates exist
+        model.scales = torch.log(torch.rand((n, 3), generator=self.generator) * 0.02)
+        model.rotations = torch.rand((n, 4), generator=self.generator)
+
+        optimizers = [torch.optim.Adam(
+            [{"params": [param], "name": name} for name, param in model.properties.items()],
+            lr=1e-3,
+        )]
+        # initialize states
+        for param in model.properties.values():
+            param.grad = torch.zeros_like(param)
+        optimizers[0].step()
+        for param in model.properties.values():
+            param.grad = None
+
+        return model, optimizers
+
+    def test_estimate_bytes_per_gaussian(self):
+        n = 1024
+        model, optimizers = self.get_model_and_optimizers(n)
+        buffers = [torch.zeros((n, 1)), torch.zeros((n,)), torch.tensor(1)]
+
+        # means 3, shs_dc 3, shs_rest 45, opacities 1, scales 3, rotations 4
+        n_floats = 3 + 3 + 45 + 1 + 3 + 4
+        expected = 4 * (
+            n_floats * 2  # properties and gradients
+            + n_floats * 2  # exp_avg and exp_avg_sq
+            + 2  # buffers, the scalar one is ignored
+        ) + 100
+        self.assertEqual(MemoryBudgetGovernor.estimate_bytes_per_gaussian(model, optimizers, buffers, renderer_bytes_per_gaussian=100), expected)
+
+    def test_select_by_budget(self):
+        n = 1024
+        model, optimizers = self.get_model_and_optimizers(n)
+
+        reporter = MockMemoryReporter(peak_bytes=1024 ** 3)
+        log_fn = MagicMock()
+        governor = MemoryBudgetGovernor(MemoryBudget(budget_gb=1.), memory_reporter=reporter, log_fn=log_fn)
+        bytes_per_gaussian = governor.estimate_bytes_per_gaussian(model, optimizers, renderer_bytes_per_gaussian=governor.config.renderer_bytes_per_gaussian)
+
+        scores = torch.rand((n,), generator=self.generator)
+        candidates = scores > 0.5
+        costs = torch.where(torch.arange(n) % 2 == 0, 2, 1)
+
+        # no memory available
+        self.assertEqual(governor.get_max_new_gaussians(model, optimizers), 0)
+        self.assertFalse(torch.any(governor.select_by_budget(scores, candidates, costs, model, optimizers)))
+
+        # within the budget
+        reporter.peak_bytes = 1024 ** 3 - 10 ** 6 * bytes_per_gaussian
+        selected = governor.select_by_budget(scores, candidates, costs, model, optimizers)
+        self.assertTrue(torch.all(selected == candidates))
+
+        # exceed the budget
+        budget = 100
+        reporter.peak_bytes = 1024 ** 3 - budget * bytes_per_gaussian
+        self.assertEqual(governor.get_max_new_gaussians(model, optimizers), budget)
+        selected = governor.select_by_budget(scores, candidates, costs, model, optimizers)
+        self.assertTrue(torch.all(candidates[selected]))
+        self.assertLessEqual(torch.sum(costs[selected]).item(), budget)
+        self.assertGreater(torch.sum(costs[selected]).item(), budget - 2)
+        # the selected ones have higher scores
+        self.assertGreater(scores[selected].min(), scores[torch.logical_and(candidates, ~selected)].max())
+
+        self.assertEqual(reporter.n_resets, 3)
+        log_fn.assert_any_call("memory/projected_peak_gb", (reporter.peak_bytes + torch.sum(costs[selected]).item() * bytes_per_gaussian) / 1024 ** 3)
+        log_fn.assert_any_call("memory/rejected_gaussians", torch.sum(costs[candidates]).item() - torch.sum(costs[selected]).item())
+
+    def test_vanilla_density_controller(self):
+        n = 1024
+        model, optimizers = self.get_model_and_optimizers(n)
+
+        density_controller = VanillaDensityController(memory_budget=MemoryBudget(budget_gb=1.)).instantiate()
+        density_controller.cameras_extent = 1.
+        density_controller.prune_extent = 1.
+        density_controller._init_state(n, "cpu")
+        density_controller.xyz_gradient_accum.copy_(torch.rand((n, 1), generator=self.generator))
+        density_controller.denom.fill_(1.)
+
+        budget = 100
+        bytes_per_gaussian = MemoryBudgetGovernor.estimate_bytes_per_gaussian(
+            model,
+            optimizers,
+            density_controller.buffers(),
+            renderer_bytes_per_gaussian=density_controller.config.memory_budget.renderer_bytes_per_gaussian,
+        )
+        reporter = MockMemoryReporter(peak_bytes=1024 ** 3 - budget * bytes_per_gaussian)
+        pl_module = MagicMock()
+        density_controller._setup_memory_budget_governor(pl_module, memory_reporter=reporter)
+
+        density_controller._densify_and_prune(None, model, optimizers)
+
+        # every candidate produces at least one Gaussian
+        self.assertGreater(model.n_gaussians, n)
+        self.assertLessEqual(model.n_gaussians, n + budget)
+        self.assertEqual(reporter.n_resets, 1)
+        pl_module.logger.log_metrics.assert_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
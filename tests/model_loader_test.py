@@ -0,0 +1,129 @@
+import unittest
+import os
+import tempfile
+import threading
+import torch
+from internal.viewer.model_loader import BackgroundModelLoader, CheckpointWatcher
+from internal.viewer.renderer import ViewerRenderer
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+
+
+class BackgroundModelLoaderTestCase(unittest.TestCase):
+    def test_loader(self):
+        statuses = []
+        loader = BackgroundModelLoader(on_status=statuses.append, status_interval=0.01)
+        try:
+            gate = threading.Event()
+            loaded = []
+
+            def load(value):
+                gate.wait()
+                return value
+
+            loader.submit("first", lambda: load(1), loaded.append)
+            # wait until the first one is started, then the pending one is replaced
+            while loader.current is None:
+                pass
+            loader.submit("second", lambda: load(2), loaded.append)
+            loader.submit("third", lambda: load(3), loaded.append)
+            self.assertTrue(loader.is_busy)
+            self.assertFalse(loader.wait(0.05))
+
+            gate.set()
+            self.assertTrue(loader.wait(10))
+            self.assertEqual(loaded, [1, 3])
+            self.assertEqual(loader.stats, {"loaded": 2, "failed": 0, "replaced": 1})
+            self.assertTrue(any(i.startswith("Loading `first`... ") and i.endswith("s") for i in statuses))
+            self.assertTrue(statuses[-1].startswith("Loaded `third` in "))
+
+            def fail():
+                raise ValueError("broken")
+
+            loader.submit("broken", fail, loaded.append)
+            self.assertTrue(loader.wait(10))
+            self.assertEqual(loader.stats["failed"], 1)
+            self.assertEqual(statuses[-1], "Failed to load `broken`: broken")
+            self.assertFalse(loader.is_busy)
+        finally:
+            loader.stop()
+
+
+class CheckpointWatcherTestCase(unittest.TestCase):
+    def test_poll(self):
+        with tempfile.TemporaryDirectory() as model_path:
+            checkpoint_dir = os.path.join(model_path, "checkpoints")
+            os.makedirs(checkpoint_dir)
+
+            def save(step: int, content: bytes = b"0"):
+                path = os.path.join(checkpoint_dir, "epoch=0-step={}.ckpt".format(step))
+                with open(path, "wb") as f:
+                    f.write(content)
+                return path
+
+            first = save(100)
+            watcher = CheckpointWatcher(model_path, lambda _: None, loaded_from=first)
+            self.assertIsNone(watcher.poll())
+
+            # reported after unchanged between two polls
+            second = save(200)
+            self.assertIsNone(watcher.poll())
+            self.assertEqual(watcher.poll(), second)
+            self.assertIsNone(watcher.poll())
+
+            # still being written
+            third = save(300)
+            self.assertIsNone(watcher.poll())
+            save(300, b"01")
+            self.assertIsNone(watcher.poll())
+            self.assertEqual(watcher.poll(), third)
+
+        # nothing saved yet
+        with tempfile.TemporaryDirectory() as model_path:
+            self.assertIsNone(CheckpointWatcher(model_path, lambda _: None).poll())
+
+    def test_watching(self):
+        with tempfile.TemporaryDirectory() as model_path:
+            path = os.path.join(model_path, "point_cloud", "iteration_1000", "point_cloud.ply")
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(b"0")
+
+            found = threading.Event()
+            watcher = CheckpointWatcher(model_path, lambda _: found.set(), interval=0.01).start()
+            try:
+                self.assertTrue(found.wait(10))
+            finally:
+                watcher.stop()
+
+
+class MockModel(torch.nn.Module):
+    def __init__(self, value: float):
+        super().__init__()
+        self.value = value
+
+
+class ViewerRendererSwapTestCase(unittest.TestCase):
+    def test_swap_model(self):
+        renderer = TorchTileRenderer().instantiate()
+        viewer_renderer = ViewerRenderer(MockModel(0.), renderer, torch.zeros((3,)))
+
+        # the same type, loaded in place
+        previous_model, previous_renderer = viewer_renderer.swap_model(MockModel(1.), TorchTileRenderer().instantiate())
+        self.assertEqual(previous_model.value, 0.)
+        self.assertIs(previous_renderer, renderer)
+        self.assertIs(viewer_renderer.renderer, renderer)
+        self.assertEqual(viewer_renderer.gaussian_model.value, 1.)
+
+        # replaced
+        another_renderer = torch.nn.Identity()
+        viewer_renderer.swap_model(MockModel(2.), another_renderer)
+        self.assertIs(viewer_renderer.renderer, another_renderer)
+
+        # the model only
+        viewer_renderer.swap_model(MockModel(3.))
+        self.assertIs(viewer_renderer.renderer, another_renderer)
+        self.assertEqual(viewer_renderer.gaussian_model.value, 3.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import torch
+from internal.cameras.cameras import Cameras
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+from internal.viewer.snapshot import ModelSnapshot
+
+
+class ModelSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_camera(self, width: int = 40, height: int = 30):
+        return Cameras(
+            R=torch.eye(3)[None],
+            T=torch.tensor([[0., 0., 2.]]),
+            fx=torch.tensor([0.8 * width]),
+            fy=torch.tensor([0.8 * width]),
+            cx=torch.tensor([0.5 * width]),
+            cy=torch.tensor([0.5 * height]),
+            width=torch.tensor([width], dtype=torch.int),
+            height=torch.tensor([height], dtype=torch.int),
+            appearance_id=torch.zeros((1,), dtype=torch.int),
+            normalized_appearance_id=torch.zeros((1,)),
+            distortion_params=None,
+            camera_type=torch.zeros((1,), dtype=torch.int),
+        )[0]
+
+    def get_model(self, n: int = 256):
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        rand_kwargs = {"generator": self.generator}
+        model.means = torch.rand((n, 3), **rand_kwargs) - 0.5
+        model.scales = torch.log(torch.rand((n, 3), **rand_kwargs) * 0.1 + 0.05)
+        model.rotations = torch.randn((n, 4), **rand_kwargs)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), **rand_kwargs) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), **rand_kwargs)
+        model.shs_rest = torch.randn((n, 3, 3), **rand_kwargs) * 0.2
+        model.active_sh_degree = 1
+        return model
+
+    def test_publish(self):
+        model = self.get_model()
+        model.means.grad = torch.ones_like(model.means)
+        snapshot = ModelSnapshot()
+        self.assertFalse(snapshot.is_available)
+
+        self.assertTrue(snapshot.publish(model, step=1))
+        idx, first = snapshot.acquire()
+        snapshot.release(idx)
+        self.assertIsNot(first, model)
+        self.assertTrue(torch.equal(first.means, model.means))
+        self.assertIsNone(first.means.grad)
+        self.assertFalse(first.means.requires_grad)
+
+        # isolated from the training
+        with torch.no_grad():
+            model.means.add_(1.)
+            model.active_sh_degree = 0
+        self.assertFalse(torch.equal(first.means, model.means))
+        self.assertEqual(first.active_sh_degree, 1)
+
+        self.assertTrue(snapshot.publish(model, step=2))
+        idx, second = snapshot.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(torch.equal(second.means, model.means))
+        self.assertEqual(second.active_sh_degree, 0)
+
+        # the buffer being rendered is not overwritten
+        self.assertTrue(snapshot.publish(model, step=3))
+        self.assertFalse(snapshot.publish(model, step=4))
+        self.assertEqual(snapshot.get_stats(), {"step": 3, "published": 3, "skipped": 1})
+        snapshot.release(idx)
+
+        # the tensors are reused
+        means_ptr = second.means.data_ptr()
+        with torch.no_grad():
+            model.means.add_(1.)
+        self.assertTrue(snapshot.publish(model, step=5))
+        idx, third = snapshot.acquire()
+        snapshot.release(idx)
+        self.assertIs(third, second)
+        self.assertEqual(third.means.data_ptr(), means_ptr)
+        self.assertTrue(torch.equal(third.means, model.means))
+
+        # densified
+        model.properties = {k: torch.concat([v, v[:8]], dim=0).detach() for k, v in model.properties.items()}
+        self.assertTrue(snapshot.publish(model, step=6))
+        self.assertTrue(snapshot.publish(model, step=7))
+        idx, densified = snapshot.acquire()
+        snapshot.release(idx)
+        self.assertEqual(densified.n_gaussians, 264)
+        self.assertTrue(torch.equal(densified.means, model.means))
+
+    def test_training_viewer_renderer(self):
+        try:
+            from internal.viewer.training_viewer import TrainingViewerRenderer
+        except ImportError as e:
+            # the viewer imports the CUDA rasterizers
+            self.skipTest(str(e))
+
+        model = self.get_model()
+        renderer = TorchTileRenderer().instantiate()
+        bg_color = torch.tensor([0., 0., 1.])
+        camera = self.get_camera()
+
+        snapshot = ModelSnapshot()
+        viewer_renderer = TrainingViewerRenderer(snapshot)
+        # nothing published
+        self.assertTrue(torch.all(viewer_renderer.get_outputs(camera) == 0.))
+
+        viewer_renderer.set_renderer(renderer, bg_color)
+        snapshot.publish(model, step=1)
+        with torch.no_grad():
+            expected = renderer(camera, model, bg_color)["render"]
+            model.means.add_(0.1)
+            images = viewer_renderer.get_batch_outputs([camera, camera])
+        self.assertEqual(len(images), 2)
+        for image in images:
+            self.assertTrue(torch.allclose(image, expected))
@@ -0,0 +1,76 @@
+import unittest
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+
+try:
+    from internal.renderers.gsplat_v1_renderer import GSplatV1Renderer
+    from internal.renderers.partition_lod_renderer import PartitionLoDRenderer
+except ImportError as e:
+    # requires gsplat
+    GSplatV1Renderer = None
+    import_error = e
+
+
+class PartitionLoDRendererTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        if GSplatV1Renderer is None:
+            self.skipTest(str(import_error))
+
+    def get_checkpoint(self, n: int, renderer_config):
+        generator = torch.Generator()
+        generator.manual_seed(42)
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        model.means = torch.rand((n, 3), generator=generator)
+        model.scales = torch.log(torch.rand((n, 3), generator=generator) * 0.1 + 0.05)
+        model.rotations = torch.randn((n, 4), generator=generator)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), generator=generator) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), generator=generator)
+        model.shs_rest = torch.randn((n, 3, 3), generator=generator)
+        model.active_sh_degree = 1
+        return {
+            "hyper_parameters": {
+                "gaussian": model.config,
+                "renderer": renderer_config,
+            },
+            "state_dict": {"gaussian_model.{}".format(k): v for k, v in model.state_dict().items()},
+        }
+
+    def test_load_block(self):
+        renderer = PartitionLoDRenderer(data="", names=[]).instantiate()
+        renderer.model_config = None
+        renderer.renderer_hparams = None
+
+        properties = renderer._load_block(self.get_checkpoint(8, GSplatV1Renderer(
+            block_size=8,
+            anti_aliased=False,
+            filter_2d_kernel_size=0.1,
+            separate_sh=False,
+            tile_based_culling=True,
+        )))
+        self.assertEqual(properties["means"].shape, (8, 3))
+        self.assertEqual(properties["shs"].shape, (8, 4, 3))
+        self.assertEqual(renderer.active_sh_degree, 1)
+
+        # the settings of the first block are kept
+        renderer._load_block(self.get_checkpoint(4, GSplatV1Renderer()))
+        renderer_config = renderer._get_gsplat_renderer_config()
+        self.assertEqual(renderer_config.block_size, 8)
+        self.assertFalse(renderer_config.anti_aliased)
+        self.assertEqual(renderer_config.filter_2d_kernel_size, 0.1)
+        self.assertFalse(renderer_config.separate_sh)
+        self.assertTrue(renderer_config.tile_based_culling)
+
+        # dropped
+        renderer = PartitionLoDRenderer(data="", names=[], drop_shs_rest=True).instantiate()
+        renderer.model_config = None
+        renderer.renderer_hparams = None
+        properties = renderer._load_block(self.get_checkpoint(8, GSplatV1Renderer()))
+        self.assertEqual(properties["shs"].shape, (8, 1, 3))
+        self.assertEqual(renderer.active_sh_degree, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import math
+import unittest
+import torch
+from internal.cameras.cameras import Cameras
+from internal.utils.spatial_index import GaussianSpatialIndex
+from internal.utils.partition_visibility import get_box_corners, is_box_in_frustum, get_visible_boxes
+
+WIDTH = 64
+HEIGHT = 48
+
+
+class PartitionVisibilityTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def look_at(self, position, target, focal: float = 40.):
+        position, target = torch.tensor(position, dtype=torch.float), torch.tensor(target, dtype=torch.float)
+        forward = torch.nn.functional.normalize(target - position, dim=-1)
+        right = torch.nn.functional.normalize(torch.linalg.cross(forward, torch.tensor([0., 0., 1.])), dim=-1)
+        down = torch.linalg.cross(forward, right)
+        R = torch.stack([right, down, forward])
+        return Cameras(
+            R=R[None],
+            T=(-R @ position)[None],
+            fx=torch.tensor([focal]),
+            fy=torch.tensor([focal]),
+            cx=torch.tensor([WIDTH / 2]),
+            cy=torch.tensor([HEIGHT / 2]),
+            width=torch.tensor([WIDTH], dtype=torch.int),
+            height=torch.tensor([HEIGHT], dtype=torch.int),
+            appearance_id=torch.zeros((1,), dtype=torch.int),
+            normalized_appearance_id=torch.zeros((1,)),
+            distortion_params=None,
+            camera_type=torch.zeros((1,), dtype=torch.int),
+        )[0]
+
+    def get_grid_layout(self, n: int = 4, size: float = 1.):
+        xy = torch.stack(torch.meshgrid(torch.arange(n), torch.arange(n), indexing="xy"), dim=-1).reshape(-1, 2).float() * size
+        heights = torch.rand((n * n, 1), generator=self.generator) * 0.2 * size
+        return torch.concat([xy, heights], dim=-1), torch.concat([xy + size, heights + 0.2 * size], dim=-1)
+
+    def get_rotation(self, angle: float):
+        c, s = math.cos(angle), math.sin(angle)
+        return torch.tensor([
+            [c, -s, 0.],
+            [s, c, 0.],
+            [0., 0., 1.],
+        ])
+
+    def get_sampled_visibility(self, camera, box_min, box_max, rotation, occluders=None, n: int = 17):
+        """
+        Returns:
+            [N] bool, whether any of the sampled points of each box is in the image and not occluded
+        """
+
+        steps = torch.linspace(0., 1., n)
+        weights = torch.stack(torch.meshgrid(steps, steps, steps, indexing="ij"), dim=-1).reshape(-1, 3)
+        points = box_min[:, None, :] + weights[None] * (box_max - box_min)[:, None, :]  # [N, n^3, 3]
+        points_in_camera = points @ rotation.T @ camera.world_to_camera[:3, :3] + camera.world_to_camera[3, :3]
+        depths = points_in_camera[..., 2]
+        u = points_in_camera[..., 0] / depths * camera.fx + camera.cx
+        v = points_in_camera[..., 1] / depths * camera.fy + camera.cy
+        is_visible = (depths > 0.01) & (u >= 0.) & (u <= WIDTH) & (v >= 0.) & (v <= HEIGHT)
+
+        if occluders is not None:
+            # intersect the rays toward the points with the bottom faces, which are opaque when seen from above
+            origin = camera.camera_center @ rotation
+            directions = points - origin
+            t = (occluders[0][:, 2] - origin[2])[:, None, None] / directions[None, ..., 2]  # [N_occluders, N, n^3]
+            hits = origin[:2] + t[..., None] * directions[None, ..., :2]
+            is_hit = torch.all((hits >= occluders[0][:, None, None, :2]) & (hits <= occluders[1][:, None, None, :2]), dim=-1)
+            is_hit &= (directions[None, ..., 2] < 0.) & (t > 0.) & (t < 1. - 1e-4)
+            is_visible &= ~torch.any(is_hit, dim=0)
+
+        return torch.any(is_visible, dim=-1)
+
+    def test_straddling(self):
+        box_min, box_max = self.get_grid_layout()
+        rotation = torch.eye(3)
+
+        # inside the partition 5, looking toward +x, the partitions on the other side of the camera plane are invisible
+        camera = self.look_at([1.5, 1.5, 0.1], [2.5, 1.5, 0.1])
+        is_visible = is_box_in_frustum(camera, box_min, box_max, rotation)
+        self.assertTrue(is_visible[5])
+        self.assertFalse(torch.any(is_visible.reshape(4, 4)[:, 0]))
+        # exact in this layout
+        self.assertTrue(torch.equal(is_visible, self.get_sampled_visibility(camera, box_min, box_max, rotation)))
+
+    def test_frustum(self):
+        for i in range(16):
+            box_min, box_max = self.get_grid_layout(n=8)
+            rotation = self.get_rotation(torch.rand((1,), generator=self.generator).item() * 2 * math.pi)
+            position = (torch.rand((3,), generator=self.generator) * torch.tensor([12., 12., 3.]) - torch.tensor([2., 2., 0.]))
+            target = torch.rand((3,), generator=self.generator) * torch.tensor([8., 8., 0.])
+            # in world space
+            camera = self.look_at((position @ rotation.T).tolist(), (target @ rotation.T).tolist())
+
+            is_visible = is_box_in_frustum(camera, box_min, box_max, rotation)
+            # conservative
+            self.assertTrue(torch.all(is_visible >= self.get_sampled_visibility(camera, box_min, box_max, rotation)))
+
+            # never worse than the plane test
+            normals, offsets = GaussianSpatialIndex.get_frustum_planes(camera)
+            corners = get_box_corners(box_min, box_max) @ rotation.T  # in world space
+            is_visible_by_planes = torch.all(torch.any(corners @ normals.T + offsets >= 0., dim=1), dim=-1)
+            self.assertTrue(torch.all(is_visible <= is_visible_by_planes))
+
+        # a box beside the camera, not separated by any of the planes, but by a box axis
+        camera = self.look_at([0., 0., 0.], [10., 10., 3.])
+        box_min = torch.tensor([[-1.8, -2.5, -3.3]])
+        box_max = torch.tensor([[-0.2, 3., 1.5]])
+        normals, offsets = GaussianSpatialIndex.get_frustum_planes(camera)
+        self.assertTrue(GaussianSpatialIndex.is_box_in_frustum(0.5 * (box_min + box_max), 0.5 * (box_max - box_min), normals, offsets)[0])
+        self.assertFalse(is_box_in_frustum(camera, box_min, box_max)[0])
+        self.assertFalse(self.get_sampled_visibility(camera, box_min, box_max, torch.eye(3))[0])
+
+    def test_occlusion(self):
+        # a plateau in front of a lower partition
+        box_min = torch.tensor([
+            [-5., 0., 5.],
+            [-5., 10., 0.],
+            [40., 10., 0.],
+        ])
+        box_max = torch.tensor([
+            [5., 10., 5.5],
+            [5., 12., 1.],
+            [50., 12., 1.],
+        ])
+        camera = self.look_at([0., -1., 6.], [0., 11., 0.5])
+
+        is_visible = get_visible_boxes(camera, box_min, box_max)
+        self.assertTrue(torch.equal(is_visible, torch.tensor([True, True, False])))
+
+        is_visible = get_visible_boxes(camera, box_min, box_max, occlusion_culling=True, tile_size=8)
+        self.assertTrue(torch.equal(is_visible, torch.tensor([True, False, False])))
+        self.assertFalse(self.get_sampled_visibility(camera, box_min, box_max, torch.eye(3), occluders=(box_min, box_max))[1])
+
+        # seen from below, the faces do not occlude
+        camera = self.look_at([0., -1., 0.5], [0., 11., 0.5])
+        is_visible = get_visible_boxes(camera, box_min, box_max, occlusion_culling=True, tile_size=8)
+        self.assertTrue(is_visible[1])
+
+    def test_conservative_occlusion(self):
+        n_occluded = 0
+        for i in range(16):
+            box_min, box_max = self.get_grid_layout(n=8)
+            # random terrain
+            box_min[:, 2] *= 20.
+            box_max[:, 2] = box_min[:, 2] + 0.2
+            rotation = self.get_rotation(torch.rand((1,), generator=self.generator).item() * 2 * math.pi)
+            position = torch.rand((3,), generator=self.generator) * torch.tensor([8., 8., 5.])
+            target = torch.rand((3,), generator=self.generator) * torch.tensor([8., 8., 1.])
+            camera = self.look_at((position @ rotation.T).tolist(), (target @ rotation.T).tolist())
+
+            is_visible = get_visible_boxes(camera, box_min, box_max, rotation, occlusion_culling=True, tile_size=4)
+            is_visible_sampled = self.get_sampled_visibility(camera, box_min, box_max, rotation, occluders=(box_min, box_max), n=9)
+            self.assertTrue(torch.all(is_visible >= is_visible_sampled))
+            n_occluded += (get_visible_boxes(camera, box_min, box_max, rotation) & ~is_visible).sum().item()
+        self.assertGreater(n_occluded, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
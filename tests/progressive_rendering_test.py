@@ -0,0 +1,188 @@
+import unittest
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.models.adaptive_sh_gaussian import AdaptiveSHGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.utils.gaussian_model_editor import MultipleGaussianModelEditor
+from internal.utils.light_gaussian import calculate_importance_order, calculate_v_imp_score
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+from internal.viewer.renderer import ViewerRenderer
+from internal.viewer.streaming import ProgressiveRenderingController
+from internal.cameras.cameras import Cameras
+
+
+def get_camera(width: int = 40, height: int = 30):
+    return Cameras(
+        R=torch.eye(3)[None],
+        T=torch.tensor([[0., 0., 2.]]),
+        fx=torch.tensor([0.8 * width]),
+        fy=torch.tensor([0.8 * width]),
+        cx=torch.tensor([0.5 * width]),
+        cy=torch.tensor([0.5 * height]),
+        width=torch.tensor([width], dtype=torch.int),
+        height=torch.tensor([height], dtype=torch.int),
+        appearance_id=torch.zeros((1,), dtype=torch.int),
+        normalized_appearance_id=torch.zeros((1,)),
+        distortion_params=None,
+        camera_type=torch.zeros((1,), dtype=torch.int),
+    )[0]
+
+
+class ProgressiveRenderingTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_model(self, n: int, pre_activate: bool):
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        rand_kwargs = {"generator": self.generator}
+        model.means = torch.rand((n, 3), **rand_kwargs) - 0.5
+        model.scales = torch.log(torch.rand((n, 3), **rand_kwargs) * 0.1 + 0.05)
+        model.rotations = torch.randn((n, 4), **rand_kwargs)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), **rand_kwargs) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), **rand_kwargs)
+        model.shs_rest = torch.randn((n, 3, 3), **rand_kwargs) * 0.2
+        model.active_sh_degree = 1
+        if pre_activate:
+            model.pre_activate_all_properties()
+        model.freeze()
+        return model
+
+    def test_importance_order(self):
+        for pre_activate in [False, True]:
+            with self.subTest(pre_activate=pre_activate):
+                model = self.get_model(64, pre_activate)
+                means = model.get_xyz.clone()
+                order = calculate_importance_order(model)
+                self.assertEqual(sorted(order.tolist()), list(range(64)))
+
+                model.reorder(order)
+                self.assertTrue(torch.equal(model.get_xyz, means[order]))
+                self.assertFalse(model.get_xyz.requires_grad)
+                score = calculate_v_imp_score(model.get_scaling, model.get_opacity.reshape(-1), 0.1)
+                self.assertTrue(torch.all(score[:-1] >= score[1:]))
+
+    def test_prefix_view(self):
+        renderer = TorchTileRenderer().instantiate()
+        camera = get_camera()
+        background_color = torch.zeros((3,))
+
+        for pre_activate in [False, True]:
+            with self.subTest(pre_activate=pre_activate):
+                model = self.get_model(64, pre_activate)
+                view = model.get_prefix_view(16)
+                self.assertEqual(view.n_gaussians, 16)
+                self.assertEqual(model.n_gaussians, 64)
+                # nothing is copied
+                for name in model.property_names:
+                    self.assertEqual(view.get_property(name).data_ptr(), model.get_property(name).data_ptr())
+                self.assertEqual(view.get_features.shape[0], 16)
+                self.assertEqual(view.get_opacity.shape[0], 16)
+
+                # the same as hiding the others
+                hidden = model.get_prefix_view(64)
+                opacities = hidden.get_opacities().clone()
+                opacities[16:] = 0.
+                hidden.set_property("opacities", hidden.opacity_inverse_activation(opacities))
+                self.assertGreater(model.get_opacities()[16:].min().item(), 0.)
+
+                with torch.no_grad():
+                    actual = renderer(camera, view, background_color)["render"]
+                    expected = renderer(camera, hidden, background_color)["render"]
+                self.assertTrue(torch.allclose(actual, expected, atol=1e-5))
+
+                viewer_renderer = ViewerRenderer(model, renderer, background_color)
+                with torch.no_grad():
+                    self.assertTrue(torch.allclose(viewer_renderer.get_outputs(camera, n_gaussians=16), expected, atol=1e-5))
+                    self.assertTrue(torch.allclose(viewer_renderer.get_batch_outputs([camera], n_gaussians=16)[0], expected, atol=1e-5))
+
+    def test_editor_prefix_view(self):
+        model = self.get_model(64, True)
+        editor = MultipleGaussianModelEditor([model], "cpu")
+        mask = torch.zeros((64,), dtype=torch.bool)
+        mask[0] = True
+        editor.delete_gaussians(mask)
+
+        view = editor.get_prefix_view(16)
+        self.assertEqual(view.n_gaussians, 16)
+        self.assertEqual(view.get_opacity[0].item(), 0.)
+        self.assertTrue(torch.equal(view.get_opacity[1:], model.get_opacity[1:16]))
+        # the store is not modified
+        self.assertGreater(model.get_opacity[0].item(), 0.)
+
+    def test_adaptive_sh_model(self):
+        for pre_activate in [False, True]:
+            with self.subTest(pre_activate=pre_activate):
+                vanilla_model = self.get_model(20, False)
+                properties = {k: v.detach() for k, v in vanilla_model.properties.items()}
+                model = AdaptiveSHGaussian(sh_degree=1).instantiate()
+                model.setup_from_vanilla_properties(properties, torch.randint(0, 2, (20,), generator=self.generator))
+                if pre_activate:
+                    model.pre_activate_all_properties()
+                model.freeze()
+                n_by_degree = model.get_n_gaussians_by_degree()
+                self.assertGreater(min(n_by_degree), 0)
+
+                # the stored order
+                view = model.get_prefix_view(n_by_degree[0] + 2)
+                self.assertEqual(view.get_n_gaussians_by_degree(), [n_by_degree[0], 2])
+                self.assertTrue(torch.equal(view.get_shs(), model.get_shs()[:n_by_degree[0] + 2]))
+
+                # the SHs are moved with the other properties, and the degrees are kept grouped
+                shs_by_means = {tuple(i.tolist()): j for i, j in zip(model.get_means(), model.get_shs())}
+                order = calculate_importance_order(model)
+                most_important = {tuple(i.tolist()) for i in model.get_means()[order[:10]]}
+                model.reorder(order)
+                self.assertEqual(model.get_n_gaussians_by_degree(), n_by_degree)
+                for means, shs in zip(model.get_means(), model.get_shs()):
+                    self.assertTrue(torch.equal(shs, shs_by_means[tuple(means.tolist())]))
+
+                view = model.get_prefix_view(10)
+                self.assertEqual(view.n_gaussians, 10)
+                self.assertEqual(sum(view.get_n_gaussians_by_degree()), 10)
+                self.assertTrue(all(i >= 0 for i in view.get_n_gaussians_by_degree()))
+                self.assertEqual({tuple(i.tolist()) for i in view.get_means()}, most_important)
+                for means, shs in zip(view.get_means(), view.get_shs()):
+                    self.assertTrue(torch.equal(shs, shs_by_means[tuple(means.tolist())]))
+                # the packed SHs are shared
+                self.assertEqual(view.get_property("shs_rest_1").data_ptr(), model.get_property("shs_rest_1").data_ptr())
+
+                self.assertEqual(model.get_prefix_view(20).n_gaussians, 20)
+                self.assertEqual(model.get_prefix_view(0).n_gaussians, 0)
+
+    def test_controller(self):
+        controller = ProgressiveRenderingController(target_fps=20., min_n_gaussians=1000)
+        n_total = 1_000_000
+        self.assertEqual(controller.get_n_gaussians(n_total), 100_000)
+
+        # 5ms overhead, 0.1 microseconds per Gaussian, 10ms sending: about 350k ones fit the 50ms
+        for _ in range(32):
+            n = controller.get_n_gaussians(n_total)
+            controller.record_frame(n, 0.005 + n * 1e-7, 0.01)
+        n = controller.get_n_gaussians(n_total)
+        self.assertGreater(n, 350_000 * 0.9)
+        self.assertLess(n, 350_000 * 1.1)
+        self.assertAlmostEqual(controller.get_stats()["fraction"], n / n_total)
+
+        # never exceeds the bounds
+        for _ in range(32):
+            n = controller.get_n_gaussians(n_total)
+            controller.record_frame(n, 1e-6, 0.)
+        self.assertEqual(controller.get_n_gaussians(n_total), n_total)
+        for _ in range(32):
+            n = controller.get_n_gaussians(n_total)
+            controller.record_frame(n, 1., 0.)
+        self.assertEqual(controller.get_n_gaussians(n_total), 1000)
+
+        # another model
+        self.assertEqual(controller.get_n_gaussians(20_000), 2_000)
+        # disabled
+        controller.target_fps = 0.
+        self.assertEqual(controller.get_n_gaussians(20_000), 20_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import torch
+from internal.cameras.cameras import Cameras
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.utils.render_cache import RenderCache
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+        self.renderer = TorchTileRenderer().instantiate()
+        self.bg_color = torch.tensor([0., 0., 1.])
+
+    def get_camera(self, width: int = 40, height: int = 30, tx: float = 0.):
+        return Cameras(
+            R=torch.eye(3)[None],
+            T=torch.tensor([[tx, 0., 2.]]),
+            fx=torch.tensor([0.8 * width]),
+            fy=torch.tensor([0.8 * width]),
+            cx=torch.tensor([0.5 * width]),
+            cy=torch.tensor([0.5 * height]),
+            width=torch.tensor([width], dtype=torch.int),
+            height=torch.tensor([height], dtype=torch.int),
+            appearance_id=torch.zeros((1,), dtype=torch.int),
+            normalized_appearance_id=torch.zeros((1,)),
+            distortion_params=None,
+            camera_type=torch.zeros((1,), dtype=torch.int),
+        )[0]
+
+    def get_model(self, n: int = 256):
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        rand_kwargs = {"generator": self.generator}
+        model.means = torch.rand((n, 3), **rand_kwargs) - 0.5
+        model.scales = torch.log(torch.rand((n, 3), **rand_kwargs) * 0.1 + 0.05)
+        model.rotations = torch.randn((n, 4), **rand_kwargs)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), **rand_kwargs) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), **rand_kwargs)
+        model.shs_rest = torch.randn((n, 3, 3), **rand_kwargs) * 0.2
+        model.active_sh_degree = 1
+        return model
+
+    def render(self, cache: RenderCache, camera, model, **kwargs):
+        return cache.render(self.renderer, camera, model, self.bg_color, **kwargs)
+
+    def test_hit_and_miss(self):
+        model = self.get_model()
+        cache = RenderCache()
+
+        with torch.no_grad():
+            outputs = self.render(cache, self.get_camera(), model)
+            # same view
+            cached = self.render(cache, self.get_camera(), model)
+            self.assertIs(cached["render"], outputs["render"])
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            # different camera, scaling modifier or render types
+            self.render(cache, self.get_camera(tx=0.1), model)
+            self.render(cache, self.get_camera(width=41), model)
+            self.render(cache, self.get_camera(), model, scaling_modifier=0.5)
+            self.render(cache, self.get_camera(), model, render_types=["rgb"])
+            self.assertEqual((cache.hits, cache.misses), (1, 5))
+            self.assertEqual(len(cache), 5)
+            self.assertAlmostEqual(cache.hit_rate, 1 / 6)
+
+        # requiring gradients are never cached
+        self.render(cache, self.get_camera(), model)
+        self.assertEqual((cache.hits, cache.misses), (1, 5))
+
+    def test_model_version(self):
+        model = self.get_model()
+        cache = RenderCache()
+        camera = self.get_camera()
+
+        def assert_miss():
+            misses = cache.misses
+            with torch.no_grad():
+                outputs = self.render(cache, camera, model)
+            self.assertEqual(cache.misses, misses + 1)
+            with torch.no_grad():
+                self.assertIs(self.render(cache, camera, model)["render"], outputs["render"])
+            return outputs
+
+        assert_miss()
+
+        # properties setter
+        model.properties = {k: v.clone() for k, v in model.properties.items()}
+        assert_miss()
+
+        # optimizer step
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        outputs = self.renderer(camera, model, self.bg_color)
+        outputs["render"].mean().backward()
+        optimizer.step()
+        updated = assert_miss()
+        self.assertFalse(torch.allclose(updated["render"], outputs["render"]))
+
+        # active sh degree
+        model.active_sh_degree = 0
+        degree_0 = assert_miss()
+        self.assertFalse(torch.allclose(degree_0["render"], updated["render"]))
+
+        # in-place update of a slice, e.g. the transformation of the editor
+        with torch.no_grad():
+            model.gaussians["means"][:8] += 0.1
+        assert_miss()
+
+    def test_eviction(self):
+        model = self.get_model()
+        with torch.no_grad():
+            n_bytes = RenderCache.get_outputs_bytes(self.renderer(self.get_camera(), model, self.bg_color))
+        cache = RenderCache(max_bytes=int(n_bytes * 2.5))
+
+        with torch.no_grad():
+            for i in range(3):
+                self.render(cache, self.get_camera(tx=0.1 * i), model)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.evictions, 1)
+            self.assertLessEqual(cache.n_bytes, cache.max_bytes)
+
+            # the least recently used one is evicted
+            self.render(cache, self.get_camera(tx=0.1), model)
+            self.render(cache, self.get_camera(tx=0.), model)
+            self.assertEqual(cache.get_metrics()["hits"], 1)
+            self.assertEqual(cache.evictions, 2)
+
+            cache.clear()
+            self.assertEqual((len(cache), cache.n_bytes), (0, 0))
+
+        # larger than the capacity
+        cache = RenderCache(max_bytes=n_bytes // 2)
+        with torch.no_grad():
+            self.render(cache, self.get_camera(), model)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
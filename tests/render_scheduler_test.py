@@ -0,0 +1,154 @@
+import unittest
+import threading
+import time
+from concurrent.futures import CancelledError
+import torch
+from internal.cameras.cameras import Cameras
+from internal.viewer.scheduler import RenderScheduler
+
+
+class MockViewerRenderer:
+    def __init__(self):
+        # block the worker until set
+        self.gate = threading.Event()
+        self.gate.set()
+        self.calls = []
+        self.rendered_at = []
+        self.n_gaussians = []
+
+    def _render(self, camera):
+        return torch.full((3, int(camera.height), int(camera.width)), float(camera.camera_center[0]))
+
+    def get_outputs(self, camera, scaling_modifier: float = 1., n_gaussians=None):
+        self.gate.wait()
+        self.calls.append(1)
+        self.n_gaussians.append(n_gaussians)
+        self.rendered_at.append(time.perf_counter())
+        return self._render(camera)
+
+    def get_batch_outputs(self, cameras, scaling_modifier: float = 1., n_gaussians=None):
+        self.gate.wait()
+        self.calls.append(len(cameras))
+        self.n_gaussians.append(n_gaussians)
+        self.rendered_at.append(time.perf_counter())
+        return [self._render(camera) for camera in cameras]
+
+
+def get_camera(tx: float = 0., width: int = 40, height: int = 30):
+    return Cameras(
+        R=torch.eye(3)[None],
+        T=torch.tensor([[-tx, 0., 2.]]),
+        fx=torch.tensor([0.8 * width]),
+        fy=torch.tensor([0.8 * width]),
+        cx=torch.tensor([0.5 * width]),
+        cy=torch.tensor([0.5 * height]),
+        width=torch.tensor([width], dtype=torch.int),
+        height=torch.tensor([height], dtype=torch.int),
+        appearance_id=torch.zeros((1,), dtype=torch.int),
+        normalized_appearance_id=torch.zeros((1,)),
+        distortion_params=None,
+        camera_type=torch.zeros((1,), dtype=torch.int),
+    )[0]
+
+
+class RenderSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer_renderer = MockViewerRenderer()
+        self.scheduler = RenderScheduler(self.viewer_renderer, max_batch_size=4)
+
+    def tearDown(self):
+        self.viewer_renderer.gate.set()
+        self.scheduler.stop()
+        super().tearDown()
+
+    def block_worker(self):
+        self.viewer_renderer.gate.clear()
+        future = self.scheduler.submit("blocker", get_camera(-1.))
+        while not future.running():
+            time.sleep(0.001)
+        return future
+
+    def test_batch_and_deduplicate(self):
+        blocker = self.block_worker()
+
+        futures = {
+            # identical
+            0: self.scheduler.submit(0, get_camera(1.)),
+            1: self.scheduler.submit(1, get_camera(1.)),
+            # the same size
+            2: self.scheduler.submit(2, get_camera(2.)),
+            3: self.scheduler.submit(3, get_camera(3.)),
+            # another size
+            4: self.scheduler.submit(4, get_camera(4., width=20)),
+        }
+        self.viewer_renderer.gate.set()
+        blocker.result(timeout=5.)
+
+        for client_id, tx in [(0, 1.), (1, 1.), (2, 2.), (3, 3.), (4, 4.)]:
+            image = futures[client_id].result(timeout=5.)
+            self.assertTrue(torch.all(image == tx))
+        self.assertEqual(futures[4].result().shape[2], 20)
+        # the blocker, then a batch of 3 unique cameras, then the other size
+        self.assertEqual(self.viewer_renderer.calls, [1, 3, 1])
+        stats = self.scheduler.get_stats()
+        self.assertEqual(stats["deduplicated"], 1)
+        self.assertEqual(stats["renders"], 5)
+
+    def test_prefix(self):
+        blocker = self.block_worker()
+        futures = [
+            self.scheduler.submit(0, get_camera(1.)),
+            # not identical to the first one, but rendered together
+            self.scheduler.submit(1, get_camera(1.), n_gaussians=100),
+            self.scheduler.submit(2, get_camera(2.), n_gaussians=100),
+        ]
+        self.viewer_renderer.gate.set()
+        blocker.result(timeout=5.)
+        for future in futures:
+            future.result(timeout=5.)
+        self.assertEqual(self.viewer_renderer.calls, [1, 1, 2])
+        self.assertEqual(self.viewer_renderer.n_gaussians, [None, None, 100])
+        self.assertEqual(self.scheduler.get_stats()["deduplicated"], 0)
+
+    def test_latest_pose(self):
+        blocker = self.block_worker()
+        first = self.scheduler.submit(0, get_camera(1.))
+        second = self.scheduler.submit(0, get_camera(2.))
+        self.assertIs(first, second)
+        self.viewer_renderer.gate.set()
+        blocker.result(timeout=5.)
+        self.assertTrue(torch.all(second.result(timeout=5.) == 2.))
+        self.assertEqual(self.scheduler.get_stats()["replaced"], 1)
+
+    def test_pacing_and_fairness(self):
+        # client 0 is limited to 10 fps, client 1 is not limited
+        for i in range(4):
+            self.scheduler.submit(0, get_camera(float(i)), max_fps=10.).result(timeout=5.)
+        self.assertGreaterEqual(self.viewer_renderer.rendered_at[-1] - self.viewer_renderer.rendered_at[0], 0.3 - 0.01)
+
+        # the least recently served one goes first
+        blocker = self.block_worker()
+        futures = [
+            self.scheduler.submit(0, get_camera(2., width=10)),
+            self.scheduler.submit(1, get_camera(1., width=20)),
+        ]
+        self.viewer_renderer.gate.set()
+        blocker.result(timeout=5.)
+        for future in futures:
+            future.result(timeout=5.)
+        self.assertLess(self.scheduler.last_served_at[1], self.scheduler.last_served_at[0])
+
+    def test_remove_client(self):
+        blocker = self.block_worker()
+        future = self.scheduler.submit(0, get_camera(1.))
+        self.scheduler.remove_client(0)
+        self.viewer_renderer.gate.set()
+        blocker.result(timeout=5.)
+        with self.assertRaises(CancelledError):
+            future.result(timeout=5.)
+
+        self.scheduler.stop()
+        self.assertFalse(self.scheduler.thread.is_alive())
+        with self.assertRaises(RuntimeError):
+            self.scheduler.submit(0, get_camera(1.))
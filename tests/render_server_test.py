@@ -0,0 +1,181 @@
+import unittest
+import threading
+import numpy as np
+import torch
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+from internal.render_server import (
+    RenderService,
+    RenderServerBusy,
+    RenderServer,
+    LocalRenderClient,
+    HTTPRenderClient,
+    RenderRequestError,
+    parse_camera,
+    decode_result,
+)
+
+
+def get_camera_dict(tx: float = 0., width: int = 40, height: int = 30, **kwargs):
+    # the camera is at (tx, 0, -2), looking at +z
+    return {
+        "width": width,
+        "height": height,
+        "fx": 0.8 * width,
+        "c2w": [[1., 0., 0., tx], [0., 1., 0., 0.], [0., 0., 1., -2.]],
+        **kwargs,
+    }
+
+
+class RenderServerTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        generator = torch.Generator()
+        generator.manual_seed(42)
+        n = 256
+        model = VanillaGaussian(sh_degree=0).instantiate()
+        model.setup_from_number(n)
+        model.means = torch.rand((n, 3), generator=generator) - 0.5
+        model.scales = torch.log(torch.rand((n, 3), generator=generator) * 0.1 + 0.05)
+        model.rotations = torch.randn((n, 4), generator=generator)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), generator=generator) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), generator=generator)
+        model.shs_rest = torch.zeros((n, 0, 3))
+        model.pre_activate_all_properties()
+        self.model = model
+        self.renderer = TorchTileRenderer().instantiate()
+
+        self.service = RenderService({"scene": (self.model, self.renderer)}, max_batch_size=4, max_queue_size=8)
+
+    def tearDown(self):
+        self.service.stop()
+        super().tearDown()
+
+    def render_directly(self, camera: dict):
+        with torch.no_grad():
+            return self.renderer(parse_camera(camera), self.model, torch.zeros((3,)))
+
+    def test_parse_camera(self):
+        camera = parse_camera(get_camera_dict(tx=0.5, appearance_id=3))
+        self.assertTrue(torch.allclose(camera.camera_center, torch.tensor([0.5, 0., -2.])))
+        self.assertEqual(int(camera.appearance_id), 3)
+        self.assertEqual(float(camera.cx), 20.)
+
+        w2c = torch.eye(4)
+        w2c[:3, 3] = torch.tensor([-0.5, 0., 2.])
+        camera_from_w2c = parse_camera({"width": 40, "height": 30, "fx": 32., "w2c": w2c.tolist()})
+        self.assertTrue(torch.allclose(camera_from_w2c.world_to_camera, camera.world_to_camera))
+
+        for invalid in [
+            {"width": 40, "height": 30, "fx": 32.},
+            get_camera_dict(width=0),
+            {**get_camera_dict(), "c2w": [[1., 0.], [0., 1.]]},
+        ]:
+            with self.assertRaises(ValueError):
+                parse_camera(invalid)
+
+    def test_local_client(self):
+        client = LocalRenderClient(self.service)
+        self.assertEqual(client.get_models(), {"scene": {"n_gaussians": 256, "outputs": ["rgb", "alpha", "acc_depth", "exp_depth"]}})
+
+        cameras = [
+            get_camera_dict(tx=0.1, format="png"),
+            get_camera_dict(tx=-0.1, output="exp_depth"),
+        ]
+        response = client.render(cameras)
+        self.assertEqual([i["format"] for i in response["results"]], ["png", "npy"])
+        for result in response["results"]:
+            self.assertEqual(set(result["timing"].keys()), {"queue_ms", "render_ms", "encode_ms", "total_ms", "batch_size"})
+
+        image, depth = [decode_result(i) for i in response["results"]]
+        expected_image = self.render_directly(cameras[0])["render"]
+        expected_image = torch.clamp(expected_image * 255. + 0.5, max=255.).to(torch.uint8).permute(1, 2, 0).numpy()
+        np.testing.assert_array_equal(image, expected_image)
+        expected_depth = self.render_directly(cameras[1])["exp_depth"][0].numpy()
+        self.assertEqual(depth.dtype, np.float32)
+        np.testing.assert_allclose(depth, expected_depth, atol=1e-5)
+
+        for invalid in [
+            get_camera_dict(output="unknown"),
+            get_camera_dict(model="unknown"),
+            get_camera_dict(output="exp_depth", format="jpeg"),
+        ]:
+            with self.assertRaises(RenderRequestError) as context:
+                client.render([invalid])
+            self.assertEqual(context.exception.status, 400)
+        with self.assertRaises(RenderRequestError):
+            client.render([])
+
+    def test_batching_and_backpressure(self):
+        # not started, so all the jobs are queued
+        jobs = self.service.submit([get_camera_dict(tx=0.01 * i) for i in range(5)])
+        jobs += self.service.submit([get_camera_dict(width=20), get_camera_dict(tx=0.2)])
+        with self.assertRaises(RenderServerBusy):
+            self.service.submit([get_camera_dict(), get_camera_dict()])
+        self.assertEqual(self.service.get_stats()["rejected"], 1)
+        self.assertEqual(self.service.get_stats()["queued"], 7)
+
+        self.service.start()
+        outputs = [i.future.result(timeout=60) for i in jobs]
+        self.assertEqual(outputs[5].shape, (3, 30, 20))
+        # the 40x30 ones are rendered in batches of at most 4, the other size separately
+        self.assertEqual([i.batch_size for i in jobs], [4, 4, 4, 4, 2, 1, 2])
+        self.assertEqual(self.service.get_stats()["batches"], 3)
+        for job, output in zip(jobs, outputs):
+            with torch.no_grad():
+                expected = self.renderer(job.camera, self.model, torch.zeros((3,)))["render"]
+            self.assertTrue(torch.allclose(output, expected, atol=1e-5))
+
+    def test_http_server(self):
+        server = RenderServer(self.service, host="127.0.0.1", port=0).start()
+        try:
+            client = HTTPRenderClient("http://127.0.0.1:{}".format(server.port))
+            self.assertEqual(list(client.get_models().keys()), ["scene"])
+
+            errors = []
+
+            def render():
+                try:
+                    arrays = client.render_arrays([get_camera_dict(), get_camera_dict(tx=0.1)])
+                    self.assertEqual(arrays[0].shape, (30, 40, 3))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=render) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(client.get_stats()["cameras"], 8)
+
+            with self.assertRaises(RenderRequestError) as context:
+                client.render([get_camera_dict() for _ in range(9)])
+            self.assertEqual(context.exception.status, 400)
+        finally:
+            server.stop()
+
+    def test_websocket_server(self):
+        try:
+            from internal.render_server import WebSocketRenderClient
+            server = RenderServer(self.service, host="127.0.0.1", port=0, websocket_port=0).start()
+        except ImportError as e:
+            self.skipTest(str(e))
+
+        try:
+            with WebSocketRenderClient("ws://127.0.0.1:{}".format(server.websocket_port)) as client:
+                for tx in [0., 0.1]:
+                    image = client.render_arrays([get_camera_dict(tx=tx, format="png")])[0]
+                    self.assertEqual(image.shape, (30, 40, 3))
+                with self.assertRaises(RenderRequestError) as context:
+                    client.render([get_camera_dict(output="unknown")])
+                self.assertEqual(context.exception.status, 400)
+                self.assertEqual(client.get_stats()["cameras"], 2)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
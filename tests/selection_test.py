@@ -0,0 +1,74 @@
+import unittest
+import torch
+from internal.utils.selection import kth_smallest, kth_largest, histogram_kth_smallest, quantile, topk_mask, weighted_sample_without_replacement
+
+
+class SelectionTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def test_kth(self):
+        values = torch.rand((10_001,), generator=self.generator)
+        sorted_values = torch.sort(values).values
+        for k in [0, 1, 5000, 9000, 10_000]:
+            self.assertEqual(kth_smallest(values, k), sorted_values[k])
+            self.assertEqual(kth_largest(values, k), sorted_values[-1 - k])
+
+    def test_quantile(self):
+        values = torch.randn((100_000,), generator=self.generator)
+        sorted_values = torch.sort(values).values
+        for q in [0., 0.1, 0.66, 0.9, 1.]:
+            exact = quantile(values, q)
+            self.assertEqual(exact, sorted_values[int(q * (values.shape[0] - 1))])
+
+            approximate = quantile(values, q, exact=False, n_bins=4096)
+            bin_width = (values.max() - values.min()) / 4096
+            self.assertLessEqual(torch.abs(approximate - exact).item(), bin_width.item())
+
+        # constant values
+        self.assertEqual(histogram_kth_smallest(torch.ones((16,)), 3), 1.)
+
+    def test_prune_mask_equivalence(self):
+        # the implementation of LightGaussian's `get_prune_mask()` before routing through `quantile()`
+        def sort_based_prune_mask(percent, importance_score):
+            sorted_tensor, _ = torch.sort(importance_score, dim=0)
+            index_nth_percentile = int(percent * (sorted_tensor.shape[0] - 1))
+            value_nth_percentile = sorted_tensor[index_nth_percentile]
+            return (importance_score <= value_nth_percentile).squeeze()
+
+        importance_score = torch.rand((8192,), generator=self.generator)
+        for percent in [0.1, 0.5, 0.66]:
+            value = quantile(importance_score, percent)
+            self.assertTrue(torch.equal(
+                (importance_score <= value).squeeze(),
+                sort_based_prune_mask(percent, importance_score),
+            ))
+
+    def test_topk_mask(self):
+        values = torch.rand((1000,), generator=self.generator)
+        mask = topk_mask(values, 100)
+        self.assertEqual(mask.sum().item(), 100)
+        self.assertGreaterEqual(values[mask].min(), values[~mask].max())
+        self.assertEqual(topk_mask(values, 0).sum().item(), 0)
+        self.assertEqual(topk_mask(values, 2000).sum().item(), 1000)
+
+    def test_weighted_sample_without_replacement(self):
+        weights = torch.tensor([0., 1., 0., 2., 4., 0., 8.])
+        indices = weighted_sample_without_replacement(weights, 4, generator=self.generator)
+        self.assertEqual(sorted(indices.tolist()), [1, 3, 4, 6])
+
+        # the frequency of the first draw follows the weights
+        counts = torch.zeros_like(weights)
+        for _ in range(4000):
+            counts[weighted_sample_without_replacement(weights, 1, generator=self.generator)] += 1
+        self.assertTrue(torch.allclose(counts / counts.sum(), weights / weights.sum(), atol=0.03))
+
+        with self.assertRaises(AssertionError):
+            weighted_sample_without_replacement(weights, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
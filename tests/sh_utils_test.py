@@ -0,0 +1,68 @@
+import unittest
+import torch
+from internal.utils.sh_utils import eval_sh, eval_sh_bases, eval_sh_with_bases, eval_sh_colors, eval_gaussian_model_sh
+
+
+class SHUtilsTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_inputs(self, n: int = 1000, n_shs: int = 25, dtype=torch.double):
+        shs = torch.randn((n, n_shs, 3), generator=self.generator, dtype=dtype)
+        dirs = torch.randn((n, 3), generator=self.generator, dtype=dtype)
+        return shs, dirs / dirs.norm(dim=-1, keepdim=True)
+
+    def test_eval_sh_colors(self):
+        shs, dirs = self.get_inputs()
+        for deg in range(5):
+            expected = eval_sh(deg, shs.transpose(1, 2), dirs)
+            self.assertTrue(torch.allclose(eval_sh_colors(deg, shs, dirs), expected))
+            # bases can be shared by different coefficients
+            bases = eval_sh_bases(deg, dirs)
+            self.assertEqual(bases.shape, (1000, (deg + 1) ** 2))
+            self.assertTrue(torch.allclose(eval_sh_with_bases(bases, shs), expected))
+            # chunking
+            for chunk_size in [1, 7, 999, 1000, 4096]:
+                self.assertTrue(torch.allclose(eval_sh_colors(deg, shs, dirs, chunk_size=chunk_size), expected))
+
+        # degree 0 does not require directions
+        self.assertTrue(torch.allclose(eval_sh_colors(0, shs[:, :1]), eval_sh(0, shs[:, :1].transpose(1, 2), None)))
+
+    def test_half_precision(self):
+        shs, dirs = self.get_inputs(dtype=torch.float)
+        for dtype in [torch.half, torch.bfloat16]:
+            outputs = eval_sh_colors(3, shs, dirs, chunk_size=256, dtype=dtype)
+            self.assertEqual(outputs.dtype, torch.float)
+            self.assertTrue(torch.allclose(outputs, eval_sh_colors(3, shs, dirs), atol=0.1))
+
+    def test_gradients(self):
+        shs, dirs = self.get_inputs(n=64)
+        shs.requires_grad_(True)
+        dirs.requires_grad_(True)
+        self.assertTrue(torch.autograd.gradcheck(lambda s, d: eval_sh_colors(3, s, d, chunk_size=10), (shs[:, :16], dirs)))
+
+    def test_eval_gaussian_model_sh(self):
+        shs, _ = self.get_inputs(n_shs=16, dtype=torch.float)
+        means = torch.randn((1000, 3), generator=self.generator)
+
+        class Model:
+            get_xyz = means
+            get_features = shs
+            active_sh_degree = 2
+            max_sh_degree = 3
+
+        class Camera:
+            camera_center = torch.tensor([0.1, 0.2, 0.3])
+
+        dirs = means - Camera.camera_center
+        dirs = dirs / dirs.norm(dim=-1, keepdim=True)
+        expected = torch.clamp_min(eval_sh(2, shs.transpose(1, 2), dirs) + 0.5, 0.)
+        self.assertTrue(torch.allclose(eval_gaussian_model_sh(Camera, Model), expected, atol=1e-6))
+        self.assertTrue(torch.allclose(eval_gaussian_model_sh(Camera, Model, chunk_size=128), expected, atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import torch
+from internal.cameras.cameras import Cameras
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.general_utils import inverse_sigmoid
+from internal.utils.spatial_index import GaussianSpatialIndex, get_spatial_index, invalidate_spatial_index
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+
+try:
+    from internal.renderers.gsplat_v1_renderer import GSplatV1Renderer
+except ImportError as e:
+    # requires gsplat
+    GSplatV1Renderer = None
+    import_error = e
+
+
+class SpatialIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_camera(self, width: int = 80, height: int = 60, yaw: float = 0.3):
+        R = torch.tensor([
+            [torch.cos(torch.tensor(yaw)), 0., -torch.sin(torch.tensor(yaw))],
+            [0., 1., 0.],
+            [torch.sin(torch.tensor(yaw)), 0., torch.cos(torch.tensor(yaw))],
+        ])
+        return Cameras(
+            R=R[None],
+            T=torch.tensor([[0.2, -0.1, 0.5]]),
+            fx=torch.tensor([0.8 * width]),
+            fy=torch.tensor([0.8 * width]),
+            cx=torch.tensor([0.45 * width]),
+            cy=torch.tensor([0.55 * height]),
+            width=torch.tensor([width], dtype=torch.int),
+            height=torch.tensor([height], dtype=torch.int),
+            appearance_id=torch.zeros((1,), dtype=torch.int),
+            normalized_appearance_id=torch.zeros((1,)),
+            distortion_params=None,
+            camera_type=torch.zeros((1,), dtype=torch.int),
+        )[0]
+
+    def get_model(self, n: int):
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        rand_kwargs = {"generator": self.generator}
+        model.means = (torch.rand((n, 3), **rand_kwargs) - 0.5) * 12.
+        model.scales = torch.log(torch.rand((n, 3), **rand_kwargs) * 0.1 + 0.01)
+        model.rotations = torch.randn((n, 4), **rand_kwargs)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), **rand_kwargs) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), **rand_kwargs)
+        model.shs_rest = torch.randn((n, 3, 3), **rand_kwargs) * 0.2
+        model.active_sh_degree = 1
+        return model
+
+    def test_cull(self):
+        model = self.get_model(8192)
+        camera = self.get_camera()
+        spatial_index = GaussianSpatialIndex(gaussians_per_cell=64).update(model)
+        self.assertGreater(spatial_index.n_cells, 1)
+        self.assertEqual(spatial_index.cell_counts.sum().item(), 8192)
+
+        for scale_modifier in [1., 2.]:
+            # cells only, conservative
+            cell_culled = spatial_index.cull(camera, scale_modifier=scale_modifier, per_gaussian=False)
+            visible = spatial_index.cull(camera, scale_modifier=scale_modifier)
+            self.assertTrue(torch.all(visible[1:] > visible[:-1]))
+            self.assertTrue(torch.all(torch.isin(visible, cell_culled)))
+            self.assertLess(cell_culled.shape[0], 8192)
+
+            # the per Gaussian results are the same as the brute force ones
+            per_gaussian_half_extents = GaussianSpatialIndex.compute_half_extents(
+                model.get_scales() * scale_modifier,
+                model.get_rotations(),
+            )
+            normals, offsets = GaussianSpatialIndex.get_frustum_planes(camera)
+            expected = torch.nonzero(GaussianSpatialIndex.is_box_in_frustum(model.get_means(), per_gaussian_half_extents, normals, offsets)).squeeze(-1)
+            self.assertTrue(torch.equal(visible, expected))
+            self.assertGreater(visible.shape[0], 0)
+            self.assertLess(visible.shape[0], cell_culled.shape[0])
+
+            # all the Gaussians whose center is in the frustum survive
+            means = model.get_means() @ camera.world_to_camera[:3, :3] + camera.world_to_camera[3, :3]
+            xy = means[:, :2] / means[:, 2:] * torch.stack([camera.fx, camera.fy]) + torch.stack([camera.cx, camera.cy])
+            is_center_visible = (means[:, 2] > 0.01) & torch.all(xy >= 0., dim=-1) & (xy[:, 0] < camera.width) & (xy[:, 1] < camera.height)
+            self.assertTrue(torch.all(torch.isin(torch.nonzero(is_center_visible).squeeze(-1), visible)))
+
+    def test_lazy_update(self):
+        model = self.get_model(1024)
+        spatial_index = get_spatial_index(model, gaussians_per_cell=32)
+        self.assertIs(get_spatial_index(model), spatial_index)
+        order = spatial_index.order
+
+        # in place update, e.g. optimizer step: refit only
+        with torch.no_grad():
+            model.means.add_(1.)
+        get_spatial_index(model)
+        self.assertIs(spatial_index.order, order)
+        self.assertTrue(torch.allclose(spatial_index.centers, model.get_means()))
+
+        # explicitly invalidated
+        invalidate_spatial_index(model)
+        get_spatial_index(model)
+        self.assertIsNot(spatial_index.order, order)
+        order = spatial_index.order
+
+        # the number of Gaussians is changed
+        model.properties = {k: v[:512] for k, v in model.properties.items()}
+        get_spatial_index(model)
+        self.assertIsNot(spatial_index.order, order)
+        self.assertEqual(spatial_index.order.shape[0], 512)
+
+    def test_renderer(self):
+        model = self.get_model(2048)
+        camera = self.get_camera()
+        bg_color = torch.tensor([0., 0., 1.])
+
+        expected = TorchTileRenderer().instantiate()(camera, model, bg_color)
+        outputs = TorchTileRenderer(frustum_culling=True).instantiate()(camera, model, bg_color)
+
+        self.assertTrue(torch.allclose(outputs["render"], expected["render"], atol=1e-5))
+        self.assertTrue(torch.equal(outputs["visibility_filter"], expected["visibility_filter"]))
+        self.assertTrue(torch.equal(outputs["radii"], expected["radii"]))
+        self.assertEqual(outputs["viewspace_points"].shape, expected["viewspace_points"].shape)
+        self.assertLess(get_spatial_index(model).cull(camera, pixel_margin=16.).shape[0], 2048)
+
+        # gradients
+        for i in [expected, outputs]:
+            model.zero_grad()
+            torch.mean((i["render"] - 0.5) ** 2).backward()
+            i["grads"] = {k: v.grad.clone() for k, v in model.gaussians.items()}
+        self.assertTrue(torch.allclose(outputs["viewspace_points"].grad, expected["viewspace_points"].grad, atol=1e-7))
+        for k, v in expected["grads"].items():
+            self.assertTrue(torch.allclose(outputs["grads"][k], v, atol=1e-6), k)
+
+    def test_gsplat_v1_renderer(self):
+        if GSplatV1Renderer is None:
+            self.skipTest(str(import_error))
+        if not torch.cuda.is_available():
+            self.skipTest("CUDA is not available")
+
+        model = self.get_model(2048).to("cuda")
+        cameras = [self.get_camera(), self.get_camera(yaw=-0.6), self.get_camera(width=40)]
+        bg_color = torch.tensor([0., 0., 1.], device="cuda")
+
+        renderer = GSplatV1Renderer().instantiate()
+        culling_renderer = GSplatV1Renderer(frustum_culling=True).instantiate()
+        self.assertLess(culling_renderer.get_visible_indices(cameras[:1], model, 1.).shape[0], 2048)
+
+        for expected, outputs in [
+            (renderer(cameras[0], model, bg_color), culling_renderer(cameras[0], model, bg_color)),
+        ] + list(zip(
+            renderer.batch_forward(cameras, model, bg_color),
+            culling_renderer.batch_forward(cameras, model, bg_color),
+        )):
+            self.assertTrue(torch.allclose(outputs["render"], expected["render"], atol=1e-5))
+            self.assertTrue(torch.equal(outputs["visibility_filter"], expected["visibility_filter"]))
+            self.assertTrue(torch.equal(outputs["radii"], expected["radii"]))
+            self.assertEqual(outputs["viewspace_points"].shape, expected["viewspace_points"].shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import torch
+from internal.utils.ssim import ssim, separable_ssim, l1_ssim_loss, get_separable_window
+
+
+class SSIMTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_image_pair(self, *shape):
+        img1 = torch.rand(shape, generator=self.generator, dtype=torch.double)
+        # correlated with img1, so that the SSIM is not close to 0
+        img2 = (img1 + 0.1 * torch.randn(shape, generator=self.generator, dtype=torch.double)).clamp(0., 1.)
+        return img1, img2
+
+    def test_separable_ssim(self):
+        for shape in [(3, 64, 48), (2, 3, 37, 53), (3, 5, 7)]:
+            img1, img2 = self.get_image_pair(*shape)
+            self.assertTrue(torch.allclose(separable_ssim(img1, img2), ssim(img1, img2)))
+            if len(shape) == 4:
+                self.assertTrue(torch.allclose(
+                    separable_ssim(img1, img2, size_average=False),
+                    ssim(img1, img2, size_average=False),
+                ))
+
+        # float32
+        img1, img2 = self.get_image_pair(3, 64, 48)
+        img1, img2 = img1.float(), img2.float()
+        self.assertTrue(torch.allclose(separable_ssim(img1, img2), ssim(img1, img2), atol=1e-6))
+
+    def test_separable_ssim_gradient(self):
+        img1, img2 = self.get_image_pair(3, 32, 40)
+
+        reference_input = img1.clone().requires_grad_(True)
+        ssim(reference_input, img2).backward()
+
+        separable_input = img1.clone().requires_grad_(True)
+        separable_ssim(separable_input, img2).backward()
+
+        self.assertTrue(torch.allclose(separable_input.grad, reference_input.grad))
+
+    def test_window_cache(self):
+        window = get_separable_window(11, 15, torch.float, torch.device("cpu"))
+        self.assertIs(window, get_separable_window(11, 15, torch.float, torch.device("cpu")))
+        self.assertIsNot(window, get_separable_window(11, 15, torch.double, torch.device("cpu")))
+        self.assertEqual(window[0].shape, (15, 1, 1, 11))
+        self.assertEqual(window[1].shape, (15, 1, 11, 1))
+
+    def test_l1_ssim_loss(self):
+        lambda_dssim = 0.2
+        image, gt_image = self.get_image_pair(3, 64, 48)
+        masked_pixels = (torch.rand((64, 48), generator=self.generator) > 0.7).unsqueeze(0).expand(3, -1, -1)
+
+        # the previous implementation in `VanillaMetricsImpl`
+        reference_input = image.clone().requires_grad_(True)
+        reference_gt = gt_image.clone()
+        reference_gt[masked_pixels] = reference_input.detach()[masked_pixels]
+        reference_l1 = torch.abs(reference_input - reference_gt).mean()
+        reference_ssim = ssim(reference_input, reference_gt)
+        reference_loss = (1. - lambda_dssim) * reference_l1 + lambda_dssim * (1. - reference_ssim)
+        reference_loss.backward()
+
+        gt_image_copy = gt_image.clone()
+        fused_input = image.clone().requires_grad_(True)
+        loss, l1, ssim_value = l1_ssim_loss(fused_input, gt_image, lambda_dssim, masked_pixels)
+        loss.backward()
+
+        self.assertTrue(torch.allclose(l1, reference_l1))
+        self.assertTrue(torch.allclose(ssim_value, reference_ssim))
+        self.assertTrue(torch.allclose(loss, reference_loss))
+        self.assertTrue(torch.allclose(fused_input.grad, reference_input.grad))
+        # G.T. must not be modified
+        self.assertTrue(torch.all(torch.eq(gt_image, gt_image_copy)))
+
+
+if __name__ == '__main__':
+    unittest.main()
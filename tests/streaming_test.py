@@ -0,0 +1,197 @@
+import unittest
+import contextlib
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+import torch
+from internal.viewer.streaming import AdaptiveStreamingController
+from internal.viewer.client import ClientThread
+
+
+class MockGUI:
+    def add_folder(self, *args, **kwargs):
+        return contextlib.nullcontext()
+
+    def add_markdown(self, content):
+        return SimpleNamespace(content=content)
+
+
+class MockCamera:
+    def __init__(self):
+        self.aspect = 4. / 3.
+        self.wxyz = np.asarray([1., 0., 0., 0.])
+        self.position = np.zeros((3,))
+        self.fov = 1.
+        self.look_at = np.zeros((3,))
+        self.up_direction = np.asarray([0., 0., 1.])
+        self.update_callbacks = []
+
+    def on_update(self, callback):
+        self.update_callbacks.append(callback)
+        return callback
+
+    def move(self, x: float):
+        self.position = np.asarray([x, 0., 0.])
+        for callback in self.update_callbacks:
+            callback(self)
+
+
+class MockClient:
+    def __init__(self):
+        self.client_id = 0
+        self.camera = MockCamera()
+        self.gui = MockGUI()
+        self.scene = SimpleNamespace(set_background_image=self.set_background_image)
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def atomic(self):
+        return self.lock
+
+    def set_background_image(self, image, format, jpeg_quality):
+        self.frames.append((image.shape[:2], jpeg_quality, self.camera.position[0]))
+
+
+class MockRenderer:
+    def __init__(self, seconds: float = 0.):
+        self.seconds = seconds
+        self.n_renders = 0
+        self.gaussian_model = SimpleNamespace(n_gaussians=1_000_000)
+        self.n_gaussians = []
+
+    def get_outputs(self, camera, scaling_modifier: float = 1., n_gaussians=None):
+        self.n_renders += 1
+        self.n_gaussians.append(n_gaussians)
+        time.sleep(self.seconds)
+        return torch.rand((3, int(camera.height), int(camera.width)))
+
+
+def get_viewer(target_fps: float = 0.):
+    return SimpleNamespace(
+        default_camera_position=None,
+        default_camera_look_at=None,
+        up_direction=np.asarray([0., 0., 1.]),
+        max_res_when_moving=SimpleNamespace(value=64),
+        jpeg_quality_when_moving=SimpleNamespace(value=60),
+        max_res_when_static=SimpleNamespace(value=256),
+        jpeg_quality_when_static=SimpleNamespace(value=100),
+        target_fps=SimpleNamespace(value=target_fps),
+        image_format="jpeg",
+        scaling_modifier=SimpleNamespace(value=1.),
+        time_slider=SimpleNamespace(value=0.),
+        camera_transform=None,
+        device=torch.device("cpu"),
+        get_appearance_id_value=lambda: (0, 0.),
+    )
+
+
+def wait_until(condition, timeout: float = 5.):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class StreamingTestCase(unittest.TestCase):
+    def test_controller(self):
+        controller = AdaptiveStreamingController(target_fps=20., min_res=64, res_step=32)
+        controller.set_limits(1024, 60, 2048, 100, target_fps=20.)
+        self.assertEqual(controller.get_moving_options(), (1024, 60))
+
+        # 1e-6 seconds per pixel: 50000 pixels within the budget, about 223 ** 2
+        for _ in range(32):
+            res, _ = controller.get_moving_options()
+            controller.record_frame(res * res, res * res * 1e-6, 0.)
+        res, jpeg_quality = controller.get_moving_options()
+        self.assertLessEqual(res, 224)
+        self.assertGreaterEqual(res, 160)
+        self.assertEqual(jpeg_quality, 60)
+
+        # the quality is lowered only at the minimum resolution
+        for _ in range(32):
+            res, _ = controller.get_moving_options()
+            controller.record_frame(res * res, res * res * 1e-3, 0.)
+        self.assertEqual(controller.get_moving_options(), (64, controller.min_jpeg_quality))
+
+        # recover
+        for _ in range(64):
+            res, _ = controller.get_moving_options()
+            controller.record_frame(res * res, res * res * 1e-9, 0.)
+        self.assertEqual(controller.get_moving_options(), (1024, 60))
+
+        # refinement ends at the static options
+        refinement_options = controller.get_refinement_options()
+        self.assertEqual(len(refinement_options), 2)
+        self.assertEqual(refinement_options[-1], (2048, 100))
+        self.assertGreater(refinement_options[0][0], 1024)
+
+        # disabled
+        controller.set_limits(1024, 60, 2048, 100, target_fps=0.)
+        controller.record_frame(64 * 64, 1., 0.)
+        self.assertEqual(controller.get_moving_options(), (1024, 60))
+
+        # nothing to refine
+        controller.set_limits(2048, 100, 2048, 100, target_fps=0.)
+        self.assertEqual(controller.get_refinement_options(), [])
+
+    def test_client(self):
+        client = MockClient()
+        renderer = MockRenderer(seconds=0.05)
+        client_thread = ClientThread(get_viewer(), renderer, client)
+        client_thread.start()
+        try:
+            # nothing is rendered without updates
+            time.sleep(0.3)
+            self.assertEqual(renderer.n_renders, 0)
+
+            # the updates during rendering are coalesced, and the latest pose is rendered
+            for i in range(20):
+                client.camera.move(float(i + 1))
+                time.sleep(0.005)
+            self.assertTrue(wait_until(lambda: len(client.frames) > 0 and client.frames[-1][2] == 20.))
+            moving_frames = [i for i in client.frames if i[1] == 60]
+            self.assertLess(len(moving_frames), 20)
+            self.assertEqual(max(moving_frames[-1][0]), 64)
+
+            # refined to the static options once the camera stops
+            self.assertTrue(wait_until(lambda: client.frames[-1][1] == 100))
+            self.assertEqual(max(client.frames[-1][0]), 256)
+            self.assertEqual(client.frames[-1][2], 20.)
+
+            # then idle
+            n_renders = renderer.n_renders
+            time.sleep(0.5)
+            self.assertEqual(renderer.n_renders, n_renders)
+            self.assertIn("Frames", client_thread.stats_markdown.content)
+        finally:
+            client_thread.stop()
+            client_thread.join(timeout=2.)
+        # stopped promptly while blocking
+        self.assertFalse(client_thread.is_alive())
+
+    def test_progressive_client(self):
+        client = MockClient()
+        renderer = MockRenderer(seconds=0.01)
+        viewer = get_viewer(target_fps=20.)
+        viewer.progressive_checkbox = SimpleNamespace(value=True)
+        client_thread = ClientThread(viewer, renderer, client)
+        client_thread.start()
+        try:
+            for i in range(5):
+                client.camera.move(float(i + 1))
+                time.sleep(0.02)
+            self.assertTrue(wait_until(lambda: len(client.frames) > 0 and client.frames[-1][1] == 100))
+            # the resolution is not lowered, but only a part of the Gaussians is rendered while moving
+            moving_frames = [i for i in client.frames if i[1] == 60]
+            self.assertEqual(max(moving_frames[-1][0]), 64)
+            self.assertEqual(renderer.n_gaussians[0], 100_000)
+            # all of them once stopped
+            self.assertIsNone(renderer.n_gaussians[-1])
+            self.assertEqual(max(client.frames[-1][0]), 256)
+            self.assertIn("Gaussians when Moving", client_thread.stats_markdown.content)
+        finally:
+            client_thread.stop()
+            client_thread.join(timeout=2.)
@@ -0,0 +1,221 @@
+import unittest
+import torch
+from internal.cameras.cameras import Cameras
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.gaussian_projection import project_gaussians, build_tile_bounds, build_gaussian_sort_key
+from internal.utils.general_utils import inverse_sigmoid
+from internal.renderers.torch_tile_renderer import TorchTileRenderer, TorchTileRasterizer
+
+
+def dense_reference_rasterize(xys, depths, conics, colors, opacities, num_tiles_hit, rect_min, rect_max, img_height, img_width, block_size, transmittance_threshold=1e-4):
+    """
+    Composite the Gaussians one by one over the whole image, in the order of depths
+    """
+
+    y, x = torch.meshgrid(torch.arange(img_height), torch.arange(img_width), indexing="ij")
+    pixels = torch.stack([x, y], dim=-1).to(xys.dtype) + 0.5  # [H, W, 2]
+    tile_x, tile_y = x // block_size, y // block_size
+
+    rgb = torch.zeros((img_height, img_width, 3), dtype=xys.dtype)
+    depth = torch.zeros((img_height, img_width), dtype=xys.dtype)
+    transmittance = torch.ones((img_height, img_width), dtype=xys.dtype)
+    is_done = torch.zeros((img_height, img_width), dtype=torch.bool)
+
+    for i in torch.argsort(depths, stable=True).tolist():
+        if num_tiles_hit[i] == 0:
+            continue
+        in_rect = (tile_x >= rect_min[i, 0]) & (tile_x < rect_max[i, 0]) & (tile_y >= rect_min[i, 1]) & (tile_y < rect_max[i, 1])
+
+        d = xys[i] - pixels
+        sigma = 0.5 * (conics[i, 0] * d[..., 0] ** 2 + conics[i, 2] * d[..., 1] ** 2) + conics[i, 1] * d[..., 0] * d[..., 1]
+        alpha = torch.clamp_max(opacities[i] * torch.exp(-sigma), 0.99)
+        alpha = torch.where(in_rect & (sigma >= 0) & (alpha >= 1. / 255.) & ~is_done, alpha, 0.)
+
+        next_transmittance = transmittance * (1. - alpha)
+        is_done = is_done | (next_transmittance < transmittance_threshold)
+        alpha = torch.where(is_done, 0., alpha)
+
+        weight = transmittance * alpha
+        rgb = rgb + weight[..., None] * colors[i]
+        depth = depth + weight * depths[i]
+        transmittance = transmittance * (1. - alpha)
+
+    return rgb, (1. - transmittance)[..., None], depth[..., None]
+
+
+class TorchTileRendererTestCase(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.generator = torch.Generator()
+        self.generator.manual_seed(42)
+
+    def get_camera(self, width: int = 80, height: int = 60):
+        return Cameras(
+            R=torch.eye(3)[None],
+            T=torch.zeros((1, 3)),
+            fx=torch.tensor([0.8 * width]),
+            fy=torch.tensor([0.8 * width]),
+            cx=torch.tensor([width / 2.]),
+            cy=torch.tensor([height / 2.]),
+            width=torch.tensor([width], dtype=torch.int),
+            height=torch.tensor([height], dtype=torch.int),
+            appearance_id=torch.zeros((1,), dtype=torch.int),
+            normalized_appearance_id=torch.zeros((1,)),
+            distortion_params=None,
+            camera_type=torch.zeros((1,), dtype=torch.int),
+        )[0]
+
+    def get_model(self, n: int):
+        model = VanillaGaussian(sh_degree=1).instantiate()
+        model.setup_from_number(n)
+        rand_kwargs = {"generator": self.generator}
+        model.means = torch.cat([
+            (torch.rand((n, 2), **rand_kwargs) - 0.5) * 4.,
+            torch.rand((n, 1), **rand_kwargs) * 4. + 1.,
+        ], dim=-1)
+        model.scales = torch.log(torch.rand((n, 3), **rand_kwargs) * 0.2 + 0.01)
+        model.rotations = torch.randn((n, 4), **rand_kwargs)
+        model.opacities = inverse_sigmoid(torch.rand((n, 1), **rand_kwargs) * 0.98 + 0.01)
+        model.shs_dc = torch.randn((n, 1, 3), **rand_kwargs)
+        model.shs_rest = torch.randn((n, 3, 3), **rand_kwargs) * 0.2
+        model.active_sh_degree = 1
+        return model
+
+    def project(self, model, camera, block_size: int = 16):
+        return project_gaussians(
+            means_3d=model.get_means(),
+            scales=model.get_scales(),
+            scale_modifier=1.,
+            quaternions=model.get_rotations(),
+            world_to_camera=camera.world_to_camera,
+            fx=camera.fx,
+            fy=camera.fy,
+            cx=camera.cx,
+            cy=camera.cy,
+            img_height=camera.height,
+            img_width=camera.width,
+            block_width=block_size,
+        )
+
+    def test_dense_parity(self):
+        camera = self.get_camera()
+        model = self.get_model(512)
+
+        with torch.no_grad():
+            xys, depths, radii, conics, comp, num_tiles_hit, cov3d, mask, rect_min, rect_max = self.project(model, camera)
+            colors = torch.rand((xys.shape[0], 3), generator=self.generator)
+            opacities = model.get_opacities().squeeze(-1)
+            tile_bounds = build_tile_bounds(camera.height, camera.width, 16, device="cpu")
+
+            expected = dense_reference_rasterize(xys, depths, conics, colors, opacities, num_tiles_hit, rect_min, rect_max, 60, 80, 16)
+            # the test covers the early termination
+            self.assertGreater((expected[1] > 1. - 1e-3).sum().item(), 0)
+
+            for chunk_size, tile_batch_size in [(1, 1024), (7, 3), (32, 1024), (1024, 5)]:
+                outputs = TorchTileRasterizer.rasterize(
+                    xys, depths, conics, colors, opacities, num_tiles_hit, rect_min, rect_max, tile_bounds,
+                    img_height=60,
+                    img_width=80,
+                    chunk_size=chunk_size,
+                    tile_batch_size=tile_batch_size,
+                )
+                for output, expected_output in zip(outputs, expected):
+                    self.assertEqual(output.shape, expected_output.shape)
+                    self.assertTrue(torch.allclose(output, expected_output, atol=1e-5))
+
+    def test_renderer(self):
+        camera = self.get_camera()
+        model = self.get_model(32)
+        renderer = TorchTileRenderer(chunk_size=16).instantiate()
+
+        bg_color = torch.tensor([0., 1., 0.])
+        outputs = renderer(camera, model, bg_color)
+        self.assertEqual(outputs["render"].shape, (3, 60, 80))
+        self.assertEqual(outputs["alpha"].shape, (1, 60, 80))
+        self.assertEqual(outputs["exp_depth"].shape, (1, 60, 80))
+        # the background is visible outside of the Gaussians
+        transparent = outputs["alpha"][0] == 0.
+        self.assertTrue(torch.any(transparent))
+        self.assertTrue(torch.all(outputs["render"].permute(1, 2, 0)[transparent] == bg_color))
+        # the depth of a pixel is between the nearest and the farthest Gaussians
+        opaque = outputs["alpha"][0] > 0.5
+        self.assertTrue(torch.all(outputs["exp_depth"][0][opaque] >= 1. - 1e-4))
+        self.assertTrue(torch.all(outputs["exp_depth"][0][opaque] <= 5. + 1e-4))
+
+        # backward
+        loss = torch.mean((outputs["render"] - 0.5) ** 2)
+        loss.backward()
+        self.assertIsNotNone(outputs["viewspace_points"].grad)
+        for name in ["means", "scales", "rotations", "opacities", "shs_dc", "shs_rest"]:
+            grad = model.gaussians[name].grad
+            self.assertIsNotNone(grad, name)
+            self.assertTrue(torch.all(torch.isfinite(grad)), name)
+            self.assertGreater(grad.abs().sum().item(), 0., name)
+
+    def test_gradcheck(self):
+        camera = self.get_camera(width=24, height=20)
+        model = self.get_model(6)
+
+        with torch.no_grad():
+            xys, depths, radii, conics, comp, num_tiles_hit, cov3d, mask, rect_min, rect_max = self.project(model, camera, block_size=8)
+            tile_bounds = build_tile_bounds(camera.height, camera.width, 8, device="cpu")
+            sort_key = build_gaussian_sort_key(depths, rect_min, rect_max, tile_bounds, torch.cumsum(num_tiles_hit, dim=-1), sort=True)
+
+        def fn(xys, conics, colors, opacities, depths):
+            return TorchTileRasterizer.rasterize(
+                xys, depths, conics, colors, opacities, num_tiles_hit, rect_min, rect_max, tile_bounds,
+                img_height=20,
+                img_width=24,
+                block_size=8,
+                chunk_size=2,
+                sort_key=sort_key,
+            )
+
+        inputs = (
+            xys.double().requires_grad_(True),
+            conics.double().requires_grad_(True),
+            torch.rand((6, 3), generator=self.generator, dtype=torch.double).requires_grad_(True),
+            (model.get_opacities().squeeze(-1).double() * 0.5).detach().requires_grad_(True),
+            depths.double().requires_grad_(True),
+        )
+        self.assertTrue(torch.autograd.gradcheck(fn, inputs, eps=1e-6, atol=1e-4))
+
+    def test_batch_forward(self):
+        model = self.get_model(64)
+        cameras = [self.get_camera(), self.get_camera(width=48, height=40)]
+        cameras[1].camera_center = cameras[1].camera_center + 0.1  # different view directions for SHs
+        bg_color = torch.tensor([0., 1., 0.])
+
+        for config in [TorchTileRenderer(), TorchTileRenderer(frustum_culling=True)]:
+            renderer = config.instantiate()
+            batch_outputs = renderer.batch_forward(cameras, model, bg_color)
+            self.assertEqual(len(batch_outputs), 2)
+            for camera, outputs in zip(cameras, batch_outputs):
+                expected = renderer(camera, model, bg_color)
+                # the default implementation renders one by one
+                loop_outputs = super(type(renderer), renderer).batch_forward([camera], model, bg_color)[0]
+                for key in ["render", "alpha", "exp_depth", "visibility_filter", "radii"]:
+                    self.assertTrue(torch.allclose(outputs[key], expected[key], atol=1e-6), key)
+                    self.assertTrue(torch.allclose(loop_outputs[key], expected[key], atol=1e-6), key)
+
+    @unittest.skipUnless(torch.cuda.is_available(), "requires CUDA")
+    def test_cuda_rasterizer_parity(self):
+        from internal.renderers.vanilla_renderer import VanillaRenderer
+        from internal.utils.ssim import ssim
+
+        camera = self.get_camera(width=320, height=240).to_device("cuda")
+        model = self.get_model(4096).to("cuda")
+        bg_color = torch.zeros((3,), device="cuda")
+
+        with torch.no_grad():
+            expected = VanillaRenderer()(camera, model, bg_color)["render"]
+            rendered = TorchTileRenderer().instantiate()(camera, model, bg_color)["render"]
+
+        mse = torch.mean((expected - rendered) ** 2)
+        self.assertGreater((-10. * torch.log10(mse)).item(), 40.)
+        self.assertGreater(ssim(expected, rendered).item(), 0.99)
+
+
+if __name__ == '__main__':
+    unittest.main()
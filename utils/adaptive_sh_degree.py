@@ -0,0 +1,185 @@
+"""
+Assign an SH degree to each Gaussian based on its view-dependent energy,
+and store the result as an `AdaptiveSHGaussian` checkpoint.
+
+The report shows the bytes saved and `analytic_color_PSNR`,
+the PSNR between the full and the truncated SH colors of the Gaussians, averaged over all view directions and weighted by opacities,
+computed from the SH band energies without rendering.
+With `--render-views`, it also shows `render_PSNR`,
+the PSNR of the images rendered from the truncated model against the ones from the full model, at the held-out cameras.
+"""
+
+import add_pypath
+import os
+import argparse
+import torch
+from internal.utils.gaussian_model_loader import GaussianModelLoader
+from internal.utils.sh_utils import assign_sh_degrees, sh_truncation_mse
+from internal.models.adaptive_sh_gaussian import AdaptiveSHGaussian
+
+VANILLA_PROPERTY_NAMES = {"means", "shs_dc", "shs_rest", "opacities", "scales", "rotations"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="Path to the checkpoint file or the training output directory")
+    parser.add_argument("--threshold", "-t", type=float, default=1. / 255,
+                        help="The maximum RMS color error allowed to be introduced by the truncation of each Gaussian")
+    parser.add_argument("--output", "-o", type=str, default=None)
+    parser.add_argument("--report", nargs="*", type=float, default=None,
+                        help="Print the report of the provided thresholds instead of converting")
+    parser.add_argument("--render-views", type=int, default=0,
+                        help="Also render this many held-out cameras of the dataset with the full and the truncated model, and report the PSNR between them")
+    parser.add_argument("--dataset-path", type=str, default=None,
+                        help="Override the dataset path stored in the checkpoint")
+    parser.add_argument("--device", type=str, default="cpu")
+    return parser.parse_args()
+
+
+def bytes_of(tensors) -> int:
+    return sum([i.numel() * i.element_size() for i in tensors])
+
+
+def get_report(properties, sh_degree: int, threshold: float, truncation_mse: torch.Tensor, opacities: torch.Tensor):
+    degrees = assign_sh_degrees(properties["shs_rest"], threshold)
+    n_by_degree = torch.bincount(degrees, minlength=sh_degree + 1)
+
+    dense_bytes = bytes_of(properties.values())
+    shs_rest_element_size = properties["shs_rest"].element_size()
+    packed_bytes = dense_bytes - bytes_of([properties["shs_rest"]]) + sum([
+        n_by_degree[degree].item() * ((degree + 1) ** 2 - 1) * 3 * shs_rest_element_size
+        for degree in range(1, sh_degree + 1)
+    ])
+
+    mse = torch.gather(truncation_mse, 1, degrees.unsqueeze(-1)).squeeze(-1)
+    weighted_mse = torch.sum(mse * opacities) / torch.sum(opacities)
+    psnr = -10. * torch.log10(weighted_mse).item() if weighted_mse > 0 else float("inf")
+
+    return degrees, n_by_degree.tolist(), dense_bytes, packed_bytes, psnr
+
+
+def get_render_cameras(ckpt, n: int, dataset_path: str = None) -> list:
+    """
+    `n` cameras evenly sampled from the validation set, or from the training set if there is no validation one
+    """
+
+    datamodule_hparams = ckpt["datamodule_hyper_parameters"]
+    dataparser_outputs = datamodule_hparams["parser"].instantiate(
+        path=datamodule_hparams["path"] if dataset_path is None else dataset_path,
+        output_path=os.getcwd(),
+        global_rank=0,
+    ).get_outputs()
+
+    cameras = dataparser_outputs.val_set.cameras
+    if len(cameras) == 0:
+        print("No validation camera, use the training ones")
+        cameras = dataparser_outputs.train_set.cameras
+    indices = torch.linspace(0, len(cameras) - 1, min(n, len(cameras))).round().long().unique().tolist()
+    return [cameras[i] for i in indices]
+
+
+def render_all(renderer, gaussian_model, cameras: list, bg_color: torch.Tensor) -> list:
+    device = bg_color.device
+    return [renderer(camera.to_device(device), gaussian_model, bg_color)["render"].clamp(0., 1.) for camera in cameras]
+
+
+def get_render_psnr(renderer, model, properties, degrees: torch.Tensor, cameras: list, bg_color: torch.Tensor, expected_images: list) -> float:
+    adaptive_model = AdaptiveSHGaussian(sh_degree=model.max_sh_degree).instantiate()
+    adaptive_model.setup_from_vanilla_properties(properties, degrees)
+    adaptive_model.active_sh_degree = model.active_sh_degree
+    adaptive_model.pre_activate_all_properties()
+    adaptive_model.eval()
+
+    mse = torch.stack([
+        torch.mean(torch.square(actual - expected))
+        for actual, expected in zip(render_all(renderer, adaptive_model, cameras, bg_color), expected_images)
+    ])
+    psnr = -10. * torch.log10(mse.clamp_min(1e-12))
+    return psnr.mean().item()
+
+
+def main():
+    args = parse_args()
+    torch.autograd.set_grad_enabled(False)
+
+    load_file = GaussianModelLoader.search_load_file(args.input)
+    assert load_file.endswith(".ckpt"), "Not a valid ckpt file can be found in '{}'".format(args.input)
+
+    print("Loading checkpoint '{}'...".format(load_file))
+    ckpt = torch.load(load_file, map_location="cpu")
+    model = GaussianModelLoader.initialize_model_from_checkpoint(ckpt, device=args.device)
+    assert set(model.property_names) == VANILLA_PROPERTY_NAMES, "only the vanilla Gaussian model is supported, but got {}".format(model.property_names)
+
+    properties = {k: v.detach() for k, v in model.properties.items()}
+    sh_degree = model.max_sh_degree
+    truncation_mse = sh_truncation_mse(properties["shs_rest"])
+    opacities = model.get_opacities().squeeze(-1)
+
+    # the images rendered from the full model are the references
+    render_psnr_of = None
+    if args.render_views > 0:
+        renderer = GaussianModelLoader.initialize_renderer_from_checkpoint(ckpt, stage="validation", device=args.device)
+        renderer.eval()
+        bg_color = torch.tensor(ckpt["hyper_parameters"]["background_color"], dtype=torch.float, device=args.device)
+        cameras = get_render_cameras(ckpt, args.render_views, args.dataset_path)
+        expected_images = render_all(renderer, model, cameras, bg_color)
+
+        def render_psnr_of(degrees):
+            return get_render_psnr(renderer, model, properties, degrees, cameras, bg_color, expected_images)
+
+    if args.report is not None:
+        thresholds = args.report if len(args.report) > 0 else [0.5 / 255, 1. / 255, 2. / 255, 4. / 255, 8. / 255]
+        columns = ["threshold", "degree_histogram", "size_MB", "saved_MB", "saved_percent", "analytic_color_PSNR"]
+        if render_psnr_of is not None:
+            columns.append("render_PSNR")
+        print("\t".join(columns))
+        for threshold in thresholds:
+            degrees, n_by_degree, dense_bytes, packed_bytes, psnr = get_report(properties, sh_degree, threshold, truncation_mse, opacities)
+            row = "{:.6f}\t{}\t{:.2f}\t{:.2f}\t{:.2f}%\t{:.2f}".format(
+                threshold,
+                n_by_degree,
+                packed_bytes / 1024 / 1024,
+                (dense_bytes - packed_bytes) / 1024 / 1024,
+                100. * (dense_bytes - packed_bytes) / dense_bytes,
+                psnr,
+            )
+            if render_psnr_of is not None:
+                row += "\t{:.2f}".format(render_psnr_of(degrees))
+            print(row)
+        return
+
+    degrees, n_by_degree, dense_bytes, packed_bytes, psnr = get_report(properties, sh_degree, args.threshold, truncation_mse, opacities)
+    print("n_by_degree={}, {:.2f}MB -> {:.2f}MB, analytic_color_PSNR={:.2f}{}".format(
+        n_by_degree,
+        dense_bytes / 1024 / 1024,
+        packed_bytes / 1024 / 1024,
+        psnr,
+        "" if render_psnr_of is None else ", render_PSNR={:.2f}".format(render_psnr_of(degrees)),
+    ))
+
+    config = AdaptiveSHGaussian(sh_degree=sh_degree, optimization=model.config.optimization)
+    adaptive_model = config.instantiate()
+    adaptive_model.setup_from_vanilla_properties(properties, degrees)
+
+    # replace the Gaussian model
+    ckpt["hyper_parameters"]["gaussian"] = config
+    for key in list(ckpt["state_dict"].keys()):
+        # density controller states do not match the new order, and are only required by training
+        if key.startswith("gaussian_model.") or key.startswith("density_controller."):
+            del ckpt["state_dict"][key]
+    for key, value in adaptive_model.state_dict().items():
+        ckpt["state_dict"]["gaussian_model.{}".format(key)] = value.cpu()
+    # training can not be resumed from the converted checkpoint
+    ckpt["optimizer_states"] = []
+    ckpt["lr_schedulers"] = []
+
+    output = args.output
+    if output is None:
+        output = "{}-adaptive_sh.ckpt".format(load_file[:load_file.rfind(".")])
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    torch.save(ckpt, output)
+    print("Saved to '{}'".format(output))
+
+
+if __name__ == "__main__":
+    main()
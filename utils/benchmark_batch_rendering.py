@@ -0,0 +1,79 @@
+import add_pypath
+import argparse
+import math
+import torch
+from internal.cameras.cameras import Cameras
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+from internal.utils.benchmark import benchmark
+from benchmark_torch_tile_renderer import get_model
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--n_cameras", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--frustum_culling", action="store_true", default=False)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=2)
+    return parser.parse_args()
+
+
+def get_cameras(n: int, width: int, height: int):
+    # orbiting the origin, looking at the scene from the -z side
+    angles = torch.linspace(-math.pi / 8, math.pi / 8, n)
+    R = torch.zeros((n, 3, 3))
+    R[:, 0, 0] = torch.cos(angles)
+    R[:, 0, 2] = -torch.sin(angles)
+    R[:, 1, 1] = 1.
+    R[:, 2, 0] = torch.sin(angles)
+    R[:, 2, 2] = torch.cos(angles)
+    return Cameras(
+        R=R,
+        T=torch.tensor([[0., 0., 0.]]).repeat(n, 1),
+        fx=torch.full((n,), 0.8 * width),
+        fy=torch.full((n,), 0.8 * width),
+        cx=torch.full((n,), width / 2.),
+        cy=torch.full((n,), height / 2.),
+        width=torch.full((n,), width, dtype=torch.int),
+        height=torch.full((n,), height, dtype=torch.int),
+        appearance_id=torch.zeros((n,), dtype=torch.int),
+        normalized_appearance_id=torch.zeros((n,)),
+        distortion_params=None,
+        camera_type=torch.zeros((n,), dtype=torch.int),
+    )
+
+
+def main():
+    args = get_args()
+
+    bg_color = torch.zeros((3,), device=args.device)
+    renderer = TorchTileRenderer(frustum_culling=args.frustum_culling).instantiate()
+    for n in args.n:
+        model = get_model(n).to(args.device)
+        for n_cameras in args.n_cameras:
+            cameras = [i.to_device(args.device) for i in get_cameras(n_cameras, args.width, args.width * 3 // 4)]
+
+            def loop():
+                with torch.no_grad():
+                    for camera in cameras:
+                        renderer(camera, model, bg_color)
+
+            def batch():
+                with torch.no_grad():
+                    renderer.batch_forward(cameras, model, bg_color)
+
+            results = {
+                "loop": benchmark(loop, args.device, args.n_iters, n_warmup=1),
+                "batch_forward": benchmark(batch, args.device, args.n_iters, n_warmup=1),
+            }
+
+            print("N={}, cameras={}: {}".format(
+                n,
+                n_cameras,
+                ", ".join(["{}={:.2f}fps".format(k, n_cameras / v) for k, v in results.items()]),
+            ))
+
+
+if __name__ == "__main__":
+    main()
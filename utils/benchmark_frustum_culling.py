@@ -0,0 +1,96 @@
+import add_pypath
+import argparse
+import torch
+from internal.cameras.cameras import Cameras
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.utils.benchmark import benchmark
+from internal.utils.gaussian_projection import project_gaussians
+from internal.utils.spatial_index import GaussianSpatialIndex
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--gaussians_per_cell", type=int, default=256)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=3)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    return parser.parse_args()
+
+
+def get_camera(width: int, height: int):
+    # inside the scene, looking toward +z
+    return Cameras(
+        R=torch.eye(3)[None],
+        T=torch.zeros((1, 3)),
+        fx=torch.tensor([0.8 * width]),
+        fy=torch.tensor([0.8 * width]),
+        cx=torch.tensor([width / 2.]),
+        cy=torch.tensor([height / 2.]),
+        width=torch.tensor([width], dtype=torch.int),
+        height=torch.tensor([height], dtype=torch.int),
+        appearance_id=torch.zeros((1,), dtype=torch.int),
+        normalized_appearance_id=torch.zeros((1,)),
+        distortion_params=None,
+        camera_type=torch.zeros((1,), dtype=torch.int),
+    )[0]
+
+
+def get_model(n: int):
+    model = VanillaGaussian().instantiate()
+    model.setup_from_number(n)
+    model.means = (torch.rand((n, 3)) - 0.5) * 100.
+    model.scales = torch.log(torch.rand((n, 3)) * 0.2 + 1e-3)
+    model.rotations = torch.randn((n, 4))
+    model.opacities = torch.zeros((n, 1))
+    return model
+
+
+def main():
+    args = get_args()
+
+    camera = get_camera(args.width, args.height).to_device(args.device)
+    for n in args.n:
+        model = get_model(n).to(args.device)
+        means, scales, rotations = model.get_means(), model.get_scales(), model.get_rotations()
+        spatial_index = GaussianSpatialIndex(gaussians_per_cell=args.gaussians_per_cell)
+
+        def project(indices=None):
+            with torch.no_grad():
+                project_gaussians(
+                    means_3d=means if indices is None else means[indices],
+                    scales=scales if indices is None else scales[indices],
+                    scale_modifier=1.,
+                    quaternions=rotations if indices is None else rotations[indices],
+                    world_to_camera=camera.world_to_camera,
+                    fx=camera.fx,
+                    fy=camera.fy,
+                    cx=camera.cx,
+                    cy=camera.cy,
+                    img_height=camera.height,
+                    img_width=camera.width,
+                    block_width=16,
+                )
+
+        with torch.no_grad():
+            results = {
+                "brute_force_projection": benchmark(project, args.device, args.n_iters, n_warmup=1),
+                "build": benchmark(lambda: spatial_index.build(means, scales, rotations), args.device, args.n_iters, n_warmup=1),
+                "refit": benchmark(lambda: spatial_index.refit(means, scales, rotations), args.device, args.n_iters, n_warmup=1),
+                "cull_cells": benchmark(lambda: spatial_index.cull(camera, per_gaussian=False), args.device, args.n_iters, n_warmup=1),
+                "cull": benchmark(lambda: spatial_index.cull(camera), args.device, args.n_iters, n_warmup=1),
+                "cull_and_projection": benchmark(lambda: project(spatial_index.cull(camera)), args.device, args.n_iters, n_warmup=1),
+            }
+            n_visible = spatial_index.cull(camera).shape[0]
+
+        print("N={}, cells={}, visible={:.1%}: {}".format(
+            n,
+            spatial_index.n_cells,
+            n_visible / n,
+            ", ".join(["{}={:.1f}ms".format(k, v * 1000) for k, v in results.items()]),
+        ))
+
+
+if __name__ == "__main__":
+    main()
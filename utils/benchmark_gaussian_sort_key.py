@@ -0,0 +1,78 @@
+import add_pypath
+import struct
+import argparse
+import torch
+from internal.utils.benchmark import benchmark
+from internal.utils.gaussian_projection import build_gaussian_sort_key
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=3)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--max_radius", type=int, default=32)
+    parser.add_argument("--loop_max_n", type=int, default=1_000,
+                        help="The Python loop implementation is only measured up to this number of Gaussians")
+    return parser.parse_args()
+
+
+def build_gaussian_sort_key_loop(depths, rect_min, rect_max, tile_bounds, cumsum_tiles_hit):
+    total_tiles_hit = cumsum_tiles_hit[-1].item()
+    sort_key = torch.zeros((total_tiles_hit,), dtype=torch.int64)
+    gaussian_ids = torch.zeros((total_tiles_hit,), dtype=torch.int32)
+
+    index = 0
+    for gaussian_idx in range(depths.shape[0]):
+        depth_id_n = struct.unpack("i", struct.pack("f", depths[gaussian_idx]))[0]
+        for i in range(rect_min[gaussian_idx][1], rect_max[gaussian_idx][1]):
+            row_tile_id_offset = tile_bounds[0] * i
+            for j in range(rect_min[gaussian_idx][0], rect_max[gaussian_idx][0]):
+                sort_key[index] = ((row_tile_id_offset + j) << 32) | depth_id_n
+                gaussian_ids[index] = gaussian_idx
+                index += 1
+
+    return sort_key, gaussian_ids
+
+
+def main():
+    args = get_args()
+
+    block_width = 16
+    tile_bounds = torch.tensor([
+        (args.width + block_width - 1) // block_width,
+        (args.height + block_width - 1) // block_width,
+        1,
+    ], dtype=torch.long, device=args.device)
+
+    for n in args.n:
+        means_2d = torch.rand((n, 2), device=args.device) * torch.tensor([args.width, args.height], device=args.device)
+        radius = torch.randint(1, args.max_radius, (n, 1), device=args.device)
+        rect_min = torch.minimum(((means_2d - radius) / block_width).int().clamp_min(0), tile_bounds[:2])
+        rect_max = torch.minimum(((means_2d + radius) / block_width).int() + 1, tile_bounds[:2])
+        rect_diff = rect_max - rect_min
+        cumsum_tiles_hit = torch.cumsum(rect_diff[:, 0] * rect_diff[:, 1], dim=-1)
+        depths = torch.rand((n,), device=args.device) * 100.
+
+        results = {
+            "vectorized": benchmark(lambda: build_gaussian_sort_key(depths, rect_min, rect_max, tile_bounds, cumsum_tiles_hit), args.device, args.n_iters, n_warmup=1),
+            "vectorized_sorted": benchmark(lambda: build_gaussian_sort_key(depths, rect_min, rect_max, tile_bounds, cumsum_tiles_hit, sort=True), args.device, args.n_iters, n_warmup=1),
+        }
+        if n <= args.loop_max_n:
+            results["loop"] = benchmark(
+                lambda: build_gaussian_sort_key_loop(depths.cpu(), rect_min.cpu(), rect_max.cpu(), tile_bounds.cpu(), cumsum_tiles_hit.cpu()),
+                n_iters=1,
+                n_warmup=0,
+            )
+
+        print("N={}, intersections={}: {}".format(
+            n,
+            cumsum_tiles_hit[-1].item(),
+            ", ".join(["{}={:.1f}ms".format(k, v * 1000) for k, v in results.items()]),
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import add_pypath
+import argparse
+import torch
+from internal.utils.benchmark import benchmark
+from internal.utils.lod_tree import GaussianLoDTree
+from benchmark_frustum_culling import get_camera, get_model
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--bits", type=int, default=16)
+    parser.add_argument("--threshold", type=float, default=1.)
+    parser.add_argument("--distances", type=float, nargs="+", default=[0., 500., 5000.])
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=3)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    for n in args.n:
+        model = get_model(n).to(args.device)
+        build_time = benchmark(lambda: GaussianLoDTree.from_gaussian_model(model, bits=args.bits), args.device, 1, n_warmup=0)
+        tree = GaussianLoDTree.from_gaussian_model(model, bits=args.bits)
+        print("N={}, nodes={}, build={:.1f}s".format(n, tree.n_nodes, build_time))
+
+        for distance in args.distances:
+            camera = get_camera(args.width, args.height)
+            # move backward
+            camera.T[2] = distance
+            camera.world_to_camera[3, 2] = distance
+            camera.camera_center[2] = -distance
+            camera.to_device(args.device)
+
+            with torch.no_grad():
+                select_time = benchmark(lambda: tree.select(camera, threshold=args.threshold), args.device, args.n_iters, n_warmup=1)
+            n_selected = tree.select(camera, threshold=args.threshold).shape[0]
+            print("  distance={}, selected={} ({:.1%}), select={:.1f}ms".format(distance, n_selected, n_selected / n, select_time * 1000))
+
+
+if __name__ == "__main__":
+    main()
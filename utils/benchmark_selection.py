@@ -0,0 +1,49 @@
+import add_pypath
+import argparse
+import torch
+from internal.utils.benchmark import benchmark
+from internal.utils.selection import quantile, kth_largest, weighted_sample_without_replacement
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[1_000_000, 5_000_000, 10_000_000, 30_000_000, 50_000_000])
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=3)
+    parser.add_argument("--percent", type=float, default=0.66)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    for n in args.n:
+        scores = torch.rand((n,), device=args.device)
+
+        def sort_based():
+            # the previous `calculate_v_imp_score()` + `get_prune_mask()`
+            kth_percent_largest = torch.sort(scores, descending=True).values[int(n * 0.9)]
+            value = torch.sort(scores, dim=0).values[int(args.percent * (n - 1))]
+            return kth_percent_largest, value
+
+        def selection_based():
+            return kth_largest(scores, int(n * 0.9)), quantile(scores, args.percent)
+
+        def histogram_based():
+            return quantile(scores, 0.1, exact=False), quantile(scores, args.percent, exact=False)
+
+        results = {
+            "sort": benchmark(sort_based, args.device, args.n_iters, n_warmup=1),
+            "kthvalue": benchmark(selection_based, args.device, args.n_iters, n_warmup=1),
+            "histogram": benchmark(histogram_based, args.device, args.n_iters, n_warmup=1),
+        }
+        if n <= 10_000_000:
+            budget = n // 10
+            results["multinomial"] = benchmark(lambda: torch.multinomial(scores, budget, replacement=False), args.device, args.n_iters, n_warmup=1)
+            results["exponential_topk"] = benchmark(lambda: weighted_sample_without_replacement(scores, budget), args.device, args.n_iters, n_warmup=1)
+
+        print("N={}: {}".format(n, ", ".join(["{}={:.1f}ms".format(k, v * 1000) for k, v in results.items()])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import add_pypath
+import argparse
+import torch
+from internal.utils.benchmark import benchmark
+from internal.utils.sh_utils import eval_sh, eval_sh_colors
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--degrees", type=int, nargs="+", default=[0, 1, 2, 3])
+    parser.add_argument("--chunk_size", type=int, default=262_144)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    half_dtype = torch.half if torch.device(args.device).type == "cuda" else torch.bfloat16
+    for n in args.n:
+        shs = torch.randn((n, 16, 3), device=args.device)
+        dirs = torch.nn.functional.normalize(torch.randn((n, 3), device=args.device), dim=-1)
+        for degree in args.degrees:
+            with torch.no_grad():
+                results = {
+                    "eval_sh": benchmark(
+                        lambda: eval_sh(degree, shs.transpose(1, 2), dirs),
+                        args.device,
+                        args.n_iters,
+                        n_warmup=1,
+                    ),
+                    "batched": benchmark(lambda: eval_sh_colors(degree, shs, dirs), args.device, args.n_iters, n_warmup=1),
+                    "chunked": benchmark(lambda: eval_sh_colors(degree, shs, dirs, chunk_size=args.chunk_size), args.device, args.n_iters, n_warmup=1),
+                    "chunked_{}".format(str(half_dtype).split(".")[-1]): benchmark(
+                        lambda: eval_sh_colors(degree, shs, dirs, chunk_size=args.chunk_size, dtype=half_dtype),
+                        args.device,
+                        args.n_iters,
+                        n_warmup=1,
+                    ),
+                }
+
+            print("N={}, degree={}: {}".format(
+                n,
+                degree,
+                ", ".join(["{}={:.1f}ms".format(k, v * 1000) for k, v in results.items()]),
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import add_pypath
+import argparse
+import torch
+from internal.utils.benchmark import benchmark
+from internal.utils.ssim import ssim, separable_ssim, l1_ssim_loss
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1080])
+    parser.add_argument("--devices", type=str, nargs="+", default=["cpu", "cuda"])
+    parser.add_argument("--n_iters", type=int, default=10)
+    parser.add_argument("--lambda_dssim", type=float, default=0.2)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    for device in args.devices:
+        if device.startswith("cuda") and not torch.cuda.is_available():
+            print("skip {}: CUDA is not available".format(device))
+            continue
+
+        for size in args.sizes:
+            height, width = size, size * 16 // 9
+            image = torch.rand((3, height, width), device=device).requires_grad_(True)
+            gt_image = torch.rand((3, height, width), device=device)
+            masked_pixels = (torch.rand((height, width), device=device) > 0.9).unsqueeze(0).expand(3, -1, -1)
+
+            def reference():
+                masked_gt_image = gt_image.clone()
+                masked_gt_image[masked_pixels] = image.detach()[masked_pixels]
+                l1 = torch.abs(image - masked_gt_image).mean()
+                loss = (1. - args.lambda_dssim) * l1 + args.lambda_dssim * (1. - ssim(image, masked_gt_image))
+                loss.backward()
+
+            def fused():
+                l1_ssim_loss(image, gt_image, args.lambda_dssim, masked_pixels)[0].backward()
+
+            results = {
+                "ssim": benchmark(lambda: ssim(image, gt_image), device, args.n_iters),
+                "separable_ssim": benchmark(lambda: separable_ssim(image, gt_image), device, args.n_iters),
+                "loss+backward": benchmark(reference, device, args.n_iters),
+                "l1_ssim_loss+backward": benchmark(fused, device, args.n_iters),
+            }
+            print("[{}] {}x{}: {}".format(
+                device,
+                width,
+                height,
+                ", ".join(["{}={:.2f}ms".format(k, v * 1000) for k, v in results.items()]),
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import add_pypath
+import argparse
+import torch
+from internal.cameras.cameras import Cameras
+from internal.models.vanilla_gaussian import VanillaGaussian
+from internal.renderers.torch_tile_renderer import TorchTileRenderer
+from internal.utils.benchmark import benchmark
+from internal.utils.general_utils import inverse_sigmoid
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[320, 640])
+    parser.add_argument("--chunk_size", type=int, nargs="+", default=[16])
+    parser.add_argument("--tile_batch_size", type=int, default=1024)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--n_iters", type=int, default=3)
+    parser.add_argument("--backward", action="store_true", default=False)
+    return parser.parse_args()
+
+
+def get_camera(width: int, height: int):
+    return Cameras(
+        R=torch.eye(3)[None],
+        T=torch.zeros((1, 3)),
+        fx=torch.tensor([0.8 * width]),
+        fy=torch.tensor([0.8 * width]),
+        cx=torch.tensor([width / 2.]),
+        cy=torch.tensor([height / 2.]),
+        width=torch.tensor([width], dtype=torch.int),
+        height=torch.tensor([height], dtype=torch.int),
+        appearance_id=torch.zeros((1,), dtype=torch.int),
+        normalized_appearance_id=torch.zeros((1,)),
+        distortion_params=None,
+        camera_type=torch.zeros((1,), dtype=torch.int),
+    )[0]
+
+
+def get_model(n: int):
+    model = VanillaGaussian().instantiate()
+    model.setup_from_number(n)
+    model.means = torch.cat([(torch.rand((n, 2)) - 0.5) * 6., torch.rand((n, 1)) * 6. + 2.], dim=-1)
+    # smaller Gaussians for larger scenes, to keep the image covered by a similar number of layers
+    model.scales = torch.log(torch.rand((n, 3)) * 0.5 / n ** 0.5 + 1e-3)
+    model.rotations = torch.randn((n, 4))
+    model.opacities = inverse_sigmoid(torch.rand((n, 1)) * 0.98 + 0.01)
+    model.shs_dc = torch.randn((n, 1, 3))
+    model.shs_rest = torch.randn((n, 15, 3)) * 0.1
+    model.active_sh_degree = 3
+    return model
+
+
+def main():
+    args = get_args()
+
+    bg_color = torch.zeros((3,), device=args.device)
+    for n in args.n:
+        model = get_model(n).to(args.device)
+        for width in args.resolutions:
+            camera = get_camera(width, width * 3 // 4).to_device(args.device)
+            for chunk_size in args.chunk_size:
+                renderer = TorchTileRenderer(chunk_size=chunk_size, tile_batch_size=args.tile_batch_size).instantiate()
+
+                def forward():
+                    with torch.no_grad():
+                        renderer(camera, model, bg_color)
+
+                def forward_and_backward():
+                    outputs = renderer(camera, model, bg_color)
+                    outputs["render"].mean().backward()
+
+                results = {
+                    "forward": benchmark(forward, args.device, args.n_iters, n_warmup=1),
+                }
+                if args.backward:
+                    results["forward_and_backward"] = benchmark(forward_and_backward, args.device, args.n_iters, n_warmup=1)
+
+                print("N={}, {}x{}, chunk_size={}: {}".format(
+                    n,
+                    width,
+                    width * 3 // 4,
+                    chunk_size,
+                    ", ".join(["{}={:.1f}ms".format(k, v * 1000) for k, v in results.items()]),
+                ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import add_pypath
+import os
+import argparse
+import torch
+from internal.utils.gaussian_model_loader import GaussianModelLoader
+from internal.utils.lod_tree import GaussianLoDTree
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="the trained model, a checkpoint or a ply file")
+    parser.add_argument("--output", "-o", type=str, default=None)
+    parser.add_argument("--bits", type=int, default=16, help="the depth of the octree")
+    parser.add_argument("--n_sigma", type=float, default=3.)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    load_from = GaussianModelLoader.search_load_file(args.path)
+    model, _ = GaussianModelLoader.search_and_load(load_from, device=args.device, pre_activate=False)
+    print("{} Gaussians loaded from {}".format(model.n_gaussians, load_from))
+
+    tree = GaussianLoDTree.from_gaussian_model(model, bits=args.bits, n_sigma=args.n_sigma)
+    print("nodes={}, levels={}".format(tree.n_nodes, tree.levels.max().item() + 1))
+
+    output = args.output
+    if output is None:
+        output = os.path.join(os.path.dirname(load_from), "lod_tree.pt")
+    tree.to("cpu").save(output)
+
+    # for the viewer
+    viewer_config = os.path.splitext(output)[0] + ".yaml"
+    with open(viewer_config, "w") as f:
+        f.write("tree: {}\n".format(os.path.abspath(output)))
+    print("saved to {}, view it by `python viewer.py {}`".format(output, viewer_config))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import add_pypath
 import argparse
 import numpy as np
+import torch
 import lightning
 from internal.utils.gaussian_utils import Gaussian
-from internal.utils.sh_utils import eval_sh
+from internal.utils.sh_utils import eval_sh_colors
 
 
 def getArgs():
@@ -25,7 +26,6 @@ def main():
     if args.input.endswith(".ply"):
         gaussians = Gaussian.load_from_ply(args.input)
     else:
-        import torch
         ckpt = torch.load(args.input)
         gaussians = Gaussian.load_from_state_dict(ckpt["hyper_parameters"]["gaussian"].sh_degree, ckpt["state_dict"]).to_ply_format()
 
@@ -39,7 +39,7 @@ def main():
     # attribute preprocess
     scales_sorted_activated = np.exp(scales_sorted).astype(np.float32)
     rot_sorted_processed = ((rot_sorted / np.linalg.norm(rot_sorted, axis=-1, keepdims=True)) * 128 + 128).clip(0, 255)
-    rgbs = eval_sh(0, features_dc, None) + 0.5
+    rgbs = eval_sh_colors(0, torch.from_numpy(features_dc).transpose(1, 2)).numpy() + 0.5
     alphas = 1. / (1 + np.exp(-opacities_sorted))
     rgbas = (np.concatenate([rgbs, alphas], axis=-1) * 255).clip(0, 255)
     # define splat file structure
@@ -28,10 +28,7 @@ def parse_args():
 
 
 @torch.no_grad()
-def calculate_gaussian_scores(cameras, gaussian_model, device):
-    hit_count_list = []
-    opacity_score_list = []
-    alpha_score_list = []
+def calculate_gaussian_scores(cameras, gaussian_model, device, batch_size: int = 8):
     all_visibility_score = torch.zeros((len(cameras), gaussian_model.get_xyz.shape[0]), dtype=torch.float, device=device)
 
     scales = gaussian_model.get_scales()
@@ -40,19 +37,16 @@ def calculate_gaussian_scores(cameras, gaussian_model, device):
             [scales, torch.full((scales.shape[0], 1), 1e-6, dtype=scales.dtype, device=scales.device)],
             dim=-1,
         )
-    for idx, camera in tqdm(enumerate(cameras), total=len(cameras), leave=False, desc="Calculating gaussian visibilities"):
-        hit_count, opacity_score, alpha_score, visibility_score = GSplatHitPixelCountRenderer.hit_pixel_count(
+    # up to `batch_size` cameras are projected together
+    for idx, (_, _, _, visibility_score) in tqdm(GSplatHitPixelCountRenderer.batch_hit_pixel_count(
             means3D=gaussian_model.get_xyz,
             opacities=gaussian_model.get_opacity,
             scales=scales,
             rotations=gaussian_model.get_rotation,
-            viewpoint_camera=camera.to_device("cuda"),
-        )
-        # hit_count_list.append(hit_count.cpu())
-        # opacity_score_list.append(opacity_score.cpu())
-        # alpha_score_list.append(alpha_score.cpu())
+            cameras=list(cameras),
+            max_batch_size=batch_size,
+    ), total=len(cameras), leave=False, desc="Calculating gaussian visibilities"):
         all_visibility_score[idx] = visibility_score.to(device=device)
-        # visibility_score_list.append(visibility_score.cpu())
 
     torch.cuda.empty_cache()
 
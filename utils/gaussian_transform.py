@@ -105,6 +105,8 @@ def main():
         r_wxyz=vt.SO3.from_matrix(rot_mat).wxyz,
         t_xyz=np.asarray([args.tx, args.ty, args.tz]),
     )
+    # the properties of `gaussian_model` are updated lazily
+    gaussian_model_editor.apply_edits()
 
     # rescale SHs
     if args.sh_factor != 1.:
@@ -0,0 +1,136 @@
+"""
+Load test the render server, with several concurrent clients orbiting the scene.
+
+    python utils/load_test_render_server.py --url http://127.0.0.1:8090 --n_clients 8
+    python utils/load_test_render_server.py --url ws://127.0.0.1:8091
+    # without a server, the models are loaded in-process
+    python utils/load_test_render_server.py --local outputs/garden
+"""
+
+import add_pypath
+import argparse
+import math
+import threading
+import time
+import numpy as np
+import torch
+from internal.render_server import HTTPRenderClient, WebSocketRenderClient, LocalRenderClient, RenderService, RenderRequestError
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--url", type=str, default=None,
+                       help="http://... or ws://...")
+    group.add_argument("--local", type=str, nargs="+", default=None,
+                       help="Serve the requests with the in-process stand-in, loading these models")
+    parser.add_argument("--n_clients", type=int, default=4)
+    parser.add_argument("--n_requests", type=int, default=32,
+                        help="The number of the requests of each client")
+    parser.add_argument("--cameras_per_request", type=int, default=1)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--radius", type=float, default=4.)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--format", type=str, default=None)
+    parser.add_argument("--model", type=str, default=None)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    return parser.parse_args()
+
+
+def get_orbit_camera(angle: float, radius: float, width: int, height: int) -> dict:
+    # look at the origin from the XZ plane, in the COLMAP convention
+    position = np.asarray([radius * math.sin(angle), 0., -radius * math.cos(angle)])
+    forward = -position / np.linalg.norm(position)
+    right = np.cross([0., 1., 0.], forward)
+    right /= np.linalg.norm(right)
+    down = np.cross(forward, right)
+    c2w = np.eye(4)
+    c2w[:3, 0], c2w[:3, 1], c2w[:3, 2], c2w[:3, 3] = right, down, forward, position
+    return {
+        "width": width,
+        "height": height,
+        "fx": 0.8 * width,
+        "c2w": c2w.tolist(),
+    }
+
+
+def run_client(client_factory, client_idx: int, args, latencies: list, server_timings: list, counters: dict, lock):
+    client = client_factory()
+    try:
+        for request_idx in range(args.n_requests):
+            cameras = []
+            for camera_idx in range(args.cameras_per_request):
+                # one degree per camera, starting from different directions
+                angle = 2 * math.pi * client_idx / args.n_clients + math.radians(request_idx * args.cameras_per_request + camera_idx)
+                camera = get_orbit_camera(angle, args.radius, args.width, args.height)
+                for key in ["output", "format", "model"]:
+                    if getattr(args, key) is not None:
+                        camera[key] = getattr(args, key)
+                cameras.append(camera)
+
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    response = client.render(cameras)
+                    break
+                except RenderRequestError as e:
+                    if e.status != 503:
+                        raise
+                    with lock:
+                        counters["rejected"] += 1
+                    time.sleep(0.05)
+
+            with lock:
+                latencies.append(time.perf_counter() - started_at)
+                server_timings.extend(i["timing"] for i in response["results"])
+                counters["cameras"] += len(cameras)
+    finally:
+        client.close()
+
+
+def main():
+    args = get_args()
+
+    if args.url is not None:
+        if args.url.startswith("ws"):
+            client_factory = lambda: WebSocketRenderClient(args.url)
+        else:
+            client_factory = lambda: HTTPRenderClient(args.url)
+    else:
+        from internal.entrypoints.render_server import load_models
+        service = RenderService(load_models(args.local, args.device), device=args.device)
+        client_factory = lambda: LocalRenderClient(service)
+
+    with client_factory() as client:
+        print(client.get_models())
+
+    latencies, server_timings = [], []
+    counters = {"cameras": 0, "rejected": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(client_factory, i, args, latencies, server_timings, counters, lock))
+        for i in range(args.n_clients)
+    ]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started_at
+
+    latencies = np.asarray(latencies) * 1000.
+    print("{} requests, {} cameras in {:.2f}s, {:.2f} cameras/s, {} rejected".format(
+        len(latencies),
+        counters["cameras"],
+        seconds,
+        counters["cameras"] / seconds,
+        counters["rejected"],
+    ))
+    print("latency: p50={:.1f}ms, p90={:.1f}ms, p99={:.1f}ms".format(*np.percentile(latencies, [50, 90, 99])))
+    for key in ["queue_ms", "render_ms", "encode_ms", "batch_size"]:
+        print("{}: mean={:.2f}".format(key, np.mean([i[key] for i in server_timings])))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,8 @@ def parse_args():
     parser.add_argument("--project_name", "-p", type=str, required=True, help="Project name")
     parser.add_argument("--min-images", type=int, default=32)
     parser.add_argument("--prune-percent", type=float, default=0.6)
+    parser.add_argument("--approximate-quantile", action="store_true", default=False,
+                        help="Use histogram based percentiles instead of exact selections")
     configure_arg_parser_v2(parser)
     return parser.parse_args()
 
@@ -114,8 +116,8 @@ def main():
             opacity_score_total = opacity_score_total[nonzero_visibility_mask]
 
             # prune by opacity
-            v_imp_score = calculate_v_imp_score(gaussian_model.get_scaling, opacity_score_total, 0.1)
-            high_opacity_score_mask = ~get_prune_mask(args.prune_percent, v_imp_score)
+            v_imp_score = calculate_v_imp_score(gaussian_model.get_scaling, opacity_score_total, 0.1, exact=not args.approximate_quantile)
+            high_opacity_score_mask = ~get_prune_mask(args.prune_percent, v_imp_score, exact=not args.approximate_quantile)
             gaussian_model.properties = {k: v[high_opacity_score_mask] for k, v in gaussian_model.properties.items()}
 
             n_after_pruning += gaussian_model.n_gaussians